@@ -5,11 +5,13 @@ Main application entry point for the smart nutrition analysis platform.
 
 import os
 import sys
+import time
 import logging
 from flask import Flask, send_from_directory, send_file, request, make_response, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 from werkzeug.serving import WSGIRequestHandler
+from sqlalchemy import text
 
 # Import controllers
 from controllers.auth_controller import auth_bp
@@ -18,6 +20,14 @@ from controllers.nutrition_analysis_controller import nutrition_analysis_bp
 from controllers.product_controller import product_bp
 from controllers.analysis_controller import analysis_bp
 from controllers.recommendation_controller import recommendation_bp
+from services.analysis_recorder import analysis_recorder
+from services.barcode_service import barcode_service
+from services.product_index import load_product_index
+from utils.json_provider import FastJSONProvider
+from utils.password_hasher import PasswordHashingBusy
+from utils.database import get_engine, get_pool_stats, register_session_teardown
+from utils.query_metrics import register_query_metrics, query_metrics
+from utils.decorators import require_auth, require_admin
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +42,9 @@ def create_app():
                 static_folder='static', 
                 static_url_path='/static')
     
+    # App-wide JSON serialization (orjson when available)
+    app.json = FastJSONProvider(app)
+    
     # Flask configuration
     flask_env = os.getenv('FLASK_ENV', 'development')
     if flask_env == 'production':
@@ -48,11 +61,29 @@ def create_app():
     app.config['TOKEN_EXPIRES_IN'] = int(os.environ.get('TOKEN_EXPIRES_IN', 86400))  # 24 hours
     app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
     
     # Google OAuth Configuration
     app.config['GOOGLE_CLIENT_ID'] = os.environ.get('GOOGLE_CLIENT_ID')
     app.config['GOOGLE_CLIENT_SECRET'] = os.environ.get('GOOGLE_CLIENT_SECRET')
     
+    # Build the shared engine now so the first request does not pay for it
+    if os.environ.get('DATABASE_URL'):
+        get_engine()
+    
+    # In-memory product index for autocomplete, from its snapshot or the OFF dump
+    if os.environ.get('PRODUCT_INDEX_ENABLED', 'true').lower() == 'true':
+        try:
+            load_product_index()
+        except Exception as e:
+            logger.warning(f"Product index not loaded: {e}")
+    
+    # One database session per request, shared by all services
+    register_session_teardown(app)
+    
+    # Query count/time per request (X-Query-* headers in debug mode)
+    register_query_metrics(app)
+    
     # Ensure upload directory exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
@@ -114,7 +145,9 @@ def create_app():
                 ],
                 'analysis': [
                     'POST /api/analysis/analyze',
-                    'POST /api/analysis/upload'
+                    'POST /api/analysis/upload',
+                    'POST /api/analysis/reformulation',
+                    'GET /api/analysis/algorithms'
                 ],
                 'products': [
                     'GET /api/products',
@@ -135,6 +168,37 @@ def create_app():
             }
         })
     
+    # Connection pool health and checkout statistics
+    @app.route('/api/health/db', methods=['GET'])
+    def database_health():
+        try:
+            started = time.perf_counter()
+            with get_engine().connect() as connection:
+                connection.execute(text('SELECT 1'))
+            return jsonify({
+                'status': 'healthy',
+                'ping_ms': round((time.perf_counter() - started) * 1000, 3),
+                'pool': get_pool_stats()
+            })
+        except Exception as e:
+            return jsonify({
+                'status': 'unavailable',
+                'error': str(e)
+            }), 503
+    
+    # Per-endpoint query count and query time histograms
+    @app.route('/api/metrics', methods=['GET'])
+    @require_auth
+    @require_admin
+    def metrics():
+        return jsonify({
+            'success': True,
+            'queries': query_metrics.snapshot(),
+            'pool': get_pool_stats() if os.environ.get('DATABASE_URL') else None,
+            'analysis_recorder': analysis_recorder.get_stats(),
+            'barcode_lookups': barcode_service.get_stats()
+        })
+    
     # Serve static files from uploads directory
     @app.route('/static/uploads/<path:filename>')
     def serve_uploads(filename):
@@ -155,6 +219,17 @@ def create_app():
             'error': 'File too large. Maximum size is 16MB.'
         }), 413
     
+    @app.errorhandler(PasswordHashingBusy)
+    def password_hashing_busy(e):
+        # Login/registration storms are shed here instead of tying up every worker
+        response = jsonify({
+            'success': False,
+            'error': e.description,
+            'retry_after': e.retry_after_seconds
+        })
+        response.headers['Retry-After'] = str(e.retry_after_seconds)
+        return response, 429
+    
     @app.errorhandler(404)
     def not_found(e):
         return jsonify({
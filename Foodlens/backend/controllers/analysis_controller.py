@@ -8,6 +8,10 @@ from werkzeug.utils import secure_filename
 import os
 from datetime import datetime
 import logging
+from services.analysis_service import analysis_service, DEFAULT_PAGE_SIZE
+from utils.decorators import rate_limit, require_auth
+from utils.query_metrics import query_budget
+from utils.rate_limiter import OCR_LIMIT_PER_CLIENT, OCR_LIMIT_GLOBAL
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +26,8 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @analysis_bp.route('/analyze', methods=['POST'])
+@rate_limit(OCR_LIMIT_PER_CLIENT, 60, key='user', cost='ocr', scope='ocr')
+@rate_limit(OCR_LIMIT_GLOBAL, 1, key='endpoint', cost='ocr', scope='ocr')
 def analyze_product():
     """
     Analyze product image using OCR and calculate Nutri-Score
@@ -289,6 +295,50 @@ def generate_recommendations_mock(language):
     }
     return recommendations
 
+@analysis_bp.route('', methods=['GET'])
+@require_auth
+@query_budget(2)
+def list_analyses():
+    """Current user's analyses, newest first, paginated with an opaque cursor"""
+    try:
+        user_id = request.current_user['id']
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        result = analysis_service.list_analyses(user_id, cursor=cursor, limit=limit)
+        
+        if result['success']:
+            return jsonify(result), 200
+        elif result['error'].startswith('Invalid cursor'):
+            return jsonify(result), 400
+        else:
+            return jsonify(result), 500
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to retrieve analyses: {str(e)}'
+        }), 500
+
+@analysis_bp.route('/<analysis_id>', methods=['GET'])
+@require_auth
+@query_budget(2)
+def get_analysis(analysis_id):
+    """Full analysis, including detailed results"""
+    try:
+        user_id = request.current_user['id']
+        result = analysis_service.get_analysis(user_id, analysis_id)
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 404
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to retrieve analysis: {str(e)}'
+        }), 500
+
 @analysis_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for analysis service"""
@@ -296,6 +346,8 @@ def health_check():
         'success': True,
         'message': 'Analysis service is running',
         'endpoints': [
-            '/analyze - POST - Analyze product image'
+            '/analyze - POST - Analyze product image',
+            '/ - GET - List analyses (cursor, limit)',
+            '/<analysis_id> - GET - Analysis details'
         ]
     })
@@ -5,11 +5,14 @@ API endpoints for user authentication and authorization.
 
 from flask import Blueprint, request, jsonify
 from services.auth_service import auth_service
-from utils.decorators import require_auth
+from utils.password_hasher import PasswordHashingBusy
+from utils.decorators import require_auth, rate_limit
+from utils.rate_limiter import AUTH_LIMIT_PER_IP
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit(AUTH_LIMIT_PER_IP, 1, key='ip', scope='auth')
 def register():
     """User registration endpoint."""
     try:
@@ -33,6 +36,8 @@ def register():
         else:
             return jsonify(result), 400
             
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -40,6 +45,7 @@ def register():
         }), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit(AUTH_LIMIT_PER_IP, 1, key='ip', scope='auth')
 def login():
     """User login endpoint."""
     try:
@@ -60,6 +66,8 @@ def login():
         else:
             return jsonify(result), 401
             
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -126,6 +134,8 @@ def change_password():
         else:
             return jsonify(result), 400
             
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -136,13 +146,22 @@ def change_password():
 @require_auth
 def verify_token():
     """Verify current token endpoint."""
+    # Access tokens only carry a few claims; return the full user record
+    user = auth_service.get_principal(request.current_user['id'])
+    if user is None:
+        return jsonify({
+            'success': False,
+            'error': 'User not found or inactive'
+        }), 401
+    
     return jsonify({
         'success': True,
-        'user': request.current_user,
+        'user': user,
         'message': 'Token is valid'
     })
 
 @auth_bp.route('/google', methods=['POST'])
+@rate_limit(AUTH_LIMIT_PER_IP, 1, key='ip', scope='auth')
 def google_auth():
     """Google OAuth authentication endpoint."""
     try:
@@ -161,6 +180,8 @@ def google_auth():
         else:
             return jsonify(result), 401
             
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -168,6 +189,7 @@ def google_auth():
         }), 500
 
 @auth_bp.route('/forgot-password', methods=['POST'])
+@rate_limit(AUTH_LIMIT_PER_IP, 1, key='ip', scope='auth')
 def forgot_password():
     """Send password reset email."""
     try:
@@ -193,6 +215,7 @@ def forgot_password():
         }), 500
 
 @auth_bp.route('/reset-password', methods=['POST'])
+@rate_limit(AUTH_LIMIT_PER_IP, 1, key='ip', scope='auth')
 def reset_password():
     """Reset password with token."""
     try:
@@ -210,6 +233,8 @@ def reset_password():
         else:
             return jsonify(result), 400
             
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -17,7 +17,17 @@ import numpy as np
 
 # Import our enhanced services
 from services.ocr_service import enhanced_ocr_service
-from services.nutri_score_service import enhanced_nutri_score_calculator
+from services.nutri_score_service import (
+    enhanced_nutri_score_calculator,
+    NUTRI_SCORE_ALGORITHMS,
+    DEFAULT_ALGORITHM_VERSION,
+    MAX_REFORMULATION_GRID_CELLS,
+    REFORMULATION_NUTRIENTS,
+)
+from services.allergen_service import allergen_service
+from services.analysis_recorder import analysis_recorder
+from utils.decorators import optional_auth, rate_limit
+from utils.rate_limiter import OCR_LIMIT_PER_CLIENT, OCR_LIMIT_GLOBAL
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +81,9 @@ def save_debug_image(image, filename, debug_folder='debug_images'):
         return None
 
 @nutrition_analysis_bp.route('/analyze', methods=['POST'])
+@optional_auth
+@rate_limit(OCR_LIMIT_PER_CLIENT, 60, key='user', cost='ocr', scope='ocr')
+@rate_limit(OCR_LIMIT_GLOBAL, 1, key='endpoint', cost='ocr', scope='ocr')
 def analyze_product():
     """Analyze product image for nutrition information and calculate Nutri-Score"""
     try:
@@ -102,6 +115,14 @@ def analyze_product():
         # Get language preference (default to Turkish)
         language = request.form.get('language', 'tr')
         
+        # Nutri-Score algorithm version (default: current rules)
+        algorithm_version = request.form.get('algorithm_version') or DEFAULT_ALGORITHM_VERSION
+        if algorithm_version not in NUTRI_SCORE_ALGORITHMS:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown Nutri-Score algorithm version: {algorithm_version}'
+            }), 400
+        
         # Create timestamp for unique filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         secure_name = secure_filename(file.filename)
@@ -134,7 +155,9 @@ def analyze_product():
         ingredients = ocr_result.get('ingredients', [])
         
         # Analyze product with enhanced Nutri-Score calculator
-        nutri_analysis = enhanced_nutri_score_calculator.analyze_product_from_ocr(ocr_result, ingredients)
+        nutri_analysis = enhanced_nutri_score_calculator.analyze_product_from_ocr(
+            ocr_result, ingredients, algorithm_version
+        )
         
         if not nutri_analysis['success']:
             return jsonify({
@@ -164,6 +187,17 @@ def analyze_product():
             }
         }
         
+        # Detect allergens; signed-in users also get warnings for their own allergens
+        allergen_check = allergen_service.check_ingredients(
+            ingredients or ocr_result.get('text', ''),
+            user_id=request.current_user['id'] if request.current_user else None
+        )
+        if allergen_check['success']:
+            response['allergens'] = allergen_check['detected_allergens']
+            response['allergen_warnings'] = allergen_check['allergen_warnings']
+        else:
+            logger.warning(allergen_check['error'])
+        
         # Add warnings if data quality is low
         if nutri_analysis['data_quality']['manual_review_needed']:
             missing = nutri_analysis['data_quality']['missing_nutrients']
@@ -173,6 +207,37 @@ def analyze_product():
             ]
             response['warnings'] = [w for w in response['warnings'] if w]
         
+        # Signed-in users' results are saved to their history behind the response
+        if request.current_user:
+            try:
+                analysis = analysis_recorder.record(
+                    request.current_user['id'], 'ocr',
+                    input_data={
+                        'ocr_text': ocr_result.get('text', ''),
+                        'ingredients': ingredients,
+                        'language': language
+                    },
+                    image_url=file_url,
+                    analysis_summary=f"Nutri-Score {nutri_analysis['nutri_score']['grade']}",
+                    detailed_analysis=nutri_analysis['nutri_score'],
+                    allergen_warnings=response.get('allergen_warnings'),
+                    nutritional_assessment={
+                        'nutrition': response['nutrition'],
+                        'data_quality': nutri_analysis['data_quality']
+                    },
+                    ai_model_version=f"nutri-score-{algorithm_version}",
+                    confidence_score=round(nutri_analysis['data_quality']['confidence'] / 100, 2),
+                    processing_time=round(processing_time, 3),
+                    status='manual_review' if nutri_analysis['data_quality']['manual_review_needed'] else 'completed'
+                )
+                if analysis is not None:
+                    response['analysis_id'] = str(analysis.id)
+                else:
+                    logger.warning("Analysis queue is full; result not saved to history")
+            except Exception as e:
+                # Losing the history entry must not fail the analysis
+                logger.error(f"Failed to record analysis: {str(e)}")
+        
         logger.info(f"Analysis completed in {processing_time:.2f}s with Nutri-Score: {nutri_analysis['nutri_score']['grade']}")
         return jsonify(response)
         
@@ -185,6 +250,9 @@ def analyze_product():
         }), 500
 
 @nutrition_analysis_bp.route('/debug-ocr', methods=['POST'])
+@optional_auth
+@rate_limit(OCR_LIMIT_PER_CLIENT, 60, key='user', cost='ocr', scope='ocr')
+@rate_limit(OCR_LIMIT_GLOBAL, 1, key='endpoint', cost='ocr', scope='ocr')
 def debug_ocr():
     """Debug endpoint for OCR processing only"""
     try:
@@ -246,3 +314,90 @@ def debug_ocr():
             'success': False,
             'error': f"Error in debug-ocr: {str(e)}"
         }), 500
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and np.isfinite(value)
+
+def reformulation_grid_error(grid):
+    """Why a reformulation grid spec is invalid, or None when it can be scored"""
+    if grid is None:
+        return None
+    if not isinstance(grid, dict):
+        return 'Grid must be an object mapping nutrients to axes'
+    for nutrient, spec in grid.items():
+        if nutrient not in REFORMULATION_NUTRIENTS:
+            return f'Unsupported reformulation nutrient: {nutrient}'
+        if isinstance(spec, list):
+            if not spec or len(spec) > MAX_REFORMULATION_GRID_CELLS:
+                return f'Grid values for {nutrient} must be a non-empty list of at most {MAX_REFORMULATION_GRID_CELLS} numbers'
+            if not all(_is_number(value) for value in spec):
+                return f'Grid values for {nutrient} must be numbers'
+        elif isinstance(spec, dict):
+            unknown = set(spec) - {'min_change', 'max_change', 'steps'}
+            if unknown:
+                return f"Unknown grid options for {nutrient}: {', '.join(sorted(map(str, unknown)))}"
+            if not all(_is_number(spec[key]) for key in ('min_change', 'max_change') if key in spec):
+                return f'Grid changes for {nutrient} must be numbers'
+            steps = spec.get('steps', 11)
+            if not isinstance(steps, int) or isinstance(steps, bool) or not 1 <= steps <= MAX_REFORMULATION_GRID_CELLS:
+                return f'Grid steps for {nutrient} must be an integer between 1 and {MAX_REFORMULATION_GRID_CELLS}'
+        else:
+            return f'Grid axis for {nutrient} must be a list of values or a range object'
+    return None
+
+@nutrition_analysis_bp.route('/reformulation', methods=['POST'])
+@rate_limit(120, 1, key='ip')
+def analyze_reformulation():
+    """What-if reformulation analysis: grade boundaries and score grid for one product"""
+    try:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('nutrition'), dict):
+            return jsonify({
+                'success': False,
+                'error': 'Nutrition values are required'
+            }), 400
+        
+        grid_error = reformulation_grid_error(data.get('grid'))
+        if grid_error:
+            return jsonify({
+                'success': False,
+                'error': grid_error
+            }), 400
+        
+        result = enhanced_nutri_score_calculator.analyze_reformulation(
+            data['nutrition'],
+            ingredients=data.get('ingredients') or [],
+            food_type=data.get('food_type'),
+            grid=data.get('grid'),
+            version=data.get('algorithm_version')
+        )
+        
+        return jsonify({
+            'success': True,
+            **result
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error in reformulation analysis: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': f"Error in reformulation analysis: {str(e)}"
+        }), 500
+
+@nutrition_analysis_bp.route('/algorithms', methods=['GET'])
+def list_algorithms():
+    """List the Nutri-Score algorithm versions that can be selected per request"""
+    return jsonify({
+        'success': True,
+        'default_version': DEFAULT_ALGORITHM_VERSION,
+        'algorithms': [
+            {'version': algorithm.version, 'description': algorithm.description}
+            for algorithm in NUTRI_SCORE_ALGORITHMS.values()
+        ]
+    })
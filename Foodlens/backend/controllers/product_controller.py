@@ -4,21 +4,107 @@ Product search, retrieval, and management endpoints.
 """
 
 from flask import Blueprint, request, jsonify
+from services.barcode_service import barcode_service
+from services.product_index import product_index
+from services.product_service import product_service, parse_filters, DEFAULT_PAGE_SIZE
+from utils.decorators import require_auth
+from utils.query_metrics import query_budget
 
 # Create blueprint
 product_bp = Blueprint('product', __name__, url_prefix='/api/products')
 
 @product_bp.route('/', methods=['GET'])
+@product_bp.route('/search', methods=['GET'])
+@query_budget(2)
 def search_products():
-    """Search products by name or barcode."""
-    return jsonify({"message": "Product search endpoint - under development"})
+    """Search products by name, brand, category or ingredients, with facet counts."""
+    try:
+        filters = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        result = product_service.search_products(
+            request.args.get('q'),
+            filters=filters,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        )
+
+        if result['success']:
+            return jsonify(result), 200
+        elif result['error'].startswith('Invalid cursor'):
+            return jsonify(result), 400
+        else:
+            return jsonify(result), 500
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Product search failed: {str(e)}'
+        }), 500
+
+@product_bp.route('/autocomplete', methods=['GET'])
+def autocomplete_products():
+    """Word completions and top products for a partial query, from the in-memory index."""
+    try:
+        query = request.args.get('q', '')
+        limit = max(1, min(request.args.get('limit', 5, type=int), 20))
+        exclude = {'allergen': [value for value in request.args.get('without_allergens', '').split(',') if value]}
+        matches = product_index.search(query, exclude_tags=exclude, limit=limit)
+
+        return jsonify({
+            'success': True,
+            'suggestions': product_index.autocomplete(query, limit=limit),
+            'products': matches['products'],
+            'total': matches['total']
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Autocomplete failed: {str(e)}'
+        }), 500
 
 @product_bp.route('/<product_id>', methods=['GET'])
+@query_budget(1)
 def get_product(product_id):
     """Get product details by ID."""
-    return jsonify({"message": f"Get product {product_id} - under development"})
+    try:
+        result = product_service.get_product(product_id)
+
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 404
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to retrieve product: {str(e)}'
+        }), 500
 
 @product_bp.route('/barcode/<barcode>', methods=['GET'])
+@require_auth
+@query_budget(3)
 def get_product_by_barcode(barcode):
-    """Get product by barcode."""
-    return jsonify({"message": f"Get product by barcode {barcode} - under development"})
+    """Get product by barcode, fetching unknown barcodes from OpenFoodFacts."""
+    try:
+        result = barcode_service.lookup(barcode)
+
+        if result['success']:
+            return jsonify(result), 200
+        elif result['error'] == 'Product not found':
+            return jsonify(result), 404
+        elif result['error'] == 'Product source unavailable':
+            return jsonify(result), 503
+        elif result['error'].startswith('Invalid barcode'):
+            return jsonify(result), 400
+        else:
+            return jsonify(result), 500
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Barcode lookup failed: {str(e)}'
+        }), 500
@@ -6,6 +6,7 @@ User profile management and preferences endpoints.
 from flask import Blueprint, request, jsonify
 from services.user_service import user_service
 from utils.decorators import require_auth, validate_json
+from utils.query_metrics import query_budget
 
 user_bp = Blueprint('users', __name__)
 
@@ -74,6 +75,7 @@ def setup_user_profile():
 
 @user_bp.route('/allergens', methods=['GET'])
 @require_auth
+@query_budget(3)
 def get_user_allergens():
     """Get user's allergen list."""
     try:
@@ -210,6 +212,7 @@ def delete_nutrition_goal(goal_id):
 
 @user_bp.route('/dashboard', methods=['GET'])
 @require_auth
+@query_budget(3)
 def get_user_dashboard():
     """Get user dashboard data."""
     try:
@@ -258,3 +261,22 @@ def update_user_basic_info():
             'success': False,
             'error': f'Failed to update basic information: {str(e)}'
         }), 500
+
+@user_bp.route('/account/deactivate', methods=['POST'])
+@require_auth
+def deactivate_account():
+    """Deactivate the current user's account."""
+    try:
+        user_id = request.current_user['id']
+        result = user_service.deactivate_user(user_id)
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 400
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to deactivate account: {str(e)}'
+        }), 500
@@ -26,6 +26,7 @@ DROP TABLE IF EXISTS users CASCADE;
 
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- 1. Users table - Basic authentication and user information
 CREATE TABLE users (
@@ -37,6 +38,8 @@ CREATE TABLE users (
     last_name VARCHAR(100),
     is_active BOOLEAN DEFAULT TRUE,
     is_verified BOOLEAN DEFAULT FALSE,
+    is_admin BOOLEAN DEFAULT FALSE,
+    token_version INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     last_login TIMESTAMP WITH TIME ZONE
@@ -104,6 +107,11 @@ CREATE TABLE products (
     product_url VARCHAR(500),
     country_of_origin VARCHAR(100),
     manufacturer VARCHAR(255),
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('turkish', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(brand, '')), 'A') ||
+        setweight(to_tsvector('turkish', coalesce(category, '')), 'B')
+    ) STORED,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -159,10 +167,20 @@ CREATE TABLE nutrition_goals (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 9. User stats table - Per-user dashboard counters maintained on write
+CREATE TABLE user_stats (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    analyses_count INTEGER NOT NULL DEFAULT 0,
+    unread_recommendations_count INTEGER NOT NULL DEFAULT 0,
+    active_goals_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes for better performance
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_users_username ON users(username);
 CREATE INDEX idx_users_active ON users(is_active);
+CREATE INDEX idx_users_token_state ON users(id) WHERE token_version <> 0 OR NOT is_active;
 
 CREATE INDEX idx_user_profiles_user_id ON user_profiles(user_id);
 CREATE INDEX idx_user_profiles_age ON user_profiles(age);
@@ -173,15 +191,21 @@ CREATE INDEX idx_user_allergens_allergen_id ON user_allergens(allergen_id);
 CREATE INDEX idx_products_barcode ON products(barcode);
 CREATE INDEX idx_products_category ON products(category);
 CREATE INDEX idx_products_brand ON products(brand);
+CREATE INDEX idx_products_search_vector ON products USING gin (search_vector);
+CREATE INDEX idx_products_name_trgm ON products USING gin (name gin_trgm_ops);
+CREATE INDEX idx_products_brand_trgm ON products USING gin (brand gin_trgm_ops);
 
 CREATE INDEX idx_analyses_user_id ON analyses(user_id);
 CREATE INDEX idx_analyses_product_id ON analyses(product_id);
 CREATE INDEX idx_analyses_status ON analyses(analysis_status);
 CREATE INDEX idx_analyses_created_at ON analyses(created_at);
+CREATE INDEX idx_analyses_user_created_id ON analyses(user_id, created_at DESC, id DESC)
+    INCLUDE (product_id, image_url, health_score, analysis_status);
 
 CREATE INDEX idx_recommendations_user_id ON recommendations(user_id);
 CREATE INDEX idx_recommendations_type ON recommendations(recommendation_type);
 CREATE INDEX idx_recommendations_is_read ON recommendations(is_read);
+CREATE INDEX idx_recommendations_user_unread ON recommendations(user_id, created_at DESC) WHERE NOT is_read;
 
 CREATE INDEX idx_nutrition_goals_user_id ON nutrition_goals(user_id);
 CREATE INDEX idx_nutrition_goals_active ON nutrition_goals(is_active);
@@ -199,6 +223,21 @@ $$ language 'plpgsql';
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Revoke access tokens when privileges or status change outside the application
+CREATE OR REPLACE FUNCTION bump_user_token_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (NEW.is_admin IS DISTINCT FROM OLD.is_admin OR NEW.is_active IS DISTINCT FROM OLD.is_active)
+       AND NEW.token_version = OLD.token_version THEN
+        NEW.token_version = OLD.token_version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER bump_users_token_version BEFORE UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION bump_user_token_version();
+
 CREATE TRIGGER update_user_profiles_updated_at BEFORE UPDATE ON user_profiles
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
@@ -228,4 +267,5 @@ COMMENT ON TABLE user_allergens IS 'User-specific allergen associations';
 COMMENT ON TABLE products IS 'Food product information and nutritional data';
 COMMENT ON TABLE analyses IS 'Product analysis results and AI insights';
 COMMENT ON TABLE recommendations IS 'AI-powered recommendations for users';
+COMMENT ON TABLE user_stats IS 'Per-user dashboard counters maintained on write';
 COMMENT ON TABLE nutrition_goals IS 'User nutrition goals and progress tracking';
@@ -0,0 +1,22 @@
+-- Access token claims: admin flag and token version used for revocation
+ALTER TABLE users ADD COLUMN IF NOT EXISTS is_admin BOOLEAN DEFAULT FALSE;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
+
+-- Users the token version table has to load (everyone else is version 0 and active)
+CREATE INDEX IF NOT EXISTS idx_users_token_state ON users(id) WHERE token_version <> 0 OR NOT is_active;
+
+-- Revoke access tokens when privileges or status change outside the application
+CREATE OR REPLACE FUNCTION bump_user_token_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (NEW.is_admin IS DISTINCT FROM OLD.is_admin OR NEW.is_active IS DISTINCT FROM OLD.is_active)
+       AND NEW.token_version = OLD.token_version THEN
+        NEW.token_version = OLD.token_version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS bump_users_token_version ON users;
+CREATE TRIGGER bump_users_token_version BEFORE UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION bump_user_token_version();
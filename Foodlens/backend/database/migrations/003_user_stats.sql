@@ -0,0 +1,25 @@
+-- Per-user dashboard counters, maintained by the application on write
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    analyses_count INTEGER NOT NULL DEFAULT 0,
+    unread_recommendations_count INTEGER NOT NULL DEFAULT 0,
+    active_goals_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Backfill from existing rows (one-off; afterwards counters are adjusted incrementally)
+INSERT INTO user_stats (user_id, analyses_count, unread_recommendations_count, active_goals_count)
+SELECT u.id,
+       (SELECT count(*) FROM analyses a WHERE a.user_id = u.id),
+       (SELECT count(*) FROM recommendations r WHERE r.user_id = u.id AND NOT r.is_read),
+       (SELECT count(*) FROM nutrition_goals g WHERE g.user_id = u.id AND g.is_active)
+FROM users u
+ON CONFLICT (user_id) DO UPDATE SET
+    analyses_count = EXCLUDED.analyses_count,
+    unread_recommendations_count = EXCLUDED.unread_recommendations_count,
+    active_goals_count = EXCLUDED.active_goals_count,
+    updated_at = CURRENT_TIMESTAMP;
+
+-- Dashboard lists: newest rows per user
+CREATE INDEX IF NOT EXISTS idx_analyses_user_created ON analyses(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_recommendations_user_unread ON recommendations(user_id, created_at DESC) WHERE NOT is_read;
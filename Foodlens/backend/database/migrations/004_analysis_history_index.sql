@@ -0,0 +1,8 @@
+-- Analysis history: keyset pages on (user_id, created_at, id), covering the list columns
+-- CONCURRENTLY cannot run inside a transaction; run this file with psql in autocommit mode
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_analyses_user_created_id
+    ON analyses(user_id, created_at DESC, id DESC)
+    INCLUDE (product_id, input_type, image_url, health_score, confidence_score, status, is_bookmarked, user_rating);
+
+-- Superseded by the index above (leading columns are the same)
+DROP INDEX CONCURRENTLY IF EXISTS idx_analyses_user_created;
@@ -0,0 +1,2 @@
+-- Label scans are recorded before (or without) being matched to a product
+ALTER TABLE analyses ALTER COLUMN product_id DROP NOT NULL;
@@ -0,0 +1,15 @@
+-- Product search: maintained tsvector document and trigram indexes
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Turkish stems for inflected words, unstemmed name/brand words for prefix matches
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('turkish', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(brand, '')), 'A') ||
+    setweight(to_tsvector('turkish', coalesce(category, '')), 'B') ||
+    setweight(to_tsvector('turkish', coalesce(ingredients, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING gin (search_vector);
+-- Typo-tolerant (word_similarity, <%) and prefix (ILIKE 'q%') matches
+CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_products_brand_trgm ON products USING gin (brand gin_trgm_ops);
@@ -0,0 +1,4 @@
+-- FoodLens Nutri-Score and allergen detection, precomputed for new and changed products
+ALTER TABLE products ADD COLUMN IF NOT EXISTS computed_nutri_score VARCHAR(1);
+ALTER TABLE products ADD COLUMN IF NOT EXISTS computed_nutri_score_points INTEGER;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS detected_allergens VARCHAR(50)[];
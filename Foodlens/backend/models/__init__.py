@@ -10,6 +10,7 @@ from .nutrition_goal import NutritionGoal
 from .product import Product
 from .analysis import Analysis
 from .recommendation import Recommendation
+from .user_stats import UserStats
 
 # Export Base for database initialization
 __all__ = [
@@ -21,5 +22,6 @@ __all__ = [
     'NutritionGoal',
     'Product',
     'Analysis',
-    'Recommendation'
+    'Recommendation',
+    'UserStats'
 ]
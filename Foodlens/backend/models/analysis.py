@@ -6,7 +6,7 @@ Product analysis results and AI-generated insights management.
 from datetime import datetime
 from typing import Optional
 import uuid
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, DECIMAL, Text, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, DECIMAL, Text, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from .user import Base
@@ -19,7 +19,7 @@ class Analysis(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
-    product_id = Column(UUID(as_uuid=True), ForeignKey('products.id'), nullable=False, index=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey('products.id'), nullable=True, index=True)  # None for label scans not matched to a product
     
     # Analysis input and source
     input_type = Column(String(20), nullable=False)  # 'ocr', 'manual', 'barcode'
@@ -58,7 +58,15 @@ class Analysis(Base):
     user = relationship("User", back_populates="analyses")
     product = relationship("Product", back_populates="analyses")
     
-    def __init__(self, user_id: uuid.UUID, product_id: uuid.UUID, input_type: str, **kwargs):
+    # History pages seek on (user_id, created_at, id); the included columns
+    # let the listing be answered from the index alone
+    __table_args__ = (
+        Index('idx_analyses_user_created_id', user_id, created_at.desc(), id.desc(),
+              postgresql_include=['product_id', 'input_type', 'image_url', 'health_score',
+                                  'confidence_score', 'status', 'is_bookmarked', 'user_rating']),
+    )
+    
+    def __init__(self, user_id: uuid.UUID, product_id: Optional[uuid.UUID], input_type: str, **kwargs):
         self.user_id = user_id
         self.product_id = product_id
         self.input_type = input_type
@@ -67,12 +75,29 @@ class Analysis(Base):
             if hasattr(self, key):
                 setattr(self, key, value)
     
-    def to_dict(self) -> dict:
-        """Convert analysis to dictionary."""
+    # Serialized fields, in to_dict order
+    SERIALIZED_FIELDS = (
+        'id', 'user_id', 'product_id', 'input_type', 'input_data', 'image_url', 'health_score',
+        'analysis_summary', 'detailed_analysis', 'allergen_warnings', 'health_insights',
+        'nutritional_assessment', 'ai_model_version', 'confidence_score', 'processing_time',
+        'status', 'is_bookmarked', 'user_rating', 'error_message', 'retry_count', 'created_at',
+        'updated_at',
+    )
+    
+    def to_dict(self, native: bool = False) -> dict:
+        """
+        Convert analysis to dictionary.
+        With native=True values are returned as stored (Decimal, UUID, datetime)
+        for the app JSON provider to encode, skipping per-field conversion;
+        zero amounts then serialize as 0 rather than None.
+        """
+        if native:
+            return {field: getattr(self, field) for field in self.SERIALIZED_FIELDS}
+        
         return {
             'id': str(self.id),
             'user_id': str(self.user_id),
-            'product_id': str(self.product_id),
+            'product_id': str(self.product_id) if self.product_id else None,
             'input_type': self.input_type,
             'input_data': self.input_data,
             'image_url': self.image_url,
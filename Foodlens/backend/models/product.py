@@ -6,9 +6,9 @@ Food product information and nutritional data management.
 from datetime import datetime
 from typing import Optional, List
 import uuid
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, DECIMAL, ARRAY, Text
-from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, DECIMAL, ARRAY, Text, Computed, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from .user import Base
 
 class Product(Base):
@@ -57,6 +57,11 @@ class Product(Base):
     is_verified = Column(Boolean, default=False)
     quality_score = Column(DECIMAL(3, 2))  # 0.00 to 1.00
     
+    # Precomputed by FoodLens for new and changed products (services.product_sync)
+    computed_nutri_score = Column(String(1))
+    computed_nutri_score_points = Column(Integer)
+    detected_allergens = Column(ARRAY(String(50)))
+    
     # Images
     image_url = Column(String(500))
     ingredient_image_url = Column(String(500))
@@ -66,17 +71,54 @@ class Product(Base):
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Full-text search document, maintained by PostgreSQL: Turkish stems for
+    # matching inflected words plus unstemmed name/brand words for prefixes.
+    # Deferred so loading a product does not fetch it.
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('turkish', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(brand, '')), 'A') || "
+        "setweight(to_tsvector('turkish', coalesce(category, '')), 'B') || "
+        "setweight(to_tsvector('turkish', coalesce(ingredients, '')), 'C')",
+        persisted=True
+    )))
+    
     # Relationships
     analyses = relationship("Analysis", back_populates="product")
     
+    # GIN indexes: tsvector matches, and trigrams for typo-tolerant and
+    # prefix matches on name and brand (needs the pg_trgm extension)
+    __table_args__ = (
+        Index('idx_products_search_vector', search_vector, postgresql_using='gin'),
+        Index('idx_products_name_trgm', name, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        Index('idx_products_brand_trgm', brand, postgresql_using='gin', postgresql_ops={'brand': 'gin_trgm_ops'}),
+    )
+    
     def __init__(self, name: str, **kwargs):
         self.name = name
         for key, value in kwargs.items():
             if hasattr(self, key):
                 setattr(self, key, value)
     
-    def to_dict(self) -> dict:
-        """Convert product to dictionary."""
+    # Serialized fields, in to_dict order
+    SERIALIZED_FIELDS = (
+        'id', 'barcode', 'name', 'brand', 'category', 'energy_kcal', 'energy_kj', 'fat',
+        'saturated_fat', 'carbohydrates', 'sugars', 'fiber', 'protein', 'salt', 'sodium',
+        'nutrition_data', 'nutri_score', 'nova_group', 'ingredients', 'allergens', 'additives',
+        'serving_size', 'packaging', 'countries', 'data_source', 'is_verified', 'quality_score',
+        'computed_nutri_score', 'computed_nutri_score_points', 'detected_allergens',
+        'image_url', 'ingredient_image_url', 'nutrition_image_url', 'created_at', 'updated_at',
+    )
+    
+    def to_dict(self, native: bool = False) -> dict:
+        """
+        Convert product to dictionary.
+        With native=True values are returned as stored (Decimal, UUID, datetime)
+        for the app JSON provider to encode, skipping per-field conversion;
+        zero amounts then serialize as 0 rather than None.
+        """
+        if native:
+            return {field: getattr(self, field) for field in self.SERIALIZED_FIELDS}
+        
         return {
             'id': str(self.id),
             'barcode': self.barcode,
@@ -105,6 +147,9 @@ class Product(Base):
             'data_source': self.data_source,
             'is_verified': self.is_verified,
             'quality_score': float(self.quality_score) if self.quality_score else None,
+            'computed_nutri_score': self.computed_nutri_score,
+            'computed_nutri_score_points': self.computed_nutri_score_points,
+            'detected_allergens': self.detected_allergens,
             'image_url': self.image_url,
             'ingredient_image_url': self.ingredient_image_url,
             'nutrition_image_url': self.nutrition_image_url,
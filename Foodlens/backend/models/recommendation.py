@@ -52,6 +52,7 @@ class Recommendation(Base):
     effectiveness_score = Column(DECIMAL(3, 2))  # Based on user feedback
     
     # User interaction
+    is_read = Column(Boolean, default=False, index=True)
     is_saved = Column(Boolean, default=False)
     is_tried = Column(Boolean, default=False)
     user_rating = Column(Integer)  # 1-5 stars
@@ -104,6 +105,7 @@ class Recommendation(Base):
             'ai_confidence': float(self.ai_confidence) if self.ai_confidence else None,
             'popularity_score': float(self.popularity_score) if self.popularity_score else None,
             'effectiveness_score': float(self.effectiveness_score) if self.effectiveness_score else None,
+            'is_read': self.is_read,
             'is_saved': self.is_saved,
             'is_tried': self.is_tried,
             'user_rating': self.user_rating,
@@ -6,12 +6,12 @@ User authentication and basic user information management.
 from datetime import datetime
 from typing import Optional, List
 import uuid
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import Column, String, Boolean, DateTime, Integer, DECIMAL, ARRAY, Text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy import ForeignKey
+from utils.password_hasher import password_hasher
 
 Base = declarative_base()
 
@@ -29,6 +29,9 @@ class User(Base):
     last_name = Column(String(100))
     is_active = Column(Boolean, default=True, index=True)
     is_verified = Column(Boolean, default=False)
+    is_admin = Column(Boolean, default=False, server_default='false')
+    # Bumped to revoke every access token issued so far (password change, deactivation)
+    token_version = Column(Integer, default=0, server_default='0', nullable=False)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     last_login = Column(DateTime(timezone=True))
@@ -49,12 +52,16 @@ class User(Base):
         self.set_password(password)
     
     def set_password(self, password: str) -> None:
-        """Hash and set the user's password."""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set the user's password (runs on the password hashing pool)."""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password: str) -> bool:
         """Check if the provided password matches the user's password."""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self) -> bool:
+        """Check if the stored hash uses outdated hashing parameters."""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def get_full_name(self) -> str:
         """Get the user's full name."""
@@ -86,6 +93,7 @@ class User(Base):
             'full_name': self.get_full_name(),
             'is_active': self.is_active,
             'is_verified': self.is_verified,
+            'is_admin': bool(self.is_admin),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'last_login': self.last_login.isoformat() if self.last_login else None
@@ -0,0 +1,31 @@
+"""
+User Stats Model for FoodLens Application
+Per-user counters maintained on write, so dashboards never run COUNT(*).
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from .user import Base
+
+class UserStats(Base):
+    """
+    Per-user totals kept current by the dashboard service's ORM events.
+    """
+    __tablename__ = 'user_stats'
+    
+    # Counter columns, in to_dict order
+    COUNTERS = ('analyses_count', 'unread_recommendations_count', 'active_goals_count')
+    
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    analyses_count = Column(Integer, nullable=False, default=0, server_default='0')
+    unread_recommendations_count = Column(Integer, nullable=False, default=0, server_default='0')
+    active_goals_count = Column(Integer, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self) -> dict:
+        """Convert user stats to dictionary."""
+        return {counter: getattr(self, counter) or 0 for counter in self.COUNTERS}
+    
+    def __repr__(self) -> str:
+        return f"<UserStats(user_id={self.user_id}, analyses={self.analyses_count})>"
@@ -0,0 +1,33 @@
+"""
+Product index snapshot script for FoodLens Application
+Builds the in-memory product index from an OpenFoodFacts dump and writes the binary snapshot loaded at startup.
+"""
+
+import sys
+import os
+import argparse
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.csv_loader import FORMATS
+from services.product_index import PRODUCT_INDEX_DUMP, PRODUCT_INDEX_SNAPSHOT, ProductIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the product index snapshot from an OpenFoodFacts dump')
+    parser.add_argument('--json-dump', default=PRODUCT_INDEX_DUMP,
+                        help='OpenFoodFacts export (JSON, JSON Lines or CSV, optionally gzipped)')
+    parser.add_argument('--format', choices=FORMATS, help='Override the format detected from the dump file name')
+    parser.add_argument('--output', default=PRODUCT_INDEX_SNAPSHOT, help='Snapshot (.npz) to write')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = ProductIndex()
+    size = index.build_from_dump(args.json_dump, args.format)
+    index.save(args.output)
+    print(f"Indexed {size} products in {time.perf_counter() - started:.2f}s; snapshot written to {args.output}")
+
+if __name__ == "__main__":
+    main()
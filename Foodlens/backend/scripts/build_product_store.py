@@ -0,0 +1,34 @@
+"""
+Product store build script for FoodLens Application
+Writes the memory-mapped product store from the products table, which running workers pick up, or from an
+OpenFoodFacts export for batch reading.
+"""
+
+import sys
+import os
+import argparse
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.csv_loader import FORMATS
+from services.product_store import PRODUCT_STORE_PATH, iter_dump_products, iter_table_products, write_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the memory-mapped product store')
+    parser.add_argument('--dump', help='OpenFoodFacts export to read instead of the products table '
+                                       '(batch reading only; the API does not serve such stores)')
+    parser.add_argument('--format', choices=FORMATS, help='Override the format detected from the dump file name')
+    parser.add_argument('--output', default=PRODUCT_STORE_PATH, help='Store file to replace')
+    args = parser.parse_args()
+
+    if args.dump:
+        stats = write_store(iter_dump_products(args.dump, args.format), args.output, source='dump')
+    else:
+        stats = write_store(iter_table_products(), args.output)
+    print(f"Stored {stats['products']} products ({stats['file_bytes'] / 1e6:.1f} MB) "
+          f"in {stats['elapsed_seconds']:.2f}s to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Nutri-Score algorithm comparison script for FoodLens Application
+Scores the whole product catalog under two algorithm versions in one pass and reports the grade migration.
+"""
+
+import sys
+import os
+import json
+import argparse
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.nutri_score_service import (
+    GRADES,
+    NUTRI_SCORE_ALGORITHMS,
+    NutritionFrame,
+    enhanced_nutri_score_calculator,
+    get_algorithm,
+    grade_migration,
+)
+from utils.csv_loader import iter_records
+from utils.external_apis import off_nutrition_values
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# Product columns read from the database, keyed by NutritionData field
+PRODUCT_NUTRITION_COLUMNS = {
+    'energy_kj': 'energy_kj',
+    'energy_kcal': 'energy_kcal',
+    'fat': 'fat',
+    'saturated_fat': 'saturated_fat',
+    'carbohydrates': 'carbohydrates',
+    'sugars': 'sugars',
+    'fiber': 'fiber',
+    'proteins': 'protein',
+    'salt': 'salt',
+    'sodium': 'sodium',
+}
+
+
+def _split_ingredients(text) -> List[str]:
+    return [part.strip() for part in (text or '').split(',') if part.strip()]
+
+
+def iter_database_products() -> Iterator[Tuple[Dict, List[str]]]:
+    """(nutrition values, ingredients) for every product in the database"""
+    from utils.database import Database
+    from models.product import Product
+
+    columns = [getattr(Product, column) for column in PRODUCT_NUTRITION_COLUMNS.values()]
+    db = Database()
+    session = db.connect()
+    try:
+        query = session.query(*columns, Product.ingredients).yield_per(DEFAULT_CHUNK_SIZE)
+        for row in query:
+            values = {
+                field: float(value)
+                for field, value in zip(PRODUCT_NUTRITION_COLUMNS, row[:-1])
+                if value is not None
+            }
+            yield values, _split_ingredients(row[-1])
+    finally:
+        db.close(session)
+
+
+def iter_json_products(path: str) -> Iterator[Tuple[Dict, List[str]]]:
+    """(nutrition values, ingredients) for every product in an OpenFoodFacts JSON, JSON Lines or CSV dump"""
+    for product in iter_records(path):
+        yield off_nutrition_values(product), _split_ingredients(product.get('ingredients_text'))
+
+
+def _chunks(products: Iterable[Tuple[Dict, List[str]]], size: int) -> Iterator[List[Tuple[Dict, List[str]]]]:
+    chunk = []
+    for product in products:
+        chunk.append(product)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def compare_versions(products: Iterable[Tuple[Dict, List[str]]], from_version: str, to_version: str,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """
+    Score products under both versions chunk by chunk and accumulate the
+    grade-migration matrix. Food type classification and FVN estimation run
+    once per product and are shared by both versions.
+    """
+    # Fail on unknown versions before reading the catalog
+    get_algorithm(from_version)
+    get_algorithm(to_version)
+
+    calculator = enhanced_nutri_score_calculator
+    matrix = np.zeros((len(GRADES), len(GRADES)), dtype=np.int64)
+    food_type_counts = {}
+
+    for chunk in _chunks(products, chunk_size):
+        frame = NutritionFrame.from_records([values for values, _ in chunk]).validate_and_convert()
+        fvn = frame['fruits_vegetables_nuts']
+        food_types = []
+        for index, (_, ingredients) in enumerate(chunk):
+            if fvn[index] <= 0:
+                fvn[index] = calculator.estimate_fruits_vegetables_nuts_percentage(ingredients)
+            food_type = calculator.classify_food_type(ingredients, frame.row(index))
+            food_types.append(food_type)
+            food_type_counts[food_type] = food_type_counts.get(food_type, 0) + 1
+        matrix += grade_migration(frame, food_types, from_version, to_version)
+
+    total = int(matrix.sum())
+    return {
+        'from_version': from_version,
+        'to_version': to_version,
+        'products': total,
+        'food_types': food_type_counts,
+        'matrix': {
+            before: {after: int(matrix[i, j]) for j, after in enumerate(GRADES)}
+            for i, before in enumerate(GRADES)
+        },
+        'unchanged': int(np.trace(matrix)),
+        'improved': int(np.tril(matrix, -1).sum()),
+        'worsened': int(np.triu(matrix, 1).sum()),
+    }
+
+
+def format_matrix(report: Dict) -> str:
+    """Plain-text grade-migration table (rows: from_version, columns: to_version)"""
+    lines = [f"{report['from_version']} -> {report['to_version']} ({report['products']} products)",
+             '      ' + ''.join(f'{grade:>9}' for grade in GRADES)]
+    for before in GRADES:
+        lines.append(f'{before:>6}' + ''.join(f"{report['matrix'][before][after]:>9}" for after in GRADES))
+    lines.append(f"unchanged: {report['unchanged']}  improved: {report['improved']}  worsened: {report['worsened']}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two Nutri-Score algorithm versions over the catalog')
+    parser.add_argument('--from-version', default='2017', choices=sorted(NUTRI_SCORE_ALGORITHMS))
+    parser.add_argument('--to-version', default='2023', choices=sorted(NUTRI_SCORE_ALGORITHMS))
+    parser.add_argument('--json-dump', help='OpenFoodFacts JSON dump to read instead of the products table')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+
+    products = iter_json_products(args.json_dump) if args.json_dump else iter_database_products()
+    report = compare_versions(products, args.from_version, args.to_version, args.chunk_size)
+
+    print(format_matrix(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Nutrient snapshot export script for FoodLens Application
+Reads an OpenFoodFacts export once and writes the memory-mapped columnar snapshot batch jobs load.
+"""
+
+import sys
+import os
+import argparse
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.csv_loader import DEFAULT_CHUNK_SIZE, FORMATS
+from services.nutrient_snapshot import NUTRIENT_SNAPSHOT_DIR, export_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a columnar nutrient snapshot from an OpenFoodFacts export')
+    parser.add_argument('path', help='Export file (.json, .jsonl, .csv; optionally .gz)')
+    parser.add_argument('--format', choices=FORMATS, help='Override the format detected from the file name')
+    parser.add_argument('--output', default=NUTRIENT_SNAPSHOT_DIR, help='Snapshot directory')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Records converted per batch')
+    args = parser.parse_args()
+
+    meta = export_snapshot(args.path, args.output, fmt=args.format, chunk_size=args.chunk_size)
+    print(f"Exported {meta['rows']} products from {meta['records']} records ({meta['skipped']} skipped) "
+          f"in {meta['elapsed_seconds']:.2f}s to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Product import script for FoodLens Application
+Streams an OpenFoodFacts JSON, JSON Lines or CSV export into the products table, one COPY and merge per chunk.
+"""
+
+import sys
+import os
+import argparse
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.csv_loader import DEFAULT_CHUNK_SIZE, FORMATS, LoadProgress
+from services.product_importer import import_products
+
+
+def print_progress(progress: LoadProgress) -> None:
+    stats = progress.to_dict()
+    print(f"\r{stats['percent']:5.1f}%  {stats['records']} records, {stats['rows']} rows, "
+          f"{stats['skipped']} skipped ({stats['records_per_second']}/s)", end='', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import products from an OpenFoodFacts export')
+    parser.add_argument('path', help='Export file (.json, .jsonl, .csv; optionally .gz)')
+    parser.add_argument('--format', choices=FORMATS, help='Override the format detected from the file name')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Records per COPY batch')
+    parser.add_argument('--dry-run', action='store_true', help='Read and normalize without writing to the database')
+    args = parser.parse_args()
+
+    kwargs = {'writer': lambda rows: {'inserted': 0, 'updated': 0, 'unchanged': len(rows), 'barcodes': []},
+              'index_snapshot': None} if args.dry_run else {}
+    stats = import_products(args.path, fmt=args.format, chunk_size=args.chunk_size, progress=print_progress, **kwargs)
+    print(f"\nImported {stats['rows']} products from {stats['records']} records in {stats['elapsed_seconds']:.2f}s: "
+          f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+          f"{stats['skipped']} skipped; {stats['indexed']} added to the product index snapshot")
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ import os
 # Add the backend directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.database import Database
+from utils.database import create_schema
 from models.user import User
 from models.user_profile import UserProfile
 from models.allergen import Allergen, UserAllergen
@@ -20,15 +20,11 @@ def init_database():
     try:
         print("Initializing FoodLens database...")
         
-        # Create database connection (this automatically creates tables)
-        db = Database()
-        session = db.connect()
+        # Create missing tables (the application itself never runs DDL)
+        create_schema()
         
         print("Database tables created successfully!")
         
-        # Close the session
-        db.close(session)
-        
         print("Seeding allergen data...")
         # Seed allergens
         seed_allergens()
@@ -0,0 +1,41 @@
+"""
+Product delta sync script for FoodLens Application
+Upserts OpenFoodFacts products modified since the last sync and precomputes scores for the changed ones.
+"""
+
+import sys
+import os
+import argparse
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.csv_loader import FORMATS
+from services.product_sync import PRODUCT_SYNC_STATE, ProductSync
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync products modified since the last run from OpenFoodFacts')
+    parser.add_argument('--dump', help='Read an export file instead of the OpenFoodFacts search API')
+    parser.add_argument('--format', choices=FORMATS, help='Override the format detected from the dump file name')
+    parser.add_argument('--state', default=PRODUCT_SYNC_STATE, help='High-water mark state file')
+    parser.add_argument('--full', action='store_true', help='Ignore the high-water mark and sync every product')
+    parser.add_argument('--max-pages', type=int,
+                        help='Most search API pages to read; the mark only advances if they reach it')
+    args = parser.parse_args()
+
+    sync = ProductSync(args.state)
+    if args.dump:
+        stats = sync.sync_dump(args.dump, fmt=args.format, full=args.full)
+    else:
+        stats = sync.sync_remote(full=args.full, max_pages=args.max_pages)
+
+    print(f"Synced products modified since {stats['since'] or 'the beginning'}: {stats['considered']} of "
+          f"{stats['records']} records considered, {stats['inserted']} inserted, {stats['updated']} updated, "
+          f"{stats['unchanged']} unchanged, {stats['precomputed']} re-scored in {stats['elapsed_seconds']:.2f}s")
+    print(f"High-water mark: {stats['high_water_mark']}")
+    if not stats['complete']:
+        print('Stopped at --max-pages before reaching the mark; it was not advanced')
+
+if __name__ == "__main__":
+    main()
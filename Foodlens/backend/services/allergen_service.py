@@ -0,0 +1,209 @@
+"""
+Allergen detection service for FoodLens Application
+Matches ingredient text against the allergens table and the user's allergen profile.
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import event, text
+
+from utils.cache import ThreadSafeTTLCache
+from utils.database import Database
+from models.allergen import Allergen, UserAllergen
+
+# A term also matches with a short suffix ("sütlü", "fındıklı", "eggs")
+MAX_TERM_SUFFIX = 4
+# How often the allergens table fingerprint is re-read to catch changes made
+# outside this process (seed script, other workers)
+FINGERPRINT_CHECK_INTERVAL = 60
+USER_ALLERGEN_CACHE_SIZE = 10000
+USER_ALLERGEN_CACHE_TTL = 300
+
+# Fold Turkish dotted/dotless i so "FINDIK", "fındık" and "findik" compare equal
+_TURKISH_FOLD = str.maketrans({'ı': 'i', 'İ': 'i', '\u0307': None})
+_WHITESPACE = re.compile(r'\s+')
+
+_FINGERPRINT_SQL = text("""
+    SELECT count(*), md5(coalesce(string_agg(
+        id::text || ':' || name || ':' || coalesce(severity_level, '') || ':' ||
+        coalesce(array_to_string(common_sources, ','), '') || ':' ||
+        coalesce(array_to_string(alternative_names, ','), ''),
+        '|' ORDER BY id), ''))
+    FROM allergens
+""")
+
+
+def normalize_text(value: str) -> str:
+    """Case- and whitespace-insensitive form used on both terms and ingredient text"""
+    return _WHITESPACE.sub(' ', value.translate(_TURKISH_FOLD).casefold()).strip()
+
+
+class AllergenMatcher:
+    """
+    Every allergen name, common source and alternative name compiled into one
+    regular expression, so ingredient text is scanned once per analysis.
+    """
+    __slots__ = ('allergens', 'term_allergens', 'pattern')
+
+    def __init__(self, allergens: Iterable[Dict[str, Any]]):
+        self.allergens = {allergen['id']: allergen for allergen in allergens}
+        term_allergens = {}
+        for allergen in self.allergens.values():
+            terms = [allergen['name']] + list(allergen.get('common_sources') or []) \
+                + list(allergen.get('alternative_names') or [])
+            for term in terms:
+                term = normalize_text(term or '')
+                if term:
+                    term_allergens.setdefault(term, set()).add(allergen['id'])
+        self.term_allergens = {term: tuple(sorted(ids)) for term, ids in term_allergens.items()}
+
+        if self.term_allergens:
+            # Longest first so "peanut butter" wins over "peanut" at the same position
+            alternation = '|'.join(re.escape(term) for term in sorted(self.term_allergens, key=len, reverse=True))
+            self.pattern = re.compile(rf'(?<!\w)({alternation})\w{{0,{MAX_TERM_SUFFIX}}}(?!\w)')
+        else:
+            self.pattern = None
+
+    def match(self, ingredients: Union[str, Iterable[str]]) -> Dict[int, List[str]]:
+        """Allergen id -> matched terms, in order of first appearance"""
+        if self.pattern is None:
+            return {}
+        if not isinstance(ingredients, str):
+            ingredients = ', '.join(ingredients)
+
+        hits = {}
+        for match in self.pattern.finditer(normalize_text(ingredients)):
+            term = match.group(1)
+            for allergen_id in self.term_allergens[term]:
+                terms = hits.setdefault(allergen_id, [])
+                if term not in terms:
+                    terms.append(term)
+        return hits
+
+
+class AllergenService:
+    def __init__(self):
+        """Initialize allergen service"""
+        self.db = Database()
+        self.logger = logging.getLogger(__name__)
+        self._matcher = None
+        self._fingerprint = None
+        self._stale = True
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._user_allergens = ThreadSafeTTLCache(maxsize=USER_ALLERGEN_CACHE_SIZE, ttl=USER_ALLERGEN_CACHE_TTL)
+
+    def mark_stale(self) -> None:
+        """Force a matcher rebuild on next use (called by Allergen ORM events)"""
+        self._stale = True
+
+    def get_matcher(self) -> AllergenMatcher:
+        """
+        Compiled matcher for the current allergens table. Rebuilt when this
+        process changed an Allergen row, or when the table fingerprint changed.
+        """
+        if self._matcher is not None and not self._stale \
+                and time.monotonic() - self._checked_at < FINGERPRINT_CHECK_INTERVAL:
+            return self._matcher
+
+        with self._lock:
+            if self._matcher is not None and not self._stale \
+                    and time.monotonic() - self._checked_at < FINGERPRINT_CHECK_INTERVAL:
+                return self._matcher
+
+            session = self.db.connect()
+            try:
+                fingerprint = tuple(session.execute(_FINGERPRINT_SQL).one())
+                if self._matcher is None or self._stale or fingerprint != self._fingerprint:
+                    # Cleared before loading so changes made during the load mark it stale again
+                    self._stale = False
+                    rows = session.query(
+                        Allergen.id, Allergen.name, Allergen.severity_level, Allergen.is_major_allergen,
+                        Allergen.common_sources, Allergen.alternative_names
+                    ).all()
+                    self._matcher = AllergenMatcher(row._asdict() for row in rows)
+                    self._fingerprint = fingerprint
+                    self.logger.info(f"Allergen matcher built with {len(self._matcher.term_allergens)} terms")
+                self._checked_at = time.monotonic()
+            finally:
+                self.db.close(session)
+        return self._matcher
+
+    def get_user_allergens(self, user_id: str) -> Tuple[Tuple[int, str], ...]:
+        """(allergen_id, severity) pairs from the user's profile, cached per user"""
+        user_id = str(user_id)
+
+        def load():
+            session = self.db.connect()
+            try:
+                rows = session.query(UserAllergen.allergen_id, UserAllergen.severity)\
+                    .filter(UserAllergen.user_id == user_id)\
+                    .all()
+                return tuple((row.allergen_id, row.severity) for row in rows)
+            finally:
+                self.db.close(session)
+
+        return self._user_allergens.get_or_load(user_id, load)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop a user's cached allergen profile after it changes"""
+        self._user_allergens.pop(str(user_id))
+
+    def detect_allergens(self, ingredients: Union[str, Iterable[str]]) -> List[Dict[str, Any]]:
+        """Allergens found in the ingredients, with the terms that matched"""
+        matcher = self.get_matcher()
+        detected = []
+        for allergen_id, terms in matcher.match(ingredients).items():
+            allergen = matcher.allergens[allergen_id]
+            detected.append({
+                'allergen_id': allergen_id,
+                'name': allergen['name'],
+                'severity_level': allergen.get('severity_level'),
+                'is_major_allergen': bool(allergen.get('is_major_allergen')),
+                'matched_terms': terms,
+            })
+        return detected
+
+    def check_ingredients(self, ingredients: Union[str, Iterable[str]], user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Detect allergens in ingredients and, for a signed-in user, warn about
+        the ones in their allergen profile.
+        """
+        try:
+            detected = self.detect_allergens(ingredients)
+            warnings = []
+            if user_id and detected:
+                user_allergens = dict(self.get_user_allergens(user_id))
+                for allergen in detected:
+                    if allergen['allergen_id'] in user_allergens:
+                        warnings.append({
+                            'allergen_id': allergen['allergen_id'],
+                            'allergen_name': allergen['name'],
+                            'severity': user_allergens[allergen['allergen_id']] or allergen['severity_level'],
+                            'matched_terms': allergen['matched_terms'],
+                            'message': f"Contains {allergen['name']} ({', '.join(allergen['matched_terms'])})"
+                        })
+
+            return {
+                'success': True,
+                'detected_allergens': detected,
+                'allergen_warnings': warnings
+            }
+
+        except Exception as e:
+            self.logger.error(f"Allergen check failed: {e}")
+            return {'success': False, 'error': f'Allergen check failed: {str(e)}'}
+
+# Global allergen service instance
+allergen_service = AllergenService()
+
+
+@event.listens_for(Allergen, 'after_insert')
+@event.listens_for(Allergen, 'after_update')
+@event.listens_for(Allergen, 'after_delete')
+def _allergen_changed(mapper, connection, target):
+    allergen_service.mark_stale()
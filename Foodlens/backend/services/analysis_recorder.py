@@ -0,0 +1,369 @@
+"""
+Analysis Recorder for FoodLens Application
+Write-behind persistence of analysis results: an in-memory queue backed by a
+local spool file, flushed to the database in batches by a background thread.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+
+from utils.database import get_engine
+from utils.json_provider import json_default
+from models.analysis import Analysis
+from services.dashboard_service import adjust_user_stats, dashboard_service, hydrate
+
+# Advisory locks mark spool files that belong to a running process
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT batch, and the longest a result waits before being flushed
+ANALYSIS_BATCH_SIZE = int(os.getenv('ANALYSIS_BATCH_SIZE', 100))
+ANALYSIS_FLUSH_INTERVAL = float(os.getenv('ANALYSIS_FLUSH_INTERVAL', 1.0))
+# Results held while the database is unreachable; beyond this record() refuses
+ANALYSIS_MAX_PENDING = int(os.getenv('ANALYSIS_MAX_PENDING', 10000))
+ANALYSIS_SPOOL_DIR = os.getenv('ANALYSIS_SPOOL_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'spool'))
+# fsync every spool append (survives power loss, not just a process crash)
+ANALYSIS_SPOOL_FSYNC = os.getenv('ANALYSIS_SPOOL_FSYNC', 'false').lower() == 'true'
+# Rewrite the spool with only unflushed rows once it grows past this size
+ANALYSIS_SPOOL_COMPACT_BYTES = int(os.getenv('ANALYSIS_SPOOL_COMPACT_BYTES', 16 * 1024 * 1024))
+# Longest wait between retries while flushes fail
+MAX_RETRY_DELAY = 30.0
+
+SPOOL_PATTERN = 'analyses-*.jsonl'
+
+
+def insert_analyses(rows: List[Dict[str, Any]]) -> int:
+    """
+    Insert analysis rows in one transaction and bump the owners' counters.
+    Rows already present (replayed after a crash that followed the commit) are
+    skipped, so a batch can be retried safely. Returns the rows inserted.
+    """
+    table = Analysis.__table__
+    with get_engine().begin() as connection:
+        existing = set(connection.execute(
+            select(table.c.id).where(table.c.id.in_([row['id'] for row in rows]))
+        ).scalars())
+        rows = [row for row in rows if row['id'] not in existing]
+        if not rows:
+            return 0
+        # executemany: batched into multi-row INSERT ... VALUES by the driver dialect
+        connection.execute(table.insert(), rows)
+
+        per_user = {}
+        for row in rows:
+            per_user[row['user_id']] = per_user.get(row['user_id'], 0) + 1
+        for user_id, count in per_user.items():
+            adjust_user_stats(connection, user_id, analyses_count=count)
+
+    dashboard_service.invalidate(per_user)
+    return len(rows)
+
+
+class AnalysisRecorder:
+    """
+    Queues analysis results and writes them behind the request.
+    record() appends the row to this process's spool file and returns at once;
+    the flusher thread inserts batches and acknowledges them in the spool.
+    Spool files left by a crashed process are replayed on start. Until a row
+    is flushed, get() and pending_for_user() serve it from the queue.
+    """
+
+    def __init__(self, spool_dir: str = ANALYSIS_SPOOL_DIR, writer: Callable = insert_analyses,
+                 batch_size: int = ANALYSIS_BATCH_SIZE, flush_interval: float = ANALYSIS_FLUSH_INTERVAL,
+                 max_pending: int = ANALYSIS_MAX_PENDING):
+        self.spool_dir = spool_dir
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Serializes flushes between the thread and explicit flush() calls
+        self._flush_lock = threading.Lock()
+        self._pending = OrderedDict()  # analysis id -> Analysis (transient)
+        self._queued_at = {}
+        self._spool = None
+        self._spool_path = None
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+        self._stats = {'recorded': 0, 'rejected': 0, 'replayed': 0, 'batches': 0, 'rows_written': 0,
+                       'failures': 0, 'last_error': None, 'last_flush_ms': 0.0, 'max_flush_ms': 0.0,
+                       'flush_ms_total': 0.0}
+
+    # Lifecycle
+
+    def start(self) -> None:
+        """Open the spool, replay orphaned spools and start the flusher (idempotent, fork-aware)"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # After a fork the parent's thread, lock and spool are not ours
+            self._pid = os.getpid()
+            self._pending.clear()
+            self._queued_at.clear()
+            self._stopping = False
+            self._open_spool()
+            self._replay_orphans()
+            self._thread = threading.Thread(target=self._run, name='analysis-recorder', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush what can be flushed and stop the thread; unflushed rows stay in the spool"""
+        atexit.unregister(self.stop)
+        with self._lock:
+            if self._spool is None:
+                return
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._wakeup.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f"Analyses left in the spool for the next start: {e}")
+        with self._lock:
+            if self._spool is not None:
+                if not self._pending:
+                    os.remove(self._spool_path)
+                self._spool.close()
+                self._spool = None
+
+    # Recording and read-your-writes
+
+    def record(self, user_id, input_type: str, **fields) -> Optional[Analysis]:
+        """
+        Queue an analysis for insertion and return it (with its id and
+        created_at assigned), or None if too many results are already waiting.
+        """
+        unknown = set(fields) - set(Analysis.SERIALIZED_FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown analysis fields: {', '.join(sorted(unknown))}")
+        if self._thread is None or self._pid != os.getpid():
+            self.start()
+
+        now = datetime.now(timezone.utc)
+        row = {field: None for field in Analysis.SERIALIZED_FIELDS}
+        row.update({'status': 'completed', 'is_bookmarked': False, 'retry_count': 0})
+        row.update(fields)
+        row.update({'id': uuid.uuid4(), 'user_id': user_id, 'input_type': input_type,
+                    'created_at': now, 'updated_at': now})
+        line = json.dumps({'add': row}, default=json_default, separators=(',', ':'))
+        # The queued copy is exactly what a replay would produce
+        analysis = hydrate(Analysis, json.loads(line)['add'])
+
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self._stats['rejected'] += 1
+                return None
+            self._append(line)
+            self._pending[analysis.id] = analysis
+            self._queued_at[analysis.id] = time.monotonic()
+            self._stats['recorded'] += 1
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+        return analysis
+
+    def get(self, analysis_id) -> Optional[Analysis]:
+        """Queued analysis not yet in the database"""
+        with self._lock:
+            return self._pending.get(analysis_id)
+
+    def pending_for_user(self, user_id) -> List[Analysis]:
+        """The user's queued analyses, oldest first"""
+        user_id = str(user_id)
+        with self._lock:
+            return [analysis for analysis in self._pending.values() if str(analysis.user_id) == user_id]
+
+    # Flushing
+
+    def flush(self) -> int:
+        """Write everything queued now; returns the rows written (raises on database errors)"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = list(self._pending.values())[:self.batch_size]
+                if not batch:
+                    return written
+                written += self._write(batch)
+
+    def _write(self, batch: List[Analysis]) -> int:
+        started = time.perf_counter()
+        try:
+            written = self.writer([analysis.to_dict(native=True) for analysis in batch])
+        except Exception as e:
+            with self._lock:
+                self._stats['failures'] += 1
+                self._stats['last_error'] = str(e)
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            ids = [analysis.id for analysis in batch]
+            for analysis_id in ids:
+                self._pending.pop(analysis_id, None)
+                self._queued_at.pop(analysis_id, None)
+            self._acknowledge(ids)
+            self._stats['batches'] += 1
+            self._stats['rows_written'] += written
+            self._stats['last_flush_ms'] = elapsed_ms
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+            self._stats['flush_ms_total'] += elapsed_ms
+        return written
+
+    def _run(self) -> None:
+        failures = 0
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+                delay = self.flush_interval if not failures else min(MAX_RETRY_DELAY, 2 ** failures)
+                if len(self._pending) < self.batch_size or failures:
+                    self._wakeup.wait(delay)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.warning(f"Analysis flush failed ({failures} in a row), will retry: {e}")
+
+    # Spool file
+
+    def _open_spool(self) -> None:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._spool_path = os.path.join(self.spool_dir, f'analyses-{self._pid}.jsonl')
+        if os.path.exists(self._spool_path):
+            # Left by an earlier process with the same pid; replay it as an orphan
+            os.replace(self._spool_path, self._spool_path + '.orphan.jsonl')
+        self._spool = open(self._spool_path, 'a', encoding='utf-8')
+        if FCNTL_AVAILABLE:
+            fcntl.flock(self._spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _append(self, line: str) -> None:
+        self._spool.write(line + '\n')
+        self._spool.flush()
+        if ANALYSIS_SPOOL_FSYNC:
+            os.fsync(self._spool.fileno())
+
+    def _acknowledge(self, ids: List[uuid.UUID]) -> None:
+        if self._spool is None:
+            return
+        if not self._pending:
+            # Everything is in the database; start the spool over
+            self._spool.truncate(0)
+        elif self._spool.tell() > ANALYSIS_SPOOL_COMPACT_BYTES:
+            self._compact()
+        else:
+            self._append(json.dumps({'done': [str(analysis_id) for analysis_id in ids]}))
+
+    def _compact(self) -> None:
+        temporary = self._spool_path + '.tmp'
+        # Locked before it takes the spool's name and kept open as the new
+        # spool, so the path never names an unlocked file another worker could replay
+        spool = open(temporary, 'a', encoding='utf-8')
+        try:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            spool.truncate(0)
+            for analysis in self._pending.values():
+                spool.write(json.dumps({'add': analysis.to_dict(native=True)}, default=json_default,
+                                       separators=(',', ':')) + '\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+            os.replace(temporary, self._spool_path)
+        except BaseException:
+            spool.close()
+            raise
+        self._spool.close()
+        self._spool = spool
+
+    def _replay_orphans(self) -> None:
+        """Queue unacknowledged rows from spools whose process is gone"""
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, SPOOL_PATTERN))):
+            if path == self._spool_path:
+                continue
+            with open(path, 'r+', encoding='utf-8') as spool:
+                if FCNTL_AVAILABLE:
+                    try:
+                        fcntl.flock(spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # Owned by a running worker
+                    if not _same_file(spool, path):
+                        continue  # Replaced by its worker's compaction after we opened it
+                rows = read_spool(spool)
+                for row in rows.values():
+                    analysis = hydrate(Analysis, row)
+                    self._append(json.dumps({'add': row}, separators=(',', ':')))
+                    self._pending[analysis.id] = analysis
+                    self._queued_at[analysis.id] = time.monotonic()
+                self._stats['replayed'] += len(rows)
+                # Our own spool now holds these rows durably
+                os.remove(path)
+                if rows:
+                    logger.info(f"Replaying {len(rows)} unflushed analyses from {os.path.basename(path)}")
+
+    # Metrics
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queue_depth'] = len(self._pending)
+            oldest = next(iter(self._queued_at.values()), None)
+        stats['oldest_pending_seconds'] = round(time.monotonic() - oldest, 3) if oldest is not None else 0.0
+        flush_ms_total = stats.pop('flush_ms_total')
+        stats['avg_flush_ms'] = round(flush_ms_total / stats['batches'], 3) if stats['batches'] else 0.0
+        stats['last_flush_ms'] = round(stats['last_flush_ms'], 3)
+        stats['max_flush_ms'] = round(stats['max_flush_ms'], 3)
+        return stats
+
+
+def _same_file(spool, path: str) -> bool:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(spool.fileno())
+    return (opened.st_dev, opened.st_ino) == (stat.st_dev, stat.st_ino)
+
+
+def read_spool(spool) -> 'OrderedDict[str, Dict[str, Any]]':
+    """Rows added to a spool file and not acknowledged, in insertion order"""
+    rows = OrderedDict()
+    for line in spool:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # A torn final line from a crash mid-write
+            continue
+        if 'add' in entry:
+            rows[entry['add']['id']] = entry['add']
+        for analysis_id in entry.get('done', ()):
+            rows.pop(analysis_id, None)
+    return rows
+
+# Global analysis recorder instance
+analysis_recorder = AnalysisRecorder()
@@ -1,14 +1,133 @@
 """
 Analysis Service for FoodLens Application
-Business logic for OCR processing and health analysis.
+Business logic for the user's analysis history.
 """
 
-# Analysis service will be implemented here
-# This service will handle:
-# - OCR image processing workflows
-# - Ingredient text parsing and extraction
-# - Health score calculation algorithms
-# - Personalized analysis based on user profile
-# - Allergen detection and warning generation
-# - AI-powered health insights
-# - Analysis result caching and optimization
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+
+from utils import pagination
+from utils.database import Database
+from utils.pagination import InvalidCursor
+from models.analysis import Analysis
+from services.analysis_recorder import analysis_recorder
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Columns returned by the history listing. All of them are in the covering
+# index on (user_id, created_at, id), so a page is an index-only scan; the
+# JSONB documents (input_data, detailed_analysis, nutritional_assessment,
+# health_insights) are only read by the detail endpoint.
+LIST_FIELDS = (
+    'id', 'product_id', 'input_type', 'image_url', 'health_score', 'confidence_score',
+    'status', 'is_bookmarked', 'user_rating', 'created_at',
+)
+
+
+def encode_cursor(created_at: datetime, analysis_id) -> str:
+    """Opaque cursor for the position after (created_at, id)"""
+    return pagination.encode_cursor([created_at.isoformat(), str(analysis_id)])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    created_at, analysis_id = pagination.decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), uuid.UUID(analysis_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {e}')
+
+
+def history_statement(user_id, position: Optional[Tuple[datetime, uuid.UUID]], limit: int):
+    """List columns of the user's analyses after position, newest first"""
+    statement = select(*[getattr(Analysis, field) for field in LIST_FIELDS])\
+        .where(Analysis.user_id == user_id)
+    if position is not None:
+        statement = statement.where(tuple_(Analysis.created_at, Analysis.id) < tuple_(*position))
+    return statement.order_by(Analysis.created_at.desc(), Analysis.id.desc()).limit(limit)
+
+
+class AnalysisService:
+    def __init__(self):
+        """Initialize analysis service"""
+        self.db = Database()
+
+    def list_analyses(self, user_id: str, cursor: Optional[str] = None,
+                      limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """
+        One page of the user's analyses, newest first. Keyset pagination on
+        (created_at, id): each page seeks straight to the cursor position, so
+        page N costs the same as page 1.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        try:
+            position = decode_cursor(cursor) if cursor else None
+        except InvalidCursor as e:
+            return {'success': False, 'error': str(e)}
+
+        session = self.db.connect()
+        try:
+            # Results still queued for insertion are listed too (read-your-writes).
+            # Taken before the query, so a row flushed in between is in both (and
+            # deduplicated) rather than in neither
+            queued = [{field: getattr(analysis, field) for field in LIST_FIELDS}
+                      for analysis in analysis_recorder.pending_for_user(user_id)]
+            # One extra row tells whether another page exists
+            rows = [row._asdict() for row in
+                    session.execute(history_statement(user_id, position, limit + 1)).all()]
+            if queued:
+                rows = {row['id']: row for row in rows + queued
+                        if position is None or (row['created_at'], row['id']) < position}
+                rows = sorted(rows.values(), key=lambda row: (row['created_at'], row['id']), reverse=True)
+
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            return {
+                'success': True,
+                'analyses': rows,
+                'next_cursor': encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None,
+                'has_more': has_more
+            }
+
+        except Exception as e:
+            return {'success': False, 'error': f'Failed to retrieve analyses: {str(e)}'}
+        finally:
+            self.db.close(session)
+
+    def get_analysis(self, user_id: str, analysis_id: str) -> Dict[str, Any]:
+        """Full analysis, including the JSONB documents, if it belongs to the user"""
+        try:
+            analysis_id = uuid.UUID(str(analysis_id))
+        except ValueError:
+            return {'success': False, 'error': 'Analysis not found'}
+
+        # Served from the queue until the write-behind flush has inserted it
+        queued = analysis_recorder.get(analysis_id)
+        if queued is not None:
+            if str(queued.user_id) != str(user_id):
+                return {'success': False, 'error': 'Analysis not found'}
+            return {'success': True, 'analysis': queued.to_dict(native=True)}
+
+        session = self.db.connect()
+        try:
+            analysis = session.query(Analysis)\
+                .filter(Analysis.id == analysis_id, Analysis.user_id == user_id)\
+                .first()
+            if not analysis:
+                return {'success': False, 'error': 'Analysis not found'}
+
+            return {
+                'success': True,
+                'analysis': analysis.to_dict(native=True)
+            }
+
+        except Exception as e:
+            return {'success': False, 'error': f'Failed to retrieve analysis: {str(e)}'}
+        finally:
+            self.db.close(session)
+
+# Global analysis service instance
+analysis_service = AnalysisService()
@@ -3,8 +3,10 @@ Authentication Service for FoodLens Application
 Business logic for user authentication and authorization.
 """
 
-from werkzeug.security import generate_password_hash, check_password_hash
-import uuid
+import os
+import threading
+import time
+import logging
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from flask import current_app
@@ -13,20 +15,126 @@ from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from google.auth.transport import requests
 from google.oauth2 import id_token
 import secrets
+from utils.cache import ThreadSafeTTLCache
+from utils.password_hasher import PasswordHashingBusy
 from utils.database import Database
 from models.user import User
 from models.user_profile import UserProfile
 from utils.validators import AuthValidator
 
+# Authenticated principals (user.to_dict() of active users) kept per process.
+# Changes made by another process are picked up when the entry expires.
+PRINCIPAL_CACHE_TTL = int(os.getenv('PRINCIPAL_CACHE_TTL', 60))
+PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', 10000))
+# How often the token version table is reloaded from the users table
+TOKEN_VERSION_REFRESH_SECONDS = int(os.getenv('TOKEN_VERSION_REFRESH_SECONDS', 30))
+# Access tokens carry claims and are signed with their own salt, so password
+# reset tokens (default salt) can never be used as access tokens
+ACCESS_TOKEN_SALT = 'access-token'
+
+logger = logging.getLogger(__name__)
+
+class TokenVersionTable:
+    """
+    Revocation state for claims tokens: token_version and is_active per user.
+    Only users that differ from the defaults (version 0, active) are kept, so
+    the table stays small. It is reloaded every TOKEN_VERSION_REFRESH_SECONDS
+    and updated immediately by change events in this process.
+    """
+    
+    def __init__(self, db: Database, refresh_interval: float = TOKEN_VERSION_REFRESH_SECONDS):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self._entries = {}
+        self._loaded_at = None
+        self._refresh_lock = threading.Lock()
+    
+    def refresh(self) -> None:
+        """Reload the table; a local entry with a newer version than the snapshot is kept."""
+        session = self.db.connect()
+        try:
+            rows = session.query(User.id, User.token_version, User.is_active)\
+                .filter((User.token_version != 0) | (User.is_active == False))\
+                .all()
+        finally:
+            self.db.close(session)
+        
+        entries = {str(row.id): (row.token_version or 0, bool(row.is_active)) for row in rows}
+        for user_id, entry in list(self._entries.items()):
+            if entry[0] > entries.get(user_id, (0, True))[0]:
+                entries[user_id] = entry
+        self._entries = entries
+        self._loaded_at = time.monotonic()
+    
+    def _ensure_fresh(self) -> None:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        # One thread refreshes; the others keep using the current table
+        if not self._refresh_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+                self.refresh()
+        except Exception as e:
+            logger.warning(f"Token version refresh failed: {e}")
+            if self._loaded_at is not None:
+                # Keep serving the last snapshot and retry after the interval
+                self._loaded_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+    
+    def record(self, user_id, token_version: int, is_active: bool) -> None:
+        """Apply a committed change made by this process."""
+        self._entries[str(user_id)] = (token_version, is_active)
+    
+    def is_current(self, user_id: str, token_version: int) -> bool:
+        """
+        Whether a token with this version is still valid. A version newer than
+        the table means the table is stale (the token was issued after a change
+        seen only by the database), not that the token is forged.
+        """
+        self._ensure_fresh()
+        if self._loaded_at is None:
+            # Never loaded: fail closed rather than accept revoked tokens
+            return False
+        known_version, is_active = self._entries.get(user_id, (0, True))
+        return token_version > known_version or (token_version == known_version and is_active)
+
 class AuthService:
     def __init__(self):
         self.db = Database()
         self.validator = AuthValidator()
+        self._principals = ThreadSafeTTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+        self._serializers = {}
+        self.token_versions = TokenVersionTable(self.db)
         
-    def _get_serializer(self):
-        """Get URLSafeTimedSerializer instance."""
+    def _get_serializer(self, salt: Optional[str] = None):
+        """Get URLSafeTimedSerializer instance (reused while SECRET_KEY is unchanged)."""
         secret_key = current_app.config.get('SECRET_KEY', 'default-secret-key')
-        return URLSafeTimedSerializer(secret_key)
+        cached = self._serializers.get(salt)
+        if cached is None or cached[0] != secret_key:
+            if salt is None:
+                cached = (secret_key, URLSafeTimedSerializer(secret_key))
+            else:
+                cached = (secret_key, URLSafeTimedSerializer(secret_key, salt=salt))
+            self._serializers[salt] = cached
+        return cached[1]
+    
+    def invalidate_principal(self, user_id) -> None:
+        """Drop a cached principal after the user's account data changes."""
+        self._principals.pop(str(user_id))
+    
+    def revoke_tokens(self, user: User) -> None:
+        """
+        Bump the user's token_version so every token issued so far is rejected.
+        Call before committing; call token_revoked(user) after the commit.
+        """
+        user.token_version = (user.token_version or 0) + 1
+    
+    def token_revoked(self, user: User) -> None:
+        """Publish a committed token_version/is_active change to this process."""
+        self.token_versions.record(user.id, user.token_version or 0, bool(user.is_active))
+        self.invalidate_principal(user.id)
     
     def register_user(self, email: str, password: str, username: str, 
                      first_name: Optional[str] = None, last_name: Optional[str] = None) -> Dict[str, Any]:
@@ -80,7 +188,7 @@ class AuthService:
             session.commit()
             
             # Generate access token
-            access_token = self._generate_token(new_user.id)
+            access_token = self._generate_token(new_user)
             
             return {
                 'success': True,
@@ -95,6 +203,8 @@ class AuthService:
                 'success': False,
                 'error': 'User with this email or username already exists'
             }
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             session.rollback()
             return {
@@ -134,12 +244,17 @@ class AuthService:
                     'error': 'Account is deactivated'
                 }
             
+            # Upgrade hashes made with older parameters while the password is known
+            if user.password_needs_rehash():
+                user.set_password(password)
+            
             # Update last login
             user.update_last_login()
             session.commit()
+            self.invalidate_principal(user.id)
             
             # Generate access token
-            access_token = self._generate_token(user.id)
+            access_token = self._generate_token(user)
             
             return {
                 'success': True,
@@ -148,6 +263,8 @@ class AuthService:
                 'access_token': access_token
             }
             
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             return {
                 'success': False,
@@ -159,30 +276,51 @@ class AuthService:
     def verify_token(self, token: str) -> Dict[str, Any]:
         """
         Verify token using itsdangerous and return user information.
+        Claims tokens are verified offline against the token version table;
+        legacy tokens (bare user id) are checked against it as version 0 and
+        fall back to the cached principal lookup.
         """
         try:
-            serializer = self._get_serializer()
             # Token expires after 24 hours (86400 seconds)
             max_age = current_app.config.get('JWT_ACCESS_TOKEN_EXPIRES', 86400)
             
-            # Deserialize token data
-            user_id = serializer.loads(token, max_age=max_age)
-            
-            if not user_id:
-                return {'success': False, 'error': 'Invalid token'}
-            
-            session = self.db.connect()
             try:
-                user = session.query(User).filter(User.id == user_id).first()
-                if not user or not user.is_active:
-                    return {'success': False, 'error': 'User not found or inactive'}
-                
+                claims = self._get_serializer(ACCESS_TOKEN_SALT).loads(token, max_age=max_age)
+            except SignatureExpired:
+                raise
+            except BadSignature:
+                claims = None
+            
+            if claims is not None:
+                if not isinstance(claims, dict) or not claims.get('uid'):
+                    return {'success': False, 'error': 'Invalid token'}
+                if not claims.get('is_active') or \
+                        not self.token_versions.is_current(claims['uid'], claims.get('token_version', 0)):
+                    return {'success': False, 'error': 'Token has been revoked'}
                 return {
                     'success': True,
-                    'user': user.to_dict()
+                    'user': self._principal_from_claims(claims),
+                    'claims': claims
                 }
-            finally:
-                self.db.close(session)
+            
+            # Legacy tokens signed over the bare user id
+            user_id = self._get_serializer().loads(token, max_age=max_age)
+            
+            if not user_id or not isinstance(user_id, str):
+                return {'success': False, 'error': 'Invalid token'}
+            # Legacy tokens predate token versions, so they count as version 0:
+            # a password change or reset, or deactivating the account, revokes them too
+            if not self.token_versions.is_current(user_id, 0):
+                return {'success': False, 'error': 'Token has been revoked'}
+            
+            principal = self.get_principal(user_id)
+            if principal is None:
+                return {'success': False, 'error': 'User not found or inactive'}
+            
+            return {
+                'success': True,
+                'user': principal
+            }
                 
         except SignatureExpired:
             return {'success': False, 'error': 'Token has expired'}
@@ -191,16 +329,57 @@ class AuthService:
         except Exception as e:
             return {'success': False, 'error': f'Token verification failed: {str(e)}'}
     
+    def get_principal(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Full user.to_dict() of an active user, cached per user id."""
+        user_id = str(user_id)
+        principal = self._principals.get(user_id)
+        if principal is None:
+            session = self.db.connect()
+            try:
+                user = session.query(User).filter(User.id == user_id).first()
+                if not user or not user.is_active:
+                    return None
+                
+                principal = user.to_dict()
+                self._principals.set(user_id, principal)
+            finally:
+                self.db.close(session)
+        
+        # Copy so callers cannot modify the shared cached principal
+        return dict(principal)
+    
+    def _principal_from_claims(self, claims: Dict[str, Any]) -> Dict[str, Any]:
+        """request.current_user built from token claims alone."""
+        return {
+            'id': claims['uid'],
+            'username': claims.get('username'),
+            'is_active': bool(claims.get('is_active')),
+            'is_admin': bool(claims.get('is_admin')),
+            'token_version': claims.get('token_version', 0)
+        }
+    
     def refresh_token(self, token: str) -> Dict[str, Any]:
         """
         Refresh an existing JWT token.
+        Claims tokens whose version is still current are re-signed without a
+        database round trip; legacy tokens are upgraded to claims tokens.
         """
         verification_result = self.verify_token(token)
         if not verification_result['success']:
             return verification_result
         
-        user_id = verification_result['user']['id']
-        new_token = self._generate_token(user_id)
+        claims = verification_result.get('claims')
+        if claims is not None:
+            new_token = self._sign_claims(claims)
+        else:
+            session = self.db.connect()
+            try:
+                user = session.query(User).filter(User.id == verification_result['user']['id']).first()
+                if not user or not user.is_active:
+                    return {'success': False, 'error': 'User not found or inactive'}
+                new_token = self._generate_token(user)
+            finally:
+                self.db.close(session)
         
         return {
             'success': True,
@@ -230,25 +409,45 @@ class AuthService:
                 }
             
             user.set_password(new_password)
+            # Sign out every other session; the caller gets a fresh token
+            self.revoke_tokens(user)
             session.commit()
+            self.token_revoked(user)
             
             return {
                 'success': True,
-                'message': 'Password changed successfully'
+                'message': 'Password changed successfully',
+                'access_token': self._generate_token(user)
             }
             
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             session.rollback()
             return {'success': False, 'error': f'Password change failed: {str(e)}'}
         finally:
             self.db.close(session)
     
-    def _generate_token(self, user_id: uuid.UUID) -> str:
+    def _generate_token(self, user: User) -> str:
         """
         Generate secure token using itsdangerous.
+        The token carries the claims request handlers need, so it can be
+        verified without loading the user.
         """
-        serializer = self._get_serializer()
-        return serializer.dumps(str(user_id))
+        return self._sign_claims({
+            'uid': str(user.id),
+            'username': user.username,
+            'is_active': bool(user.is_active),
+            'is_admin': bool(user.is_admin),
+            'token_version': user.token_version or 0
+        })
+    
+    def issue_token(self, user: User) -> str:
+        """Access token for a user whose claims changed (e.g. a new username)."""
+        return self._generate_token(user)
+    
+    def _sign_claims(self, claims: Dict[str, Any]) -> str:
+        return self._get_serializer(ACCESS_TOKEN_SALT).dumps(claims)
 
     def verify_google_token(self, token: str) -> Dict[str, Any]:
         """
@@ -319,9 +518,10 @@ class AuthService:
                 # Update last login
                 user.update_last_login()
                 session.commit()
+                self.invalidate_principal(user.id)
                 
                 # Generate access token
-                access_token = self._generate_token(user.id)
+                access_token = self._generate_token(user)
                 
                 return {
                     'success': True,
@@ -349,7 +549,7 @@ class AuthService:
                 session.commit()
                 
                 # Generate access token
-                access_token = self._generate_token(new_user.id)
+                access_token = self._generate_token(new_user)
                 
                 return {
                     'success': True,
@@ -365,6 +565,8 @@ class AuthService:
                 'success': False,
                 'error': 'User registration failed due to data conflict'
             }
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             session.rollback()
             return {
@@ -472,7 +674,9 @@ class AuthService:
             
             # Update password
             user.set_password(new_password)
+            self.revoke_tokens(user)
             session.commit()
+            self.token_revoked(user)
             
             return {
                 'success': True,
@@ -489,6 +693,8 @@ class AuthService:
                 'success': False,
                 'error': 'Invalid reset token'
             }
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             session.rollback()
             return {
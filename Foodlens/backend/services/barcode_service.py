@@ -0,0 +1,222 @@
+"""
+Barcode lookup service for FoodLens Application
+Resolves scanned barcodes from an in-process cache, the product store, the products table, then a remote source.
+Caches are dropped when imports or syncs bump the catalog generation.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from utils.cache import ThreadSafeTTLCache
+from utils.catalog_generation import CatalogGeneration
+from utils.database import Database
+from utils.external_apis import OpenFoodFactsClient, RemoteSourceError
+from utils.validators import product_validator
+from models.product import Product
+from services.product_store import ProductStore
+
+BARCODE_CACHE_SIZE = int(os.getenv('BARCODE_CACHE_SIZE', '10000'))
+BARCODE_CACHE_TTL = float(os.getenv('BARCODE_CACHE_TTL', '3600'))
+# Unknown barcodes are remembered this long before the remote source is asked again
+BARCODE_MISS_TTL = float(os.getenv('BARCODE_MISS_TTL', '600'))
+BARCODE_REMOTE_LOOKUP = os.getenv('BARCODE_REMOTE_LOOKUP', 'true').lower() == 'true'
+# Serve products from the memory-mapped product store before querying the table;
+# needs a store rebuilt from the table after every import or sync
+PRODUCT_STORE_ENABLED = os.getenv('PRODUCT_STORE_ENABLED', 'false').lower() == 'true'
+# How long a request waits for another thread's lookup of the same barcode
+COALESCE_TIMEOUT = 15.0
+
+_NOT_FOUND = 'Product not found'
+_UNAVAILABLE = 'Product source unavailable'
+
+# Remote source: barcode -> product column values, None when unknown;
+# raises RemoteSourceError when it cannot answer
+RemoteSource = Callable[[str], Optional[Dict[str, Any]]]
+
+
+def lookup_statement(barcode: str):
+    """Product by barcode, served by the unique barcode index"""
+    return select(Product).where(Product.barcode == barcode)
+
+
+def store_statement(fields: Dict[str, Any]):
+    """Insert a fetched product unless another worker stored it first"""
+    return insert(Product).values(**fields).on_conflict_do_nothing(index_elements=[Product.barcode])
+
+
+class _Lookup:
+    """One in-flight lookup that concurrent requests for the same barcode wait on"""
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class BarcodeService:
+    def __init__(self, remote: Optional[RemoteSource] = None, store: Optional[ProductStore] = None,
+                 catalog: Optional[CatalogGeneration] = None):
+        """Initialize barcode service"""
+        self.db = Database()
+        self.logger = logging.getLogger(__name__)
+        self.remote = remote
+        self.store = store
+        self.catalog = catalog
+        self._generation = catalog.current() if catalog is not None else None
+        self._products = ThreadSafeTTLCache(maxsize=BARCODE_CACHE_SIZE, ttl=BARCODE_CACHE_TTL)
+        self._misses = ThreadSafeTTLCache(maxsize=BARCODE_CACHE_SIZE, ttl=BARCODE_MISS_TTL)
+        self._inflight: Dict[str, _Lookup] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'cache_hits': 0, 'negative_hits': 0, 'store_hits': 0, 'table_hits': 0, 'remote_hits': 0,
+            'remote_misses': 0, 'remote_errors': 0, 'coalesced': 0, 'store_failures': 0, 'generation_resets': 0
+        }
+
+    def lookup(self, barcode: str) -> Dict[str, Any]:
+        """
+        Product for a barcode. Misses are cached for BARCODE_MISS_TTL, and
+        concurrent lookups of one barcode share a single table/remote fetch.
+        Products in the product store are served without a query.
+        """
+        validation = product_validator.validate_barcode(barcode)
+        if not barcode or not validation['is_valid']:
+            return {'success': False, 'error': f"Invalid barcode: {validation.get('error', 'Barcode is required')}"}
+        barcode = validation['sanitized_barcode']
+
+        self._drop_stale()
+        product = self._products.get(barcode)
+        if product is not None:
+            self._count('cache_hits')
+            return {'success': True, 'product': product, 'source': 'cache'}
+        if self._misses.get(barcode):
+            self._count('negative_hits')
+            return {'success': False, 'error': _NOT_FOUND}
+        if self.store is not None:
+            product = self.store.get(barcode)
+            if product is not None:
+                self._count('store_hits')
+                return {'success': True, 'product': product, 'source': 'store'}
+
+        with self._lock:
+            pending = self._inflight.get(barcode)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[barcode] = _Lookup()
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            if not pending.done.wait(COALESCE_TIMEOUT):
+                return {'success': False, 'error': _UNAVAILABLE}
+            return pending.result
+
+        try:
+            pending.result = self._resolve(barcode)
+        except Exception as e:
+            pending.result = {'success': False, 'error': f'Barcode lookup failed: {str(e)}'}
+        finally:
+            with self._lock:
+                self._inflight.pop(barcode, None)
+            pending.done.set()
+        return pending.result
+
+    def _resolve(self, barcode: str) -> Dict[str, Any]:
+        product = self._find(barcode)
+        if product is not None:
+            self._count('table_hits')
+            self._products.set(barcode, product)
+            return {'success': True, 'product': product, 'source': 'database'}
+
+        if self.remote is None:
+            self._misses.set(barcode, True)
+            return {'success': False, 'error': _NOT_FOUND}
+
+        try:
+            fields = self.remote(barcode)
+        except RemoteSourceError as e:
+            # Not cached as a miss: the product may exist once the source recovers
+            self._count('remote_errors')
+            self.logger.warning(f"Remote lookup of {barcode} failed: {e}")
+            return {'success': False, 'error': _UNAVAILABLE}
+
+        if fields is None:
+            self._count('remote_misses')
+            self._misses.set(barcode, True)
+            return {'success': False, 'error': _NOT_FOUND}
+
+        self._count('remote_hits')
+        fields = dict(fields, barcode=barcode)
+        try:
+            product = self._save(fields)
+            self._products.set(barcode, product)
+        except Exception as e:
+            # Served anyway; the next scan retries the write
+            self._count('store_failures')
+            self.logger.error(f"Failed to store product {barcode}: {e}")
+            product = dict(dict.fromkeys(Product.SERIALIZED_FIELDS), **fields)
+        return {'success': True, 'product': product, 'source': 'remote'}
+
+    def _find(self, barcode: str) -> Optional[Dict[str, Any]]:
+        session = self.db.connect()
+        try:
+            product = session.execute(lookup_statement(barcode)).scalar_one_or_none()
+            return product.to_dict(native=True) if product else None
+        finally:
+            self.db.close(session)
+
+    def _save(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Write a remote product back to the table and return the stored row"""
+        session = self.db.connect()
+        try:
+            session.execute(store_statement(fields))
+            session.commit()
+            product = session.execute(lookup_statement(fields['barcode'])).scalar_one()
+            return product.to_dict(native=True)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self.db.close(session)
+
+    def _drop_stale(self) -> None:
+        """Clear both caches once products were written by any process since they were filled"""
+        if self.catalog is None:
+            return
+        generation = self.catalog.current()
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation == self._generation:
+                return
+            self._generation = generation
+            self._stats['generation_resets'] += 1
+        self._products.clear()
+        self._misses.clear()
+
+    def invalidate(self, barcode: str) -> None:
+        """Drop a barcode from both caches of this process after its row changed"""
+        self._products.pop(barcode)
+        self._misses.pop(barcode)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache sizes and lookup outcome counters"""
+        with self._lock:
+            stats = dict(self._stats, inflight=len(self._inflight))
+        stats.update(cached=len(self._products), cached_misses=len(self._misses))
+        if self.store is not None:
+            stats['store'] = self.store.get_stats()
+        return stats
+
+# Global barcode service instance
+_catalog = CatalogGeneration()
+barcode_service = BarcodeService(OpenFoodFactsClient().fetch_product if BARCODE_REMOTE_LOOKUP else None,
+                                 ProductStore(catalog=_catalog) if PRODUCT_STORE_ENABLED else None, _catalog)
@@ -0,0 +1,290 @@
+"""
+Dashboard Service for FoodLens Application
+One-statement dashboard reads, maintained per-user counters and a per-user cache.
+"""
+
+import logging
+import os
+import re
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import Date, DateTime, Numeric, event, func, inspect, literal_column, select, update
+from sqlalchemy.dialects.postgresql import UUID, aggregate_order_by, insert as pg_insert
+from sqlalchemy.orm import Session
+
+from utils.cache import ThreadSafeTTLCache
+from utils.database import Database
+from models.analysis import Analysis
+from models.nutrition_goal import NutritionGoal
+from models.recommendation import Recommendation
+from models.user_stats import UserStats
+
+RECENT_ANALYSES_LIMIT = 5
+UNREAD_RECOMMENDATIONS_LIMIT = 10
+# Cached payloads are dropped on change in this process; the TTL bounds how
+# long another worker's changes take to show up
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 60))
+DASHBOARD_CACHE_SIZE = 10000
+
+# Session.info key collecting users whose dashboard changed in a transaction
+_DIRTY_USERS = 'dashboard_dirty_users'
+# PostgreSQL trims trailing zeros from fractional seconds; fromisoformat
+# before Python 3.11 only accepts 3 or 6 digits
+_FRACTION = re.compile(r'\.(\d{1,6})')
+
+
+def _parse_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(_FRACTION.sub(lambda m: '.' + m.group(1).ljust(6, '0'), value, count=1))
+
+
+def hydrate(model, row: Dict[str, Any]):
+    """
+    Detached model instance from a json_build_object row, with column values
+    converted back to the types the ORM would load (UUID, Decimal, datetime),
+    so the model's own to_dict serializes it.
+    """
+    mapper = inspect(model)
+    instance = mapper.class_manager.new_instance()
+    for attribute in mapper.column_attrs:
+        column = attribute.columns[0]
+        value = row.get(column.name)
+        if value is not None:
+            if isinstance(column.type, UUID):
+                value = uuid.UUID(value)
+            elif isinstance(column.type, DateTime):
+                value = _parse_datetime(value)
+            elif isinstance(column.type, Date):
+                value = date.fromisoformat(value)
+            elif isinstance(column.type, Numeric):
+                value = Decimal(str(value))
+        setattr(instance, attribute.key, value)
+    return instance
+
+
+def _key(name: str):
+    # Column names are identifiers from the models, safe to inline as JSON keys
+    return literal_column(f"'{name}'")
+
+
+def _json_rows(model, where, limit: Optional[int] = None):
+    """Scalar subquery: json array of matching rows, newest first"""
+    table = model.__table__
+    query = select(table).where(where).order_by(table.c.created_at.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.subquery()
+    row_object = func.json_build_object(*[
+        part for column in table.columns for part in (_key(column.name), rows.c[column.name])
+    ])
+    return select(func.coalesce(
+        func.json_agg(aggregate_order_by(row_object, rows.c.created_at.desc())),
+        func.json_build_array()
+    )).scalar_subquery()
+
+
+def dashboard_statement(user_id):
+    """Recent analyses, unread recommendations, active goals and counters in one statement"""
+    stats = UserStats.__table__
+    return select(
+        _json_rows(Analysis, Analysis.user_id == user_id, RECENT_ANALYSES_LIMIT).label('recent_analyses'),
+        _json_rows(Recommendation, (Recommendation.user_id == user_id) & (Recommendation.is_read == False),
+                   UNREAD_RECOMMENDATIONS_LIMIT).label('unread_recommendations'),
+        _json_rows(NutritionGoal, (NutritionGoal.user_id == user_id) & (NutritionGoal.is_active == True))
+            .label('active_goals'),
+        select(func.json_build_object(*[part for counter in UserStats.COUNTERS
+                                        for part in (_key(counter), stats.c[counter])]))
+            .where(stats.c.user_id == user_id).scalar_subquery().label('stats')
+    )
+
+
+class DashboardService:
+    def __init__(self):
+        """Initialize dashboard service"""
+        self.db = Database()
+        self.logger = logging.getLogger(__name__)
+        self._cache = ThreadSafeTTLCache(maxsize=DASHBOARD_CACHE_SIZE, ttl=DASHBOARD_CACHE_TTL)
+
+    def invalidate(self, user_ids: Iterable) -> None:
+        """Drop cached dashboards after their analyses, recommendations or goals change"""
+        for user_id in user_ids:
+            self._cache.pop(str(user_id))
+
+    def get_dashboard(self, user_id: str) -> Dict[str, Any]:
+        """Dashboard payload for a user, cached until the underlying rows change"""
+        user_id = str(user_id)
+        dashboard = self._cache.get(user_id)
+        if dashboard is None:
+            session = self.db.connect()
+            try:
+                if session.get_bind().dialect.name == 'postgresql':
+                    dashboard = self._load_single_statement(session, user_id)
+                else:
+                    dashboard = self._load_orm(session, user_id)
+            finally:
+                self.db.close(session)
+            self._cache.set(user_id, dashboard)
+        return dashboard
+
+    def _load_single_statement(self, session, user_id: str) -> Dict[str, Any]:
+        row = session.execute(dashboard_statement(uuid.UUID(user_id))).one()
+        return self._payload(
+            [hydrate(Analysis, item) for item in row.recent_analyses],
+            [hydrate(Recommendation, item) for item in row.unread_recommendations],
+            [hydrate(NutritionGoal, item) for item in row.active_goals],
+            row.stats or {}
+        )
+
+    def _load_orm(self, session, user_id: str) -> Dict[str, Any]:
+        # Databases without json_agg (tests, tooling) get the same payload in four queries
+        recent_analyses = session.query(Analysis)\
+            .filter(Analysis.user_id == user_id)\
+            .order_by(Analysis.created_at.desc())\
+            .limit(RECENT_ANALYSES_LIMIT)\
+            .all()
+        unread_recommendations = session.query(Recommendation)\
+            .filter(Recommendation.user_id == user_id, Recommendation.is_read == False)\
+            .order_by(Recommendation.created_at.desc())\
+            .limit(UNREAD_RECOMMENDATIONS_LIMIT)\
+            .all()
+        active_goals = session.query(NutritionGoal)\
+            .filter(NutritionGoal.user_id == user_id, NutritionGoal.is_active == True)\
+            .order_by(NutritionGoal.created_at.desc())\
+            .all()
+        stats = session.get(UserStats, user_id)
+        return self._payload(recent_analyses, unread_recommendations, active_goals,
+                             stats.to_dict() if stats else {})
+
+    def _payload(self, analyses: List[Analysis], recommendations: List[Recommendation],
+                 goals: List[NutritionGoal], stats: Dict[str, int]) -> Dict[str, Any]:
+        return {
+            'recent_analyses': [analysis.to_dict(native=True) for analysis in analyses],
+            'unread_recommendations': [rec.to_dict() for rec in recommendations],
+            'active_goals': [goal.to_dict() for goal in goals],
+            'stats': {
+                'total_analyses': stats.get('analyses_count') or 0,
+                'unread_recommendations_count': stats.get('unread_recommendations_count') or 0,
+                'active_goals_count': stats.get('active_goals_count') or 0
+            }
+        }
+
+# Global dashboard service instance
+dashboard_service = DashboardService()
+
+
+def adjust_user_stats(connection, user_id, **deltas: int) -> None:
+    """Add deltas to a user's counters in the current transaction, creating the row if needed"""
+    deltas = {counter: delta for counter, delta in deltas.items() if delta}
+    if not deltas or user_id is None:
+        return
+    stats = UserStats.__table__
+    values = {counter: func.greatest(stats.c[counter] + delta, 0) for counter, delta in deltas.items()}
+    values['updated_at'] = func.now()
+
+    if connection.dialect.name == 'postgresql':
+        statement = pg_insert(stats).values(user_id=user_id, **{c: max(d, 0) for c, d in deltas.items()})
+        connection.execute(statement.on_conflict_do_update(index_elements=[stats.c.user_id], set_=values))
+        return
+
+    result = connection.execute(update(stats).where(stats.c.user_id == user_id).values(**values))
+    if result.rowcount == 0:
+        connection.execute(stats.insert().values(user_id=user_id, **{c: max(d, 0) for c, d in deltas.items()}))
+
+
+def _mark_dirty(target) -> None:
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_DIRTY_USERS, set()).add(target.user_id)
+
+
+def _changed(target, attribute: str) -> Optional[bool]:
+    """New value of a boolean attribute changed in this flush, or None if unchanged"""
+    history = inspect(target).attrs[attribute].history
+    if not history.has_changes() or not history.deleted:
+        return None
+    old, new = bool(history.deleted[0]), bool(history.added[0]) if history.added else False
+    return new if old != new else None
+
+
+# The counters need the old value of these flags. Without active history a
+# flag that was expired (after every commit) or never loaded is replaced
+# without its old value, and _changed cannot tell whether it changed.
+@event.listens_for(Recommendation.is_read, 'set', active_history=True)
+@event.listens_for(NutritionGoal.is_active, 'set', active_history=True)
+def _load_previous_flag(target, value, oldvalue, initiator):
+    pass
+
+
+@event.listens_for(Analysis, 'after_insert')
+def _analysis_inserted(mapper, connection, target):
+    adjust_user_stats(connection, target.user_id, analyses_count=1)
+    _mark_dirty(target)
+
+
+@event.listens_for(Analysis, 'after_delete')
+def _analysis_deleted(mapper, connection, target):
+    adjust_user_stats(connection, target.user_id, analyses_count=-1)
+    _mark_dirty(target)
+
+
+@event.listens_for(Analysis, 'after_update')
+def _analysis_updated(mapper, connection, target):
+    _mark_dirty(target)
+
+
+@event.listens_for(Recommendation, 'after_insert')
+def _recommendation_inserted(mapper, connection, target):
+    if not target.is_read:
+        adjust_user_stats(connection, target.user_id, unread_recommendations_count=1)
+    _mark_dirty(target)
+
+
+@event.listens_for(Recommendation, 'after_update')
+def _recommendation_updated(mapper, connection, target):
+    is_read = _changed(target, 'is_read')
+    if is_read is not None:
+        adjust_user_stats(connection, target.user_id, unread_recommendations_count=-1 if is_read else 1)
+    _mark_dirty(target)
+
+
+# Before the DELETE, so an expired flag can still be loaded
+@event.listens_for(Recommendation, 'before_delete')
+def _recommendation_deleted(mapper, connection, target):
+    if not target.is_read:
+        adjust_user_stats(connection, target.user_id, unread_recommendations_count=-1)
+    _mark_dirty(target)
+
+
+@event.listens_for(NutritionGoal, 'after_insert')
+def _goal_inserted(mapper, connection, target):
+    if target.is_active is not False:
+        adjust_user_stats(connection, target.user_id, active_goals_count=1)
+    _mark_dirty(target)
+
+
+@event.listens_for(NutritionGoal, 'after_update')
+def _goal_updated(mapper, connection, target):
+    is_active = _changed(target, 'is_active')
+    if is_active is not None:
+        adjust_user_stats(connection, target.user_id, active_goals_count=1 if is_active else -1)
+    _mark_dirty(target)
+
+
+# Before the DELETE, so an expired flag can still be loaded
+@event.listens_for(NutritionGoal, 'before_delete')
+def _goal_deleted(mapper, connection, target):
+    if target.is_active is not False:
+        adjust_user_stats(connection, target.user_id, active_goals_count=-1)
+    _mark_dirty(target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    dashboard_service.invalidate(session.info.pop(_DIRTY_USERS, ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop(_DIRTY_USERS, None)
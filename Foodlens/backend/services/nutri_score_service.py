@@ -6,54 +6,135 @@ Based on European algorithm with improved accuracy and robustness
 import logging
 import re
 import math
-from typing import Dict, List, Optional, Tuple, Union
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 import json
 from pathlib import Path
+from bisect import bisect_left
+import numpy as np
+
+# Fixed field layout shared by NutritionData (scalar) and NutritionFrame (columnar)
+NUTRITION_FIELDS = (
+    'energy_kj',
+    'energy_kcal',
+    'fat',
+    'saturated_fat',
+    'carbohydrates',
+    'sugars',
+    'fiber',
+    'proteins',
+    'salt',
+    'sodium',
+    'fruits_vegetables_nuts',  # percentage
+)
+NUTRITION_FIELD_INDEX = {name: index for index, name in enumerate(NUTRITION_FIELDS)}
+
+KCAL_TO_KJ = 4.184
+SALT_TO_SODIUM_MG = 400  # sodium is ~40% of salt, expressed in mg
+SODIUM_MG_TO_SALT = 2.5 / 1000
+
+# Upper bounds applied by validate_and_convert (a field name means bounded by that field)
+NUTRITION_RANGES = (
+    ('energy_kcal', 900),
+    ('fat', 100),
+    ('saturated_fat', 'fat'),  # Can't be more than total fat
+    ('carbohydrates', 100),
+    ('sugars', 'carbohydrates'),  # Can't be more than total carbs
+    ('fiber', 50),
+    ('proteins', 100),
+    ('salt', 50),
+    ('fruits_vegetables_nuts', 100),
+)
+
+
+def _clamp(value, min_value: float, max_value: float):
+    """Validate a value is within expected range or set to 0"""
+    if not isinstance(value, (int, float)) or math.isnan(value) or value < min_value:
+        return 0.0
+    if value > max_value:
+        return float(max_value)
+    return value
+
 
-@dataclass
 class NutritionData:
-    """Enhanced nutritional data structure with validation and unit conversion"""
-    energy_kj: float = 0.0
-    energy_kcal: float = 0.0
-    fat: float = 0.0
-    saturated_fat: float = 0.0
-    carbohydrates: float = 0.0
-    sugars: float = 0.0
-    fiber: float = 0.0
-    proteins: float = 0.0
-    salt: float = 0.0
-    sodium: float = 0.0
-    fruits_vegetables_nuts: float = 0.0  # percentage
-    
+    """Enhanced nutritional data structure with validation and unit conversion
+
+    Slotted with a fixed field layout (NUTRITION_FIELDS) so instances carry no
+    per-object __dict__ and map one-to-one onto NutritionFrame columns.
+    """
+    __slots__ = NUTRITION_FIELDS
+
+    def __init__(self, energy_kj: float = 0.0, energy_kcal: float = 0.0, fat: float = 0.0,
+                 saturated_fat: float = 0.0, carbohydrates: float = 0.0, sugars: float = 0.0,
+                 fiber: float = 0.0, proteins: float = 0.0, salt: float = 0.0,
+                 sodium: float = 0.0, fruits_vegetables_nuts: float = 0.0):
+        self.energy_kj = energy_kj
+        self.energy_kcal = energy_kcal
+        self.fat = fat
+        self.saturated_fat = saturated_fat
+        self.carbohydrates = carbohydrates
+        self.sugars = sugars
+        self.fiber = fiber
+        self.proteins = proteins
+        self.salt = salt
+        self.sodium = sodium
+        self.fruits_vegetables_nuts = fruits_vegetables_nuts
+
+    @classmethod
+    def from_values(cls, values: Dict) -> 'NutritionData':
+        """Build from a mapping, ignoring unknown keys and non-numeric values"""
+        nutrition = cls()
+        for key, value in values.items():
+            if key in NUTRITION_FIELD_INDEX and isinstance(value, (int, float)):
+                setattr(nutrition, key, float(value))
+        return nutrition
+
+    def to_tuple(self) -> Tuple[float, ...]:
+        """Field values in NUTRITION_FIELDS order"""
+        return (self.energy_kj, self.energy_kcal, self.fat, self.saturated_fat,
+                self.carbohydrates, self.sugars, self.fiber, self.proteins,
+                self.salt, self.sodium, self.fruits_vegetables_nuts)
+
+    def to_dict(self) -> Dict[str, float]:
+        """Field values keyed by name"""
+        return dict(zip(NUTRITION_FIELDS, self.to_tuple()))
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.to_tuple() == other.to_tuple()
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={value!r}' for name, value in zip(NUTRITION_FIELDS, self.to_tuple()))
+        return f'NutritionData({fields})'
+
     def validate_and_convert(self):
         """Validate nutrition values and perform necessary conversions"""
         # Convert energy units if needed
         if self.energy_kj <= 0 and self.energy_kcal > 0:
             # Convert kcal to kJ
-            self.energy_kj = self.energy_kcal * 4.184
+            self.energy_kj = self.energy_kcal * KCAL_TO_KJ
         elif self.energy_kcal <= 0 and self.energy_kj > 0:
             # Convert kJ to kcal
-            self.energy_kcal = self.energy_kj / 4.184
+            self.energy_kcal = self.energy_kj / KCAL_TO_KJ
         
         # Convert salt to sodium and vice versa if one is missing
         if self.sodium <= 0 and self.salt > 0:
             # Salt to sodium (sodium is ~40% of salt)
-            self.sodium = self.salt * 400  # Convert to mg
+            self.sodium = self.salt * SALT_TO_SODIUM_MG  # Convert to mg
         elif self.salt <= 0 and self.sodium > 0:
             # Sodium to salt
-            self.salt = self.sodium / 1000 * 2.5  # Convert mg to g and multiply by 2.5
+            self.salt = self.sodium * SODIUM_MG_TO_SALT  # Convert mg to g and multiply by 2.5
         
         # Validate ranges and fix unrealistic values
-        self._validate_range('energy_kcal', 0, 900)
-        self._validate_range('fat', 0, 100)
-        self._validate_range('saturated_fat', 0, self.fat)  # Can't be more than total fat
-        self._validate_range('carbohydrates', 0, 100)
-        self._validate_range('sugars', 0, self.carbohydrates)  # Can't be more than total carbs
-        self._validate_range('fiber', 0, 50)
-        self._validate_range('proteins', 0, 100)
-        self._validate_range('salt', 0, 50)
-        self._validate_range('fruits_vegetables_nuts', 0, 100)
+        self.energy_kcal = _clamp(self.energy_kcal, 0, 900)
+        self.fat = _clamp(self.fat, 0, 100)
+        self.saturated_fat = _clamp(self.saturated_fat, 0, self.fat)
+        self.carbohydrates = _clamp(self.carbohydrates, 0, 100)
+        self.sugars = _clamp(self.sugars, 0, self.carbohydrates)
+        self.fiber = _clamp(self.fiber, 0, 50)
+        self.proteins = _clamp(self.proteins, 0, 100)
+        self.salt = _clamp(self.salt, 0, 50)
+        self.fruits_vegetables_nuts = _clamp(self.fruits_vegetables_nuts, 0, 100)
         
         # Ensure macronutrient consistency (total should not exceed 100g per 100g)
         total_macros = self.fat + self.carbohydrates + self.proteins
@@ -66,14 +147,466 @@ class NutritionData:
             # Also scale down components
             self.saturated_fat *= scale_factor
             self.sugars *= scale_factor
-    
-    def _validate_range(self, attribute: str, min_value: float, max_value: float):
-        """Validate a value is within expected range or set to 0"""
-        value = getattr(self, attribute)
-        if not isinstance(value, (int, float)) or math.isnan(value) or value < min_value:
-            setattr(self, attribute, 0.0)
-        elif value > max_value:
-            setattr(self, attribute, float(max_value))
+
+
+class NutritionFrame:
+    """Columnar nutrition data for many products
+
+    Values live in a single (len(NUTRITION_FIELDS), n) float64 array, so every
+    nutrient is a contiguous column and validation/conversion run vectorized
+    over the whole frame instead of one NutritionData object per product.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data: np.ndarray):
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        if data.ndim != 2 or data.shape[0] != len(NUTRITION_FIELDS):
+            raise ValueError(f'NutritionFrame expects shape ({len(NUTRITION_FIELDS)}, n), got {data.shape}')
+        self.data = data
+
+    @classmethod
+    def zeros(cls, size: int) -> 'NutritionFrame':
+        return cls(np.zeros((len(NUTRITION_FIELDS), size), dtype=np.float64))
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence[float]], size: Optional[int] = None) -> 'NutritionFrame':
+        """Build from per-nutrient sequences; missing nutrients are zero-filled"""
+        if size is None:
+            size = max((len(values) for values in columns.values()), default=0)
+        frame = cls.zeros(size)
+        for name, values in columns.items():
+            if name in NUTRITION_FIELD_INDEX:
+                frame.data[NUTRITION_FIELD_INDEX[name]] = np.asarray(values, dtype=np.float64)
+        return frame
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict]) -> 'NutritionFrame':
+        """Build from nutrition_values-style dicts (same rules as NutritionData.from_values)"""
+        frame = cls.zeros(len(records))
+        for column, name in zip(frame.data, NUTRITION_FIELDS):
+            column[:] = [
+                value if isinstance(value, (int, float)) else 0.0
+                for value in (record.get(name, 0.0) for record in records)
+            ]
+        return frame
+
+    @classmethod
+    def from_nutrition(cls, items: Sequence[NutritionData]) -> 'NutritionFrame':
+        return cls(np.array([item.to_tuple() for item in items], dtype=np.float64).reshape(-1, len(NUTRITION_FIELDS)).T)
+
+    def __len__(self) -> int:
+        return self.data.shape[1]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Column view for a nutrient (writes go through to the frame)"""
+        return self.data[NUTRITION_FIELD_INDEX[name]]
+
+    def __setitem__(self, name: str, values):
+        self.data[NUTRITION_FIELD_INDEX[name]] = values
+
+    def row(self, index: int) -> NutritionData:
+        return NutritionData(*self.data[:, index].tolist())
+
+    def copy(self) -> 'NutritionFrame':
+        return NutritionFrame(self.data.copy())
+
+    def validate_and_convert(self) -> 'NutritionFrame':
+        """Vectorized NutritionData.validate_and_convert over every product, in place"""
+        energy_kj, energy_kcal = self['energy_kj'], self['energy_kcal']
+        to_kj = (energy_kj <= 0) & (energy_kcal > 0)
+        to_kcal = (energy_kcal <= 0) & (energy_kj > 0)
+        np.copyto(energy_kj, energy_kcal * KCAL_TO_KJ, where=to_kj)
+        np.copyto(energy_kcal, energy_kj / KCAL_TO_KJ, where=to_kcal)
+
+        salt, sodium = self['salt'], self['sodium']
+        to_sodium = (sodium <= 0) & (salt > 0)
+        to_salt = (salt <= 0) & (sodium > 0)
+        np.copyto(sodium, salt * SALT_TO_SODIUM_MG, where=to_sodium)
+        np.copyto(salt, sodium * SODIUM_MG_TO_SALT, where=to_salt)
+
+        for name, max_value in NUTRITION_RANGES:
+            column = self[name]
+            if isinstance(max_value, str):
+                max_value = self[max_value]
+            invalid = np.isnan(column) | (column < 0)
+            np.minimum(column, max_value, out=column)
+            column[invalid] = 0.0
+
+        fat, carbohydrates, proteins = self['fat'], self['carbohydrates'], self['proteins']
+        total_macros = fat + carbohydrates + proteins
+        over = total_macros > 100
+        if over.any():
+            scale_factor = np.ones_like(total_macros)
+            scale_factor[over] = 100 / total_macros[over]
+            for name in ('fat', 'carbohydrates', 'proteins', 'saturated_fat', 'sugars'):
+                self[name] *= scale_factor
+        return self
+
+
+class PointsTable:
+    """Threshold table mapping a nutrient value to Nutri-Score points
+
+    A value scores points[i] where i is the number of thresholds strictly below
+    it, i.e. ``value <= thresholds[0]`` scores points[0]. NaN scores the
+    maximum, matching the chained ``<=`` comparisons this table replaces.
+    """
+    __slots__ = ('thresholds', 'points', '_threshold_list', '_points_list')
+
+    def __init__(self, thresholds: Sequence[float], points: Optional[Sequence[int]] = None):
+        if points is None:
+            points = range(len(thresholds) + 1)
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.points = np.asarray(points, dtype=np.int64)
+        if len(self.points) != len(self.thresholds) + 1:
+            raise ValueError('PointsTable needs exactly one more points entry than thresholds')
+        self._threshold_list = self.thresholds.tolist()
+        self._points_list = self.points.tolist()
+
+    def index(self, value: float) -> int:
+        """Band index of a value"""
+        if value != value:  # NaN
+            return len(self._threshold_list)
+        return bisect_left(self._threshold_list, value)
+
+    def points_for(self, value: float) -> int:
+        return self._points_list[self.index(value)]
+
+    def points_array(self, values: np.ndarray) -> np.ndarray:
+        return self.points[np.searchsorted(self.thresholds, values, side='left')]
+
+    def band(self, value: float) -> Tuple[Optional[float], Optional[float]]:
+        """(exclusive lower, inclusive upper) threshold around a value; None when unbounded"""
+        index = self.index(value)
+        lower = self._threshold_list[index - 1] if index > 0 else None
+        upper = self._threshold_list[index] if index < len(self._threshold_list) else None
+        return lower, upper
+
+
+ENERGY_PER_G_SATURATED_FAT_KJ = 37
+# Scores below every reachable bound; a grade with this bound can never be assigned
+UNREACHABLE_SCORE = -(2 ** 31)
+GRADES = ('A', 'B', 'C', 'D', 'E')
+
+
+def _saturated_fat_ratio(saturated_fat, fat):
+    """Saturated fat as a percentage of total fat; works on scalars and arrays"""
+    has_fat = fat > 0
+    return np.where(has_fat, saturated_fat / np.where(has_fat, fat, 1.0) * 100, 0.0)
+
+
+# Component inputs computed from several NutritionData fields
+DERIVED_INPUTS = {
+    'energy_from_saturates': (('saturated_fat',), lambda saturated_fat: saturated_fat * ENERGY_PER_G_SATURATED_FAT_KJ),
+    'saturated_fat_ratio': (('saturated_fat', 'fat'), _saturated_fat_ratio),
+}
+
+
+class NutriScoreAlgorithm:
+    """A versioned Nutri-Score rule set, compiled per food type for scoring
+
+    ``components`` are (points name, polarity, tables) where tables maps a food
+    type (or 'default') to (input, PointsTable); an input is a NutritionData
+    field or a DERIVED_INPUTS key. ``rules`` describe how points combine per
+    food type. When a rule's 'gate' matches (negative points >= threshold and,
+    if given, FVN points < limit) only 'gated_positives' are subtracted.
+    ``grade_bounds`` give the inclusive upper score of grades A-D per food
+    type; anything above the last bound is E and a None bound is unreachable.
+    """
+
+    def __init__(self, version: str, description: str, components: Sequence[Tuple],
+                 rules: Dict[str, Dict], grade_bounds: Dict[str, Sequence[Tuple[str, Optional[int]]]]):
+        for food_type, bounds in grade_bounds.items():
+            if tuple(grade for grade, _ in bounds) != GRADES[:-1]:
+                raise ValueError(f'Grade bounds for {version}/{food_type} must cover grades A-D in order')
+        if 'default' not in rules or 'default' not in grade_bounds:
+            raise ValueError(f'Algorithm {version} needs default rules and grade bounds')
+
+        self.version = version
+        self.description = description
+        self.components = tuple(components)
+        self.rules = rules
+        self.grade_bounds = grade_bounds
+        self.component_names = tuple(name for name, _, _ in self.components)
+        self.negative_components = tuple(name for name, polarity, _ in self.components if polarity == 'negative')
+        self.positive_components = tuple(name for name, polarity, _ in self.components if polarity == 'positive')
+        self._compiled = {}
+
+    def compile(self, food_type: str) -> Dict:
+        """Resolved tables, rule and grade bounds for one food type (cached)"""
+        compiled = self._compiled.get(food_type)
+        if compiled is None:
+            bounds = [UNREACHABLE_SCORE if bound is None else bound
+                      for _, bound in self.grade_bounds.get(food_type, self.grade_bounds['default'])]
+            compiled = {
+                'tables': tuple((name,) + tables.get(food_type, tables['default'])
+                                for name, _, tables in self.components),
+                'rule': self.rules.get(food_type, self.rules['default']),
+                'grade_bounds': bounds,
+                'grade_bounds_array': np.array(bounds, dtype=np.int64),
+            }
+            self._compiled[food_type] = compiled
+        return compiled
+
+    @staticmethod
+    def input_value(nutrition: 'NutritionData', name: str) -> float:
+        if name in DERIVED_INPUTS:
+            fields, function = DERIVED_INPUTS[name]
+            return float(function(*(getattr(nutrition, field) for field in fields)))
+        return getattr(nutrition, name)
+
+    @staticmethod
+    def input_column(frame: NutritionFrame, name: str) -> np.ndarray:
+        if name in DERIVED_INPUTS:
+            fields, function = DERIVED_INPUTS[name]
+            return np.asarray(function(*(frame[field] for field in fields)), dtype=np.float64)
+        return frame[name]
+
+    def component_points(self, nutrition: 'NutritionData', food_type: str) -> Dict[str, int]:
+        return {
+            name: table.points_for(self.input_value(nutrition, input_name))
+            for name, input_name, table in self.compile(food_type)['tables']
+        }
+
+    def combine_points(self, points: Dict[str, int], food_type: str) -> int:
+        """Final score from component points for a single product"""
+        rule = self.compile(food_type)['rule']
+        negative = sum(points[name] for name in rule['negatives'])
+        positives = rule['positives']
+        gate = rule.get('gate')
+        if gate and negative >= gate['negative_at_least'] and \
+                points['fruits_vegetables_nuts'] < gate.get('fruits_vegetables_nuts_below', math.inf):
+            positives = rule['gated_positives']
+        return negative - sum(points[name] for name in positives)
+
+    def grade_for_score(self, score: int, food_type: str = 'general_food') -> str:
+        return GRADES[bisect_left(self.compile(food_type)['grade_bounds'], score)]
+
+    def score_frame(self, frame: NutritionFrame,
+                    food_types: Union[str, Sequence[str]] = 'general_food') -> Dict[str, np.ndarray]:
+        """Vectorized scoring of a whole NutritionFrame
+
+        ``food_types`` is a single food type for every row or one per row.
+        Returns per-component point arrays plus negative/positive totals, score
+        and grade index (into GRADES).
+        """
+        size = len(frame)
+        if isinstance(food_types, str):
+            groups = [(food_types, slice(None))]
+        else:
+            food_types = np.asarray(food_types, dtype=object)
+            groups = [(food_type, food_types == food_type) for food_type in set(food_types.tolist())]
+
+        results = {f'{name}_points': np.zeros(size, dtype=np.int64) for name in self.component_names}
+        results['negative_points'] = np.zeros(size, dtype=np.int64)
+        results['positive_points'] = np.zeros(size, dtype=np.int64)
+        results['score'] = np.zeros(size, dtype=np.int64)
+        results['grade_index'] = np.zeros(size, dtype=np.int64)
+        columns = {}
+
+        for food_type, mask in groups:
+            compiled = self.compile(food_type)
+            points = {}
+            for name, input_name, table in compiled['tables']:
+                if input_name not in columns:
+                    columns[input_name] = self.input_column(frame, input_name)
+                points[name] = table.points_array(columns[input_name][mask])
+                results[f'{name}_points'][mask] = points[name]
+
+            results['negative_points'][mask] = sum(points[name] for name in self.negative_components)
+            results['positive_points'][mask] = sum(points[name] for name in self.positive_components)
+
+            rule = compiled['rule']
+            negative = sum(points[name] for name in rule['negatives'])
+            positive = sum(points[name] for name in rule['positives'])
+            gate = rule.get('gate')
+            if gate:
+                gated = negative >= gate['negative_at_least']
+                if 'fruits_vegetables_nuts_below' in gate:
+                    gated &= points['fruits_vegetables_nuts'] < gate['fruits_vegetables_nuts_below']
+                gated_positive = sum(points[name] for name in rule['gated_positives'])
+                positive = np.where(gated, gated_positive, positive)
+            score = negative - positive
+            results['score'][mask] = score
+            results['grade_index'][mask] = np.searchsorted(compiled['grade_bounds_array'], score, side='left')
+        return results
+
+
+# Rules FoodLens has shipped since launch: 2017 thresholds with food-type special cases
+NUTRI_SCORE_2017 = NutriScoreAlgorithm(
+    version='2017',
+    description='2017 Nutri-Score thresholds with FoodLens cheese, added fat and beverage rules',
+    components=(
+        ('energy', 'negative', {
+            'default': ('energy_kj', PointsTable([335, 670, 1005, 1340, 1675, 2010, 2345, 2680, 3015, 3350])),  # kJ
+        }),
+        ('saturated_fat', 'negative', {
+            'default': ('saturated_fat', PointsTable([1, 2, 3, 4, 5, 6, 7, 8, 9, 10])),  # g
+        }),
+        ('sugar', 'negative', {
+            'default': ('sugars', PointsTable([4.5, 9, 13.5, 18, 22.5, 27, 31, 36, 40, 45])),  # g
+            'beverage': ('sugars', PointsTable([0, 1.5, 3, 4.5, 6, 7.5, 9, 10.5, 12, 13.5])),
+        }),
+        ('sodium', 'negative', {
+            'default': ('sodium', PointsTable([90, 180, 270, 360, 450, 540, 630, 720, 810, 900])),  # mg
+        }),
+        ('fruits_vegetables_nuts', 'positive', {
+            'default': ('fruits_vegetables_nuts', PointsTable([40, 60, 80], [0, 1, 2, 5])),  # %
+            'beverage': ('fruits_vegetables_nuts', PointsTable([40, 60, 80], [0, 2, 4, 10])),
+        }),
+        ('fiber', 'positive', {
+            'default': ('fiber', PointsTable([0.9, 1.9, 2.8, 3.7, 4.7])),  # g
+        }),
+        ('protein', 'positive', {
+            'default': ('proteins', PointsTable([1.6, 3.2, 4.8, 6.4, 8.0])),  # g
+        }),
+    ),
+    rules={
+        # Special rules for cheese (high protein, calcium-rich foods)
+        'cheese': {'negatives': ('energy', 'saturated_fat', 'sodium'), 'positives': ('protein',)},
+        # Special rules for added fats (oils, butter, etc.)
+        'added_fat': {
+            'negatives': ('energy', 'saturated_fat', 'sugar', 'sodium'),
+            'positives': ('fruits_vegetables_nuts', 'fiber'),
+        },
+        # For beverages and general foods
+        'default': {
+            'negatives': ('energy', 'saturated_fat', 'sugar', 'sodium'),
+            'positives': ('fruits_vegetables_nuts', 'fiber', 'protein'),
+            'gate': {'negative_at_least': 11, 'fruits_vegetables_nuts_below': 5},
+            'gated_positives': ('fruits_vegetables_nuts', 'fiber'),
+        },
+    },
+    grade_bounds={
+        'default': (('A', -1), ('B', 2), ('C', 10), ('D', 18)),
+    },
+)
+
+# 2023 revision of the general, fats and beverages algorithms. Water is the
+# only A beverage; FoodLens does not classify water so A is unreachable there.
+_ALL_NEGATIVES_2023 = ('energy', 'saturated_fat', 'sugar', 'salt')
+_ALL_POSITIVES_2023 = ('fruits_vegetables_nuts', 'fiber', 'protein')
+NUTRI_SCORE_2023 = NutriScoreAlgorithm(
+    version='2023',
+    description='2023 revised Nutri-Score algorithm (general foods, fats, beverages)',
+    components=(
+        ('energy', 'negative', {
+            'default': ('energy_kj', PointsTable([335, 670, 1005, 1340, 1675, 2010, 2345, 2680, 3015, 3350])),  # kJ
+            'added_fat': ('energy_from_saturates',
+                          PointsTable([120, 240, 360, 480, 600, 720, 840, 960, 1080, 1200])),  # kJ
+            'beverage': ('energy_kj', PointsTable([30, 90, 150, 210, 240, 270, 300, 330, 360, 390])),
+        }),
+        ('saturated_fat', 'negative', {
+            'default': ('saturated_fat', PointsTable([1, 2, 3, 4, 5, 6, 7, 8, 9, 10])),  # g
+            'added_fat': ('saturated_fat_ratio', PointsTable([10, 16, 22, 28, 34, 40, 46, 52, 58, 64])),  # %
+        }),
+        ('sugar', 'negative', {
+            'default': ('sugars', PointsTable([3.4, 6.8, 10, 14, 17, 20, 24, 27, 31, 34, 37, 41, 44, 48, 51])),  # g
+            'beverage': ('sugars', PointsTable([0.5, 2, 3.5, 5, 6, 7, 8, 9, 10, 11])),
+        }),
+        ('salt', 'negative', {
+            'default': ('salt', PointsTable([round(0.2 * step, 1) for step in range(1, 21)])),  # g
+        }),
+        ('fruits_vegetables_nuts', 'positive', {
+            'default': ('fruits_vegetables_nuts', PointsTable([40, 60, 80], [0, 1, 2, 5])),  # %
+            'beverage': ('fruits_vegetables_nuts', PointsTable([40, 60, 80], [0, 2, 4, 6])),
+        }),
+        ('fiber', 'positive', {
+            'default': ('fiber', PointsTable([3.0, 4.1, 5.2, 6.3, 7.4])),  # g
+        }),
+        ('protein', 'positive', {
+            'default': ('proteins', PointsTable([2.4, 4.8, 7.2, 9.6, 12, 14, 17])),  # g
+            'beverage': ('proteins', PointsTable([1.2, 1.5, 1.8, 2.1, 2.4, 2.7, 3.0])),
+        }),
+    ),
+    rules={
+        # Cheese always counts protein
+        'cheese': {'negatives': _ALL_NEGATIVES_2023, 'positives': _ALL_POSITIVES_2023},
+        'added_fat': {
+            'negatives': _ALL_NEGATIVES_2023,
+            'positives': _ALL_POSITIVES_2023,
+            'gate': {'negative_at_least': 7},
+            'gated_positives': ('fruits_vegetables_nuts', 'fiber'),
+        },
+        'beverage': {'negatives': _ALL_NEGATIVES_2023, 'positives': _ALL_POSITIVES_2023},
+        'default': {
+            'negatives': _ALL_NEGATIVES_2023,
+            'positives': _ALL_POSITIVES_2023,
+            'gate': {'negative_at_least': 11},
+            'gated_positives': ('fruits_vegetables_nuts', 'fiber'),
+        },
+    },
+    grade_bounds={
+        'default': (('A', 0), ('B', 2), ('C', 10), ('D', 18)),
+        'added_fat': (('A', -6), ('B', 2), ('C', 10), ('D', 18)),
+        'beverage': (('A', None), ('B', 2), ('C', 6), ('D', 9)),
+    },
+)
+
+NUTRI_SCORE_ALGORITHMS: Dict[str, NutriScoreAlgorithm] = {}
+DEFAULT_ALGORITHM_VERSION = '2017'
+
+
+def register_algorithm(algorithm: NutriScoreAlgorithm) -> NutriScoreAlgorithm:
+    NUTRI_SCORE_ALGORITHMS[algorithm.version] = algorithm
+    return algorithm
+
+
+def get_algorithm(version: Optional[str] = None) -> NutriScoreAlgorithm:
+    """Registered algorithm for a version; None selects the default"""
+    algorithm = NUTRI_SCORE_ALGORITHMS.get(version or DEFAULT_ALGORITHM_VERSION)
+    if algorithm is None:
+        raise ValueError(f'Unknown Nutri-Score algorithm version: {version}. '
+                         f'Available: {", ".join(sorted(NUTRI_SCORE_ALGORITHMS))}')
+    return algorithm
+
+
+register_algorithm(NUTRI_SCORE_2017)
+register_algorithm(NUTRI_SCORE_2023)
+
+
+def grade_for_score(score: int, food_type: str = 'general_food', version: Optional[str] = None) -> str:
+    return get_algorithm(version).grade_for_score(score, food_type)
+
+
+def score_frame(frame: NutritionFrame, food_types: Union[str, Sequence[str]] = 'general_food',
+                version: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Vectorized calculate_nutri_score_points over a whole NutritionFrame"""
+    return get_algorithm(version).score_frame(frame, food_types)
+
+
+def grade_migration(frame: NutritionFrame, food_types: Union[str, Sequence[str]],
+                    from_version: str, to_version: str) -> np.ndarray:
+    """
+    Score a frame under two algorithm versions and count grade changes.
+    Returns a len(GRADES) x len(GRADES) matrix where [i, j] is the number of
+    products graded GRADES[i] by from_version and GRADES[j] by to_version.
+    """
+    before = get_algorithm(from_version).score_frame(frame, food_types)['grade_index']
+    after = get_algorithm(to_version).score_frame(frame, food_types)['grade_index']
+    grade_count = len(GRADES)
+    return np.bincount(before * grade_count + after, minlength=grade_count * grade_count) \
+        .reshape(grade_count, grade_count)
+
+
+# Nutrients a reformulation can change, in reporting units, with the frame
+# fields they set and each field's factor from the reporting unit. Salt moves
+# salt and sodium together so either can be the scored input.
+REFORMULATION_NUTRIENTS = {
+    'energy_kj': {'unit': 'kJ', 'fields': {'energy_kj': 1.0}},
+    'saturated_fat': {'unit': 'g', 'fields': {'saturated_fat': 1.0}},
+    'sugars': {'unit': 'g', 'fields': {'sugars': 1.0}},
+    'salt': {'unit': 'g', 'fields': {'salt': 1.0, 'sodium': SALT_TO_SODIUM_MG}},
+    'fruits_vegetables_nuts': {'unit': '%', 'fields': {'fruits_vegetables_nuts': 1.0}},
+    'fiber': {'unit': 'g', 'fields': {'fiber': 1.0}},
+    'proteins': {'unit': 'g', 'fields': {'proteins': 1.0}},
+}
+MAX_REFORMULATION_GRID_CELLS = 100000
+
+
+def _rounded(value: float) -> float:
+    """Round reported nutrient amounts to strip float noise from threshold arithmetic"""
+    return round(value, 4)
+
 
 class EnhancedNutriScoreCalculator:
     def __init__(self):
@@ -115,12 +648,8 @@ class EnhancedNutriScoreCalculator:
         Convert OCR extracted nutrition values to NutritionData object
         with validation and unit conversion
         """
-        nutrition = NutritionData()
-        
         # Map nutrition_values to NutritionData
-        for key, value in nutrition_values.items():
-            if hasattr(nutrition, key) and isinstance(value, (int, float)):
-                setattr(nutrition, key, float(value))
+        nutrition = NutritionData.from_values(nutrition_values)
         
         # Validate and convert units
         nutrition.validate_and_convert()
@@ -351,244 +880,32 @@ class EnhancedNutriScoreCalculator:
         # Default to general food
         return 'general_food'
     
-    def calculate_nutri_score_points(self, nutrition: NutritionData, food_type: str = 'general_food') -> Dict:
+    def calculate_nutri_score_points(self, nutrition: NutritionData, food_type: str = 'general_food',
+                                     version: Optional[str] = None) -> Dict:
         """
         Calculate Nutri-Score points based on European algorithm with food type adjustments
         """
-        # Negative points (per 100g)
-        negative_points = 0
-        positive_points = 0
-        
-        # Energy points (kJ per 100g)
-        energy_points = 0
-        if nutrition.energy_kj <= 335:
-            energy_points = 0
-        elif nutrition.energy_kj <= 670:
-            energy_points = 1
-        elif nutrition.energy_kj <= 1005:
-            energy_points = 2
-        elif nutrition.energy_kj <= 1340:
-            energy_points = 3
-        elif nutrition.energy_kj <= 1675:
-            energy_points = 4
-        elif nutrition.energy_kj <= 2010:
-            energy_points = 5
-        elif nutrition.energy_kj <= 2345:
-            energy_points = 6
-        elif nutrition.energy_kj <= 2680:
-            energy_points = 7
-        elif nutrition.energy_kj <= 3015:
-            energy_points = 8
-        elif nutrition.energy_kj <= 3350:
-            energy_points = 9
-        else:
-            energy_points = 10
-        
-        negative_points += energy_points
-        
-        # Saturated fat points (g per 100g)
-        saturated_fat_points = 0
-        if nutrition.saturated_fat <= 1:
-            saturated_fat_points = 0
-        elif nutrition.saturated_fat <= 2:
-            saturated_fat_points = 1
-        elif nutrition.saturated_fat <= 3:
-            saturated_fat_points = 2
-        elif nutrition.saturated_fat <= 4:
-            saturated_fat_points = 3
-        elif nutrition.saturated_fat <= 5:
-            saturated_fat_points = 4
-        elif nutrition.saturated_fat <= 6:
-            saturated_fat_points = 5
-        elif nutrition.saturated_fat <= 7:
-            saturated_fat_points = 6
-        elif nutrition.saturated_fat <= 8:
-            saturated_fat_points = 7
-        elif nutrition.saturated_fat <= 9:
-            saturated_fat_points = 8
-        elif nutrition.saturated_fat <= 10:
-            saturated_fat_points = 9
-        else:
-            saturated_fat_points = 10
-            
-        negative_points += saturated_fat_points
-        
-        # Sugar points (g per 100g)
-        sugar_points = 0
-        if food_type == 'beverage':
-            # Beverages use different sugar scale
-            if nutrition.sugars <= 0:
-                sugar_points = 0
-            elif nutrition.sugars <= 1.5:
-                sugar_points = 1
-            elif nutrition.sugars <= 3:
-                sugar_points = 2
-            elif nutrition.sugars <= 4.5:
-                sugar_points = 3
-            elif nutrition.sugars <= 6:
-                sugar_points = 4
-            elif nutrition.sugars <= 7.5:
-                sugar_points = 5
-            elif nutrition.sugars <= 9:
-                sugar_points = 6
-            elif nutrition.sugars <= 10.5:
-                sugar_points = 7
-            elif nutrition.sugars <= 12:
-                sugar_points = 8
-            elif nutrition.sugars <= 13.5:
-                sugar_points = 9
-            else:
-                sugar_points = 10
-        else:
-            # Standard sugar scale
-            if nutrition.sugars <= 4.5:
-                sugar_points = 0
-            elif nutrition.sugars <= 9:
-                sugar_points = 1
-            elif nutrition.sugars <= 13.5:
-                sugar_points = 2
-            elif nutrition.sugars <= 18:
-                sugar_points = 3
-            elif nutrition.sugars <= 22.5:
-                sugar_points = 4
-            elif nutrition.sugars <= 27:
-                sugar_points = 5
-            elif nutrition.sugars <= 31:
-                sugar_points = 6
-            elif nutrition.sugars <= 36:
-                sugar_points = 7
-            elif nutrition.sugars <= 40:
-                sugar_points = 8
-            elif nutrition.sugars <= 45:
-                sugar_points = 9
-            else:
-                sugar_points = 10
-                
-        negative_points += sugar_points
-        
-        # Sodium points (mg per 100g)
-        sodium_points = 0
-        if nutrition.sodium <= 90:
-            sodium_points = 0
-        elif nutrition.sodium <= 180:
-            sodium_points = 1
-        elif nutrition.sodium <= 270:
-            sodium_points = 2
-        elif nutrition.sodium <= 360:
-            sodium_points = 3
-        elif nutrition.sodium <= 450:
-            sodium_points = 4
-        elif nutrition.sodium <= 540:
-            sodium_points = 5
-        elif nutrition.sodium <= 630:
-            sodium_points = 6
-        elif nutrition.sodium <= 720:
-            sodium_points = 7
-        elif nutrition.sodium <= 810:
-            sodium_points = 8
-        elif nutrition.sodium <= 900:
-            sodium_points = 9
-        else:
-            sodium_points = 10
-            
-        negative_points += sodium_points
-        
-        # Positive points
-        
-        # Fruits, vegetables, nuts points (% of total weight)
-        fruits_vegetables_nuts_points = 0
-        if food_type == 'beverage':
-            # Beverages use different FVN scale
-            if nutrition.fruits_vegetables_nuts <= 40:
-                fruits_vegetables_nuts_points = 0
-            elif nutrition.fruits_vegetables_nuts <= 60:
-                fruits_vegetables_nuts_points = 2
-            elif nutrition.fruits_vegetables_nuts <= 80:
-                fruits_vegetables_nuts_points = 4
-            else:
-                fruits_vegetables_nuts_points = 10
-        else:
-            # Standard FVN scale
-            if nutrition.fruits_vegetables_nuts <= 40:
-                fruits_vegetables_nuts_points = 0
-            elif nutrition.fruits_vegetables_nuts <= 60:
-                fruits_vegetables_nuts_points = 1
-            elif nutrition.fruits_vegetables_nuts <= 80:
-                fruits_vegetables_nuts_points = 2
-            else:
-                fruits_vegetables_nuts_points = 5
-                
-        positive_points += fruits_vegetables_nuts_points
-        
-        # Fiber points (g per 100g)
-        fiber_points = 0
-        if nutrition.fiber <= 0.9:
-            fiber_points = 0
-        elif nutrition.fiber <= 1.9:
-            fiber_points = 1
-        elif nutrition.fiber <= 2.8:
-            fiber_points = 2
-        elif nutrition.fiber <= 3.7:
-            fiber_points = 3
-        elif nutrition.fiber <= 4.7:
-            fiber_points = 4
-        else:
-            fiber_points = 5
-            
-        positive_points += fiber_points
-        
-        # Protein points (g per 100g)
-        protein_points = 0
-        if nutrition.proteins <= 1.6:
-            protein_points = 0
-        elif nutrition.proteins <= 3.2:
-            protein_points = 1
-        elif nutrition.proteins <= 4.8:
-            protein_points = 2
-        elif nutrition.proteins <= 6.4:
-            protein_points = 3
-        elif nutrition.proteins <= 8.0:
-            protein_points = 4
-        else:
-            protein_points = 5
-            
-        positive_points += protein_points
+        algorithm = get_algorithm(version)
+        points = algorithm.component_points(nutrition, food_type)
         
-        # Calculate final score according to food type
-        final_score = 0
-        
-        # Special rules for cheese (high protein, calcium-rich foods)
-        if food_type == 'cheese':
-            final_score = energy_points + saturated_fat_points + sodium_points - protein_points
-        # Special rules for added fats (oils, butter, etc.)
-        elif food_type == 'added_fat':
-            final_score = energy_points + saturated_fat_points + sugar_points + sodium_points - fruits_vegetables_nuts_points - fiber_points
-        # For beverages and general foods
-        else:
-            # If negative points >= 11 and fruits/vegs/nuts is < 5, only subtract FVN, fiber, protein
-            if negative_points >= 11 and fruits_vegetables_nuts_points < 5:
-                final_score = negative_points - fruits_vegetables_nuts_points - fiber_points
-            else:
-                final_score = negative_points - positive_points
-        
-        return {
-            'score': final_score,
-            'negative_points': negative_points,
-            'positive_points': positive_points,
-            'energy_points': energy_points,
-            'saturated_fat_points': saturated_fat_points,
-            'sugar_points': sugar_points,
-            'sodium_points': sodium_points,
-            'fruits_vegetables_nuts_points': fruits_vegetables_nuts_points,
-            'fiber_points': fiber_points,
-            'protein_points': protein_points,
-            'food_type': food_type
+        result = {
+            'score': algorithm.combine_points(points, food_type),
+            'negative_points': sum(points[name] for name in algorithm.negative_components),
+            'positive_points': sum(points[name] for name in algorithm.positive_components),
         }
+        for name, value in points.items():
+            result[f'{name}_points'] = value
+        result['food_type'] = food_type
+        result['algorithm_version'] = algorithm.version
+        return result
     
-    def calculate_nutri_score(self, nutrition: NutritionData, ingredients: List[str] = None) -> Dict:
+    def calculate_nutri_score(self, nutrition: NutritionData, ingredients: List[str] = None,
+                              version: Optional[str] = None) -> Dict:
         """
         Calculate final Nutri-Score grade with enhanced food type detection
         """
+        algorithm = get_algorithm(version)
+        
         # Ensure we have a valid NutritionData object
         if not isinstance(nutrition, NutritionData):
             nutrition = self.extract_nutrition_from_values(nutrition)
@@ -604,37 +921,191 @@ class EnhancedNutriScoreCalculator:
         food_type = self.classify_food_type(ingredients, nutrition)
         
         # Calculate score
-        score_results = self.calculate_nutri_score_points(nutrition, food_type)
+        score_results = self.calculate_nutri_score_points(nutrition, food_type, algorithm.version)
         final_score = score_results['score']
         
         # Determine grade
-        grade = 'E'  # Default worst grade
-        for grade_key, grade_info in self.grade_mapping.items():
-            if grade_info['min'] <= final_score <= grade_info['max']:
-                grade = grade_key
-                break
+        grade = algorithm.grade_for_score(final_score, food_type)
         
         return {
             'grade': grade,
             'score': final_score,
             'color': self.grade_mapping[grade]['color'],
-            'nutrition_data': {
-                'energy_kj': nutrition.energy_kj,
-                'energy_kcal': nutrition.energy_kcal,
-                'fat': nutrition.fat,
-                'saturated_fat': nutrition.saturated_fat,
-                'carbohydrates': nutrition.carbohydrates,
-                'sugars': nutrition.sugars,
-                'fiber': nutrition.fiber,
-                'proteins': nutrition.proteins,
-                'salt': nutrition.salt,
-                'sodium': nutrition.sodium,
-                'fruits_vegetables_nuts': nutrition.fruits_vegetables_nuts
-            },
+            'algorithm_version': algorithm.version,
+            'nutrition_data': nutrition.to_dict(),
             'scoring_details': score_results
         }
     
-    def analyze_product_from_ocr(self, ocr_result: Dict, ingredients: List[str] = None) -> Dict:
+    def analyze_reformulation(self, nutrition: NutritionData, ingredients: List[str] = None,
+                              food_type: Optional[str] = None, grid: Optional[Dict] = None,
+                              version: Optional[str] = None) -> Dict:
+        """
+        What-if analysis for one product: distance to the neighbouring point
+        thresholds and to the nearest better/worse grade for every nutrient,
+        plus a grid of scores over a range of reformulations.
+        All candidate and grid products are scored in one vectorized call.
+        Nutrients that only reach the score through a derived input (e.g.
+        saturated fat for 2023 added fats) report no thresholds.
+        """
+        algorithm = get_algorithm(version)
+        if isinstance(nutrition, NutritionData):
+            # Work on a validated copy so salt and sodium agree before salt is varied
+            nutrition = NutritionData(*nutrition.to_tuple())
+            nutrition.validate_and_convert()
+        else:
+            nutrition = self.extract_nutrition_from_values(nutrition)
+        ingredients = ingredients or []
+        if nutrition.fruits_vegetables_nuts <= 0:
+            nutrition.fruits_vegetables_nuts = self.estimate_fruits_vegetables_nuts_percentage(ingredients)
+        food_type = food_type or self.classify_food_type(ingredients, nutrition)
+        
+        base_points = self.calculate_nutri_score_points(nutrition, food_type, algorithm.version)
+        base_grade_index = GRADES.index(algorithm.grade_for_score(base_points['score'], food_type))
+        scored_by = self._reformulation_components(algorithm, food_type)
+        
+        # Candidate values sit exactly on thresholds: "at most t" to drop a band,
+        # "more than t" to climb one (scored at the next representable value).
+        candidates = []
+        for nutrient, (_, input_name, table, _) in scored_by.items():
+            index = table.index(getattr(nutrition, input_name))
+            for threshold in reversed(table.thresholds[:index].tolist()):
+                candidates.append((nutrient, threshold, threshold, '<='))
+            for threshold in table.thresholds[index:].tolist():
+                candidates.append((nutrient, threshold, np.nextafter(threshold, np.inf), '>'))
+        
+        grid = self._reformulation_grid_axes(nutrition, grid, scored_by)
+        grid_size = int(np.prod([len(axis['values']) for axis in grid])) if grid else 0
+        
+        base = np.array(nutrition.to_tuple(), dtype=np.float64)
+        frame = NutritionFrame(np.repeat(base[:, None], len(candidates) + grid_size, axis=1))
+        for column, (nutrient, threshold, scored_value, _) in enumerate(candidates):
+            _, input_name, _, factor = scored_by[nutrient]
+            for field, field_factor in REFORMULATION_NUTRIENTS[nutrient]['fields'].items():
+                frame[field][column] = threshold / factor * field_factor
+            frame[input_name][column] = scored_value
+        if grid:
+            mesh = np.meshgrid(*[axis['values'] for axis in grid], indexing='ij')
+            for axis, values in zip(grid, mesh):
+                for field, field_factor in REFORMULATION_NUTRIENTS[axis['nutrient']]['fields'].items():
+                    frame[field][len(candidates):] = values.ravel() * field_factor
+        
+        scored = algorithm.score_frame(frame, food_type)
+        scores = scored['score'].tolist()
+        grade_indexes = scored['grade_index'].tolist()
+        
+        nutrients = {}
+        for nutrient, spec in REFORMULATION_NUTRIENTS.items():
+            entry = {
+                'value': _rounded(self._reformulation_value(nutrition, nutrient, scored_by)),
+                'unit': spec['unit'],
+                'points': None,
+                'threshold_below': None,
+                'threshold_above': None,
+                'distance_to_threshold_below': None,
+                'distance_to_threshold_above': None,
+                'better_grade': None,
+                'worse_grade': None,
+            }
+            if nutrient in scored_by:
+                component, input_name, table, factor = scored_by[nutrient]
+                value = getattr(nutrition, input_name)
+                lower, upper = table.band(value)
+                entry['points'] = base_points[f'{component}_points']
+                if lower is not None:
+                    entry['threshold_below'] = _rounded(lower / factor)
+                    entry['distance_to_threshold_below'] = _rounded((value - lower) / factor)
+                if upper is not None:
+                    entry['threshold_above'] = _rounded(upper / factor)
+                    entry['distance_to_threshold_above'] = _rounded((upper - value) / factor)
+            nutrients[nutrient] = entry
+        
+        for column, (nutrient, threshold, _, comparison) in enumerate(candidates):
+            grade_index = grade_indexes[column]
+            if grade_index == base_grade_index:
+                continue
+            key = 'better_grade' if grade_index < base_grade_index else 'worse_grade'
+            entry = nutrients[nutrient]
+            target_value = _rounded(threshold / scored_by[nutrient][3])
+            change = _rounded(target_value - entry['value'])
+            if entry[key] is None or abs(change) < abs(entry[key]['change']):
+                entry[key] = {
+                    'grade': GRADES[grade_index],
+                    'score': scores[column],
+                    'target_value': target_value,
+                    'comparison': comparison,
+                    'change': change,
+                }
+        
+        result = {
+            'algorithm_version': algorithm.version,
+            'food_type': food_type,
+            'grade': GRADES[base_grade_index],
+            'score': base_points['score'],
+            'nutrients': nutrients,
+        }
+        if grid:
+            shape = [len(axis['values']) for axis in grid]
+            grid_scores = scored['score'][len(candidates):].reshape(shape)
+            grid_grades = np.array(GRADES)[scored['grade_index'][len(candidates):]].reshape(shape)
+            result['grid'] = {
+                'axes': [{'nutrient': axis['nutrient'], 'unit': REFORMULATION_NUTRIENTS[axis['nutrient']]['unit'],
+                          'values': [_rounded(value) for value in axis['values'].tolist()]} for axis in grid],
+                'scores': grid_scores.tolist(),
+                'grades': grid_grades.tolist(),
+            }
+        return result
+    
+    def _reformulation_components(self, algorithm: NutriScoreAlgorithm, food_type: str) -> Dict[str, Tuple]:
+        """
+        Map each reformulation nutrient to the component scoring it directly:
+        (component, input field, PointsTable, factor from reporting unit to input unit)
+        """
+        scored_by = {}
+        for name, input_name, table in algorithm.compile(food_type)['tables']:
+            for nutrient, spec in REFORMULATION_NUTRIENTS.items():
+                if input_name in spec['fields']:
+                    scored_by[nutrient] = (name, input_name, table, spec['fields'][input_name])
+        return scored_by
+    
+    def _reformulation_value(self, nutrition: NutritionData, nutrient: str, scored_by: Dict[str, Tuple]) -> float:
+        """Current amount of a nutrient in reporting units, read from the field that is scored"""
+        if nutrient in scored_by:
+            _, field, _, factor = scored_by[nutrient]
+        else:
+            field, factor = next(iter(REFORMULATION_NUTRIENTS[nutrient]['fields'].items()))
+        return getattr(nutrition, field) / factor
+    
+    def _reformulation_grid_axes(self, nutrition: NutritionData, grid: Optional[Dict],
+                                 scored_by: Dict[str, Tuple]) -> List[Dict]:
+        """
+        Normalize a grid spec into axes of absolute nutrient values.
+        Each entry is either a list of values or {'min_change', 'max_change', 'steps'}
+        with changes in percent of the current value.
+        """
+        if not grid:
+            return []
+        
+        axes = []
+        for nutrient, spec in grid.items():
+            if nutrient not in REFORMULATION_NUTRIENTS:
+                raise ValueError(f'Unsupported reformulation nutrient: {nutrient}')
+            current = self._reformulation_value(nutrition, nutrient, scored_by)
+            if isinstance(spec, dict):
+                steps = int(spec.get('steps', 11))
+                if steps < 1:
+                    raise ValueError(f'Grid steps for {nutrient} must be positive')
+                changes = np.linspace(float(spec.get('min_change', -50)), float(spec.get('max_change', 0)), steps)
+                values = current * (1 + changes / 100)
+            else:
+                values = np.asarray(spec, dtype=np.float64)
+            axes.append({'nutrient': nutrient, 'values': np.clip(values, 0, None)})
+        
+        if int(np.prod([len(axis['values']) for axis in axes])) > MAX_REFORMULATION_GRID_CELLS:
+            raise ValueError(f'Reformulation grid exceeds {MAX_REFORMULATION_GRID_CELLS} cells')
+        return axes
+    
+    def analyze_product_from_ocr(self, ocr_result: Dict, ingredients: List[str] = None,
+                                 version: Optional[str] = None) -> Dict:
         """
         Analyze product from enhanced OCR results and return Nutri-Score
         """
@@ -650,7 +1121,7 @@ class EnhancedNutriScoreCalculator:
             ingredients = ingredients or ocr_result.get('ingredients', [])
             
             # Calculate Nutri-Score
-            nutri_score_result = self.calculate_nutri_score(nutrition, ingredients)
+            nutri_score_result = self.calculate_nutri_score(nutrition, ingredients, version)
             
             # Data quality assessment
             data_quality = self.assess_data_quality(nutrition, ocr_result.get('confidence', 0))
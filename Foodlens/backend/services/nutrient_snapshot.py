@@ -0,0 +1,318 @@
+"""
+Nutrient Snapshot for FoodLens Application
+Columnar .npy export of the catalog's nutrition data, memory-mapped by batch
+jobs instead of parsing the OpenFoodFacts dump.
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils.csv_loader import DEFAULT_CHUNK_SIZE, iter_records
+from utils.external_apis import OFF_NUTRIMENT_FIELDS
+from services.nutri_score_service import GRADES, NUTRITION_FIELDS, NutritionFrame
+
+logger = logging.getLogger(__name__)
+
+NUTRIENT_SNAPSHOT_DIR = os.getenv('NUTRIENT_SNAPSHOT_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'nutrient_snapshot'))
+SNAPSHOT_VERSION = 1
+
+# OpenFoodFacts fields the snapshot is built from
+SNAPSHOT_FIELDS = ('code', 'nutriments', 'nutriscore_grade', 'nova_group', 'allergens_tags', 'categories_tags')
+# Bit i of the allergen mask is ALLERGEN_TAGS[i] (the EU major allergens as OFF tags them)
+ALLERGEN_TAGS = (
+    'en:gluten', 'en:crustaceans', 'en:eggs', 'en:fish', 'en:peanuts', 'en:soybeans', 'en:milk',
+    'en:nuts', 'en:celery', 'en:mustard', 'en:sesame-seeds', 'en:sulphur-dioxide-and-sulphites',
+    'en:lupin', 'en:molluscs',
+)
+ALLERGEN_BITS = {tag: 1 << bit for bit, tag in enumerate(ALLERGEN_TAGS)}
+# nutri_score and nova_group value of products without one
+MISSING = -1
+
+# Column files of a snapshot version
+COLUMNS = (
+    'barcodes',  # fixed-width bytes, sorted
+    'nutrients',  # float32, (len(NUTRITION_FIELDS), n), NaN where unknown
+    'nutri_score',  # int8 index into GRADES
+    'nova_group',  # int8
+    'allergens',  # uint32 bitmask over ALLERGEN_TAGS
+    'category_offsets',  # int64; row i has category_ids[offsets[i]:offsets[i + 1]]
+    'category_ids',  # uint32 indexes into category_tags
+    'category_tags',  # sorted unicode vocabulary
+)
+CURRENT_FILE = 'CURRENT'
+META_FILE = 'meta.json'
+
+_NUTRIMENT_KEYS = [OFF_NUTRIMENT_FIELDS[field][0] for field in NUTRITION_FIELDS]
+_FACTORS = np.array([OFF_NUTRIMENT_FIELDS[field][1] for field in NUTRITION_FIELDS])
+_GRADE_INDEX = {grade.lower(): index for index, grade in enumerate(GRADES)}
+
+
+def _number(value) -> float:
+    if isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _tag_list(value) -> List[str]:
+    if isinstance(value, str):
+        value = value.split(',')
+    return [tag.strip().lower() for tag in value or () if isinstance(tag, str) and tag.strip()]
+
+
+class _Columns:
+    """Snapshot columns accumulated chunk by chunk while an export is read"""
+    __slots__ = ('barcodes', 'nutrients', 'nutri_score', 'nova_group', 'allergens',
+                 'category_counts', 'category_ids', 'vocabulary', 'skipped')
+
+    def __init__(self):
+        self.barcodes, self.nutrients, self.nutri_score, self.nova_group = [], [], [], []
+        self.allergens, self.category_counts, self.category_ids = [], [], []
+        self.vocabulary: Dict[str, int] = {}
+        self.skipped = 0
+
+    def add_chunk(self, records: List[Dict[str, Any]]) -> None:
+        kept = []
+        for record in records:
+            code = str(record.get('code') or '').strip()
+            if not code or not code.isascii():
+                self.skipped += 1
+                continue
+            kept.append(record)
+            self.barcodes.append(code.encode('ascii'))
+
+            grade = _GRADE_INDEX.get(str(record.get('nutriscore_grade') or '').lower(), MISSING)
+            nova = str(record.get('nova_group') or '')
+            self.nutri_score.append(grade)
+            self.nova_group.append(int(nova) if nova in ('1', '2', '3', '4') else MISSING)
+
+            mask = 0
+            for tag in _tag_list(record.get('allergens_tags')):
+                mask |= ALLERGEN_BITS.get(tag, 0)
+            self.allergens.append(mask)
+
+            categories = dict.fromkeys(_tag_list(record.get('categories_tags')))
+            self.category_counts.append(len(categories))
+            self.category_ids.extend(self.vocabulary.setdefault(tag, len(self.vocabulary)) for tag in categories)
+        if not kept:
+            return
+
+        # Nutrients are converted as one matrix per chunk: OFF units to ours,
+        # negative and non-numeric values become NaN
+        matrix = np.array([[_number((record.get('nutriments') or {}).get(key)) for key in _NUTRIMENT_KEYS]
+                           for record in kept], dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            matrix = matrix * _FACTORS
+            matrix[~np.isfinite(matrix) | (matrix < 0)] = np.nan
+        self.nutrients.append(matrix.T.astype(np.float32))
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Final columns: rows sorted by barcode, the last record of a repeated barcode kept"""
+        barcodes = np.array(self.barcodes, dtype=bytes) if self.barcodes else np.empty(0, dtype='S1')
+        order = np.argsort(barcodes, kind='stable')
+        sorted_barcodes = barcodes[order]
+        # A stable sort keeps repeats in input order, so the last of each run is the newest
+        last = np.append(sorted_barcodes[1:] != sorted_barcodes[:-1], True) if len(order) else np.empty(0, bool)
+        order = order[last]
+
+        # Vocabulary ids in sorted tag order, so tags are found by binary search
+        tags = np.array(sorted(self.vocabulary), dtype=str) if self.vocabulary else np.empty(0, dtype='U1')
+        renumber = np.empty(len(self.vocabulary), dtype=np.uint32)
+        renumber[[self.vocabulary[tag] for tag in tags.tolist()]] = np.arange(len(tags), dtype=np.uint32)
+        ids = renumber[np.asarray(self.category_ids, dtype=np.int64)]
+
+        # Gather each kept row's slice of category ids in the new row order
+        counts = np.asarray(self.category_counts, dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(counts)))[:-1]
+        kept_counts = counts[order]
+        offsets = np.concatenate(([0], np.cumsum(kept_counts))).astype(np.int64)
+        positions = np.repeat(starts[order] - offsets[:-1], kept_counts) + np.arange(offsets[-1])
+
+        nutrients = (np.concatenate(self.nutrients, axis=1) if self.nutrients
+                     else np.empty((len(NUTRITION_FIELDS), 0), dtype=np.float32))
+        return {
+            'barcodes': barcodes[order],
+            'nutrients': np.ascontiguousarray(nutrients[:, order]),
+            'nutri_score': np.asarray(self.nutri_score, dtype=np.int8)[order],
+            'nova_group': np.asarray(self.nova_group, dtype=np.int8)[order],
+            'allergens': np.asarray(self.allergens, dtype=np.uint32)[order],
+            'category_offsets': offsets,
+            'category_ids': ids[positions].astype(np.uint32),
+            'category_tags': tags,
+        }
+
+
+def _current_version(path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(path, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_snapshot(records: Iterable[Dict[str, Any]], path: str = NUTRIENT_SNAPSHOT_DIR,
+                   source: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Write OpenFoodFacts records as a new snapshot version under path and make
+    it current. The CURRENT pointer is replaced atomically, so readers see the
+    old or the new version, never a partial one; versions older than the
+    previous one are removed.
+    """
+    started = time.perf_counter()
+    columns = _Columns()
+    chunk, records_read = [], 0
+    for record in records:
+        records_read += 1
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            columns.add_chunk(chunk)
+            chunk = []
+    if chunk:
+        columns.add_chunk(chunk)
+    arrays = columns.arrays()
+
+    os.makedirs(path, exist_ok=True)
+    version = f"v{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}"
+    version_dir = os.path.join(path, version)
+    os.makedirs(version_dir)
+    for name, values in arrays.items():
+        np.save(os.path.join(version_dir, f'{name}.npy'), values, allow_pickle=False)
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'rows': len(arrays['barcodes']),
+        'records': records_read,
+        'skipped': columns.skipped,
+        'source': source,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'nutrient_fields': list(NUTRITION_FIELDS),
+        'allergen_tags': list(ALLERGEN_TAGS),
+    }
+    with open(os.path.join(version_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    previous = _current_version(path)
+    temp_path = os.path.join(path, f'{CURRENT_FILE}.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(temp_path, os.path.join(path, CURRENT_FILE))
+
+    # Processes that opened the previous version keep reading it until they reopen
+    for entry in os.listdir(path):
+        if entry.startswith('v') and entry not in (version, previous):
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+    meta['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(f"Nutrient snapshot {version}: {meta['rows']} products from {records_read} records")
+    return meta
+
+
+def export_snapshot(dump_path: str, path: str = NUTRIENT_SNAPSHOT_DIR, fmt: Optional[str] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Snapshot of an OpenFoodFacts JSON, JSON Lines or CSV export"""
+    return write_snapshot(iter_records(dump_path, fmt, fields=SNAPSHOT_FIELDS), path,
+                          source=dump_path, chunk_size=chunk_size)
+
+
+class NutrientSnapshot:
+    """
+    Read-only view of the current snapshot. Columns are memory-mapped, so
+    opening costs a few file opens whatever the catalog size and processes
+    opening the same version share its pages.
+    """
+    __slots__ = ('path', 'meta', 'barcodes', 'nutrients', 'nutri_score', 'nova_group', 'allergens',
+                 'category_offsets', 'category_ids', 'category_tags')
+
+    def __init__(self, path: str, meta: Dict[str, Any], columns: Dict[str, np.ndarray]):
+        self.path = path
+        self.meta = meta
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def open(cls, path: str = NUTRIENT_SNAPSHOT_DIR) -> 'NutrientSnapshot':
+        version = _current_version(path)
+        if version is None:
+            raise FileNotFoundError(f'No nutrient snapshot in {path}')
+        version_dir = os.path.join(path, version)
+        with open(os.path.join(version_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != SNAPSHOT_VERSION or meta.get('nutrient_fields') != list(NUTRITION_FIELDS):
+            raise ValueError(f'Nutrient snapshot {version_dir} has an incompatible layout; export it again')
+        columns = {name: np.load(os.path.join(version_dir, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+                   for name in COLUMNS}
+        return cls(version_dir, meta, columns)
+
+    def __len__(self) -> int:
+        return len(self.barcodes)
+
+    def __getitem__(self, nutrient: str) -> np.ndarray:
+        """Per-100g values of one nutrient (NaN where unknown), without copying"""
+        return self.nutrients[NUTRITION_FIELDS.index(nutrient)]
+
+    def find(self, barcode: str) -> Optional[int]:
+        """Row of a barcode, by binary search over the sorted barcode column"""
+        try:
+            key = np.bytes_(str(barcode).strip().encode('ascii'))
+        except UnicodeEncodeError:
+            return None
+        row = int(np.searchsorted(self.barcodes, key))
+        return row if row < len(self.barcodes) and self.barcodes[row] == key else None
+
+    def frame(self, rows=None) -> NutritionFrame:
+        """NutritionFrame of all rows (or the selected ones) with unknown nutrients as zero, ready for score_frame"""
+        values = self.nutrients if rows is None else self.nutrients[:, rows]
+        return NutritionFrame(np.nan_to_num(values.astype(np.float64), nan=0.0))
+
+    def allergen_mask(self, tags: Iterable[str]) -> int:
+        mask = 0
+        for tag in tags:
+            tag = tag.strip().lower()
+            if tag not in ALLERGEN_BITS:
+                raise ValueError(f'Unknown allergen tag {tag}; expected one of {", ".join(ALLERGEN_TAGS)}')
+            mask |= ALLERGEN_BITS[tag]
+        return mask
+
+    def containing_allergens(self, tags: Iterable[str]) -> np.ndarray:
+        """Boolean row mask of products declaring any of the allergens"""
+        return (self.allergens & np.uint32(self.allergen_mask(tags))) != 0
+
+    def in_category(self, tag: str) -> np.ndarray:
+        """Boolean row mask of products tagged with the category"""
+        mask = np.zeros(len(self), dtype=bool)
+        tag = tag.strip().lower()
+        category = int(np.searchsorted(self.category_tags, tag))
+        if category == len(self.category_tags) or self.category_tags[category] != tag:
+            return mask
+        positions = np.flatnonzero(self.category_ids == category)
+        mask[np.searchsorted(self.category_offsets, positions, side='right') - 1] = True
+        return mask
+
+    def categories(self, row: int) -> List[str]:
+        ids = self.category_ids[self.category_offsets[row]:self.category_offsets[row + 1]]
+        return self.category_tags[ids].tolist()
+
+    def product(self, row: int) -> Dict[str, Any]:
+        """One row as a dict, for debugging and small lookups"""
+        grade, nova = int(self.nutri_score[row]), int(self.nova_group[row])
+        allergens = int(self.allergens[row])
+        return {
+            'barcode': self.barcodes[row].decode('ascii'),
+            'nutrients': {field: float(value) for field, value in zip(NUTRITION_FIELDS, self.nutrients[:, row])
+                          if not np.isnan(value)},
+            'nutri_score': GRADES[grade] if grade != MISSING else None,
+            'nova_group': nova if nova != MISSING else None,
+            'allergens': [tag for tag, bit in ALLERGEN_BITS.items() if allergens & bit],
+            'categories': self.categories(row),
+        }
@@ -0,0 +1,154 @@
+"""
+Product Importer for FoodLens Application
+Bulk product upserts: rows are streamed into a temporary staging table with
+COPY and merged into products with one INSERT ... ON CONFLICT statement.
+"""
+
+import io
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from utils.catalog_generation import bump_catalog_generation
+from utils.csv_loader import DEFAULT_CHUNK_SIZE, load_products, log_progress
+from utils.database import get_engine
+from services.product_index import PRODUCT_INDEX_SNAPSHOT, index_export
+
+# Product columns written by imports, as produced by off_product_fields
+IMPORT_COLUMNS = (
+    'barcode', 'name', 'brand', 'category', 'energy_kcal', 'energy_kj', 'fat', 'saturated_fat',
+    'carbohydrates', 'sugars', 'fiber', 'protein', 'salt', 'sodium', 'nutrition_data', 'nutri_score',
+    'nova_group', 'ingredients', 'allergens', 'additives', 'countries', 'packaging', 'serving_size',
+    'image_url', 'ingredient_image_url', 'nutrition_image_url', 'data_source',
+)
+_UPDATED_COLUMNS = [column for column in IMPORT_COLUMNS if column != 'barcode']
+_COLUMN_LIST = ', '.join(IMPORT_COLUMNS)
+
+STAGING_SQL = f"""
+    CREATE TEMPORARY TABLE product_staging ON COMMIT DROP AS
+    SELECT {_COLUMN_LIST} FROM products WITH NO DATA
+"""
+COPY_SQL = f"COPY product_staging ({_COLUMN_LIST}) FROM STDIN"
+# Existing rows are rewritten only when an imported value differs, so
+# unchanged products keep their updated_at and cause no dead tuples.
+# Verified products are never overwritten by imports.
+MERGE_SQL = f"""
+    INSERT INTO products (id, {_COLUMN_LIST}, created_at, updated_at)
+    SELECT gen_random_uuid(), {_COLUMN_LIST}, now(), now() FROM product_staging
+    ON CONFLICT (barcode) DO UPDATE SET
+        {', '.join(f'{column} = EXCLUDED.{column}' for column in _UPDATED_COLUMNS)},
+        updated_at = now()
+    WHERE products.is_verified IS NOT TRUE
+      AND ({', '.join(f'products.{column}' for column in _UPDATED_COLUMNS)})
+          IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in _UPDATED_COLUMNS)})
+    RETURNING barcode, (xmax = 0) AS inserted
+"""
+
+# COPY text format: backslash escapes, \N for NULL; PostgreSQL text cannot hold NUL
+_COPY_SPECIAL = re.compile(r'[\\\t\n\r\x00]')
+_COPY_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\x00': ''}
+
+
+def _escape(value: str) -> str:
+    # Most values need no escaping; searching first skips the substitution
+    if _COPY_SPECIAL.search(value) is None:
+        return value
+    return _COPY_SPECIAL.sub(lambda match: _COPY_ESCAPES[match.group()], value)
+
+
+def _array_literal(values: Iterable[Any]) -> str:
+    items = []
+    for value in values:
+        if value is None:
+            items.append('NULL')
+        else:
+            items.append('"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"')
+    return '{' + ','.join(items) + '}'
+
+
+def copy_value(value: Any) -> str:
+    """One column value in COPY text format"""
+    kind = type(value)
+    if kind is str:
+        return _escape(value)
+    if value is None:
+        return '\\N'
+    if kind is float or kind is int:
+        return repr(value)
+    if kind is bool:
+        return 't' if value else 'f'
+    if kind is list or kind is tuple:
+        return _escape(_array_literal(value))
+    if kind is dict:
+        return _escape(json.dumps(value, ensure_ascii=False))
+    return _escape(str(value))
+
+
+def copy_buffer(rows: Iterable[Dict[str, Any]]) -> io.StringIO:
+    """COPY input for rows, one line per row in IMPORT_COLUMNS order"""
+    buffer = io.StringIO()
+    buffer.writelines('\t'.join(copy_value(row.get(column)) for column in IMPORT_COLUMNS) + '\n'
+                      for row in rows)
+    buffer.seek(0)
+    return buffer
+
+
+def upsert_products(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Insert new products and update changed ones in one transaction.
+    A barcode repeated within rows keeps its last occurrence. Returns the
+    inserted/updated/unchanged counts and the barcodes that were written.
+    """
+    # ON CONFLICT cannot update one row twice in a statement
+    staged = list({row['barcode']: row for row in rows if row.get('barcode')}.values())
+    if not staged:
+        return {'inserted': 0, 'updated': 0, 'unchanged': 0, 'barcodes': []}
+
+    with get_engine().begin() as connection:
+        connection.execute(text(STAGING_SQL))
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(COPY_SQL, copy_buffer(staged))
+        finally:
+            cursor.close()
+        written = connection.execute(text(MERGE_SQL)).all()
+
+    inserted = sum(1 for row in written if row.inserted)
+    barcodes = [row.barcode for row in written]
+    if barcodes:
+        # Barcode caches and product stores of every process are now stale
+        bump_catalog_generation()
+    return {
+        'inserted': inserted,
+        'updated': len(written) - inserted,
+        'unchanged': len(staged) - len(written),
+        'barcodes': barcodes
+    }
+
+
+def import_products(path: str, fmt: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    on_changed: Optional[Callable[[List[str]], Any]] = None,
+                    progress: Optional[Callable] = log_progress,
+                    writer: Callable[[List[Dict[str, Any]]], Dict[str, Any]] = upsert_products,
+                    index_snapshot: Optional[str] = PRODUCT_INDEX_SNAPSHOT) -> Dict[str, Any]:
+    """
+    Stream an OpenFoodFacts export into products, one COPY and merge per chunk.
+    on_changed receives the barcodes inserted or updated by each chunk.
+    The export's products are then added to the product index snapshot,
+    if there is one, for running workers to reload.
+    """
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+    def sink(rows):
+        result = writer(rows)
+        for key in totals:
+            totals[key] += result[key]
+        if on_changed is not None and result['barcodes']:
+            on_changed(result['barcodes'])
+
+    stats = load_products(path, sink=sink, fmt=fmt, chunk_size=chunk_size, progress=progress)
+    stats.update(totals)
+    stats['indexed'] = index_export(path, fmt, index_snapshot) if index_snapshot else 0
+    return stats
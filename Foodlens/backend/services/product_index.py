@@ -0,0 +1,545 @@
+"""
+Product Index for FoodLens Application
+In-memory inverted index over the OpenFoodFacts dump for keyword search,
+tag filters and autocomplete without a database round trip. Imports and syncs
+add their products to the snapshot, which running workers reload.
+"""
+
+import bisect
+import contextlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from utils.csv_loader import iter_records
+
+# Advisory locks serialize processes that rewrite the snapshot
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCT_INDEX_DUMP = os.getenv('PRODUCT_INDEX_DUMP', os.path.join(
+    os.path.dirname(_BACKEND_DIR), 'data', 'raw_data', 'turkey_products.json'))
+PRODUCT_INDEX_SNAPSHOT = os.getenv('PRODUCT_INDEX_SNAPSHOT', os.path.join(
+    _BACKEND_DIR, 'instance', 'product_index.npz'))
+# How often workers look for a snapshot rewritten by an import or sync, in seconds
+PRODUCT_INDEX_CHECK_INTERVAL = float(os.getenv('PRODUCT_INDEX_CHECK_INTERVAL', '60'))
+
+# Tag fields indexed for filtering, by filter name
+TAG_FIELDS = {
+    'brand': 'brands_tags',
+    'category': 'categories_tags',
+    'allergen': 'allergens_tags',
+}
+# Stored per product and returned with results
+DOCUMENT_FIELDS = ('code', 'product_name', 'brands', 'nutriscore_grade')
+# OpenFoodFacts fields read when indexing a product
+INDEX_FIELDS = DOCUMENT_FIELDS + ('_keywords', 'popularity_key') + tuple(TAG_FIELDS.values())
+
+# Most vocabulary terms a trailing query prefix expands to, most frequent first
+MAX_PREFIX_EXPANSIONS = 64
+# Prefixes whose most frequent terms are remembered per index version
+MAX_CACHED_PREFIXES = 4096
+# Rebuild once this fraction of documents has been replaced
+COMPACT_RATIO = 0.25
+
+POSTING_DTYPE = np.uint32
+_EMPTY = np.empty(0, dtype=POSTING_DTYPE)
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def normalize_terms(text: str) -> List[str]:
+    """Lower-case ASCII words, as in OpenFoodFacts _keywords ('Pâte' -> 'pate', 'Sütlü' -> 'sutlu')"""
+    text = text.replace('I', 'i').replace('İ', 'i').lower().replace('ı', 'i')
+    text = unicodedata.normalize('NFKD', text)
+    return _WORD.findall(''.join(char for char in text if not unicodedata.combining(char)))
+
+
+def _product_terms(product: Dict[str, Any]) -> List[str]:
+    keywords = product.get('_keywords')
+    if keywords:
+        terms = [term for keyword in keywords for term in normalize_terms(keyword)]
+    else:
+        terms = normalize_terms(f"{product.get('product_name') or ''} {product.get('brands') or ''}")
+    code = str(product.get('code') or '')
+    if code:
+        terms.append(code)
+    return terms
+
+
+def _intersect(postings: List[np.ndarray]) -> np.ndarray:
+    # Smallest list first keeps every intermediate result small
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for other in postings[1:]:
+        if not len(result):
+            break
+        result = np.intersect1d(result, other, assume_unique=True)
+    return result
+
+
+def _union(postings: List[np.ndarray]) -> np.ndarray:
+    if not postings:
+        return _EMPTY
+    return np.unique(np.concatenate(postings))
+
+
+class IndexState:
+    """
+    One immutable version of the index. Postings are sorted uint32 arrays of
+    document ids; replaced documents stay in the arrays and are masked out
+    through `live` until the next compaction. Document lists and doc_of_code
+    are shared with the states that follow until a compaction: later states
+    only append to them, and a state never reads past its own documents.
+    `frequency` is the posting length of each vocabulary term, so replaced
+    documents are counted until the next compaction.
+    """
+    __slots__ = ('terms', 'tags', 'vocabulary', 'frequency', 'documents', 'doc_of_code', 'popularity', 'live',
+                 'prefixes')
+
+    def __init__(self, terms: Dict[str, np.ndarray], tags: Dict[str, np.ndarray],
+                 documents: Dict[str, List[str]], popularity: np.ndarray, live: np.ndarray,
+                 vocabulary: Optional[List[str]] = None, doc_of_code: Optional[Dict[str, int]] = None,
+                 frequency: Optional[np.ndarray] = None):
+        self.terms = terms
+        self.tags = tags
+        self.documents = documents
+        self.popularity = popularity
+        self.live = live
+        self.vocabulary = vocabulary if vocabulary is not None else sorted(terms)
+        self.frequency = frequency if frequency is not None else \
+            np.fromiter((len(terms[term]) for term in self.vocabulary), dtype=np.int64, count=len(self.vocabulary))
+        self.doc_of_code = doc_of_code if doc_of_code is not None else \
+            {code: doc for doc, code in enumerate(documents['code']) if live[doc]}
+        # prefix -> vocabulary positions of its most frequent terms
+        self.prefixes: Dict[str, np.ndarray] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.doc_of_code)
+
+    def top_terms(self, prefix: str) -> np.ndarray:
+        """
+        Vocabulary positions of the MAX_PREFIX_EXPANSIONS most frequent terms
+        starting with prefix, most frequent first. The terms form one range of
+        the vocabulary; it is ranked once per state and prefix.
+        """
+        top = self.prefixes.get(prefix)
+        if top is not None:
+            return top
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        counts = self.frequency[start:end]
+        if len(counts) > MAX_PREFIX_EXPANSIONS:
+            positions = np.argpartition(-counts, MAX_PREFIX_EXPANSIONS - 1)[:MAX_PREFIX_EXPANSIONS]
+        else:
+            positions = np.arange(len(counts))
+        # Most frequent first, alphabetical among equals
+        top = start + positions[np.lexsort((positions, -counts[positions]))]
+        if len(self.prefixes) >= MAX_CACHED_PREFIXES:
+            self.prefixes.clear()
+        self.prefixes[prefix] = top
+        return top
+
+
+def _empty_state() -> IndexState:
+    return IndexState({}, {}, {field: [] for field in DOCUMENT_FIELDS},
+                      np.empty(0, dtype=np.int64), np.empty(0, dtype=bool))
+
+
+class ProductIndex:
+    """
+    Inverted index from keywords and tags to products.
+    Readers use whichever IndexState is current; add_products builds the
+    next state and swaps it in, so queries never take a lock. A watched
+    snapshot is reloaded in the background when another process rewrites it.
+    """
+
+    def __init__(self):
+        self._state = _empty_state()
+        self._write_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._snapshot_path: Optional[str] = None
+        self._snapshot_identity = None
+        self._check_interval = PRODUCT_INDEX_CHECK_INTERVAL
+        self._checked_at = 0.0
+
+    @property
+    def size(self) -> int:
+        return self._state.size
+
+    # Building
+
+    def add_products(self, products: Iterable[Dict[str, Any]]) -> int:
+        """
+        Index products, replacing earlier versions with the same code.
+        New documents are appended to the lists the current state shares,
+        and postings of terms the new products do not use are shared rather
+        than copied, so a call costs in proportion to what it adds (plus one
+        byte per document for the live mask). Returns the number of products added.
+        """
+        with self._write_lock:
+            state = self._state
+            base = len(state.live)
+            documents = state.documents
+            for values in documents.values():
+                # Left behind by a call that failed part way; no state reads past base
+                del values[base:]
+            live = state.live.copy()
+            new_live, popularity, codes = [], [], {}
+            new_terms, new_tags = {}, {}
+
+            for product in products:
+                code = str(product.get('code') or '').strip()
+                if not code:
+                    continue
+                doc = base + len(new_live)
+                replaced = codes.get(code, state.doc_of_code.get(code))
+                if replaced is not None and replaced < base:
+                    live[replaced] = False
+                elif replaced is not None:
+                    new_live[replaced - base] = False
+                codes[code] = doc
+
+                for field in DOCUMENT_FIELDS:
+                    value = product.get(field)
+                    documents[field].append(str(value).strip() if value is not None else '')
+                new_live.append(True)
+                popularity.append(int(product.get('popularity_key') or 0))
+                for term in set(_product_terms(product)):
+                    new_terms.setdefault(term, []).append(doc)
+                for name, field in TAG_FIELDS.items():
+                    for tag in set(product.get(field) or ()):
+                        new_tags.setdefault(f'{name}:{str(tag).lower()}', []).append(doc)
+
+            added = len(new_live)
+            if not added:
+                return 0
+
+            # New ids are larger than every existing id, so appending keeps postings sorted
+            terms, tags = dict(state.terms), dict(state.tags)
+            for target, additions in ((terms, new_terms), (tags, new_tags)):
+                for key, docs in additions.items():
+                    ids = np.asarray(docs, dtype=POSTING_DTYPE)
+                    target[key] = np.concatenate((target[key], ids)) if key in target else ids
+            # Two sorted runs, merged by one linear sort pass
+            new_vocabulary = sorted(term for term in new_terms if term not in state.terms)
+            vocabulary = sorted(state.vocabulary + new_vocabulary) if new_vocabulary else state.vocabulary
+            frequency = state.frequency
+            if new_vocabulary:
+                # New terms start at 0, inserted where the merge placed them
+                frequency = np.insert(frequency, [bisect.bisect_left(state.vocabulary, term)
+                                                  for term in new_vocabulary], 0)
+            else:
+                frequency = frequency.copy()
+            for term, docs in new_terms.items():
+                frequency[bisect.bisect_left(vocabulary, term)] += len(docs)
+
+            # Older states may see these codes early; they resolve to documents already appended
+            doc_of_code = state.doc_of_code
+            doc_of_code.update(codes)
+            next_state = IndexState(terms, tags, documents,
+                                    np.concatenate((state.popularity, np.asarray(popularity, dtype=np.int64))),
+                                    np.concatenate((live, np.asarray(new_live, dtype=bool))),
+                                    vocabulary, doc_of_code, frequency)
+            if len(live) and 1 - next_state.size / len(live) > COMPACT_RATIO:
+                next_state = self._compacted(next_state)
+            self._state = next_state
+            return added
+
+    def _compacted(self, state: IndexState) -> IndexState:
+        """Renumber live documents and drop replaced ones from every posting list"""
+        kept = np.flatnonzero(state.live)
+        renumber = np.full(len(state.live), -1, dtype=np.int64)
+        renumber[kept] = np.arange(len(kept))
+
+        def remap(postings: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+            result = {}
+            for key, ids in postings.items():
+                ids = renumber[ids]
+                ids = ids[ids >= 0].astype(POSTING_DTYPE)
+                if len(ids):
+                    result[key] = ids
+            return result
+
+        documents = {field: [values[doc] for doc in kept] for field, values in state.documents.items()}
+        return IndexState(remap(state.terms), remap(state.tags), documents,
+                          state.popularity[kept], np.ones(len(kept), dtype=bool))
+
+    def build_from_dump(self, path: str = PRODUCT_INDEX_DUMP, fmt: Optional[str] = None) -> int:
+        """Replace the index with the products of an OpenFoodFacts export, streamed record by record"""
+        index = ProductIndex()
+        index.add_products(iter_records(path, fmt, fields=INDEX_FIELDS))
+        self._state = index._state
+        return self.size
+
+    # Querying
+
+    def _term_postings(self, state: IndexState, term: str, prefix: bool) -> np.ndarray:
+        if not prefix:
+            return state.terms.get(term, _EMPTY)
+        return _union([state.terms[state.vocabulary[position]] for position in state.top_terms(term)])
+
+    def _refresh(self) -> None:
+        """Start a background reload when the watched snapshot was rewritten"""
+        if self._snapshot_path is None or time.monotonic() - self._checked_at < self._check_interval:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        self._checked_at = time.monotonic()
+        identity = _file_identity(self._snapshot_path)
+        if identity is None or identity == self._snapshot_identity:
+            self._reload_lock.release()
+            return
+        threading.Thread(target=self._reload, args=(identity,), daemon=True).start()
+
+    def _reload(self, identity) -> None:
+        try:
+            loaded = ProductIndex()
+            size = loaded.load(self._snapshot_path)
+            with self._write_lock:
+                self._state = loaded._state
+            logger.info(f"Product index reloaded from snapshot: {size} products")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Product index snapshot not reloaded: {e}")
+        finally:
+            # Not retried until the file changes again
+            self._snapshot_identity = identity
+            self._reload_lock.release()
+
+    def watch(self, path: str = PRODUCT_INDEX_SNAPSHOT, check_interval: float = PRODUCT_INDEX_CHECK_INTERVAL) -> None:
+        """Reload the snapshot at path whenever it is rewritten; the current file counts as loaded"""
+        self._snapshot_path = path
+        self._snapshot_identity = _file_identity(path)
+        self._check_interval = check_interval
+        self._checked_at = time.monotonic()
+
+    def search(self, query: str = '', mode: str = 'and', tags: Optional[Dict[str, List[str]]] = None,
+               exclude_tags: Optional[Dict[str, List[str]]] = None, prefix: bool = True,
+               limit: int = 20) -> Dict[str, Any]:
+        """
+        Products matching the query words (all of them for mode 'and', any for
+        'or'), having every tag in `tags` and none in `exclude_tags`. The last
+        word also matches as a prefix when `prefix` is set, for search-as-you-type.
+        Results are ordered by matched words, then OpenFoodFacts popularity.
+        """
+        if mode not in ('and', 'or'):
+            raise ValueError("mode must be 'and' or 'or'")
+        self._refresh()
+        state = self._state
+        words = normalize_terms(query or '')
+        postings = [self._term_postings(state, word, prefix and position == len(words) - 1)
+                    for position, word in enumerate(words)]
+
+        if not words:
+            candidates = np.flatnonzero(state.live).astype(POSTING_DTYPE)
+        elif mode == 'and':
+            candidates = _intersect(postings)
+        else:
+            candidates = _union(postings)
+
+        required = [state.tags.get(f'{name}:{value.lower()}', _EMPTY)
+                    for name, values in (tags or {}).items() for value in values]
+        if required:
+            candidates = _intersect([candidates] + required)
+        excluded = [state.tags.get(f'{name}:{value.lower()}', _EMPTY)
+                    for name, values in (exclude_tags or {}).items() for value in values]
+        if excluded:
+            candidates = np.setdiff1d(candidates, _union(excluded), assume_unique=True)
+        candidates = candidates[state.live[candidates]]
+
+        if mode == 'or' and len(words) > 1:
+            # Matched word count per candidate
+            matched = np.zeros(len(candidates), dtype=np.int64)
+            for ids in postings:
+                matched += np.isin(candidates, ids, assume_unique=True)
+        else:
+            matched = np.zeros(len(candidates), dtype=np.int64)
+        order = np.lexsort((-state.popularity[candidates], -matched))[:limit]
+
+        return {
+            'total': int(len(candidates)),
+            'products': [self._document(state, int(doc)) for doc in candidates[order]]
+        }
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Vocabulary terms starting with the prefix, most frequent first (at
+        most MAX_PREFIX_EXPANSIONS). Terms are picked by posting length;
+        counts leave out replaced documents.
+        """
+        self._refresh()
+        state = self._state
+        words = normalize_terms(prefix or '')
+        if not words:
+            return []
+        completions = []
+        for position in state.top_terms(words[-1])[:limit]:
+            term = state.vocabulary[position]
+            count = int(state.frequency[position])
+            if state.size < len(state.live):
+                count = int(np.count_nonzero(state.live[state.terms[term]]))
+            if count:
+                completions.append((term, count))
+        completions.sort(key=lambda item: (-item[1], item[0]))
+        return [{'term': term, 'count': count} for term, count in completions]
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        self._refresh()
+        state = self._state
+        doc = state.doc_of_code.get(str(code))
+        return self._document(state, doc) if doc is not None else None
+
+    def _document(self, state: IndexState, doc: int) -> Dict[str, Any]:
+        return {field: state.documents[field][doc] or None for field in DOCUMENT_FIELDS}
+
+    # Snapshots
+
+    def save(self, path: str = PRODUCT_INDEX_SNAPSHOT) -> None:
+        """
+        Write the index as one .npz of flat arrays: each posting dictionary is
+        a sorted key array, an offsets array and one concatenated id array.
+        """
+        state = self._compacted(self._state)
+        arrays = {'popularity': state.popularity}
+        for name, postings in (('terms', state.terms), ('tags', state.tags)):
+            keys = sorted(postings)
+            lengths = [len(postings[key]) for key in keys]
+            arrays[f'{name}_keys'] = np.asarray(keys, dtype=str)
+            arrays[f'{name}_offsets'] = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+            arrays[f'{name}_ids'] = np.concatenate([postings[key] for key in keys]) if keys else _EMPTY
+        for field in DOCUMENT_FIELDS:
+            arrays[f'doc_{field}'] = np.asarray(state.documents[field], dtype=str)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # A temp file of its own, so concurrent writers never share one
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix=f'{os.path.basename(path)}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(temporary, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporary)
+            raise
+
+    def load(self, path: str = PRODUCT_INDEX_SNAPSHOT) -> int:
+        """Replace the index with a snapshot written by save()"""
+        with np.load(path, allow_pickle=False) as snapshot:
+            postings = {}
+            for name in ('terms', 'tags'):
+                keys, offsets, ids = (snapshot[f'{name}_{part}'] for part in ('keys', 'offsets', 'ids'))
+                ids = ids.astype(POSTING_DTYPE, copy=False)
+                # Slices are views into the one concatenated array
+                postings[name] = {str(key): ids[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+                if name == 'terms':
+                    # Keys are saved sorted, and the snapshot holds no replaced documents
+                    vocabulary, frequency = list(postings[name]), np.diff(offsets).astype(np.int64)
+            documents = {field: snapshot[f'doc_{field}'].tolist() for field in DOCUMENT_FIELDS}
+            popularity = snapshot['popularity'].astype(np.int64)
+        self._state = IndexState(postings['terms'], postings['tags'], documents, popularity,
+                                 np.ones(len(popularity), dtype=bool), vocabulary, frequency=frequency)
+        return self.size
+
+def _file_identity(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_mtime_ns
+
+# Global product index instance
+product_index = ProductIndex()
+
+
+@contextlib.contextmanager
+def snapshot_lock(path: str = PRODUCT_INDEX_SNAPSHOT) -> Iterator[None]:
+    """
+    Hold the exclusive lock on the snapshot's sidecar lock file. Writers
+    take it around opening, adding to and saving the snapshot, so two
+    imports or syncs never save over each other's products.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock:
+        if FCNTL_AVAILABLE:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+def open_snapshot(path: str = PRODUCT_INDEX_SNAPSHOT) -> Optional[ProductIndex]:
+    """
+    A private index loaded from the snapshot, for adding products and saving
+    it back under snapshot_lock(); None when there is no snapshot, which
+    startup builds from the dump
+    """
+    if not os.path.exists(path):
+        return None
+    index = ProductIndex()
+    index.load(path)
+    return index
+
+
+def index_export(path: str, fmt: Optional[str] = None, snapshot_path: str = PRODUCT_INDEX_SNAPSHOT) -> int:
+    """Add the products of an imported export to the snapshot; returns the number indexed"""
+    with snapshot_lock(snapshot_path):
+        index = open_snapshot(snapshot_path)
+        if index is None:
+            return 0
+        added = index.add_products(iter_records(path, fmt, fields=INDEX_FIELDS))
+        if added:
+            index.save(snapshot_path)
+    return added
+
+
+def _snapshot_is_fresh(snapshot_path: str, dump_mtime: Optional[float]) -> bool:
+    return os.path.exists(snapshot_path) and (dump_mtime is None or os.path.getmtime(snapshot_path) >= dump_mtime)
+
+
+def _load_snapshot(snapshot_path: str) -> int:
+    size = product_index.load(snapshot_path)
+    product_index.watch(snapshot_path)
+    logger.info(f"Product index loaded from snapshot: {size} products")
+    return size
+
+
+def load_product_index(dump_path: str = PRODUCT_INDEX_DUMP, snapshot_path: str = PRODUCT_INDEX_SNAPSHOT) -> int:
+    """
+    Fill the global index at startup: from the snapshot when it is newer than
+    the dump, otherwise by building from the dump and writing a new snapshot.
+    """
+    dump_mtime = os.path.getmtime(dump_path) if os.path.exists(dump_path) else None
+    if _snapshot_is_fresh(snapshot_path, dump_mtime):
+        return _load_snapshot(snapshot_path)
+    if dump_mtime is None:
+        logger.warning(f"No product dump at {dump_path}; product index is empty")
+        return 0
+
+    with contextlib.ExitStack() as stack:
+        try:
+            stack.enter_context(snapshot_lock(snapshot_path))
+        except OSError as e:
+            logger.warning(f"Could not lock product index snapshot: {e}")
+        # Workers booting together wait for the first one's snapshot instead of each building
+        if _snapshot_is_fresh(snapshot_path, dump_mtime):
+            return _load_snapshot(snapshot_path)
+        size = product_index.build_from_dump(dump_path)
+        try:
+            product_index.save(snapshot_path)
+            product_index.watch(snapshot_path)
+        except OSError as e:
+            logger.warning(f"Could not write product index snapshot: {e}")
+    logger.info(f"Product index built from {os.path.basename(dump_path)}: {size} products")
+    return size
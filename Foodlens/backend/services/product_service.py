@@ -1,14 +1,219 @@
 """
 Product Service for FoodLens Application
-Business logic for product management and nutritional analysis.
+Product retrieval and ranked, faceted, typo-tolerant search.
 """
 
-# Product service will be implemented here
-# This service will handle:
-# - Product search and retrieval logic
-# - Nutritional data processing and validation
-# - Nutri-Score and NOVA classification
-# - Product data enrichment from external APIs
-# - Barcode lookup and validation
-# - Product image processing
-# - Data quality scoring and verification
+import re
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Float, and_, cast, func, literal, or_, select, tuple_
+
+from utils import pagination
+from utils.database import Database
+from utils.pagination import InvalidCursor
+from models.product import Product
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Longest query considered; the frontend sends one request per keystroke
+MAX_QUERY_TERMS = 8
+MAX_TERM_LENGTH = 50
+
+# Columns returned in search results; details come from get_product
+SEARCH_FIELDS = ('id', 'barcode', 'name', 'brand', 'category', 'nutri_score', 'nova_group', 'image_url')
+FACETS = ('category', 'nutri_score', 'nova_group')
+# Most values reported per facet
+FACET_LIMIT = 20
+
+NUTRI_SCORE_GRADES = ('A', 'B', 'C', 'D', 'E')
+NOVA_GROUPS = (1, 2, 3, 4)
+
+_TERM = re.compile(r'\w+')
+
+
+def query_terms(query: Optional[str]) -> List[str]:
+    """Words of a search query, as tsquery-safe terms"""
+    return [term[:MAX_TERM_LENGTH] for term in _TERM.findall(query or '')][:MAX_QUERY_TERMS]
+
+
+def prefix_tsquery(terms: List[str]) -> str:
+    """to_tsquery text matching every term as a word prefix: 'sut:* & cikol:*'"""
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SearchQuery:
+    """Match condition, rank and filters for one search request"""
+    __slots__ = ('text', 'terms', 'conditions', 'rank')
+
+    def __init__(self, text: Optional[str], filters: Dict[str, Any]):
+        self.terms = query_terms(text)
+        self.text = ' '.join(self.terms)
+        self.conditions = []
+        self.rank = None
+
+        if self.terms:
+            # Stemmed whole words (Turkish suffixes) or unstemmed word prefixes
+            tsquery = func.to_tsquery('simple', prefix_tsquery(self.terms)).op('||')(
+                func.plainto_tsquery('turkish', self.text))
+            text = literal(self.text)
+            self.conditions.append(or_(
+                Product.search_vector.op('@@')(tsquery),
+                Product.name.ilike(_escape_like(self.text) + '%'),
+                # Trigram word similarity (pg_trgm <%) tolerates typos
+                text.op('<%')(Product.name),
+                text.op('<%')(Product.brand)
+            ))
+            # ts_rank_cd is real; as double precision the rank survives the round
+            # trip through a cursor exactly, so ties at a page boundary compare equal
+            self.rank = cast(func.ts_rank_cd(Product.search_vector, tsquery) + func.greatest(
+                func.word_similarity(text, Product.name),
+                func.word_similarity(text, func.coalesce(Product.brand, ''))
+            ), Float(53))
+
+        if filters.get('category'):
+            self.conditions.append(Product.category == filters['category'])
+        if filters.get('brand'):
+            self.conditions.append(Product.brand == filters['brand'])
+        if filters.get('nutri_score'):
+            self.conditions.append(Product.nutri_score.in_(filters['nutri_score']))
+        if filters.get('nova_group'):
+            self.conditions.append(Product.nova_group.in_(filters['nova_group']))
+
+    def sort_key(self):
+        """Best matches first when searching, alphabetical when browsing"""
+        return self.rank if self.rank is not None else Product.name
+
+    def after(self, position: List[Any]):
+        """Rows after a cursor position in sort order"""
+        value, product_id = position[0], uuid.UUID(position[1])
+        expected = (int, float) if self.rank is not None else str
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError('cursor belongs to a different search')
+        if self.rank is not None:
+            value = literal(float(value), Float(53))
+            return or_(self.rank < value, and_(self.rank == value, Product.id > product_id))
+        return tuple_(Product.name, Product.id) > tuple_(value, product_id)
+
+    def results_statement(self, position: Optional[List[Any]], limit: int):
+        conditions = list(self.conditions)
+        if position is not None:
+            conditions.append(self.after(position))
+        sort_key = self.sort_key()
+        order = sort_key.desc() if self.rank is not None else sort_key.asc()
+        return select(*[getattr(Product, field) for field in SEARCH_FIELDS], sort_key.label('sort_key'))\
+            .where(*conditions)\
+            .order_by(order, Product.id.asc())\
+            .limit(limit)
+
+    def facets_statement(self):
+        """Counts per category, nutri_score and nova_group over all matches, in one pass"""
+        columns = [getattr(Product, facet) for facet in FACETS]
+        return select(*columns, *[func.grouping(column) for column in columns], func.count())\
+            .where(*self.conditions)\
+            .group_by(func.grouping_sets(*columns))
+
+
+def parse_filters(args) -> Dict[str, Any]:
+    """Search filters from query parameters; raises ValueError on invalid values"""
+    filters = {'category': args.get('category'), 'brand': args.get('brand')}
+    if args.get('nutri_score'):
+        grades = [grade.strip().upper() for grade in args['nutri_score'].split(',') if grade.strip()]
+        if any(grade not in NUTRI_SCORE_GRADES for grade in grades):
+            raise ValueError(f"Invalid nutri_score filter, expected any of {', '.join(NUTRI_SCORE_GRADES)}")
+        filters['nutri_score'] = grades
+    if args.get('nova_group'):
+        try:
+            groups = [int(group) for group in args['nova_group'].split(',') if group.strip()]
+        except ValueError:
+            groups = None
+        if not groups or any(group not in NOVA_GROUPS for group in groups):
+            raise ValueError('Invalid nova_group filter, expected any of 1, 2, 3, 4')
+        filters['nova_group'] = groups
+    return filters
+
+
+class ProductService:
+    def __init__(self):
+        """Initialize product service"""
+        self.db = Database()
+
+    def search_products(self, query: Optional[str] = None, filters: Optional[Dict[str, Any]] = None,
+                        cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """
+        Ranked product search with keyset paging. Facet counts over the whole
+        result set are returned with the first page only.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        search = SearchQuery(query, filters or {})
+        try:
+            position = pagination.decode_cursor(cursor, 2) if cursor else None
+            if position is not None:
+                search.after(position)
+        except InvalidCursor as e:
+            return {'success': False, 'error': str(e)}
+        except (ValueError, TypeError) as e:
+            return {'success': False, 'error': f'Invalid cursor: {e}'}
+
+        session = self.db.connect()
+        try:
+            rows = session.execute(search.results_statement(position, limit + 1)).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+
+            result = {
+                'success': True,
+                'query': search.text,
+                'products': [{field: getattr(row, field) for field in SEARCH_FIELDS} for row in rows],
+                'next_cursor': pagination.encode_cursor([rows[-1].sort_key, str(rows[-1].id)]) if has_more else None,
+                'has_more': has_more
+            }
+            if position is None:
+                result['facets'] = self._facets(session.execute(search.facets_statement()).all())
+            return result
+
+        except Exception as e:
+            return {'success': False, 'error': f'Product search failed: {str(e)}'}
+        finally:
+            self.db.close(session)
+
+    def _facets(self, rows) -> Dict[str, List[Dict[str, Any]]]:
+        facets = {facet: [] for facet in FACETS}
+        for row in rows:
+            values, grouping, count = row[:len(FACETS)], row[len(FACETS):-1], row[-1]
+            for index, facet in enumerate(FACETS):
+                # grouping() is 0 for the column this grouping set is about
+                if grouping[index] == 0 and values[index] is not None:
+                    facets[facet].append({'value': values[index], 'count': count})
+        return {facet: sorted(counts, key=lambda item: (-item['count'], str(item['value'])))[:FACET_LIMIT]
+                for facet, counts in facets.items()}
+
+    def get_product(self, product_id: str) -> Dict[str, Any]:
+        """Product details by id"""
+        try:
+            product_id = uuid.UUID(str(product_id))
+        except ValueError:
+            return {'success': False, 'error': 'Product not found'}
+
+        session = self.db.connect()
+        try:
+            product = session.get(Product, product_id)
+            if not product:
+                return {'success': False, 'error': 'Product not found'}
+
+            return {
+                'success': True,
+                'product': product.to_dict(native=True)
+            }
+
+        except Exception as e:
+            return {'success': False, 'error': f'Failed to retrieve product: {str(e)}'}
+        finally:
+            self.db.close(session)
+
+# Global product service instance
+product_service = ProductService()
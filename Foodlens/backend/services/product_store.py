@@ -0,0 +1,368 @@
+"""
+Product Store for FoodLens Application
+Read-only, memory-mapped product file with fixed-width records, a string heap
+and an open-addressing barcode index, shared by every worker on the host.
+A store is only served while the catalog generation it was built at is current.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+from utils.catalog_generation import CatalogGeneration, read_catalog_generation
+from utils.csv_loader import DEFAULT_CHUNK_SIZE, iter_product_chunks
+from models.product import Product
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_STORE_PATH = os.getenv('PRODUCT_STORE_PATH', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'product_store.bin'))
+# How often readers look for a rebuilt file, in seconds
+PRODUCT_STORE_CHECK_INTERVAL = float(os.getenv('PRODUCT_STORE_CHECK_INTERVAL', '30'))
+
+MAGIC = b'FLPS'
+FORMAT_VERSION = 2
+# magic, format version, products, hash slots, records/slots/heap offsets, heap size,
+# built at (epoch seconds), catalog generation, source
+_HEADER = struct.Struct('<4sIQQQQQQdQI')
+# Where the products came from; only stores built from the table are served
+SOURCES = ('table', 'dump')
+_ALIGNMENT = 64
+
+# DECIMAL(x, 2) columns, stored exactly as int32 hundredths
+DECIMAL_FIELDS = ('energy_kcal', 'energy_kj', 'fat', 'saturated_fat', 'carbohydrates', 'sugars', 'fiber',
+                  'protein', 'salt', 'sodium', 'serving_size', 'quality_score')
+INTEGER_FIELDS = ('nova_group', 'computed_nutri_score_points')
+TIME_FIELDS = ('created_at', 'updated_at')
+# Variable-length fields live in the heap; records hold (offset, length)
+TEXT_FIELDS = ('barcode', 'name', 'brand', 'category', 'nutri_score', 'ingredients', 'packaging', 'data_source',
+               'computed_nutri_score', 'image_url', 'ingredient_image_url', 'nutrition_image_url')
+LIST_FIELDS = ('allergens', 'additives', 'countries', 'detected_allergens')
+JSON_FIELDS = ('nutrition_data',)
+HEAP_FIELDS = TEXT_FIELDS + LIST_FIELDS + JSON_FIELDS
+
+RECORD_DTYPE = np.dtype(
+    [('id', 'V16'), ('is_verified', 'i1')]
+    + [(field, '<i4') for field in DECIMAL_FIELDS + INTEGER_FIELDS]
+    + [(field, '<i8') for field in TIME_FIELDS]
+    + [(f'{field}{part}', kind) for field in HEAP_FIELDS for part, kind in (('_offset', '<u4'), ('_length', '<u4'))]
+)
+SLOT_DTYPE = np.dtype([('hash', '<u8'), ('record', '<u4'), ('unused', '<u4')])
+
+EMPTY_SLOT = 0xFFFFFFFF
+NULL_INT32 = -2 ** 31
+NULL_INT64 = -2 ** 63
+NULL_LENGTH = 0xFFFFFFFF
+MAX_HEAP_SIZE = 0xFFFFFFFF
+_NULL_ID = bytes(16)
+_LIST_SEPARATOR = '\x1f'
+# Short strings (brands, categories, grades) are stored once in the heap
+_INTERN_LIMIT = 128
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def barcode_hash(barcode: bytes) -> int:
+    """64-bit barcode hash; unlike hash() it is the same in every process"""
+    return int.from_bytes(hashlib.blake2b(barcode, digest_size=8).digest(), 'little')
+
+
+def _hundredths(value) -> int:
+    if value is None:
+        return NULL_INT32
+    if isinstance(value, Decimal):
+        return int(value.scaleb(2).to_integral_value())
+    return round(float(value) * 100)
+
+
+def _microseconds(value: Optional[datetime]) -> int:
+    if value is None:
+        return NULL_INT64
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _heap_text(field: str, value) -> Optional[str]:
+    if value is None:
+        return None
+    if field in LIST_FIELDS:
+        return _LIST_SEPARATOR.join(value)
+    if field in JSON_FIELDS:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return str(value)
+
+
+def _slot_count(products: int) -> int:
+    # Power of two at most half full keeps linear probe runs short
+    return 1 << max(3, (2 * products - 1).bit_length())
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_store(products: Iterable[Dict[str, Any]], path: str = PRODUCT_STORE_PATH, source: str = 'table',
+                generation: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Write products (dicts of Product columns) as a store file and atomically
+    replace path with it. Products without a barcode are left out; a repeated
+    barcode keeps its last product. The build time and catalog generation
+    are taken before the first product is read, so a write that lands while
+    the store is built makes it stale rather than silently missing.
+    """
+    if source not in SOURCES:
+        raise ValueError(f'Unknown product store source: {source}')
+    built_at = time.time()
+    if generation is None:
+        generation = read_catalog_generation()
+    started = time.perf_counter()
+    rows, positions = [], {}
+    heap, interned = bytearray(), {}
+    read = 0
+
+    def heap_ref(text: Optional[str]):
+        if text is None:
+            return 0, NULL_LENGTH
+        if text in interned:
+            return interned[text]
+        data = text.encode('utf-8')
+        if len(heap) + len(data) > MAX_HEAP_SIZE:
+            raise ValueError('Product store heap exceeds 4 GiB')
+        ref = (len(heap), len(data))
+        heap.extend(data)
+        if len(data) <= _INTERN_LIMIT:
+            interned[text] = ref
+        return ref
+
+    for product in products:
+        read += 1
+        barcode = str(product.get('barcode') or '').strip()
+        if not barcode:
+            continue
+        product = dict(product, barcode=barcode)
+        product_id = product.get('id')
+        values = [product_id.bytes if isinstance(product_id, uuid.UUID) else _NULL_ID,
+                  -1 if product.get('is_verified') is None else int(bool(product['is_verified']))]
+        values.extend(_hundredths(product.get(field)) for field in DECIMAL_FIELDS)
+        values.extend(NULL_INT32 if product.get(field) is None else int(product[field]) for field in INTEGER_FIELDS)
+        values.extend(_microseconds(product.get(field)) for field in TIME_FIELDS)
+        for field in HEAP_FIELDS:
+            values.extend(heap_ref(_heap_text(field, product.get(field))))
+
+        if barcode in positions:
+            rows[positions[barcode]] = tuple(values)
+        else:
+            positions[barcode] = len(rows)
+            rows.append(tuple(values))
+
+    records = np.array(rows, dtype=RECORD_DTYPE) if rows else np.empty(0, dtype=RECORD_DTYPE)
+    slots = np.zeros(_slot_count(len(records)), dtype=SLOT_DTYPE)
+    slots['record'] = EMPTY_SLOT
+    mask = len(slots) - 1
+    slot_hashes, slot_records = slots['hash'], slots['record']
+    for barcode, record in positions.items():
+        key = barcode_hash(barcode.encode('utf-8'))
+        slot = key & mask
+        while slot_records[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        slot_hashes[slot] = key
+        slot_records[slot] = record
+
+    records_offset = _aligned(_HEADER.size)
+    slots_offset = _aligned(records_offset + records.nbytes)
+    heap_offset = _aligned(slots_offset + slots.nbytes)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(records), len(slots), records_offset, slots_offset,
+                          heap_offset, len(heap), built_at, generation, SOURCES.index(source))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        for offset, data in ((0, header), (records_offset, records.tobytes()),
+                             (slots_offset, slots.tobytes()), (heap_offset, heap)):
+            f.write(bytes(offset - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    # Workers that mapped the old file keep its inode until they reopen
+    os.replace(temp_path, path)
+
+    stats = {'products': len(records), 'read': read, 'heap_bytes': len(heap), 'file_bytes': heap_offset + len(heap),
+             'elapsed_seconds': round(time.perf_counter() - started, 3)}
+    logger.info(f"Product store written to {path}: {stats}")
+    return stats
+
+
+def iter_table_products(chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Every product row as Product column values, streamed from the database"""
+    from sqlalchemy import select
+    from utils.database import get_engine
+
+    table = Product.__table__
+    statement = select(*[table.c[field] for field in Product.SERIALIZED_FIELDS])
+    with get_engine().connect() as connection:
+        result = connection.execution_options(yield_per=chunk_size).execute(statement)
+        for row in result.mappings():
+            yield dict(row)
+
+
+def iter_dump_products(path: str, fmt: Optional[str] = None,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Product column values of an OpenFoodFacts export, normalized as imports do"""
+    for rows in iter_product_chunks(path, fmt, chunk_size):
+        yield from rows
+
+
+class StoreState:
+    """One mapped version of the store file; replaced, never modified"""
+    __slots__ = ('map', 'records', 'slots', 'heap', 'mask', 'built_at', 'generation', 'source', 'identity')
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < _HEADER.size:
+            raise ValueError(f'{path} is not a product store')
+        (magic, version, products, slots, records_offset, slots_offset, heap_offset, heap_size, built_at,
+         generation, source) = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a version {FORMAT_VERSION} product store')
+        if source >= len(SOURCES):
+            raise ValueError(f'{path} has an unknown source')
+        if heap_offset + heap_size > len(self.map):
+            raise ValueError(f'{path} is truncated')
+        # Views over the mapping; nothing is read until a page is touched
+        self.records = np.frombuffer(self.map, dtype=RECORD_DTYPE, count=products, offset=records_offset)
+        self.slots = np.frombuffer(self.map, dtype=SLOT_DTYPE, count=slots, offset=slots_offset)
+        self.heap = memoryview(self.map)[heap_offset:heap_offset + heap_size]
+        self.mask = slots - 1
+        self.built_at = built_at
+        self.generation = generation
+        self.source = SOURCES[source]
+        self.identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+
+    def find(self, barcode: bytes) -> Optional[int]:
+        """Record number of a barcode: O(1) expected probes, no decoding"""
+        key = barcode_hash(barcode)
+        slot = key & self.mask
+        while True:
+            stored_hash, record, _ = self.slots[slot].item()
+            if record == EMPTY_SLOT:
+                return None
+            if stored_hash == key:
+                values = self.records[record]
+                offset, length = int(values['barcode_offset']), int(values['barcode_length'])
+                if self.heap[offset:offset + length] == barcode:
+                    return record
+            slot = (slot + 1) & self.mask
+
+    def _text(self, offset: int, length: int) -> Optional[str]:
+        if length == NULL_LENGTH:
+            return None
+        return str(self.heap[offset:offset + length], 'utf-8')
+
+    def product(self, record: int) -> Dict[str, Any]:
+        """A record as Product.to_dict(native=True) would return it"""
+        values = dict(zip(RECORD_DTYPE.names, self.records[record].item()))
+        product = {
+            'id': uuid.UUID(bytes=values['id']) if values['id'] != _NULL_ID else None,
+            'is_verified': bool(values['is_verified']) if values['is_verified'] >= 0 else None,
+        }
+        for field in DECIMAL_FIELDS:
+            value = values[field]
+            product[field] = Decimal(value).scaleb(-2) if value != NULL_INT32 else None
+        for field in INTEGER_FIELDS:
+            product[field] = values[field] if values[field] != NULL_INT32 else None
+        for field in TIME_FIELDS:
+            value = values[field]
+            product[field] = _EPOCH + timedelta(microseconds=value) if value != NULL_INT64 else None
+        for field in HEAP_FIELDS:
+            text = self._text(values[f'{field}_offset'], values[f'{field}_length'])
+            if text is not None and field in LIST_FIELDS:
+                text = text.split(_LIST_SEPARATOR) if text else []
+            elif text is not None and field in JSON_FIELDS:
+                text = json.loads(text)
+            product[field] = text
+        return {field: product[field] for field in Product.SERIALIZED_FIELDS}
+
+
+class ProductStore:
+    """
+    Barcode lookups against the store file. The file is opened on first use
+    and reopened when a rebuild replaced it; lookups read whichever
+    StoreState is current, so they never wait for a reload. A store built
+    before the current catalog generation, or from a dump (whose products
+    may not be in the table and have no ids), answers nothing.
+    """
+
+    def __init__(self, path: str = PRODUCT_STORE_PATH, check_interval: float = PRODUCT_STORE_CHECK_INTERVAL,
+                 catalog: Optional[CatalogGeneration] = None):
+        self.path = path
+        self.check_interval = check_interval
+        self.catalog = catalog or CatalogGeneration()
+        self._state: Optional[StoreState] = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _current(self) -> Optional[StoreState]:
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._state
+        with self._lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._state
+            try:
+                stat = os.stat(self.path)
+                identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+                if self._state is None or self._state.identity != identity:
+                    self._state = StoreState(self.path)
+                    logger.info(f"Product store opened: {len(self._state.records)} products from {self.path}")
+                    if self._state.source != 'table':
+                        logger.warning(f"Product store {self.path} was built from a {self._state.source}; not serving it")
+            except FileNotFoundError:
+                self._state = None
+            except (OSError, ValueError) as e:
+                # Keep serving the mapped version rather than failing lookups
+                logger.warning(f"Product store {self.path} not reopened: {e}")
+            self._checked_at = time.monotonic()
+        return self._state
+
+    def _servable(self) -> Optional[StoreState]:
+        state = self._current()
+        if state is None or state.source != 'table' or state.generation != self.catalog.current():
+            return None
+        return state
+
+    def get(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Product for a barcode, None when it is not in the store or there is no current store"""
+        state = self._servable()
+        if state is None:
+            return None
+        try:
+            key = barcode.encode('utf-8')
+        except (AttributeError, UnicodeEncodeError):
+            return None
+        record = state.find(key)
+        return state.product(record) if record is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        state = self._current()
+        if state is None:
+            return {'path': self.path, 'products': 0, 'built_at': None, 'serving': False}
+        return {
+            'path': self.path,
+            'products': len(state.records),
+            'built_at': datetime.fromtimestamp(state.built_at, timezone.utc).isoformat(),
+            'source': state.source,
+            'generation': state.generation,
+            'serving': self._servable() is not None
+        }
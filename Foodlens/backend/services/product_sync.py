@@ -0,0 +1,246 @@
+"""
+Product Sync for FoodLens Application
+Delta syncs of the OpenFoodFacts catalog: only products modified since the
+last sync are upserted, and only the changed ones are re-scored. The synced
+products are added to the product index snapshot.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import bindparam, select
+
+from utils.catalog_generation import bump_catalog_generation
+from utils.csv_loader import DEFAULT_CHUNK_SIZE, iter_records, normalize_chunk
+from utils.database import get_engine
+from utils.external_apis import OFF_PRODUCT_FIELDS, OpenFoodFactsClient
+from models.product import Product
+from services.allergen_service import allergen_service
+from services.nutri_score_service import GRADES, NutritionFrame, enhanced_nutri_score_calculator, score_frame
+from services.product_importer import upsert_products
+from services.product_index import INDEX_FIELDS, PRODUCT_INDEX_SNAPSHOT, open_snapshot, snapshot_lock
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_SYNC_STATE = os.getenv('PRODUCT_SYNC_STATE', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'product_sync.json'))
+
+# Product columns read for scoring, keyed by NutritionData field
+NUTRITION_COLUMNS = {
+    'energy_kj': 'energy_kj',
+    'energy_kcal': 'energy_kcal',
+    'fat': 'fat',
+    'saturated_fat': 'saturated_fat',
+    'carbohydrates': 'carbohydrates',
+    'sugars': 'sugars',
+    'fiber': 'fiber',
+    'proteins': 'protein',
+    'salt': 'salt',
+    'sodium': 'sodium',
+}
+# Source fields read by syncs: the product columns and the product index
+SYNC_FIELDS = tuple(dict.fromkeys(OFF_PRODUCT_FIELDS + INDEX_FIELDS))
+
+
+def _split_ingredients(text: Optional[str]) -> List[str]:
+    return [part.strip() for part in (text or '').split(',') if part.strip()]
+
+
+def precomputed_values(rows: Sequence, detect: Callable[[str], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    FoodLens Nutri-Score and detected allergens for product rows (barcode,
+    nutrition columns, nutrition_data, ingredients), scored as one frame.
+    Products without nutrition values get no score.
+    """
+    calculator = enhanced_nutri_score_calculator
+    records = []
+    for row in rows:
+        values = {field: float(value) for field, value in zip(NUTRITION_COLUMNS, row[1:1 + len(NUTRITION_COLUMNS)])
+                  if value is not None}
+        fvn = (row.nutrition_data or {}).get('fruits_vegetables_nuts')
+        if values and isinstance(fvn, (int, float)):
+            values['fruits_vegetables_nuts'] = float(fvn)
+        records.append(values)
+
+    frame = NutritionFrame.from_records(records).validate_and_convert()
+    fvn = frame['fruits_vegetables_nuts']
+    food_types = []
+    for index, row in enumerate(rows):
+        ingredients = _split_ingredients(row.ingredients)
+        if fvn[index] <= 0:
+            fvn[index] = calculator.estimate_fruits_vegetables_nuts_percentage(ingredients)
+        food_types.append(calculator.classify_food_type(ingredients, frame.row(index)))
+    scores = score_frame(frame, food_types) if rows else {'score': [], 'grade_index': []}
+
+    values = []
+    for index, row in enumerate(rows):
+        scored = bool(records[index])
+        values.append({
+            '_barcode': row.barcode,
+            '_grade': GRADES[int(scores['grade_index'][index])] if scored else None,
+            '_points': int(scores['score'][index]) if scored else None,
+            '_allergens': [allergen['name'][:50] for allergen in detect(row.ingredients)] if row.ingredients else None,
+        })
+    return values
+
+
+def precompute_products(barcodes: List[str]) -> int:
+    """Re-score and re-detect allergens for the given products; returns the rows updated"""
+    if not barcodes:
+        return 0
+    columns = [getattr(Product, column) for column in NUTRITION_COLUMNS.values()]
+    engine = get_engine()
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(Product.barcode, *columns, Product.nutrition_data, Product.ingredients)
+            .where(Product.barcode.in_(barcodes))
+        ).all()
+    values = precomputed_values(rows, allergen_service.detect_allergens)
+    if not values:
+        return 0
+
+    table = Product.__table__
+    statement = table.update().where(table.c.barcode == bindparam('_barcode')).values(
+        computed_nutri_score=bindparam('_grade'),
+        computed_nutri_score_points=bindparam('_points'),
+        detected_allergens=bindparam('_allergens'),
+        # Derived columns; the product itself did not change
+        updated_at=table.c.updated_at
+    )
+    with engine.begin() as connection:
+        connection.execute(statement, values)
+    # Scores and allergens are served with the product
+    bump_catalog_generation()
+    return len(values)
+
+
+def _modified_time(record: Dict[str, Any]) -> Optional[int]:
+    value = record.get('last_modified_t')
+    try:
+        return int(value) if value not in (None, '') and not isinstance(value, bool) else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ProductSync:
+    """
+    Upserts OpenFoodFacts products modified since the recorded high-water mark
+    (the newest last_modified_t seen by the previous sync), then precomputes
+    scores for the barcodes that actually changed. The mark only advances
+    when a sync completes and read its source back to the mark, so a failed
+    or truncated sync is repeated in full next time.
+    """
+
+    def __init__(self, state_path: str = PRODUCT_SYNC_STATE, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 writer: Callable[[List[Dict[str, Any]]], Dict[str, Any]] = upsert_products,
+                 precompute: Callable[[List[str]], int] = precompute_products,
+                 index_snapshot: Optional[str] = PRODUCT_INDEX_SNAPSHOT):
+        self.state_path = state_path
+        self.chunk_size = chunk_size
+        self.writer = writer
+        self.precompute = precompute
+        # Product index snapshot the synced products are added to; None to skip
+        self.index_snapshot = index_snapshot
+
+    def load_state(self) -> Dict[str, Any]:
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_state(self, state: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        temp_path = f'{self.state_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    def sync_records(self, records: Iterable[Dict[str, Any]], source: str, full: bool = False,
+                     complete: Callable[[], bool] = lambda: True) -> Dict[str, Any]:
+        """
+        Upsert the records modified at or after the high-water mark (all of
+        them when full). The mark itself is included: products modified in
+        the same second as the last sync are re-checked, and unchanged ones
+        cost nothing but the comparison. complete tells, once the records are
+        read, whether they reached back to the mark; if not, products older
+        than those read may still be missing and the previous mark is kept.
+        """
+        previous = self.load_state().get('high_water_mark')
+        since = None if full else previous
+        high_water_mark = since or 0
+        stats = {'records': 0, 'considered': 0, 'skipped': 0, 'inserted': 0, 'updated': 0,
+                 'unchanged': 0, 'precomputed': 0, 'indexed': 0}
+        started = time.perf_counter()
+        chunk = []
+        # The snapshot stays locked from open to save so concurrent imports keep their products
+        with snapshot_lock(self.index_snapshot) if self.index_snapshot else contextlib.nullcontext():
+            index = open_snapshot(self.index_snapshot) if self.index_snapshot else None
+
+            def flush():
+                rows = normalize_chunk(chunk)
+                stats['skipped'] += len(chunk) - len(rows)
+                if rows:
+                    result = self.writer(rows)
+                    for key in ('inserted', 'updated', 'unchanged'):
+                        stats[key] += result[key]
+                    if result['barcodes']:
+                        stats['precomputed'] += self.precompute(result['barcodes'])
+                    # Every considered product, so a sync repeated after a failure indexes it again
+                    if index is not None:
+                        stats['indexed'] += index.add_products(chunk)
+                chunk.clear()
+
+            for record in records:
+                stats['records'] += 1
+                modified = _modified_time(record)
+                if since is not None and modified is not None and modified < since:
+                    continue
+                if modified is not None:
+                    high_water_mark = max(high_water_mark, modified)
+                stats['considered'] += 1
+                chunk.append(record)
+                if len(chunk) >= self.chunk_size:
+                    flush()
+            if chunk:
+                flush()
+            if index is not None and stats['indexed']:
+                index.save(self.index_snapshot)
+
+        stats['complete'] = complete()
+        if not stats['complete']:
+            high_water_mark = previous or 0
+        stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+        self._save_state({
+            'high_water_mark': high_water_mark or None,
+            'previous_high_water_mark': since,
+            'source': source,
+            'synced_at': datetime.now(timezone.utc).isoformat(),
+            'last_sync': stats,
+        })
+        logger.info(f"Product sync from {source}: {stats}")
+        return dict(stats, high_water_mark=high_water_mark or None, since=since)
+
+    def sync_dump(self, path: str, fmt: Optional[str] = None, full: bool = False) -> Dict[str, Any]:
+        """Delta sync from an OpenFoodFacts export; unmodified records are read but not written"""
+        return self.sync_records(iter_records(path, fmt, fields=SYNC_FIELDS), source=path, full=full)
+
+    def sync_remote(self, client: Optional[OpenFoodFactsClient] = None, full: bool = False,
+                    max_pages: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Delta sync from the OpenFoodFacts search API, requesting only recently
+        modified pages. When max_pages stops the crawl before the mark, the
+        mark stays where it was.
+        """
+        client = client or OpenFoodFactsClient()
+        since = None if full else self.load_state().get('high_water_mark')
+        crawl = {'complete': False}
+
+        def records():
+            crawl['complete'] = yield from client.iter_modified(since, max_pages=max_pages, fields=SYNC_FIELDS)
+
+        return self.sync_records(records(), source=client.base_url, full=full, complete=lambda: crawl['complete'])
@@ -7,12 +7,16 @@ from datetime import datetime, date
 from typing import Dict, Any, List, Optional
 import uuid
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from utils.database import Database
 from models.user import User
 from models.user_profile import UserProfile
 from models.allergen import Allergen, UserAllergen
 from models.nutrition_goal import NutritionGoal
 from utils.validators import profile_validator
+from services.allergen_service import allergen_service
+from services.auth_service import auth_service
+from services.dashboard_service import dashboard_service
 
 class UserService:
     def __init__(self):
@@ -118,7 +122,9 @@ class UserService:
         """Get user's allergen list."""
         session = self.db.connect()
         try:
+            # to_dict reads the allergen name; load it in the same query
             user_allergens = session.query(UserAllergen)\
+                .options(joinedload(UserAllergen.allergen))\
                 .filter(UserAllergen.user_id == user_id)\
                 .all()
             
@@ -175,6 +181,7 @@ class UserService:
             
             session.add(user_allergen)
             session.commit()
+            allergen_service.invalidate_user(user_id)
             
             return {
                 'success': True,
@@ -201,6 +208,7 @@ class UserService:
             
             session.delete(user_allergen)
             session.commit()
+            allergen_service.invalidate_user(user_id)
             
             return {
                 'success': True,
@@ -260,11 +268,14 @@ class UserService:
             
             user.updated_at = datetime.utcnow()
             session.commit()
+            auth_service.invalidate_principal(user_id)
             
             return {
                 'success': True,
                 'message': 'Basic information updated successfully',
-                'user': user.to_dict()
+                'user': user.to_dict(),
+                # Tokens carry the username; older tokens keep the old one until refreshed
+                'access_token': auth_service.issue_token(user)
             }
             
         except Exception as e:
@@ -273,6 +284,31 @@ class UserService:
         finally:
             self.db.close(session)
     
+    def deactivate_user(self, user_id: str) -> Dict[str, Any]:
+        """Deactivate user account; existing tokens stop working immediately."""
+        session = self.db.connect()
+        try:
+            user = session.query(User).filter(User.id == user_id).first()
+            if not user:
+                return {'success': False, 'error': 'User not found'}
+            
+            user.is_active = False
+            user.updated_at = datetime.utcnow()
+            auth_service.revoke_tokens(user)
+            session.commit()
+            auth_service.token_revoked(user)
+            
+            return {
+                'success': True,
+                'message': 'Account deactivated successfully'
+            }
+            
+        except Exception as e:
+            session.rollback()
+            return {'success': False, 'error': f'Failed to deactivate account: {str(e)}'}
+        finally:
+            self.db.close(session)
+    
     def get_nutrition_goals(self, user_id: str) -> Dict[str, Any]:
         """Get user's nutrition goals."""
         session = self.db.connect()
@@ -406,48 +442,14 @@ class UserService:
     
     def get_user_dashboard(self, user_id: str) -> Dict[str, Any]:
         """Get user dashboard data."""
-        session = self.db.connect()
         try:
-            from models.analysis import Analysis
-            from models.recommendation import Recommendation
-            
-            # Get recent analyses
-            recent_analyses = session.query(Analysis)\
-                .filter(Analysis.user_id == user_id)\
-                .order_by(Analysis.created_at.desc())\
-                .limit(5)\
-                .all()
-            
-            # Get unread recommendations
-            unread_recommendations = session.query(Recommendation)\
-                .filter(Recommendation.user_id == user_id, Recommendation.is_read == False)\
-                .order_by(Recommendation.created_at.desc())\
-                .limit(10)\
-                .all()
-            
-            # Get active nutrition goals
-            active_goals = session.query(NutritionGoal)\
-                .filter(NutritionGoal.user_id == user_id, NutritionGoal.is_active == True)\
-                .all()
-            
             return {
                 'success': True,
-                'dashboard': {
-                    'recent_analyses': [analysis.to_dict() for analysis in recent_analyses],
-                    'unread_recommendations': [rec.to_dict() for rec in unread_recommendations],
-                    'active_goals': [goal.to_dict() for goal in active_goals],
-                    'stats': {
-                        'total_analyses': len(recent_analyses),
-                        'unread_recommendations_count': len(unread_recommendations),
-                        'active_goals_count': len(active_goals)
-                    }
-                }
+                'dashboard': dashboard_service.get_dashboard(user_id)
             }
             
         except Exception as e:
             return {'success': False, 'error': f'Failed to retrieve dashboard: {str(e)}'}
-        finally:
-            self.db.close(session)
 
 # Global user service instance
 user_service = UserService()
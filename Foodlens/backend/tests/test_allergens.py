@@ -0,0 +1,69 @@
+"""
+Tests for allergen detection
+Compiled matcher and per-user allergen warnings.
+"""
+
+import time
+import pytest
+
+from services.allergen_service import AllergenMatcher, AllergenService
+
+ALLERGENS = [
+    {'id': 1, 'name': 'Laktoz', 'severity_level': 'moderate', 'is_major_allergen': True,
+     'common_sources': ['milk', 'cheese', 'butter', 'süt'], 'alternative_names': ['lactose']},
+    {'id': 2, 'name': 'Yer fıstığı', 'severity_level': 'severe', 'is_major_allergen': True,
+     'common_sources': ['peanuts', 'peanut butter'], 'alternative_names': ['groundnut']},
+    {'id': 3, 'name': 'Fındık', 'severity_level': 'severe', 'is_major_allergen': True,
+     'common_sources': ['hazelnuts'], 'alternative_names': None},
+]
+
+@pytest.fixture
+def service():
+    """AllergenService with a prebuilt matcher and no database access."""
+    service = AllergenService()
+    service._matcher = AllergenMatcher(ALLERGENS)
+    service._stale = False
+    service._checked_at = time.monotonic()
+    return service
+
+class TestAllergenMatcher:
+    """Test the compiled allergen matcher."""
+
+    def test_matches_names_sources_and_suffixes(self):
+        """Terms match case-insensitively, with Turkish i folding and short suffixes."""
+        hits = AllergenMatcher(ALLERGENS).match(['Şeker', 'SÜTLÜ çikolata', 'FINDIK ezmesi', 'Whole Milk'])
+        assert hits == {1: ['süt', 'milk'], 3: ['findik']}
+
+    def test_longest_term_wins(self):
+        """A multi-word term is reported instead of its prefix."""
+        hits = AllergenMatcher(ALLERGENS).match('peanut butter, salt')
+        assert hits == {2: ['peanut butter']}
+
+    def test_requires_word_start(self):
+        """Terms inside longer words do not match."""
+        assert AllergenMatcher(ALLERGENS).match('nonmilk creamer, cheesecloth') == {}
+        assert AllergenMatcher([]).match('milk') == {}
+
+class TestAllergenService:
+    """Test allergen warnings for users."""
+
+    def test_warnings_only_for_user_allergens(self, service, monkeypatch):
+        """Warnings are the intersection of detected allergens and the user's profile."""
+        monkeypatch.setattr(service, 'get_user_allergens', lambda user_id: ((3, 'severe'), (99, 'mild')))
+        result = service.check_ingredients(['milk', 'hazelnuts'], user_id='user-1')
+        assert result['success']
+        assert [a['allergen_id'] for a in result['detected_allergens']] == [1, 3]
+        assert [(w['allergen_id'], w['severity']) for w in result['allergen_warnings']] == [(3, 'severe')]
+
+    def test_anonymous_gets_no_warnings(self, service):
+        """Without a user only detection runs."""
+        result = service.check_ingredients('milk')
+        assert result['allergen_warnings'] == []
+        assert result['detected_allergens'][0]['name'] == 'Laktoz'
+
+    def test_user_cache_invalidation(self, service):
+        """Invalidating a user drops their cached allergen profile."""
+        service._user_allergens.set('user-1', ((1, 'mild'),))
+        assert service.get_user_allergens('user-1') == ((1, 'mild'),)
+        service.invalidate_user('user-1')
+        assert 'user-1' not in service._user_allergens
@@ -1 +1,256 @@
-# Tests for product analysis functionality
+"""
+Tests for product analysis functionality
+Nutri-Score data structures and scoring.
+"""
+
+import math
+import pytest
+import numpy as np
+from services.nutri_score_service import (
+    NutritionData,
+    NutritionFrame,
+    NUTRITION_FIELDS,
+    enhanced_nutri_score_calculator,
+)
+
+def _random_records(count, seed=7):
+    """Nutrition value dicts including missing, negative, NaN and oversized values."""
+    rng = np.random.default_rng(seed)
+    records = []
+    for _ in range(count):
+        record = {}
+        for name in NUTRITION_FIELDS:
+            roll = rng.random()
+            if roll < 0.15:
+                continue
+            elif roll < 0.2:
+                record[name] = float('nan')
+            elif roll < 0.25:
+                record[name] = -float(rng.random() * 10)
+            else:
+                record[name] = float(rng.random() * 120)
+        records.append(record)
+    return records
+
+class TestNutritionData:
+    """Test the slotted NutritionData structure."""
+    
+    def test_has_fixed_layout(self):
+        """NutritionData instances do not carry a __dict__."""
+        nutrition = NutritionData()
+        assert not hasattr(nutrition, '__dict__')
+        with pytest.raises(AttributeError):
+            nutrition.unknown_field = 1.0
+    
+    def test_from_values_ignores_unknown_and_non_numeric(self):
+        """Unknown keys and non-numeric values are skipped."""
+        nutrition = NutritionData.from_values({'fat': 3, 'sugars': 'n/a', 'to_dict': 1.0})
+        assert nutrition.fat == 3.0
+        assert nutrition.sugars == 0.0
+        assert list(nutrition.to_dict()) == list(NUTRITION_FIELDS)
+    
+    def test_validate_and_convert(self):
+        """Unit conversions and range validation."""
+        nutrition = NutritionData(energy_kcal=100, salt=1.0, fat=5, saturated_fat=9, sugars=float('nan'))
+        nutrition.validate_and_convert()
+        assert nutrition.energy_kj == pytest.approx(418.4)
+        assert nutrition.sodium == pytest.approx(400)
+        assert nutrition.saturated_fat == 5.0
+        assert nutrition.sugars == 0.0
+
+class TestNutritionFrame:
+    """Test the columnar NutritionFrame."""
+    
+    def test_columns_are_contiguous(self):
+        """Each nutrient column is a contiguous float64 view into the frame."""
+        frame = NutritionFrame.from_columns({'fat': [1.0, 2.0], 'sugars': [3.0, 4.0]})
+        assert len(frame) == 2
+        assert frame['fat'].flags['C_CONTIGUOUS']
+        frame['fat'][0] = 5.0
+        assert frame.row(0).fat == 5.0
+        assert frame.row(1).sugars == 4.0
+    
+    def test_vectorized_validation_matches_scalar(self):
+        """Vectorized validate_and_convert matches NutritionData row by row."""
+        records = _random_records(500)
+        frame = NutritionFrame.from_records(records).validate_and_convert()
+        
+        for index, record in enumerate(records):
+            expected = NutritionData.from_values(record)
+            expected.validate_and_convert()
+            actual = frame.row(index)
+            for name in NUTRITION_FIELDS:
+                expected_value = getattr(expected, name)
+                actual_value = getattr(actual, name)
+                if math.isnan(expected_value):
+                    assert math.isnan(actual_value)
+                else:
+                    assert actual_value == pytest.approx(expected_value), (index, name)
+    
+    def test_from_nutrition_round_trip(self):
+        """Frames built from NutritionData objects keep field order."""
+        items = [NutritionData(fat=1.0, sodium=2.0), NutritionData(fiber=3.0)]
+        frame = NutritionFrame.from_nutrition(items)
+        assert frame.row(0) == items[0]
+        assert frame.row(1) == items[1]
+
+class TestNutriScoreCalculator:
+    """Test Nutri-Score calculation."""
+    
+    def test_nutrition_data_in_response(self):
+        """calculate_nutri_score reports every nutrition field."""
+        nutrition = NutritionData(energy_kj=1500, sugars=20, fat=10, saturated_fat=4, sodium=300, proteins=5)
+        result = enhanced_nutri_score_calculator.calculate_nutri_score(nutrition, ['sugar', 'wheat flour'])
+        assert set(result['nutrition_data']) == set(NUTRITION_FIELDS)
+        assert result['grade'] in 'ABCDE'
+
+class TestNutriScoreEngine:
+    """Test the threshold tables and vectorized scoring engine."""
+    
+    def test_points_table_boundaries(self):
+        """Values on a threshold stay in the lower band; NaN scores the maximum."""
+        from services.nutri_score_service import PointsTable
+        table = PointsTable([40, 60, 80], [0, 1, 2, 5])
+        assert table.points_for(40) == 0
+        assert table.points_for(40.01) == 1
+        assert table.points_for(81) == 5
+        assert table.points_for(float('nan')) == 5
+        assert table.band(50) == (40.0, 60.0)
+        assert table.points_array(np.array([40, 40.01, 81, np.nan])).tolist() == [0, 1, 5, 5]
+    
+    def test_score_frame_matches_scalar(self):
+        """score_frame gives the same points as calculate_nutri_score_points."""
+        from services.nutri_score_service import score_frame
+        rng = np.random.default_rng(11)
+        food_types = ['general_food', 'beverage', 'cheese', 'added_fat', 'breakfast_cereal']
+        records = [{
+            'energy_kj': float(rng.uniform(0, 4000)),
+            'saturated_fat': float(rng.uniform(0, 15)),
+            'sugars': float(rng.uniform(0, 60)),
+            'sodium': float(rng.uniform(0, 1200)),
+            'fruits_vegetables_nuts': float(rng.uniform(0, 100)),
+            'fiber': float(rng.uniform(0, 8)),
+            'proteins': float(rng.uniform(0, 15)),
+        } for _ in range(300)]
+        row_types = [food_types[index % len(food_types)] for index in range(len(records))]
+        
+        scored = score_frame(NutritionFrame.from_records(records), row_types)
+        for index, (record, food_type) in enumerate(zip(records, row_types)):
+            expected = enhanced_nutri_score_calculator.calculate_nutri_score_points(
+                NutritionData.from_values(record), food_type
+            )
+            for key, value in expected.items():
+                if key not in ('food_type', 'algorithm_version'):
+                    assert int(scored[key][index]) == value, (index, key)
+
+class TestReformulation:
+    """Test what-if reformulation analysis."""
+    
+    def test_grade_boundaries_and_grid(self):
+        """Reducing sugar to the reported target reaches the reported grade."""
+        nutrition = NutritionData(energy_kj=1500, sugars=30, carbohydrates=60, fat=12,
+                                  saturated_fat=6, salt=1.5, fiber=1, proteins=4)
+        nutrition.validate_and_convert()
+        result = enhanced_nutri_score_calculator.analyze_reformulation(
+            nutrition, food_type='general_food',
+            grid={'sugars': {'min_change': -100, 'max_change': 0, 'steps': 5}, 'salt': [0.5, 1.5]}
+        )
+        
+        better = result['nutrients']['sugars']['better_grade']
+        assert better is not None
+        assert better['grade'] < result['grade']
+        
+        reformulated = NutritionData.from_values(nutrition.to_dict())
+        reformulated.sugars = better['target_value']
+        rescored = enhanced_nutri_score_calculator.calculate_nutri_score_points(reformulated, 'general_food')
+        assert rescored['score'] == better['score']
+        
+        grid = result['grid']
+        assert [len(axis['values']) for axis in grid['axes']] == [5, 2]
+        assert grid['scores'][-1][-1] == result['score']
+        assert grid['scores'][0][0] <= grid['scores'][-1][-1]
+    
+    def test_rejects_unknown_nutrient(self):
+        """Unknown grid nutrients are rejected."""
+        with pytest.raises(ValueError):
+            enhanced_nutri_score_calculator.analyze_reformulation(
+                NutritionData(sugars=10), food_type='general_food', grid={'caffeine': [1, 2]}
+            )
+    
+    def test_endpoint_rejects_malformed_grid(self):
+        """Malformed grids get 400 from the endpoint instead of failing in the engine."""
+        from flask import Flask
+        from controllers.nutrition_analysis_controller import nutrition_analysis_bp
+        
+        app = Flask(__name__)
+        app.config['RATE_LIMIT_ENABLED'] = False
+        app.register_blueprint(nutrition_analysis_bp)
+        client = app.test_client()
+        nutrition = {'sugars': 30, 'energy_kj': 1500}
+        for grid in ([1, 2], 'sugars', {'sugars': 5}, {'sugars': []}, {'sugars': ['a']},
+                     {'sugars': {'steps': 0}}, {'sugars': {'steps': 2.5}}, {'sugars': {'min_change': 'x'}},
+                     {'caffeine': [1]}):
+            response = client.post('/reformulation', json={'nutrition': nutrition, 'grid': grid})
+            assert response.status_code == 400, grid
+            assert response.get_json()['success'] is False
+        response = client.post('/reformulation', json={'nutrition': nutrition, 'grid': {'sugars': [10, 20]}})
+        assert response.status_code == 200
+
+class TestAlgorithmVersions:
+    """Test the versioned algorithm registry."""
+    
+    def test_unknown_version_rejected(self):
+        """Unregistered versions raise ValueError."""
+        from services.nutri_score_service import get_algorithm
+        assert get_algorithm().version == '2017'
+        with pytest.raises(ValueError):
+            get_algorithm('1999')
+    
+    def test_2023_score_frame_matches_scalar(self):
+        """The 2023 rules score the same vectorized and one product at a time."""
+        from services.nutri_score_service import score_frame, GRADES
+        records = _random_records(300, seed=23)
+        frame = NutritionFrame.from_records(records).validate_and_convert()
+        food_types = ['general_food', 'beverage', 'cheese', 'added_fat']
+        row_types = [food_types[index % len(food_types)] for index in range(len(records))]
+        
+        scored = score_frame(frame, row_types, version='2023')
+        for index, food_type in enumerate(row_types):
+            result = enhanced_nutri_score_calculator.calculate_nutri_score_points(frame.row(index), food_type, '2023')
+            assert result['algorithm_version'] == '2023'
+            assert int(scored['score'][index]) == result['score'], index
+            assert int(scored['salt_points'][index]) == result['salt_points'], index
+    
+    def test_2023_rules(self):
+        """Salt is scored in grams, beverages never grade A and added fats use the saturated fat ratio."""
+        from services.nutri_score_service import get_algorithm
+        algorithm = get_algorithm('2023')
+        nutrition = NutritionData(salt=1.1, fat=50, saturated_fat=10)
+        points = algorithm.component_points(nutrition, 'added_fat')
+        assert points['salt'] == 5
+        assert points['saturated_fat'] == 2  # 20% of fat is saturated
+        assert points['energy'] == 3  # 370 kJ from saturates
+        assert algorithm.grade_for_score(-10, 'beverage') == 'B'
+        assert algorithm.grade_for_score(-10, 'general_food') == 'A'
+    
+    def test_grade_migration(self):
+        """The migration matrix counts every product once; a version against itself is diagonal."""
+        from services.nutri_score_service import grade_migration
+        frame = NutritionFrame.from_records(_random_records(200, seed=5)).validate_and_convert()
+        matrix = grade_migration(frame, 'general_food', '2017', '2023')
+        assert matrix.shape == (5, 5)
+        assert matrix.sum() == 200
+        same = grade_migration(frame, 'general_food', '2017', '2017')
+        assert np.count_nonzero(same - np.diag(np.diag(same))) == 0
+    
+    def test_reformulation_under_2023(self):
+        """Reformulation targets are valid for the selected version."""
+        nutrition = NutritionData(energy_kj=1500, sugars=30, carbohydrates=60, fat=12,
+                                  saturated_fat=6, salt=1.5, fiber=1, proteins=4)
+        result = enhanced_nutri_score_calculator.analyze_reformulation(
+            nutrition, food_type='general_food', version='2023'
+        )
+        assert result['algorithm_version'] == '2023'
+        better = result['nutrients']['salt']['better_grade'] or result['nutrients']['sugars']['better_grade']
+        assert better is not None
+        assert result['nutrients']['salt']['points'] == 7
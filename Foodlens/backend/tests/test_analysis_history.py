@@ -0,0 +1,104 @@
+"""
+Tests for the analysis history service
+Cursor encoding, the keyset statement and page assembly.
+"""
+
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from services.analysis_service import (
+    AnalysisService, InvalidCursor, LIST_FIELDS, decode_cursor, encode_cursor, history_statement
+)
+
+USER_ID = '6f1c1d2e-8c49-4a55-9d4e-1f2a3b4c5d6e'
+Row = namedtuple('Row', LIST_FIELDS)
+
+def make_rows(count):
+    start = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    return [Row(uuid.uuid4(), None, 'ocr', None, None, None, 'completed', False, None,
+                start - timedelta(minutes=index)) for index in range(count)]
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        limit = statement._limit
+        rows = self.rows
+
+        class Result:
+            def all(self):
+                return rows[:limit]
+        return Result()
+
+@pytest.fixture
+def service(monkeypatch):
+    service = AnalysisService()
+    session = FakeSession(make_rows(5))
+    monkeypatch.setattr(service.db, 'connect', lambda: session)
+    monkeypatch.setattr(service.db, 'close', lambda s: None)
+    service.session = session
+    return service
+
+class TestCursor:
+    """Test the opaque pagination cursor."""
+
+    def test_round_trip(self):
+        """A cursor decodes to the position it was made from."""
+        created_at, analysis_id = datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc), uuid.uuid4()
+        assert decode_cursor(encode_cursor(created_at, analysis_id)) == (created_at, analysis_id)
+
+    @pytest.mark.parametrize('cursor', ['', 'not-a-cursor', encode_cursor(datetime(2024, 1, 1), 'x')])
+    def test_invalid(self, cursor):
+        """Malformed cursors raise InvalidCursor."""
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor)
+
+class TestHistoryStatement:
+    """Test the keyset statement."""
+
+    def test_list_columns_only(self):
+        """The listing never selects the JSONB documents."""
+        sql = str(history_statement(USER_ID, None, 21).compile(dialect=postgresql.dialect()))
+        assert 'detailed_analysis' not in sql and 'input_data' not in sql
+        assert 'ORDER BY analyses.created_at DESC, analyses.id DESC' in sql
+
+    def test_seeks_past_cursor(self):
+        """Later pages filter on (created_at, id) instead of using OFFSET."""
+        position = (datetime(2024, 5, 1, tzinfo=timezone.utc), uuid.uuid4())
+        sql = str(history_statement(USER_ID, position, 21).compile(dialect=postgresql.dialect()))
+        assert '(analyses.created_at, analyses.id) <' in sql
+        assert 'OFFSET' not in sql
+
+class TestListAnalyses:
+    """Test page assembly."""
+
+    def test_pages(self, service):
+        """Pages follow next_cursor until has_more is false."""
+        first = service.list_analyses(USER_ID, limit=3)
+        assert first['success'] and first['has_more']
+        assert len(first['analyses']) == 3
+        assert decode_cursor(first['next_cursor']) == (first['analyses'][-1]['created_at'],
+                                                        first['analyses'][-1]['id'])
+
+        service.session.rows = service.session.rows[3:]
+        second = service.list_analyses(USER_ID, cursor=first['next_cursor'], limit=3)
+        assert len(second['analyses']) == 2
+        assert second['has_more'] is False and second['next_cursor'] is None
+
+    def test_limit_is_capped(self, service):
+        """Requests for huge pages are capped at the maximum page size."""
+        service.list_analyses(USER_ID, limit=10000)
+        assert service.session.statements[-1]._limit == 101
+
+    def test_invalid_cursor(self, service):
+        """An invalid cursor is reported without querying."""
+        result = service.list_analyses(USER_ID, cursor='garbage')
+        assert result['success'] is False and result['error'].startswith('Invalid cursor')
+        assert service.session.statements == []
@@ -0,0 +1,206 @@
+"""
+Tests for the write-behind analysis recorder
+Batching, spool replay after a crash, failures and read-your-writes.
+"""
+
+import fcntl
+import io
+import json
+import os
+import time
+import uuid
+from decimal import Decimal
+
+import pytest
+
+from services import analysis_recorder as analysis_recorder_module
+from services import analysis_service as analysis_service_module
+from services.analysis_recorder import AnalysisRecorder, read_spool
+from services.analysis_service import AnalysisService
+
+USER_ID = '6f1c1d2e-8c49-4a55-9d4e-1f2a3b4c5d6e'
+
+class ListWriter:
+    """Stands in for insert_analyses, keeping rows in memory."""
+
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    def __call__(self, rows):
+        if self.fail:
+            raise ConnectionError('database unavailable')
+        self.batches.append(rows)
+        return len(rows)
+
+@pytest.fixture
+def writer():
+    return ListWriter()
+
+@pytest.fixture
+def recorder(tmp_path, writer):
+    # A long interval keeps the background thread out of the way; tests flush explicitly
+    recorder = AnalysisRecorder(spool_dir=str(tmp_path), writer=writer, batch_size=100, flush_interval=3600)
+    yield recorder
+    writer.fail = True
+    recorder.stop(timeout=1)
+
+def spooled(recorder):
+    with open(recorder._spool_path, encoding='utf-8') as spool:
+        return read_spool(spool)
+
+class TestRecording:
+    """Test queueing and batched flushes."""
+
+    def test_record_then_flush(self, recorder, writer):
+        """Rows are queued and spooled, then written in batches and acknowledged."""
+        ids = [recorder.record(USER_ID, 'ocr', health_score=Decimal('7.5')).id for _ in range(3)]
+        assert recorder.get_stats()['queue_depth'] == 3
+        recorder.batch_size = 2
+        assert list(spooled(recorder)) == [str(analysis_id) for analysis_id in ids]
+
+        assert recorder.flush() == 3
+        assert [len(batch) for batch in writer.batches] == [2, 1]
+        row = writer.batches[0][0]
+        assert row['id'] == ids[0] and row['user_id'] == uuid.UUID(USER_ID)
+        assert row['health_score'] == Decimal('7.5') and row['status'] == 'completed'
+        assert recorder.get(ids[0]) is None
+        assert spooled(recorder) == {}
+
+        stats = recorder.get_stats()
+        assert stats['queue_depth'] == 0 and stats['rows_written'] == 3 and stats['batches'] == 2
+
+    def test_background_flush(self, tmp_path, writer):
+        """A full batch wakes the flusher thread."""
+        recorder = AnalysisRecorder(spool_dir=str(tmp_path), writer=writer, batch_size=2, flush_interval=3600)
+        try:
+            recorder.record(USER_ID, 'ocr')
+            recorder.record(USER_ID, 'ocr')
+            deadline = time.monotonic() + 5
+            while not writer.batches and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(writer.batches) == 1
+        finally:
+            recorder.stop(timeout=1)
+
+    def test_unknown_field(self, recorder):
+        """Fields that are not analysis columns are rejected."""
+        with pytest.raises(TypeError):
+            recorder.record(USER_ID, 'ocr', grade='A')
+
+    def test_queue_limit(self, recorder):
+        """Beyond max_pending, record() refuses instead of growing without bound."""
+        recorder.max_pending = 1
+        assert recorder.record(USER_ID, 'ocr') is not None
+        assert recorder.record(USER_ID, 'ocr') is None
+        assert recorder.get_stats()['rejected'] == 1
+
+    def test_failed_flush_keeps_rows(self, recorder, writer):
+        """A failed batch stays queued and spooled for the next attempt."""
+        analysis = recorder.record(USER_ID, 'ocr')
+        writer.fail = True
+        with pytest.raises(ConnectionError):
+            recorder.flush()
+        assert recorder.get(analysis.id) is analysis
+        assert recorder.get_stats()['failures'] == 1
+
+        writer.fail = False
+        assert recorder.flush() == 1
+
+class TestSpool:
+    """Test the spool file."""
+
+    def test_acknowledged_rows_are_not_replayed(self):
+        """Only rows added and never marked done are outstanding."""
+        spool = io.StringIO('\n'.join([
+            json.dumps({'add': {'id': 'a'}}), json.dumps({'add': {'id': 'b'}}),
+            json.dumps({'done': ['a']}), '{"add": {"id": "c"'  # torn write
+        ]))
+        assert list(read_spool(spool)) == ['b']
+
+    def test_replay_after_crash(self, tmp_path, writer):
+        """Rows spooled by a process that died are written by the next one."""
+        crashed = AnalysisRecorder(spool_dir=str(tmp_path), writer=writer, batch_size=100, flush_interval=3600)
+        ids = [crashed.record(USER_ID, 'ocr', processing_time=Decimal('1.25')).id for _ in range(3)]
+        crashed._write([crashed.get(ids[0])])
+        # Dies without flushing: the file handle (and its lock) goes away with the process
+        crashed._spool.close()
+        crashed._spool = None
+        crashed._stopping = True
+
+        restarted = AnalysisRecorder(spool_dir=str(tmp_path), writer=writer, batch_size=100, flush_interval=3600)
+        try:
+            restarted.start()
+            assert restarted.get_stats()['replayed'] == 2
+            assert restarted.get(ids[1]).processing_time == Decimal('1.25')
+            restarted.flush()
+            assert [row['id'] for row in writer.batches[-1]] == ids[1:]
+            assert len(list(tmp_path.glob('*.jsonl'))) == 1
+        finally:
+            restarted.stop(timeout=1)
+
+    def test_compacted_spool_stays_locked(self, recorder, writer, tmp_path, monkeypatch):
+        """Compaction swaps in an already-locked file, so other workers never replay the live spool."""
+        recorder.start()
+        # A second worker process on the same spool directory
+        other = AnalysisRecorder(spool_dir=str(tmp_path), writer=writer, batch_size=100, flush_interval=3600)
+        getpid = os.getpid
+        monkeypatch.setattr(os, 'getpid', lambda: getpid() + 1)
+        other.start()
+        monkeypatch.setattr(os, 'getpid', getpid)
+        try:
+            monkeypatch.setattr(analysis_recorder_module, 'ANALYSIS_SPOOL_COMPACT_BYTES', 0)
+            replace = os.replace
+
+            def replace_then_replay(source, target):
+                # Another worker looks for orphans right as the compacted spool is renamed
+                replace(source, target)
+                other._replay_orphans()
+            monkeypatch.setattr(os, 'replace', replace_then_replay)
+
+            ids = [recorder.record(USER_ID, 'ocr').id for _ in range(2)]
+            recorder._write([recorder.get(ids[0])])
+            monkeypatch.setattr(os, 'replace', replace)
+
+            assert other.get_stats()['replayed'] == 0
+            assert list(spooled(recorder)) == [str(ids[1])]
+            assert os.fstat(recorder._spool.fileno()).st_ino == os.stat(recorder._spool_path).st_ino
+            with open(recorder._spool_path, encoding='utf-8') as spool:
+                with pytest.raises(BlockingIOError):
+                    fcntl.flock(spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        finally:
+            other.stop(timeout=1)
+
+class TestReadYourWrites:
+    """Test queued analyses in the history API."""
+
+    @pytest.fixture
+    def service(self, monkeypatch, recorder):
+        monkeypatch.setattr(analysis_service_module, 'analysis_recorder', recorder)
+        service = AnalysisService()
+
+        class EmptySession:
+            def execute(self, statement):
+                class Result:
+                    def all(self):
+                        return []
+                return Result()
+        monkeypatch.setattr(service.db, 'connect', lambda: EmptySession())
+        monkeypatch.setattr(service.db, 'close', lambda session: None)
+        return service
+
+    def test_detail_served_from_queue(self, service, recorder):
+        """A queued analysis is readable by its owner only."""
+        analysis = recorder.record(USER_ID, 'ocr', detailed_analysis={'grade': 'B'})
+        result = service.get_analysis(USER_ID, str(analysis.id))
+        assert result['success'] and result['analysis']['detailed_analysis'] == {'grade': 'B'}
+        assert service.get_analysis(str(uuid.uuid4()), str(analysis.id))['success'] is False
+
+    def test_listed_before_flush(self, service, recorder):
+        """Queued analyses appear in the user's history, newest first."""
+        queued = [recorder.record(USER_ID, 'ocr'), recorder.record(USER_ID, 'ocr')]
+        newest, oldest = sorted(queued, key=lambda analysis: (analysis.created_at, analysis.id), reverse=True)
+        page = service.list_analyses(USER_ID, limit=1)
+        assert [row['id'] for row in page['analyses']] == [newest.id]
+        page = service.list_analyses(USER_ID, cursor=page['next_cursor'], limit=1)
+        assert [row['id'] for row in page['analyses']] == [oldest.id] and page['has_more'] is False
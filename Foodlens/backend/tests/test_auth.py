@@ -1 +1,138 @@
-# Tests for authentication functionality
+"""
+Tests for authentication functionality
+Claims access tokens, revocation and the cached principal lookup.
+"""
+
+import pytest
+from flask import Flask
+
+from models.user import User
+from services.auth_service import AuthService
+
+USER_ID = '6f1c1d2e-8c49-4a55-9d4e-1f2a3b4c5d6e'
+
+@pytest.fixture
+def app():
+    """Minimal app providing the SECRET_KEY used for tokens."""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test-secret'
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def service(monkeypatch):
+    """AuthService whose token version table is loaded and holds no entries."""
+    service = AuthService()
+    monkeypatch.setattr(service.token_versions, 'refresh', lambda: None)
+    service.token_versions._loaded_at = float('inf')
+    return service
+
+def make_user(**overrides):
+    """Detached User as loaded from the database."""
+    user = User('ayse@example.com', 'Password123', 'ayse')
+    user.id = USER_ID
+    user.is_active = True
+    user.is_admin = False
+    user.token_version = 0
+    for name, value in overrides.items():
+        setattr(user, name, value)
+    return user
+
+def legacy_token(service, user_id):
+    """Token in the format issued before claims tokens (bare user id)."""
+    return service._get_serializer().dumps(user_id)
+
+class TestAccessTokenClaims:
+    """Test self-contained access tokens."""
+
+    def test_claims_verified_without_database(self, app, service, monkeypatch):
+        """A claims token yields the principal without opening a session."""
+        monkeypatch.setattr(service.db, 'connect', lambda: pytest.fail('database should not be used'))
+        result = service.verify_token(service._generate_token(make_user(is_admin=True)))
+        assert result['success']
+        assert result['user'] == {'id': USER_ID, 'username': 'ayse', 'is_active': True,
+                                  'is_admin': True, 'token_version': 0}
+
+    def test_version_bump_revokes_older_tokens(self, app, service):
+        """Tokens issued before a version bump are rejected, newer ones accepted."""
+        user = make_user()
+        old_token = service._generate_token(user)
+        service.revoke_tokens(user)
+        service.token_revoked(user)
+
+        assert service.verify_token(old_token)['error'] == 'Token has been revoked'
+        assert service.verify_token(service._generate_token(user))['success']
+
+    def test_deactivation_revokes_tokens(self, app, service):
+        """A deactivated user's tokens stop working even at the current version."""
+        user = make_user()
+        token = service._generate_token(user)
+        service.token_versions.record(USER_ID, 0, False)
+        assert not service.verify_token(token)['success']
+
+    def test_fails_closed_before_first_load(self, app, monkeypatch):
+        """Without a loaded version table claims tokens are rejected."""
+        service = AuthService()
+        def unavailable():
+            raise RuntimeError('database unavailable')
+        monkeypatch.setattr(service.token_versions, 'refresh', unavailable)
+        assert not service.verify_token(service._generate_token(make_user()))['success']
+
+    def test_refresh_resigns_offline(self, app, service, monkeypatch):
+        """Refreshing a current claims token does not touch the database."""
+        monkeypatch.setattr(service.db, 'connect', lambda: pytest.fail('database should not be used'))
+        result = service.refresh_token(service._generate_token(make_user()))
+        assert result['success']
+        assert service.verify_token(result['access_token'])['user']['id'] == USER_ID
+
+    def test_version_bump_revokes_legacy_tokens(self, app, service):
+        """Legacy bare-id tokens count as version 0 and are rejected after a bump."""
+        user = make_user()
+        service._principals.set(USER_ID, {'id': USER_ID, 'is_active': True})
+        token = legacy_token(service, USER_ID)
+        assert service.verify_token(token)['success']
+        service.revoke_tokens(user)
+        service.token_revoked(user)
+        assert service.verify_token(token)['error'] == 'Token has been revoked'
+
+    def test_reset_token_is_not_an_access_token(self, app, service):
+        """Password reset tokens share the secret but are rejected as access tokens."""
+        reset_token = service._get_serializer().dumps({'user_id': USER_ID, 'purpose': 'password_reset'})
+        assert not service.verify_token(reset_token)['success']
+
+class TestPrincipalCache:
+    """Test the cached principal lookup behind require_auth."""
+
+    def test_cached_principal_skips_database(self, app, service, monkeypatch):
+        """A legacy token is served from a cached principal without opening a session."""
+        monkeypatch.setattr(service.db, 'connect', lambda: pytest.fail('database should not be used'))
+        user_id = USER_ID
+        service._principals.set(user_id, {'id': user_id, 'username': 'ayse', 'is_active': True})
+
+        result = service.verify_token(legacy_token(service, user_id))
+        assert result['success']
+        assert result['user']['username'] == 'ayse'
+
+        # Callers get a copy, not the shared cache entry
+        result['user']['username'] = 'changed'
+        assert service.verify_token(legacy_token(service, user_id))['user']['username'] == 'ayse'
+
+    def test_invalidated_principal_is_reloaded(self, app, service, monkeypatch):
+        """After invalidation the next verification goes back to the database."""
+        user_id = USER_ID
+        service._principals.set(user_id, {'id': user_id, 'is_active': True})
+        service.invalidate_principal(user_id)
+
+        def unavailable():
+            raise RuntimeError('database unavailable')
+        monkeypatch.setattr(service.db, 'connect', unavailable)
+        result = service.verify_token(legacy_token(service, user_id))
+        assert not result['success']
+
+    def test_serializer_reused_until_secret_changes(self, app):
+        """The serializer is built once per SECRET_KEY."""
+        service = AuthService()
+        serializer = service._get_serializer()
+        assert service._get_serializer() is serializer
+        app.config['SECRET_KEY'] = 'rotated'
+        assert service._get_serializer() is not serializer
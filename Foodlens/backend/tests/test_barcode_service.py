@@ -0,0 +1,175 @@
+"""
+Tests for barcode lookups
+Cache, table and remote resolution order, negative caching, coalescing and the OpenFoodFacts client.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from services.barcode_service import BarcodeService, store_statement
+from utils.catalog_generation import CatalogGeneration, bump_catalog_generation
+from utils.external_apis import OpenFoodFactsClient, RemoteSourceError
+
+OFF_PRODUCTS = {
+    '8690504018018': {'code': '8690504018018', 'product_name': 'Sütlü Çikolata', 'brands': 'Ülker, Yıldız',
+                      'categories': 'Snacks, Chocolates', 'nutriscore_grade': 'e', 'nova_group': 4,
+                      'allergens_tags': ['en:milk'], 'nutriments': {'energy-kcal_100g': 545, 'sodium_100g': 0.04}},
+    '8690000000001': {'code': '8690000000001', 'brands': 'Eti'},
+}
+
+class OpenFoodFactsStub(BaseHTTPRequestHandler):
+    """Answers /api/v2/product/<barcode>.json like the OpenFoodFacts API."""
+    requests = []
+    delay = 0.0
+
+    def do_GET(self):
+        type(self).requests.append(self.path)
+        time.sleep(type(self).delay)
+        barcode = self.path.split('/')[-1].split('.json')[0]
+        if barcode == '5000000000005':
+            self.send_response(500)
+            self.end_headers()
+            return
+        product = OFF_PRODUCTS.get(barcode)
+        body = json.dumps({'status': 1, 'product': product} if product else {'status': 0}).encode()
+        self.send_response(200 if product else 404)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def off_server():
+    OpenFoodFactsStub.requests = []
+    OpenFoodFactsStub.delay = 0.0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OpenFoodFactsStub)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def service(off_server, monkeypatch):
+    client = OpenFoodFactsClient(off_server, timeout=5)
+    service = BarcodeService(client.fetch_product)
+    table = {'8690000000018': {'barcode': '8690000000018', 'name': 'Ayran'}}
+    service.table = table
+    service.table_reads = []
+
+    def find(barcode):
+        service.table_reads.append(barcode)
+        return table.get(barcode)
+
+    def save(fields):
+        table.setdefault(fields['barcode'], dict(fields, id='stored'))
+        return table[fields['barcode']]
+
+    monkeypatch.setattr(service, '_find', find)
+    monkeypatch.setattr(service, '_save', save)
+    yield service
+    client.close()
+
+class TestOpenFoodFactsClient:
+    """Test the pooled OpenFoodFacts client."""
+
+    def test_maps_product_fields(self, off_server):
+        """OFF products become products table columns."""
+        fields = OpenFoodFactsClient(off_server).fetch_product('8690504018018')
+        assert fields['name'] == 'Sütlü Çikolata' and fields['brand'] == 'Ülker'
+        assert fields['category'] == 'Snacks' and fields['nutri_score'] == 'E' and fields['nova_group'] == 4
+        assert fields['energy_kcal'] == 545.0 and fields['sodium'] == 40.0
+        assert fields['allergens'] == ['milk'] and fields['data_source'] == 'openfoodfacts'
+
+    def test_unknown_and_nameless(self, off_server):
+        """Unknown barcodes and products without a name are not found."""
+        client = OpenFoodFactsClient(off_server)
+        assert client.fetch_product('4000000000006') is None
+        assert client.fetch_product('8690000000001') is None
+
+    def test_server_error(self, off_server):
+        """5xx answers raise instead of looking like unknown barcodes."""
+        with pytest.raises(RemoteSourceError):
+            OpenFoodFactsClient(off_server).fetch_product('5000000000005')
+
+class TestLookup:
+    """Test resolution order and caching."""
+
+    def test_table_then_cache(self, service):
+        """Table hits are cached in process; the remote is not asked."""
+        assert service.lookup('8690000000018')['source'] == 'database'
+        assert service.lookup('8690000000018')['source'] == 'cache'
+        assert service.table_reads == ['8690000000018'] and OpenFoodFactsStub.requests == []
+
+    def test_remote_is_written_back(self, service):
+        """Remote products are stored in the table and then served from the cache."""
+        result = service.lookup('8690504018018')
+        assert result['source'] == 'remote' and result['product']['id'] == 'stored'
+        assert service.table['8690504018018']['name'] == 'Sütlü Çikolata'
+        assert service.lookup('8690504018018')['source'] == 'cache'
+        assert len(OpenFoodFactsStub.requests) == 1
+
+    def test_negative_cache(self, service):
+        """Unknown barcodes are remembered, so repeat scans do not reach the remote."""
+        for _ in range(3):
+            assert service.lookup('4000000000006')['error'] == 'Product not found'
+        assert len(OpenFoodFactsStub.requests) == 1
+        assert service.get_stats()['negative_hits'] == 2
+        service.invalidate('4000000000006')
+        service.lookup('4000000000006')
+        assert len(OpenFoodFactsStub.requests) == 2
+
+    def test_catalog_writes_drop_caches(self, service, tmp_path):
+        """A bump of the catalog generation by another process clears products and misses."""
+        service.catalog = CatalogGeneration(str(tmp_path / 'catalog_generation'), check_interval=0)
+        service.lookup('8690000000018')
+        service.lookup('4000000000006')
+        assert service.lookup('8690000000018')['source'] == 'cache'
+        assert len(service.table_reads) == 2 and len(OpenFoodFactsStub.requests) == 1
+
+        resets = service.get_stats()['generation_resets']
+        bump_catalog_generation(service.catalog.path)
+        assert service.lookup('8690000000018')['source'] == 'database'
+        service.lookup('4000000000006')
+        assert len(service.table_reads) == 4 and len(OpenFoodFactsStub.requests) == 2
+        assert service.get_stats()['generation_resets'] == resets + 1
+
+    def test_remote_errors_are_not_cached(self, service):
+        """An unavailable remote is retried on the next scan."""
+        for _ in range(2):
+            assert service.lookup('5000000000005')['error'] == 'Product source unavailable'
+        assert len(OpenFoodFactsStub.requests) == 2
+
+    def test_invalid_barcode(self, service):
+        """Malformed barcodes are rejected without any lookup."""
+        assert service.lookup('12ab')['error'].startswith('Invalid barcode')
+        assert service.lookup('123')['error'].startswith('Invalid barcode')
+        assert service.table_reads == []
+
+    def test_concurrent_lookups_coalesce(self, service):
+        """Simultaneous scans of one barcode make one table read and one remote fetch."""
+        OpenFoodFactsStub.delay = 0.2
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.lookup('8690504018018')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 8 and all(result['success'] for result in results)
+        assert len(OpenFoodFactsStub.requests) == 1 and len(service.table_reads) == 1
+        stats = service.get_stats()
+        assert stats['coalesced'] + stats['cache_hits'] == 7
+
+    def test_store_statement(self):
+        """Write-back never overwrites a row stored concurrently."""
+        sql = str(store_statement({'barcode': '1', 'name': 'x'}).compile(dialect=postgresql.dialect()))
+        assert 'ON CONFLICT (barcode) DO NOTHING' in sql
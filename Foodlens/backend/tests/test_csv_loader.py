@@ -0,0 +1,86 @@
+"""
+Tests for the streaming product loader
+JSON array, JSON Lines and CSV reading, field projection, vectorized nutrient normalization and chunked loading.
+"""
+
+import gzip
+import json
+
+import pytest
+
+from utils import csv_loader
+from utils.csv_loader import detect_format, iter_records, load_products, normalize_chunk
+
+PRODUCTS = [
+    {'code': '8690504018018', 'product_name': 'Sütlü Çikolata', 'brands': 'Ülker', 'nutriscore_grade': 'e',
+     'nutriments': {'energy-kcal_100g': 545, 'fat_100g': 31.456, 'sodium_100g': 0.04, 'carbon-footprint_100g': 9},
+     'allergens_tags': ['en:milk'], 'images': {'front': {'sizes': {}}}},
+    {'code': '8690000000018', 'product_name': 'Ayran', 'nutriments': {'salt_100g': '0.8', 'sugars_100g': -1,
+                                                                        'energy-kj_100g': True}},
+    {'code': '8690000000025', 'brands': 'Eti'},
+]
+
+class TestReaders:
+    """Test incremental readers for each format."""
+
+    def test_json_array_across_read_blocks(self, tmp_path, monkeypatch):
+        """Array elements split by the read boundary are decoded whole."""
+        monkeypatch.setattr(csv_loader, 'READ_BLOCK_SIZE', 7)
+        path = tmp_path / 'dump.json'
+        path.write_text(json.dumps(PRODUCTS, indent=2, ensure_ascii=False), encoding='utf-8')
+        records = list(iter_records(str(path)))
+        assert [record['code'] for record in records] == ['8690504018018', '8690000000018', '8690000000025']
+        # Unused fields are dropped while reading
+        assert 'images' not in records[0] and 'carbon-footprint_100g' not in records[0]['nutriments']
+
+    def test_json_lines(self, tmp_path):
+        """Gzipped JSON Lines are read line by line; malformed lines are skipped."""
+        path = tmp_path / 'dump.jsonl.gz'
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps(PRODUCTS[0]) + '\n{broken\n\n' + json.dumps(PRODUCTS[1]) + '\n')
+        assert [record['code'] for record in iter_records(str(path))] == ['8690504018018', '8690000000018']
+
+    def test_csv(self, tmp_path):
+        """Tab-separated OpenFoodFacts CSV rows take the shape of JSON products."""
+        path = tmp_path / 'export.csv'
+        path.write_text('code\tproduct_name\tallergens\tenergy-kcal_100g\tserving_quantity\n'
+                        '8690504018018\tSütlü Çikolata\ten:milk,en:nuts\t545\t25\n', encoding='utf-8')
+        record, = iter_records(str(path))
+        assert record['allergens_tags'] == ['en:milk', 'en:nuts']
+        assert record['nutriments'] == {'energy-kcal_100g': '545'} and record['serving_quantity'] == 25.0
+
+    def test_detect_format(self):
+        """Formats come from the file name, ignoring .gz."""
+        assert detect_format('a.ndjson.gz') == 'jsonl' and detect_format('b.tsv') == 'csv'
+        with pytest.raises(ValueError):
+            detect_format('c.xml')
+
+class TestNormalize:
+    """Test chunk normalization."""
+
+    def test_nutrients(self):
+        """Units are converted, values rounded to the column scale and invalid values dropped."""
+        chunk = normalize_chunk([csv_loader._project(product) for product in PRODUCTS])
+        assert len(chunk) == 2
+        chocolate, ayran = chunk
+        assert chocolate['fat'] == 31.46 and chocolate['sodium'] == 40.0 and chocolate['nutri_score'] == 'E'
+        assert ayran['salt'] == 0.8 and ayran['sugars'] is None and ayran['energy_kj'] is None
+
+    def test_out_of_range(self):
+        """Values the DECIMAL column cannot hold are dropped rather than failing the batch."""
+        row, = normalize_chunk([{'code': '1', 'product_name': 'Tuz', 'nutriments': {'sodium_100g': 39.3}}])
+        assert row['sodium'] is None
+
+class TestLoad:
+    """Test chunked loading."""
+
+    def test_chunks_and_progress(self, tmp_path):
+        """Rows reach the sink chunk by chunk and progress is reported after each."""
+        path = tmp_path / 'dump.jsonl'
+        path.write_text(''.join(json.dumps(dict(PRODUCTS[1], code=str(code))) + '\n' for code in range(7)))
+        batches, reports = [], []
+        stats = load_products(str(path), sink=batches.append, chunk_size=3,
+                              progress=lambda progress: reports.append(progress.to_dict()))
+        assert [len(batch) for batch in batches] == [3, 3, 1]
+        assert [report['rows'] for report in reports] == [3, 6, 7]
+        assert stats['records'] == 7 and stats['percent'] == 100.0
@@ -0,0 +1,123 @@
+"""
+Tests for the dashboard service
+Rehydrating single-statement rows, counters and the per-user cache.
+"""
+
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from models.analysis import Analysis
+from models.nutrition_goal import NutritionGoal
+from models.recommendation import Recommendation
+from models.user_stats import UserStats
+from services import dashboard_service as dashboard_module
+from services.dashboard_service import DashboardService, hydrate
+
+USER_ID = '6f1c1d2e-8c49-4a55-9d4e-1f2a3b4c5d6e'
+
+# Just enough of the PostgreSQL column types for SQLite-backed counter tests
+@compiles(UUID, 'sqlite')
+def _uuid_on_sqlite(type_, compiler, **kw):
+    return 'CHAR(32)'
+
+@compiles(JSONB, 'sqlite')
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return 'JSON'
+
+@pytest.fixture
+def session():
+    """Session on SQLite holding the counted tables; expires objects on commit like the app's sessions."""
+    engine = create_engine('sqlite://')
+    event.listen(engine, 'connect', lambda connection, _: connection.create_function('greatest', 2, max))
+    for table in (Recommendation.__table__, NutritionGoal.__table__, UserStats.__table__):
+        table.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+def counters(session):
+    return session.get(UserStats, uuid.UUID(USER_ID)).to_dict()
+
+class TestHydrate:
+    """Test rebuilding models from json_build_object rows."""
+
+    def test_analysis_round_trip(self):
+        """A JSON row serializes exactly like the ORM-loaded analysis."""
+        analysis_id, product_id = uuid.uuid4(), uuid.uuid4()
+        loaded = Analysis(uuid.UUID(USER_ID), product_id, 'ocr', id=analysis_id,
+                          health_score=Decimal('7.25'), processing_time=Decimal('1.234'),
+                          detailed_analysis={'grade': 'B'}, status='completed', retry_count=0,
+                          created_at=datetime(2024, 5, 1, 12, 30, 0, 123400, tzinfo=timezone.utc))
+        row = {
+            'id': str(analysis_id), 'user_id': USER_ID, 'product_id': str(product_id), 'input_type': 'ocr',
+            'health_score': 7.25, 'processing_time': 1.234, 'detailed_analysis': {'grade': 'B'},
+            'status': 'completed', 'retry_count': 0,
+            # PostgreSQL drops trailing zeros from the fraction
+            'created_at': '2024-05-01T12:30:00.1234+00:00', 'updated_at': None,
+        }
+        assert hydrate(Analysis, row).to_dict() == loaded.to_dict()
+        assert hydrate(Analysis, row).to_dict(native=True) == loaded.to_dict(native=True)
+
+    def test_dates_and_decimals(self):
+        """Date and numeric columns come back as date and Decimal."""
+        goal = hydrate(NutritionGoal, {'id': str(uuid.uuid4()), 'user_id': USER_ID, 'goal_type': 'protein',
+                                       'target_value': 120, 'current_value': 30.5, 'start_date': '2024-05-01',
+                                       'is_active': True})
+        assert goal.target_value == Decimal('120')
+        assert goal.to_dict()['start_date'] == '2024-05-01'
+        assert goal.to_dict()['progress_percentage'] == pytest.approx(25.4166, rel=1e-3)
+
+class TestDashboardCache:
+    """Test the per-user dashboard cache."""
+
+    def test_totals_come_from_counters(self):
+        """Stats report the maintained counters, not the length of the recent list."""
+        payload = DashboardService()._payload([], [], [], {'analyses_count': 42, 'active_goals_count': 2})
+        assert payload['stats'] == {'total_analyses': 42, 'unread_recommendations_count': 0,
+                                    'active_goals_count': 2}
+
+    def test_cached_until_commit_invalidates(self, monkeypatch):
+        """A cached dashboard is served without the database until a commit touches the user."""
+        service = DashboardService()
+        monkeypatch.setattr(dashboard_module, 'dashboard_service', service)
+        monkeypatch.setattr(service.db, 'connect', lambda: pytest.fail('database should not be used'))
+        service._cache.set(USER_ID, {'stats': {'total_analyses': 1}})
+        assert service.get_dashboard(USER_ID)['stats']['total_analyses'] == 1
+
+        class CommittedSession:
+            info = {'dashboard_dirty_users': {uuid.UUID(USER_ID)}}
+        dashboard_module._invalidate_committed(CommittedSession())
+        assert USER_ID not in service._cache
+
+class TestCounters:
+    """Test counter maintenance by the ORM events."""
+
+    def test_flag_changes_on_expired_objects(self, session):
+        """Flags changed after a commit expired them still move the counters."""
+        user_id = uuid.UUID(USER_ID)
+        recommendation = Recommendation(user_id, 'product', 'Daha az şekerli')
+        goal = NutritionGoal(user_id, 'protein', 120, 'g', datetime(2024, 5, 1).date())
+        session.add_all([recommendation, goal])
+        session.commit()
+        assert counters(session)['unread_recommendations_count'] == 1
+        assert counters(session)['active_goals_count'] == 1
+
+        session.expire_all()
+        recommendation.is_read = True
+        goal.is_active = False
+        session.commit()
+        assert counters(session)['unread_recommendations_count'] == 0
+        assert counters(session)['active_goals_count'] == 0
+
+        recommendation.is_read = False
+        session.commit()
+        session.delete(recommendation)
+        session.commit()
+        assert counters(session)['unread_recommendations_count'] == 0
@@ -0,0 +1,109 @@
+"""
+Tests for database utilities
+Shared engine, pool statistics and request-scoped sessions.
+"""
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from utils import database
+from utils.database import (
+    Database, TimedQueuePool, dispose_engine, get_engine, get_pool_stats, register_session_teardown
+)
+
+@pytest.fixture
+def sqlite_url(tmp_path, monkeypatch):
+    """DATABASE_URL pointing at a throwaway SQLite file; the engine is reset around the test."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'foodlens.db'}")
+    dispose_engine()
+    yield
+    dispose_engine()
+
+class TestSharedEngine:
+    """Test the process-wide engine."""
+
+    def test_instances_share_engine(self, sqlite_url):
+        """Every Database instance uses the same engine and pool."""
+        first, second = Database(), Database()
+        assert first.engine is second.engine is get_engine()
+        assert isinstance(first.engine.pool, TimedQueuePool)
+        assert first.engine.pool.size() == database.DB_POOL_SIZE
+
+    def test_connect_does_not_create_schema(self, sqlite_url, monkeypatch):
+        """Opening a session never runs DDL."""
+        monkeypatch.setattr(database.Base.metadata, 'create_all', lambda *args, **kwargs: pytest.fail('DDL at runtime'))
+        session = Database().connect()
+        try:
+            assert session.execute(text('SELECT 1')).scalar() == 1
+        finally:
+            session.close()
+
+    def test_pool_stats(self, sqlite_url):
+        """Checkouts and wait times are recorded."""
+        db = Database()
+        for _ in range(3):
+            session = db.connect()
+            session.execute(text('SELECT 1'))
+            db.close(session)
+        stats = get_pool_stats()
+        assert stats['checkouts'] == 3
+        assert stats['checked_out'] == 0
+        assert stats['timeouts'] == 0
+        assert stats['max_wait_ms'] >= stats['avg_wait_ms'] >= 0
+
+    def test_missing_url(self, monkeypatch):
+        """Without DATABASE_URL the error says so."""
+        monkeypatch.delenv('DATABASE_URL', raising=False)
+        dispose_engine()
+        with pytest.raises(RuntimeError, match='DATABASE_URL'):
+            get_engine()
+
+class TestRequestSession:
+    """Test the session shared by services during a request."""
+
+    @pytest.fixture
+    def app(self, sqlite_url):
+        """App with the session teardown and a scratch table."""
+        app = Flask(__name__)
+        register_session_teardown(app)
+        with get_engine().begin() as connection:
+            connection.execute(text('CREATE TABLE notes (body TEXT)'))
+        return app
+
+    def count_notes(self):
+        with get_engine().connect() as connection:
+            return connection.execute(text('SELECT count(*) FROM notes')).scalar()
+
+    def test_services_share_one_session(self, app):
+        """Separate Database instances get the same session and one checkout."""
+        with app.app_context():
+            first, second = Database().connect(), Database().connect()
+            assert first is second
+            first.execute(text('SELECT 1'))
+            Database().close(first)
+            second.execute(text('SELECT 1'))
+            assert get_pool_stats()['checked_out'] == 1
+        assert get_pool_stats()['checked_out'] == 0
+
+    def test_teardown_commits(self, app):
+        """Uncommitted work is committed when the request ends cleanly."""
+        with app.app_context():
+            Database().connect().execute(text("INSERT INTO notes VALUES ('kept')"))
+        assert self.count_notes() == 1
+
+    def test_teardown_rolls_back_on_error(self, app):
+        """An unhandled error rolls the request's work back."""
+        with pytest.raises(RuntimeError):
+            with app.app_context():
+                Database().connect().execute(text("INSERT INTO notes VALUES ('dropped')"))
+                raise RuntimeError('handler failed')
+        assert self.count_notes() == 0
+
+    def test_standalone_outside_app_context(self, sqlite_url):
+        """Scripts and background threads get their own sessions."""
+        db = Database()
+        first, second = db.connect(), db.connect()
+        assert first is not second
+        db.close(first)
+        db.close(second)
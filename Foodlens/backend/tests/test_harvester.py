@@ -0,0 +1,201 @@
+"""
+Tests for the Open Food Facts harvester and scraper spool
+Ordered concurrent paging, rate budget, bounded retries, checkpoint resume and JSONL spool compaction against a local fake OFF server.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'scraping'))
+
+from harvester import Harvester, HarvestError
+
+class FakeOpenFoodFacts(BaseHTTPRequestHandler):
+    """Serves search.pl style pages over `total` products."""
+    total = 25
+    report_count = True
+    failures = {}
+    delay = 0.0
+    requests = []
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        query = parse_qs(urlparse(self.path).query)
+        page, size = int(query['page'][0]), int(query['page_size'][0])
+        with cls.lock:
+            cls.requests.append(page)
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+            failure = cls.failures.get(page)
+            if failure and failure[1] != 0:
+                cls.failures[page] = (failure[0], failure[1] - 1)
+        time.sleep(cls.delay)
+        with cls.lock:
+            cls.active -= 1
+
+        if failure and failure[1] != 0:
+            self.send_response(failure[0])
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        codes = range((page - 1) * size, min(page * size, cls.total))
+        payload = {'page': page, 'products': [{'code': str(code)} for code in codes]}
+        if cls.report_count:
+            payload['count'] = cls.total
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def off_url():
+    FakeOpenFoodFacts.total = 25
+    FakeOpenFoodFacts.report_count = True
+    FakeOpenFoodFacts.failures = {}
+    FakeOpenFoodFacts.delay = 0.0
+    FakeOpenFoodFacts.requests = []
+    FakeOpenFoodFacts.max_active = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenFoodFacts)
+    threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/cgi/search.pl?page={{page}}&page_size={{page_size}}'
+    server.shutdown()
+    server.server_close()
+
+def harvest(harvester, **kwargs):
+    pages = []
+    harvester.harvest(lambda page, products: pages.append((page, [p['code'] for p in products])), **kwargs)
+    return pages
+
+class TestHarvest:
+    """Test paging and concurrency."""
+
+    def test_pages_in_order(self, off_url):
+        """Concurrently fetched pages are delivered in order and the crawl stops at the last page."""
+        FakeOpenFoodFacts.delay = 0.05
+        harvester = Harvester(off_url, page_size=3, concurrency=4, rps=0)
+        pages = harvest(harvester)
+        assert [page for page, _ in pages] == list(range(1, 10))
+        assert [code for _, codes in pages for code in codes] == [str(code) for code in range(25)]
+        assert 1 < FakeOpenFoodFacts.max_active <= 4
+        assert max(FakeOpenFoodFacts.requests) <= 9 + 4
+
+    def test_stops_at_empty_page(self, off_url):
+        """Without a total count, the first empty page ends the crawl."""
+        FakeOpenFoodFacts.report_count = False
+        pages = harvest(Harvester(off_url, page_size=10, concurrency=2, rps=0))
+        assert [page for page, _ in pages] == [1, 2, 3]
+
+    def test_rate_budget(self, off_url):
+        """The requests-per-second budget is shared by all workers."""
+        harvester = Harvester(off_url, page_size=3, concurrency=4, rps=40)
+        started = time.monotonic()
+        harvest(harvester)
+        assert time.monotonic() - started >= 8 / 40
+
+class TestRetries:
+    """Test backoff and checkpoints."""
+
+    def test_transient_errors_are_retried(self, off_url):
+        """429 and 5xx answers are retried with backoff."""
+        FakeOpenFoodFacts.failures = {2: (503, 2), 3: (429, 1)}
+        harvester = Harvester(off_url, page_size=5, concurrency=2, rps=0, backoff=0.01)
+        assert len(harvest(harvester)) == 5
+        assert harvester.stats['retries'] == 3
+
+    def test_bounded_retries_and_resume(self, off_url, tmp_path):
+        """A page that keeps failing stops the crawl at the checkpoint, and a rerun resumes after it."""
+        checkpoint = str(tmp_path / 'checkpoint.json')
+        FakeOpenFoodFacts.failures = {4: (500, 3)}
+        harvester = Harvester(off_url, page_size=3, concurrency=3, rps=0, backoff=0.01,
+                              max_retries=2, checkpoint_path=checkpoint)
+        pages = []
+        with pytest.raises(HarvestError):
+            harvester.harvest(lambda page, products: pages.append(page))
+        assert pages == [1, 2, 3] and harvester.load_checkpoint() == 3
+
+        FakeOpenFoodFacts.requests = []
+        resumed = Harvester(off_url, page_size=3, concurrency=3, rps=0, checkpoint_path=checkpoint)
+        assert [page for page, _ in harvest(resumed)] == list(range(4, 10))
+        assert min(FakeOpenFoodFacts.requests) == 4
+
+    def test_checkpoint_of_other_crawl_is_ignored(self, off_url, tmp_path):
+        """A checkpoint written with another page size starts over."""
+        checkpoint = str(tmp_path / 'checkpoint.json')
+        Harvester(off_url, page_size=3, checkpoint_path=checkpoint).save_checkpoint(5)
+        assert Harvester(off_url, page_size=3, checkpoint_path=checkpoint).load_checkpoint() == 5
+        assert Harvester(off_url, page_size=10, checkpoint_path=checkpoint).load_checkpoint() == 0
+class TestSpool:
+    """Test the scraper's append-only spool and compaction."""
+
+    @pytest.fixture
+    def scraping(self, tmp_path, monkeypatch):
+        import scraping
+        monkeypatch.setattr(scraping, 'raw_data_path', lambda: str(tmp_path))
+        return scraping
+
+    def test_pages_are_appended(self, scraping, tmp_path):
+        """Each page is appended as JSON lines; reopening in append mode keeps earlier pages."""
+        path = str(tmp_path / 'spool.jsonl')
+        spool = scraping.ProductSpool(path, fsync_every=2)
+        spool.write_page([{'code': '1'}, {'code': '2'}])
+        spool.close()
+        spool = scraping.ProductSpool(path, append=True)
+        spool.write_page([{'code': '3', 'product_name': 'Süt'}])
+        spool.close()
+        assert [product['code'] for product in scraping.read_spool(path)] == ['1', '2', '3']
+        assert open(path, encoding='utf-8').read().count('\n') == 3
+
+    def test_resume_drops_torn_line(self, scraping, tmp_path):
+        """A half-written last line is cut off on resume instead of swallowing the next product."""
+        path = str(tmp_path / 'spool.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"code": "1"}\n{"code": "2", "prod')
+        spool = scraping.ProductSpool(path, append=True)
+        spool.write_page([{'code': '3'}])
+        spool.close()
+        assert [product['code'] for product in scraping.read_spool(path)] == ['1', '3']
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"code": "torn"')
+        spool = scraping.ProductSpool(path, append=True)
+        spool.write_page([{'code': '4'}])
+        spool.close()
+        assert [product['code'] for product in scraping.read_spool(path)] == ['4']
+
+    def test_compaction(self, scraping, tmp_path):
+        """Compaction writes a JSON array, keeps the last copy of a barcode and skips a torn last line."""
+        path = str(tmp_path / 'spool.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"code": "1", "v": 1}\n{"code": "2"}\n{"code": "1", "v": 2}\n{"code": "3", "prod')
+        assert scraping.compact_spool(path, 'products.json') == 2
+        products = json.load(open(tmp_path / 'products.json', encoding='utf-8'))
+        assert products == [{'code': '2'}, {'code': '1', 'v': 2}]
+
+    def test_crawl_resumes_from_spool(self, scraping, off_url, tmp_path, monkeypatch):
+        """An interrupted crawl keeps its spooled pages and the rerun appends only the rest."""
+        monkeypatch.setattr(scraping, 'Harvester', lambda **kwargs: Harvester(
+            off_url, page_size=3, backoff=0.01, max_retries=1, **kwargs))
+        monkeypatch.setattr(scraping, 'FSYNC_EVERY', 2)
+        FakeOpenFoodFacts.failures = {6: (500, 2)}
+        assert scraping.fetch_turkey_products(concurrency=1, rps=0, spool_filename='s.jsonl') is None
+
+        FakeOpenFoodFacts.requests = []
+        spool_path = scraping.fetch_turkey_products(concurrency=2, rps=0, spool_filename='s.jsonl')
+        assert min(FakeOpenFoodFacts.requests) == 5
+        assert scraping.compact_spool(spool_path) == 25
+        assert not os.path.exists(spool_path + '.checkpoint')
@@ -0,0 +1,71 @@
+"""
+Tests for the app-wide JSON provider
+Native encoding of database and NumPy types.
+"""
+
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from flask import Flask, jsonify
+
+from models.analysis import Analysis
+from utils import json_provider
+from utils.json_provider import FastJSONProvider
+
+@pytest.fixture(params=[True, False], ids=['orjson', 'stdlib'])
+def app(request, monkeypatch):
+    """Flask app using FastJSONProvider, with and without orjson."""
+    if request.param and not json_provider.ORJSON_AVAILABLE:
+        pytest.skip('orjson not installed')
+    monkeypatch.setattr(json_provider, 'ORJSON_AVAILABLE', request.param)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+class TestFastJSONProvider:
+    """Test FastJSONProvider encoding."""
+
+    def test_encodes_native_types(self, app):
+        """Decimal, UUID, datetime and NumPy values encode like the to_dict conversions."""
+        identifier = uuid.uuid4()
+        created = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+        payload = {
+            'id': identifier,
+            'amount': Decimal('12.50'),
+            'created_at': created,
+            'count': np.int64(3),
+            'ratio': np.float32(0.5),
+            'values': np.arange(3),
+            1: 'non-string key',
+        }
+        with app.app_context():
+            body = json.loads(jsonify(payload).get_data(as_text=True))
+        assert body == {
+            'id': str(identifier),
+            'amount': 12.5,
+            'created_at': created.isoformat(),
+            'count': 3,
+            'ratio': 0.5,
+            'values': [0, 1, 2],
+            '1': 'non-string key',
+        }
+
+    def test_keeps_insertion_order(self, app):
+        """Keys are not sorted."""
+        with app.app_context():
+            assert list(json.loads(app.json.dumps({'success': True, 'a': 1}))) == ['success', 'a']
+
+    def test_model_native_dict_matches_converted(self, app):
+        """Analysis.to_dict(native=True) serializes to the same JSON as to_dict()."""
+        analysis = Analysis(uuid.uuid4(), uuid.uuid4(), 'ocr', id=uuid.uuid4(),
+                            health_score=Decimal('7.25'), confidence_score=Decimal('0.90'),
+                            processing_time=Decimal('1.234'), status='completed',
+                            created_at=datetime(2024, 5, 1, 12, 30), updated_at=None)
+        with app.app_context():
+            native = json.loads(app.json.dumps(analysis.to_dict(native=True)))
+            converted = json.loads(app.json.dumps(analysis.to_dict()))
+        assert native == converted
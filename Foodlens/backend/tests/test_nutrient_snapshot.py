@@ -0,0 +1,114 @@
+"""
+Tests for the columnar nutrient snapshot
+Export from OpenFoodFacts records, memory-mapped loading, lookups and version swaps.
+"""
+
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from services.nutrient_snapshot import (
+    CURRENT_FILE,
+    NutrientSnapshot,
+    export_snapshot,
+    write_snapshot,
+)
+from services.nutri_score_service import score_frame
+
+RECORDS = [
+    {'code': '869', 'nutriments': {'fat_100g': 30.5, 'sodium_100g': 0.2, 'energy-kcal_100g': '540'},
+     'nutriscore_grade': 'e', 'nova_group': 4, 'allergens_tags': ['en:milk', 'en:soybeans', 'en:unknown'],
+     'categories_tags': ['en:snacks', 'en:chocolates']},
+    {'code': '123', 'nutriments': {'fat_100g': -1, 'sugars_100g': 'n/a', 'proteins_100g': 3.3},
+     'nutriscore_grade': 'unknown', 'categories_tags': ['en:dairies']},
+    {'code': '', 'product_name': 'No barcode'},
+    {'code': '5000', 'nutriments': {'fat_100g': 1}, 'nutriscore_grade': 'a', 'nova_group': '1',
+     'allergens_tags': ['en:gluten'], 'categories_tags': ['en:snacks']},
+    {'code': '123', 'nutriments': {'fat_100g': 3.5, 'proteins_100g': 3.3}, 'nutriscore_grade': 'b',
+     'categories_tags': ['en:dairies', 'en:yogurts']},
+]
+
+@pytest.fixture
+def snapshot(tmp_path):
+    write_snapshot(RECORDS, str(tmp_path / 'snapshot'), chunk_size=2)
+    return NutrientSnapshot.open(str(tmp_path / 'snapshot'))
+
+class TestExport:
+    """Test column contents."""
+
+    def test_rows_sorted_and_deduplicated(self, snapshot):
+        """Rows are ordered by barcode and a repeated barcode keeps its last record."""
+        assert [barcode.decode() for barcode in snapshot.barcodes] == ['123', '5000', '869']
+        assert snapshot.meta['skipped'] == 1 and snapshot.meta['records'] == 5
+        product = snapshot.product(snapshot.find('123'))
+        assert product['nutri_score'] == 'B' and product['nutrients'] == pytest.approx({'fat': 3.5, 'proteins': 3.3})
+        assert product['categories'] == ['en:dairies', 'en:yogurts']
+
+    def test_values(self, snapshot):
+        """Units are converted, invalid values become NaN and known allergens set bits."""
+        product = snapshot.product(snapshot.find('869'))
+        assert product['nutrients'] == pytest.approx({'fat': 30.5, 'sodium': 200.0, 'energy_kcal': 540.0})
+        assert product['nova_group'] == 4 and product['nutri_score'] == 'E'
+        assert product['allergens'] == ['en:soybeans', 'en:milk']
+        assert np.isnan(snapshot['sugars']).all()
+
+    def test_find(self, snapshot):
+        """Unknown and non-ASCII barcodes are not found."""
+        assert snapshot.find('5000') == 1
+        assert snapshot.find('124') is None and snapshot.find('9999') is None and snapshot.find('çay') is None
+
+class TestQueries:
+    """Test vectorized filters over the mapped columns."""
+
+    def test_columns_are_memory_mapped(self, snapshot):
+        """Columns and nutrient views are backed by the files, not copies."""
+        assert isinstance(snapshot.nutrients, np.memmap)
+        assert np.shares_memory(snapshot['fat'], snapshot.nutrients)
+
+    def test_filters(self, snapshot):
+        """Allergen and category masks select rows."""
+        assert snapshot.containing_allergens(['en:gluten', 'en:milk']).tolist() == [False, True, True]
+        assert snapshot.in_category('en:snacks').tolist() == [False, True, True]
+        assert not snapshot.in_category('en:beverages').any()
+        with pytest.raises(ValueError):
+            snapshot.allergen_mask(['en:bananas'])
+
+    def test_frame_scores(self, snapshot):
+        """The nutrient matrix feeds score_frame directly."""
+        frame = snapshot.frame()
+        assert len(frame) == 3 and frame['sugars'].tolist() == [0.0, 0.0, 0.0]
+        assert len(score_frame(frame.validate_and_convert())['grade_index']) == 3
+
+class TestVersions:
+    """Test snapshot replacement."""
+
+    def test_swap_keeps_open_readers(self, tmp_path):
+        """A new export becomes current while an open snapshot keeps reading its version."""
+        path = str(tmp_path / 'snapshot')
+        write_snapshot(RECORDS, path)
+        old = NutrientSnapshot.open(path)
+        write_snapshot(RECORDS[:1], path)
+        write_snapshot(RECORDS[:2], path)
+        assert len(NutrientSnapshot.open(path)) == 2
+        assert len([entry for entry in os.listdir(path) if entry.startswith('v')]) == 2
+        assert len(old) == 3 and old.find('869') == 2
+
+    def test_missing_snapshot(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            NutrientSnapshot.open(str(tmp_path))
+
+    def test_export_csv(self, tmp_path):
+        """CSV exports keep their category tags."""
+        dump = tmp_path / 'products.csv'
+        with open(dump, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerow(['code', 'product_name', 'categories_tags', 'fat_100g', 'nutriscore_grade'])
+            writer.writerow(['42', 'Simit', 'en:breads,en:bakery', '4.5', 'c'])
+        meta = export_snapshot(str(dump), str(tmp_path / 'snapshot'))
+        snapshot = NutrientSnapshot.open(str(tmp_path / 'snapshot'))
+        assert meta['rows'] == 1 and snapshot.categories(0) == ['en:breads', 'en:bakery']
+        assert snapshot.product(0)['nutrients'] == pytest.approx({'fat': 4.5})
+        assert snapshot.meta['source'] == str(dump)
+        assert (tmp_path / 'snapshot' / CURRENT_FILE).read_text() == os.path.basename(snapshot.path)
@@ -0,0 +1,96 @@
+"""
+Tests for the password hashing pool
+Hashing, parameter upgrades, bounded concurrency and load shedding.
+"""
+
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from utils.password_hasher import PasswordHasher, PasswordHashingBusy
+
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+class TestPasswordHasher:
+    """Test PasswordHasher."""
+
+    def test_hash_and_verify(self):
+        """Hashes verify and use the configured method."""
+        hasher = PasswordHasher(method=FAST_METHOD, workers=2, queue_size=2)
+        password_hash = hasher.hash('Password123')
+        assert password_hash.startswith('pbkdf2:sha256:1000$')
+        assert hasher.verify(password_hash, 'Password123')
+        assert not hasher.verify(password_hash, 'wrong')
+        assert not hasher.verify(None, 'Password123')
+
+    def test_needs_rehash_on_parameter_change(self):
+        """Hashes made with other parameters are flagged for upgrade."""
+        old = PasswordHasher(method='pbkdf2:sha256:500', workers=1, queue_size=0)
+        new = PasswordHasher(method=FAST_METHOD, workers=1, queue_size=0)
+        assert new.needs_rehash(old.hash('Password123'))
+        assert not new.needs_rehash(new.hash('Password123'))
+
+    def test_rejects_when_saturated(self):
+        """Beyond workers + queue_size, requests are rejected with a retry hint."""
+        hasher = PasswordHasher(method=FAST_METHOD, workers=1, queue_size=1)
+        release = threading.Event()
+
+        def blocked():
+            release.wait(5)
+            return True
+
+        threads = [threading.Thread(target=hasher._run, args=(blocked,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while hasher.get_stats()['in_flight'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        try:
+            with pytest.raises(PasswordHashingBusy) as error:
+                hasher.hash('Password123')
+            assert error.value.retry_after_seconds >= 1
+            assert hasher.get_stats()['rejected'] == 1
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join()
+        assert hasher.verify(hasher.hash('Password123'), 'Password123')
+
+    def test_limits_concurrent_hashes(self):
+        """Admitted requests beyond `workers` wait for a slot instead of hashing at once."""
+        hasher = PasswordHasher(method=FAST_METHOD, workers=1, queue_size=2)
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def work():
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+
+        threads = [threading.Thread(target=hasher._run, args=(work,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert state['peak'] == 1
+
+class TestPasswordHashingBusyResponse:
+    """Test the 429 response."""
+
+    def test_rendered_as_429(self):
+        """The app error handler returns 429 with Retry-After."""
+        app = create_app()
+
+        @app.route('/test-busy')
+        def busy():
+            raise PasswordHashingBusy(3)
+
+        response = app.test_client().get('/test-busy')
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '3'
+        assert response.get_json()['success'] is False
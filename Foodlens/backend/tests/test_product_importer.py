@@ -0,0 +1,112 @@
+"""
+Tests for bulk product upserts
+COPY encoding, staging and merge statements, change counts and chunked imports.
+"""
+
+import json
+from collections import namedtuple
+
+import pytest
+
+from services import product_importer
+from services.product_importer import IMPORT_COLUMNS, copy_buffer, copy_value, import_products, upsert_products
+from utils.external_apis import off_product_fields
+
+Written = namedtuple('Written', 'barcode inserted')
+
+class TestCopyEncoding:
+    """Test COPY text format values."""
+
+    def test_scalars(self):
+        """NULLs, booleans and control characters are encoded for COPY."""
+        assert copy_value(None) == '\\N' and copy_value(True) == 't' and copy_value(1.5) == '1.5'
+        assert copy_value('a\tb\nc\\d\x00') == 'a\\tb\\nc\\\\d'
+
+    def test_arrays_and_json(self):
+        """Lists become array literals and dicts JSON, both escaped."""
+        assert copy_value(['en:milk', 'say "x"', None]) == '{"en:milk","say \\\\"x\\\\"",NULL}'
+        assert json.loads(copy_value({'fruits_vegetables_nuts': 13.0})) == {'fruits_vegetables_nuts': 13.0}
+
+    def test_columns_match_projection(self):
+        """Every column off_product_fields produces is imported."""
+        fields = off_product_fields({'code': '1', 'product_name': 'Ayran'})
+        assert set(fields) == set(IMPORT_COLUMNS)
+        line = copy_buffer([fields]).getvalue()
+        assert line.count('\t') == len(IMPORT_COLUMNS) - 1 and line.startswith('1\tAyran\t')
+
+class TestUpsert:
+    """Test the staging and merge round trip."""
+
+    @pytest.fixture
+    def connection(self, monkeypatch):
+        class Cursor:
+            def copy_expert(self, sql, buffer):
+                connection.copied = (sql, buffer.getvalue())
+
+            def close(self):
+                pass
+
+        class Connection:
+            statements = []
+            copied = None
+            written = []
+
+            def __init__(self):
+                self.connection = type('Pooled', (), {'dbapi_connection': type('Raw', (), {'cursor': lambda s: Cursor()})()})()
+
+            def execute(self, statement):
+                self.statements.append(str(statement))
+                written = self.written
+
+                class Result:
+                    def all(self):
+                        return written
+                return Result()
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+        connection = Connection()
+        monkeypatch.setattr(product_importer, 'get_engine', lambda: type('Engine', (), {'begin': lambda s: connection})())
+        return connection
+
+    def test_counts(self, connection):
+        """Rows the merge did not return were unchanged; xmax tells inserts from updates."""
+        connection.written = [Written('1', True), Written('2', False)]
+        rows = [{'barcode': str(code), 'name': 'x'} for code in range(1, 5)]
+        result = upsert_products(rows)
+        assert result == {'inserted': 1, 'updated': 1, 'unchanged': 2, 'barcodes': ['1', '2']}
+        staging, merge = connection.statements
+        assert 'CREATE TEMPORARY TABLE product_staging ON COMMIT DROP' in staging
+        assert 'ON CONFLICT (barcode) DO UPDATE' in merge and 'IS DISTINCT FROM' in merge
+        assert connection.copied[0].startswith('COPY product_staging (barcode, name,')
+
+    def test_duplicate_barcodes(self, connection):
+        """A barcode repeated in one batch is staged once, with its last values."""
+        upsert_products([{'barcode': '1', 'name': 'old'}, {'barcode': '1', 'name': 'new'}, {'name': 'no barcode'}])
+        lines = connection.copied[1].splitlines()
+        assert len(lines) == 1 and lines[0].startswith('1\tnew\t')
+
+    def test_empty(self, connection):
+        """Nothing to stage runs no statements."""
+        assert upsert_products([])['inserted'] == 0 and connection.statements == []
+
+class TestImport:
+    """Test chunked imports."""
+
+    def test_totals_and_changes(self, tmp_path):
+        """Counts add up across chunks and changed barcodes are reported per chunk."""
+        path = tmp_path / 'dump.jsonl'
+        path.write_text(''.join(json.dumps({'code': str(code), 'product_name': 'Ayran'}) + '\n' for code in range(5)))
+        changed = []
+
+        def writer(rows):
+            return {'inserted': 1, 'updated': 0, 'unchanged': len(rows) - 1, 'barcodes': [rows[0]['barcode']]}
+
+        stats = import_products(str(path), chunk_size=2, on_changed=changed.append, progress=None, writer=writer,
+                                index_snapshot=None)
+        assert (stats['inserted'], stats['unchanged'], stats['rows']) == (3, 2, 5)
+        assert changed == [['0'], ['2'], ['4']]
@@ -0,0 +1,200 @@
+"""
+Tests for the in-memory product index
+Boolean queries, tag filters, autocomplete, incremental updates and snapshots.
+"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from services.product_index import ProductIndex, index_export, load_product_index, normalize_terms, snapshot_lock
+
+PRODUCTS = [
+    {'code': '1', 'product_name': 'Sütlü Çikolata', 'brands': 'Ülker', 'popularity_key': 30,
+     '_keywords': ['sutlu', 'cikolata', 'ulker'], 'brands_tags': ['ulker'],
+     'categories_tags': ['en:chocolates'], 'allergens_tags': ['en:milk']},
+    {'code': '2', 'product_name': 'Bitter Çikolata', 'brands': 'Ülker', 'popularity_key': 20,
+     '_keywords': ['bitter', 'cikolata', 'ulker'], 'brands_tags': ['ulker'],
+     'categories_tags': ['en:chocolates', 'en:dark-chocolates']},
+    {'code': '3', 'product_name': 'Sütlü Gofret', 'brands': 'Eti', 'popularity_key': 10,
+     '_keywords': ['sutlu', 'gofret', 'eti'], 'brands_tags': ['eti'],
+     'categories_tags': ['en:wafers'], 'allergens_tags': ['en:milk', 'en:gluten']},
+]
+
+def codes(result):
+    return [product['code'] for product in result['products']]
+
+@pytest.fixture
+def index():
+    index = ProductIndex()
+    index.add_products(PRODUCTS)
+    return index
+
+class TestNormalize:
+    """Test term normalization."""
+
+    def test_turkish_and_accents(self):
+        """Query words are folded the way OpenFoodFacts builds _keywords."""
+        assert normalize_terms('Sütlü ÇİKOLATA, Pâte') == ['sutlu', 'cikolata', 'pate']
+
+class TestSearch:
+    """Test boolean queries and filters."""
+
+    def test_and(self, index):
+        """Every word must match; results are ordered by popularity."""
+        assert codes(index.search('sütlü')) == ['1', '3']
+        assert codes(index.search('sütlü çikolata')) == ['1']
+
+    def test_or_ranks_by_matched_words(self, index):
+        """With mode 'or' products matching more words come first."""
+        assert codes(index.search('sutlu cikolata', mode='or')) == ['1', '2', '3']
+
+    def test_prefix(self, index):
+        """The last word matches as a prefix unless disabled."""
+        assert codes(index.search('gof')) == ['3']
+        assert index.search('gof', prefix=False)['total'] == 0
+
+    def test_tag_filters(self, index):
+        """Required tags narrow the results and excluded tags remove products."""
+        assert codes(index.search('', tags={'brand': ['Ulker']})) == ['1', '2']
+        assert codes(index.search('cikolata', exclude_tags={'allergen': ['en:milk']})) == ['2']
+        assert codes(index.search('', tags={'category': ['en:chocolates']}, limit=1)) == ['1']
+
+    def test_autocomplete(self, index):
+        """Completions are ordered by document frequency."""
+        assert index.autocomplete('ç') == [{'term': 'cikolata', 'count': 2}]
+        assert [item['term'] for item in index.autocomplete('sütlü g')] == ['gofret']
+
+    def test_prefix_expands_to_frequent_terms(self, monkeypatch):
+        """A short prefix expands to its most frequent terms, not the first ones alphabetically."""
+        from services import product_index as module
+
+        monkeypatch.setattr(module, 'MAX_PREFIX_EXPANSIONS', 2)
+        index = ProductIndex()
+        index.add_products([{'code': str(i), '_keywords': [f'ka{i}']} for i in range(5)])
+        index.add_products([{'code': str(i), '_keywords': ['kz', 'ka4']} for i in range(5, 7)])
+        index.add_products([{'code': str(i), '_keywords': ['kz']} for i in range(7, 10)])
+        assert codes(index.search('k')) == ['4', '5', '6', '7', '8', '9']
+        assert index.autocomplete('k', limit=1) == [{'term': 'kz', 'count': 5}]
+
+class TestUpdates:
+    """Test incremental updates and snapshots."""
+
+    def test_replace_product(self, index):
+        """Re-importing a code replaces the old version everywhere."""
+        index.add_products([{'code': '2', 'product_name': 'Bitter Gofret', '_keywords': ['bitter', 'gofret']}])
+        assert index.size == 3
+        assert codes(index.search('gofret')) == ['3', '2']
+        assert codes(index.search('cikolata')) == ['1']
+        assert index.get('2')['product_name'] == 'Bitter Gofret'
+        assert index.autocomplete('ç') == [{'term': 'cikolata', 'count': 1}]
+
+    def test_appends_share_documents(self, index):
+        """New products are appended to the document lists instead of copying them."""
+        before = index._state
+        index.add_products([{'code': '4', 'product_name': 'Ayran', '_keywords': ['ayran']}])
+        assert index._state.documents['code'] is before.documents['code']
+        assert codes(index.search('ayran')) == ['4'] and len(before.live) == 3
+        assert codes(index.search('sutlu')) == ['1', '3']
+
+    def test_failed_add_changes_nothing(self, index):
+        """Products read before a failing source are dropped with it."""
+        def products():
+            yield {'code': '4', 'product_name': 'Ayran', '_keywords': ['ayran']}
+            raise OSError('dump truncated')
+
+        with pytest.raises(OSError):
+            index.add_products(products())
+        assert index.size == 3 and index.get('4') is None
+        index.add_products([{'code': '5', 'product_name': 'Simit', '_keywords': ['simit']}])
+        assert index.get('5')['product_name'] == 'Simit' and index.search('ayran')['total'] == 0
+
+    def test_compaction(self, index):
+        """Replacing many products renumbers the documents without losing any."""
+        for _ in range(3):
+            index.add_products(PRODUCTS)
+        assert index.size == 3
+        assert len(index._state.live) < 3 * 4
+        assert codes(index.search('sutlu')) == ['1', '3']
+
+    def test_snapshot_round_trip(self, index, tmp_path):
+        """A loaded snapshot answers queries like the index it was saved from."""
+        path = str(tmp_path / 'index.npz')
+        index.save(path)
+        loaded = ProductIndex()
+        assert loaded.load(path) == 3
+        for query in ('sutlu', 'cik', 'eti'):
+            assert loaded.search(query) == index.search(query)
+        assert loaded.autocomplete('s') == index.autocomplete('s')
+
+    def test_startup_prefers_fresh_snapshot(self, index, tmp_path, monkeypatch):
+        """The snapshot is used unless the dump is newer."""
+        from services import product_index as module
+
+        dump, snapshot = tmp_path / 'dump.json', str(tmp_path / 'index.npz')
+        dump.write_text(json.dumps(PRODUCTS[:1]))
+        monkeypatch.setattr(module, 'product_index', ProductIndex())
+        assert load_product_index(str(dump), snapshot) == 1
+        assert os.path.exists(snapshot)
+
+        index.save(snapshot)
+        assert load_product_index(str(dump), snapshot) == 3
+
+    def test_build_from_jsonl(self, tmp_path):
+        """Dumps are streamed by the import loader, so JSON Lines and CSV work too."""
+        dump = tmp_path / 'dump.jsonl'
+        dump.write_text(''.join(json.dumps(dict(product, nutriments={})) + '\n' for product in PRODUCTS))
+        index = ProductIndex()
+        assert index.build_from_dump(str(dump)) == 3
+        assert codes(index.search('sutlu', exclude_tags={'allergen': ['en:gluten']})) == ['1']
+
+    def test_imports_update_snapshot(self, index, tmp_path):
+        """Imported exports are added to an existing snapshot, which watching workers reload."""
+        snapshot, export = str(tmp_path / 'index.npz'), tmp_path / 'export.jsonl'
+        export.write_text(json.dumps({'code': '4', 'product_name': 'Ayran', '_keywords': ['ayran']}) + '\n')
+        assert index_export(str(export), snapshot_path=snapshot) == 0 and not os.path.exists(snapshot)
+
+        index.save(snapshot)
+        index.watch(snapshot, check_interval=0)
+        assert index_export(str(export), snapshot_path=snapshot) == 1
+        index.search('ayran')
+        deadline = time.monotonic() + 5
+        while index.get('4') is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert codes(index.search('ayran')) == ['4'] and index.size == 4
+
+    def test_concurrent_imports_keep_every_product(self, index, tmp_path):
+        """Imports wait for the snapshot lock, so neither saves over the other's products."""
+        snapshot = str(tmp_path / 'index.npz')
+        index.save(snapshot)
+        exports = []
+        for code, name in (('4', 'ayran'), ('5', 'kefir')):
+            export = tmp_path / f'{name}.jsonl'
+            export.write_text(json.dumps({'code': code, 'product_name': name, '_keywords': [name]}) + '\n')
+            exports.append(str(export))
+
+        with snapshot_lock(snapshot):
+            threads = [threading.Thread(target=index_export, args=(export,), kwargs={'snapshot_path': snapshot})
+                       for export in exports]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+            assert ProductIndex().load(snapshot) == 3
+        for thread in threads:
+            thread.join()
+        loaded = ProductIndex()
+        assert loaded.load(snapshot) == 5
+        assert codes(loaded.search('kefir')) == ['5'] and codes(loaded.search('ayran')) == ['4']
+
+    def test_save_leaves_no_temporary_files(self, index, tmp_path, monkeypatch):
+        """Each save writes a temp file of its own, removed if the write fails."""
+        import numpy as np
+
+        index.save(str(tmp_path / 'index.npz'))
+        monkeypatch.setattr(np, 'savez', lambda *args, **kwargs: (_ for _ in ()).throw(OSError('disk full')))
+        with pytest.raises(OSError):
+            index.save(str(tmp_path / 'index.npz'))
+        assert os.listdir(tmp_path) == ['index.npz']
@@ -0,0 +1,181 @@
+"""
+Tests for product search
+Query terms, generated SQL, filters, cursors and facet assembly.
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.dialects import postgresql
+
+from services.product_service import (
+    ProductService, SearchQuery, parse_filters, prefix_tsquery, query_terms
+)
+from utils import pagination
+
+def compile_sql(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+class TestQueryTerms:
+    """Test turning user input into tsquery terms."""
+
+    def test_operators_are_dropped(self):
+        """tsquery syntax in user input cannot break to_tsquery."""
+        assert query_terms("süt & !çikolata:* | (x)") == ['süt', 'çikolata', 'x']
+        assert prefix_tsquery(['süt', 'çikol']) == 'süt:* & çikol:*'
+
+    def test_empty(self):
+        """Blank or punctuation-only queries have no terms."""
+        assert query_terms(None) == [] and query_terms(' ?! ') == []
+
+class TestSearchStatement:
+    """Test the generated SQL."""
+
+    def test_indexed_match(self):
+        """Matches use the tsvector, prefix ILIKE and trigram operators, never a leading wildcard."""
+        sql = compile_sql(SearchQuery('ülker', {}).results_statement(None, 21))
+        assert 'products.search_vector @@' in sql
+        assert 'products.name ILIKE' in sql and '<%% products.name' in sql
+        assert 'ts_rank_cd' in sql
+        # Double precision rank, so cursor values compare equal to the rows they came from
+        assert 'AS FLOAT(53)) AS sort_key' in sql
+
+    def test_browse_is_alphabetical(self):
+        """Without a query, rows are ordered by name with (name, id) keyset paging."""
+        position = ['Ayran', str(uuid.uuid4())]
+        sql = compile_sql(SearchQuery(None, {}).results_statement(position, 21))
+        assert '(products.name, products.id) >' in sql
+        assert 'ORDER BY products.name ASC, products.id ASC' in sql
+
+    def test_facets_in_one_statement(self):
+        """Facet counts come from one GROUPING SETS query with the same filters."""
+        sql = compile_sql(SearchQuery('süt', {'category': 'Dairy'}).facets_statement())
+        assert 'GROUPING SETS(products.category, products.nutri_score, products.nova_group)' in sql
+        assert 'products.category =' in sql
+
+    def test_cursor_from_other_mode(self):
+        """A browse cursor cannot be used for a ranked search."""
+        with pytest.raises(ValueError):
+            SearchQuery('süt', {}).after(['Ayran', str(uuid.uuid4())])
+
+class TestKeysetPaging:
+    """Test paging through ranked results on a database."""
+
+    @pytest.fixture
+    def connection(self):
+        """SQLite products table; the rank functions read a fixed rank from search_vector."""
+        engine = create_engine('sqlite://')
+
+        @event.listens_for(engine, 'connect')
+        def register_functions(dbapi_connection, _):
+            dbapi_connection.create_function('to_tsquery', 2, lambda config, query: query)
+            dbapi_connection.create_function('plainto_tsquery', 2, lambda config, query: query)
+            dbapi_connection.create_function('ts_rank_cd', 2, lambda vector, query: float(vector))
+            dbapi_connection.create_function('word_similarity', 2, lambda text, value: 0.0)
+            dbapi_connection.create_function('greatest', 2, max)
+
+        with engine.connect() as connection:
+            connection.execute(text(
+                'CREATE TABLE products (id CHAR(32) PRIMARY KEY, barcode TEXT, name TEXT, brand TEXT, '
+                'category TEXT, nutri_score TEXT, nova_group INTEGER, image_url TEXT, search_vector TEXT)'))
+            yield connection
+        engine.dispose()
+
+    def test_ties_at_page_boundaries(self, connection):
+        """Rows with equal rank split across pages are neither skipped nor repeated."""
+        ranks = [0.1, 0.1, 0.1, 0.7, 0.1, 0.30000000000000004, 0.1]
+        for index, rank in enumerate(ranks):
+            connection.execute(text('INSERT INTO products (id, name, search_vector) VALUES (:id, :name, :rank)'),
+                               {'id': uuid.uuid4().hex, 'name': f'Süt {index}', 'rank': str(rank)})
+        search = SearchQuery('süt', {})
+        # SQLite has no tsquery or trigram operators; the rank and keyset are what is tested
+        search.conditions = []
+
+        seen, position = [], None
+        while True:
+            rows = connection.execute(search.results_statement(position, 2)).all()
+            seen.extend(rows)
+            if len(rows) < 2:
+                break
+            # Through a cursor, as the API pages
+            cursor = pagination.encode_cursor([rows[-1].sort_key, str(rows[-1].id)])
+            position = pagination.decode_cursor(cursor, 2)
+
+        assert len(seen) == len(ranks)
+        assert len({row.id for row in seen}) == len(ranks)
+        assert [row.sort_key for row in seen] == sorted(ranks, reverse=True)
+
+class TestFilters:
+    """Test query parameter filters."""
+
+    def test_parse(self):
+        """Comma lists are split and normalized."""
+        filters = parse_filters({'nutri_score': 'a, b', 'nova_group': '1,4', 'category': 'Snacks'})
+        assert filters == {'category': 'Snacks', 'brand': None, 'nutri_score': ['A', 'B'], 'nova_group': [1, 4]}
+
+    @pytest.mark.parametrize('args', [{'nutri_score': 'F'}, {'nova_group': '5'}, {'nova_group': 'x'}])
+    def test_invalid(self, args):
+        """Unknown grades and groups are rejected."""
+        with pytest.raises(ValueError):
+            parse_filters(args)
+
+class TestSearchService:
+    """Test result and facet assembly."""
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        service = ProductService()
+        product_id = uuid.uuid4()
+
+        class Row(tuple):
+            def __getattr__(self, name):
+                return dict(zip(('id', 'barcode', 'name', 'brand', 'category', 'nutri_score',
+                                 'nova_group', 'image_url', 'sort_key'), self))[name]
+
+        results = [Row((product_id, '869', 'Süt', 'Pınar', 'Dairy', 'A', 1, None, 0.9)),
+                   Row((uuid.uuid4(), '870', 'Sütlaç', 'Pınar', 'Desserts', 'C', 3, None, 0.5))]
+        facets = [('Dairy', None, None, 0, 1, 1, 4), ('Desserts', None, None, 0, 1, 1, 9),
+                  (None, 'A', None, 1, 0, 1, 4), (None, None, None, 1, 1, 0, 2)]
+
+        class Session:
+            def __init__(self):
+                self.statements = []
+
+            def execute(self, statement):
+                self.statements.append(statement)
+                rows = facets if len(self.statements) == 2 else results
+
+                class Result:
+                    def all(self):
+                        return rows
+                return Result()
+
+        session = Session()
+        monkeypatch.setattr(service.db, 'connect', lambda: session)
+        monkeypatch.setattr(service.db, 'close', lambda s: None)
+        service.session = session
+        service.product_id = product_id
+        return service
+
+    def test_first_page(self, service):
+        """The first page carries results, a cursor and facets sorted by count."""
+        result = service.search_products('süt', limit=1)
+        assert result['success'] and result['has_more']
+        assert result['products'][0]['id'] == service.product_id
+        assert pagination.decode_cursor(result['next_cursor'], 2) == [0.9, str(service.product_id)]
+        assert result['facets']['category'] == [{'value': 'Desserts', 'count': 9}, {'value': 'Dairy', 'count': 4}]
+        assert result['facets']['nutri_score'] == [{'value': 'A', 'count': 4}]
+        # Products without a NOVA group are not a facet value
+        assert result['facets']['nova_group'] == []
+
+    def test_later_pages_skip_facets(self, service):
+        """Pages after the first run one statement."""
+        cursor = pagination.encode_cursor([0.9, str(uuid.uuid4())])
+        result = service.search_products('süt', cursor=cursor)
+        assert 'facets' not in result and len(service.session.statements) == 1
+
+    def test_invalid_cursor(self, service):
+        """Malformed cursors are reported without querying."""
+        assert service.search_products('süt', cursor='junk')['error'].startswith('Invalid cursor')
+        assert service.session.statements == []
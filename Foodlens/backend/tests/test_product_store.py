@@ -0,0 +1,138 @@
+"""
+Tests for the memory-mapped product store
+Record round trips, the barcode hash index, rebuild swaps, staleness and store-backed barcode lookups.
+"""
+
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from models.product import Product
+from services.barcode_service import BarcodeService
+from services.product_store import ProductStore, StoreState, iter_dump_products, write_store
+from utils.catalog_generation import CatalogGeneration, bump_catalog_generation
+
+PRODUCT_ID = uuid.UUID('6f1c1c62-1d0a-4a3e-9a4e-0b8f3c1d2e7a')
+AYRAN = {
+    'id': PRODUCT_ID, 'barcode': '8690000000018', 'name': 'Ayran', 'brand': 'Sütaş', 'fat': Decimal('1.50'),
+    'sodium': Decimal('40.00'), 'energy_kcal': 36.4, 'nova_group': 1, 'nutri_score': 'B', 'is_verified': False,
+    'allergens': ['milk'], 'countries': [], 'nutrition_data': {'fruits_vegetables_nuts': 0.0},
+    'ingredients': 'Yoğurt, su, tuz', 'created_at': datetime(2026, 1, 2, 3, 4, 5, 678, tzinfo=timezone.utc),
+}
+
+@pytest.fixture
+def catalog(tmp_path):
+    return CatalogGeneration(str(tmp_path / 'catalog_generation'), check_interval=0)
+
+@pytest.fixture
+def path(tmp_path, catalog):
+    path = str(tmp_path / 'product_store.bin')
+    write_store([AYRAN, {'barcode': '123', 'name': 'Su'}, {'barcode': '', 'name': 'No barcode'}], path,
+                generation=catalog.current())
+    return path
+
+class TestRecords:
+    """Test what a lookup returns."""
+
+    def test_round_trip(self, path, catalog):
+        """Products come back like Product.to_dict(native=True)."""
+        product = ProductStore(path, catalog=catalog).get('8690000000018')
+        assert list(product) == list(Product.SERIALIZED_FIELDS)
+        assert product['id'] == PRODUCT_ID and product['name'] == 'Ayran' and product['brand'] == 'Sütaş'
+        assert product['fat'] == Decimal('1.50') and str(product['sodium']) == '40.00'
+        assert product['energy_kcal'] == Decimal('36.40') and product['protein'] is None
+        assert product['allergens'] == ['milk'] and product['countries'] == [] and product['additives'] is None
+        assert product['nutrition_data'] == {'fruits_vegetables_nuts': 0.0}
+        assert product['is_verified'] is False and product['nova_group'] == 1
+        assert product['created_at'] == AYRAN['created_at'] and product['updated_at'] is None
+
+    def test_missing(self, path, tmp_path, catalog):
+        """Unknown barcodes and a missing file give None."""
+        assert ProductStore(path, catalog=catalog).get('999') is None
+        assert ProductStore(str(tmp_path / 'none.bin'), catalog=catalog).get('123') is None
+
+    def test_many_products(self, tmp_path):
+        """Every barcode is found through the probe sequence; repeats keep the last product."""
+        path = str(tmp_path / 'store.bin')
+        products = [{'barcode': str(1000 + i), 'name': f'P{i}'} for i in range(3000)]
+        stats = write_store(products + [{'barcode': '1007', 'name': 'Newer'}], path)
+        state = StoreState(path)
+        assert stats['products'] == 3000 and len(state.slots) == 8192
+        assert all(state.find(str(1000 + i).encode()) == i for i in range(3000))
+        assert state.find(b'999') is None
+        assert state.product(7)['name'] == 'Newer'
+
+    def test_from_dump(self, tmp_path, catalog):
+        """OpenFoodFacts exports are normalized as imports do, but such stores are not served to lookups."""
+        dump = tmp_path / 'products.jsonl'
+        dump.write_text(json.dumps({'code': '42', 'product_name': 'Simit', 'nutriments': {'fat_100g': 4.5}}) + '\n')
+        path = str(tmp_path / 'store.bin')
+        write_store(iter_dump_products(str(dump)), path, source='dump', generation=catalog.current())
+        state = StoreState(path)
+        product = state.product(state.find(b'42'))
+        assert product['fat'] == Decimal('4.50') and product['data_source'] == 'openfoodfacts'
+        assert state.source == 'dump' and product['id'] is None
+        store = ProductStore(path, catalog=catalog)
+        assert store.get('42') is None and store.get_stats()['serving'] is False
+
+    def test_built_at_precedes_reads(self, tmp_path):
+        """The build time is taken before the first product is read."""
+        read_at = []
+
+        def products():
+            time.sleep(0.01)
+            read_at.append(time.time())
+            yield {'barcode': '123', 'name': 'Su'}
+            time.sleep(0.01)
+
+        path = str(tmp_path / 'store.bin')
+        write_store(products(), path, generation=0)
+        assert StoreState(path).built_at < read_at[0]
+
+class TestRebuilds:
+    """Test file replacement."""
+
+    def test_rebuild_is_picked_up(self, path, catalog):
+        """Readers reopen a replaced file; states already mapped keep working."""
+        store = ProductStore(path, check_interval=0, catalog=catalog)
+        old = store._current()
+        write_store([{'barcode': '123', 'name': 'Maden Suyu'}], path, generation=catalog.current())
+        assert store.get('123')['name'] == 'Maden Suyu' and store.get('8690000000018') is None
+        assert old.product(old.find(b'8690000000018'))['name'] == 'Ayran'
+        assert not os.path.exists(f'{path}.tmp')
+
+    def test_corrupt_file_keeps_mapped_version(self, path, catalog):
+        """A file that is not a store is ignored while the mapped version is served."""
+        store = ProductStore(path, check_interval=0, catalog=catalog)
+        assert store.get('123') is not None
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(b'not a store')
+        os.replace(f'{path}.tmp', path)
+        assert store.get('123')['name'] == 'Su'
+        assert ProductStore(path, catalog=catalog).get('123') is None
+
+class TestBarcodeLookups:
+    """Test the store in front of the products table."""
+
+    def test_store_before_table(self, path, catalog, monkeypatch):
+        """Stored products need no query; after a write anywhere the table is read until a rebuild."""
+        service = BarcodeService(store=ProductStore(path, check_interval=0, catalog=catalog))
+        reads = []
+        monkeypatch.setattr(service, '_find', lambda barcode: reads.append(barcode) or {'barcode': barcode})
+        result = service.lookup('8690000000018')
+        assert result['source'] == 'store' and result['product']['name'] == 'Ayran' and reads == []
+
+        # Another process (an import or sync) wrote products
+        bump_catalog_generation(catalog.path)
+        assert service.lookup('8690000000018')['source'] == 'database' and reads == ['8690000000018']
+        assert service.get_stats()['store_hits'] == 1 and service.get_stats()['store']['serving'] is False
+
+        # A store built at the new generation serves products again
+        write_store([AYRAN], path, generation=catalog.current())
+        service._products.pop('8690000000018')
+        assert service.lookup('8690000000018')['source'] == 'store'
@@ -0,0 +1,148 @@
+"""
+Tests for delta product syncs
+High-water mark filtering, state handling and precomputation of changed products only.
+"""
+
+import json
+from collections import namedtuple
+
+import pytest
+
+from services.product_index import ProductIndex
+from services.product_sync import NUTRITION_COLUMNS, ProductSync, precomputed_values
+from utils.external_apis import OpenFoodFactsClient
+
+def record(code, modified, name='Ayran'):
+    return {'code': code, 'product_name': name, 'last_modified_t': modified}
+
+@pytest.fixture
+def sync(tmp_path):
+    calls = {'written': [], 'precomputed': []}
+
+    def writer(rows):
+        calls['written'].append([row['barcode'] for row in rows])
+        changed = [row['barcode'] for row in rows if row['name'] != 'same']
+        return {'inserted': len(changed), 'updated': 0, 'unchanged': len(rows) - len(changed), 'barcodes': changed}
+
+    def precompute(barcodes):
+        calls['precomputed'].append(barcodes)
+        return len(barcodes)
+
+    sync = ProductSync(str(tmp_path / 'state.json'), chunk_size=2, writer=writer, precompute=precompute,
+                       index_snapshot=None)
+    sync.calls = calls
+    return sync
+
+class TestDeltaSync:
+    """Test high-water mark handling."""
+
+    def test_first_sync_takes_everything(self, sync):
+        """Without a mark every record is written and the newest time becomes the mark."""
+        stats = sync.sync_records([record('1', 100), record('2', 300), record('3', 200)], source='test')
+        assert stats['considered'] == 3 and stats['high_water_mark'] == 300
+        assert sync.load_state()['high_water_mark'] == 300
+
+    def test_only_modified_records(self, sync):
+        """Records older than the mark are skipped; the mark itself is re-checked."""
+        sync.sync_records([record('1', 100), record('2', 300)], source='test')
+        stats = sync.sync_records([record('1', 100), record('2', 300, 'same'), record('3', 400), record('4', None)],
+                                  source='test')
+        assert stats['since'] == 300 and stats['considered'] == 3
+        assert sync.calls['written'][-2:] == [['2', '3'], ['4']]
+        assert stats['unchanged'] == 1 and stats['high_water_mark'] == 400
+
+    def test_precompute_changed_only(self, sync):
+        """Only barcodes the upsert changed are re-scored."""
+        stats = sync.sync_records([record('1', 1, 'same'), record('2', 2), record('3', 3, 'same')], source='test')
+        assert sync.calls['precomputed'] == [['2']] and stats['precomputed'] == 1
+
+    def test_failed_sync_keeps_mark(self, sync):
+        """An error leaves the previous mark so the next sync repeats the work."""
+        sync.sync_records([record('1', 100)], source='test')
+
+        def failing(rows):
+            raise RuntimeError('database unavailable')
+        sync.writer = failing
+        with pytest.raises(RuntimeError):
+            sync.sync_records([record('2', 500)], source='test')
+        assert sync.load_state()['high_water_mark'] == 100
+
+    def test_full_sync(self, sync):
+        """A full sync ignores the mark."""
+        sync.sync_records([record('1', 100)], source='test')
+        assert sync.sync_records([record('1', 100), record('0', 50)], source='test', full=True)['considered'] == 2
+
+    def test_dump(self, sync, tmp_path):
+        """Dumps are filtered on last_modified_t as they are streamed."""
+        path = tmp_path / 'dump.jsonl'
+        path.write_text('\n'.join(json.dumps(record(str(code), code)) for code in range(10)))
+        sync._save_state({'high_water_mark': 7})
+        assert sync.sync_dump(str(path))['considered'] == 3
+
+    def test_synced_products_are_indexed(self, sync, tmp_path):
+        """Considered products are added to the product index snapshot."""
+        sync.index_snapshot = str(tmp_path / 'index.npz')
+        index = ProductIndex()
+        index.add_products([{'code': '1', 'product_name': 'Ayran', '_keywords': ['ayran']}])
+        index.save(sync.index_snapshot)
+        sync._save_state({'high_water_mark': 500})
+        stats = sync.sync_records([record('1', 400, 'Old'), dict(record('2', 600, 'Kefir'), _keywords=['kefir'])],
+                                  source='test')
+        assert stats['indexed'] == 1
+        assert index.load(sync.index_snapshot) == 2 and index.get('2')['product_name'] == 'Kefir'
+
+    def test_remote_stops_at_mark(self, sync, monkeypatch):
+        """The search API is paged newest first until a product older than the mark."""
+        pages = {1: [record('9', 900), record('8', 800)], 2: [record('7', 700), record('6', 600)], 3: []}
+        requested = []
+
+        class Response:
+            def __init__(self, page):
+                self.page = page
+
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return {'products': pages[self.page]}
+
+        client = OpenFoodFactsClient('http://off.test')
+
+        def get(url, params, timeout):
+            requested.append(params['page'])
+            assert params['sort_by'] == 'last_modified_t'
+            return Response(params['page'])
+        monkeypatch.setattr(client.session, 'get', get)
+
+        sync._save_state({'high_water_mark': 700})
+        stats = sync.sync_remote(client)
+        assert requested == [1, 2] and stats['considered'] == 3
+        assert stats['complete'] and sync.load_state()['high_water_mark'] == 900
+
+        # Cut off by max_pages before the mark: products between 800 and the mark
+        # were not read, so the mark must not move past them
+        pages[1] = [record('11', 1100), record('10', 1000)]
+        pages[2] = [record('9', 950), record('9b', 920)]
+        pages[3] = [record('8', 850), record('7', 700)]
+        requested.clear()
+        stats = sync.sync_remote(client, max_pages=2)
+        assert requested == [1, 2] and stats['considered'] == 4
+        assert not stats['complete'] and sync.load_state()['high_water_mark'] == 900
+
+        requested.clear()
+        stats = sync.sync_remote(client)
+        assert requested == [1, 2, 3] and stats['complete']
+        assert sync.load_state()['high_water_mark'] == 1100
+
+class TestPrecompute:
+    """Test score and allergen precomputation."""
+
+    def test_values(self):
+        """Products are scored as one frame; rows without nutrition values get no score."""
+        Row = namedtuple('Row', ['barcode', *NUTRITION_COLUMNS.values(), 'nutrition_data', 'ingredients'])
+        rows = [Row('1', 2252, 539, 30.9, 10.6, 57.5, 56.3, None, 6.3, 0.11, 42.8,
+                    {'fruits_vegetables_nuts': 13.0}, 'şeker, fındık, süt tozu'),
+                Row('2', *([None] * 10), None, None)]
+        values = precomputed_values(rows, lambda text: [{'name': 'Milk'}])
+        assert values[0]['_grade'] == 'E' and values[0]['_allergens'] == ['Milk']
+        assert values[1] == {'_barcode': '2', '_grade': None, '_points': None, '_allergens': None}
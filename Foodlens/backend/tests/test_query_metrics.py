@@ -0,0 +1,89 @@
+"""
+Tests for query instrumentation
+Per-request query counts, repeated statements and query budgets.
+"""
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import text
+
+from utils.database import Database, dispose_engine, register_session_teardown
+from utils.query_metrics import (
+    QueryBudgetExceeded, fingerprint, query_budget, query_metrics, register_query_metrics
+)
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App on a SQLite database with query metrics and debug headers."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'foodlens.db'}")
+    dispose_engine()
+    query_metrics.reset()
+    app = Flask(__name__)
+    app.config.update(TESTING=True, QUERY_METRICS_HEADERS=True)
+    register_session_teardown(app)
+    register_query_metrics(app)
+
+    @app.route('/items/<int:count>')
+    def items(count):
+        session = Database().connect()
+        for item_id in range(count):
+            session.execute(text('SELECT :id'), {'id': item_id})
+        return jsonify({'success': True})
+
+    @app.route('/budgeted')
+    @query_budget(2)
+    def budgeted():
+        session = Database().connect()
+        for item_id in range(3):
+            session.execute(text('SELECT :id'), {'id': item_id})
+        return jsonify({'success': True})
+
+    yield app
+    dispose_engine()
+
+class TestFingerprint:
+    """Test statement fingerprints."""
+
+    def test_parameters_and_literals_collapse(self):
+        """Statements differing only in values share a fingerprint."""
+        assert fingerprint("SELECT * FROM users WHERE id = %(id_1)s AND age > 30") == \
+            fingerprint("SELECT *  FROM users\n WHERE id = 'abc' AND age > 41")
+        assert fingerprint("SELECT 1 FROM t WHERE id IN (%(a)s, %(b)s, %(c)s)") == "SELECT ? FROM t WHERE id IN (?+)"
+
+class TestRequestQueryStats:
+    """Test per-request query counting."""
+
+    def test_debug_headers(self, app):
+        """Responses report query count, time and repeats."""
+        response = app.test_client().get('/items/2')
+        assert response.headers['X-Query-Count'] == '2'
+        assert float(response.headers['X-Query-Time-Ms']) >= 0
+        assert response.headers['X-Query-Repeated'] == '0'
+
+    def test_repeated_statements_flagged(self, app):
+        """The same statement run in a loop is reported as repeated."""
+        response = app.test_client().get('/items/6')
+        assert response.headers['X-Query-Repeated'] == '6'
+        assert query_metrics.snapshot()['items']['requests_with_repeated_queries'] == 1
+
+    def test_histograms(self, app):
+        """Each endpoint gets cumulative query count histograms."""
+        client = app.test_client()
+        client.get('/items/1')
+        client.get('/items/3')
+        histogram = query_metrics.snapshot()['items']['query_count']
+        assert histogram['count'] == 2
+        assert histogram['sum'] == 4
+        assert histogram['buckets']['1'] == 1
+        assert histogram['buckets']['5'] == 2
+        assert histogram['buckets']['+Inf'] == 2
+
+    def test_budget_enforced_in_testing(self, app):
+        """Going over the budget fails under TESTING."""
+        with pytest.raises(QueryBudgetExceeded, match='ran 3 queries'):
+            app.test_client().get('/budgeted')
+
+    def test_budget_only_logged_otherwise(self, app):
+        """Outside tests the endpoint still responds."""
+        app.config['TESTING'] = False
+        assert app.test_client().get('/budgeted').status_code == 200
@@ -0,0 +1,165 @@
+"""
+Tests for rate limiting
+Token buckets, the Redis backend and the rate_limit decorator.
+"""
+
+import pytest
+from flask import Flask, jsonify, request
+
+from utils import decorators, rate_limiter as rate_limiter_module
+from utils.decorators import rate_limit
+from utils.rate_limiter import MemoryBucketStore, RedisBucketStore, RateLimiter, _take
+
+class FakeClock:
+    """Stand-in for time.monotonic."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeRedis:
+    """
+    Local stand-in for a Redis server: register_script runs the token bucket
+    in Python and replies in Redis' shape (integer plus bulk strings).
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.hashes = {}
+        self.fail = False
+
+    def register_script(self, script):
+        assert 'redis.call' in script
+
+        def run(keys, args):
+            if self.fail:
+                raise ConnectionError('connection refused')
+            capacity, rate, cost = float(args[0]), float(args[1]), float(args[2])
+            now = self.clock()
+            tokens, updated_at = self.hashes.get(keys[0], (capacity, now))
+            allowed, tokens, retry_after = _take(tokens, updated_at, now, capacity, rate, cost)
+            self.hashes[keys[0]] = (tokens, now)
+            return [int(allowed), str(tokens).encode(), str(retry_after).encode()]
+        return run
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable monotonic clock for the memory store."""
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter_module.time, 'monotonic', clock)
+    return clock
+
+class TestBucketStores:
+    """Test the memory and Redis bucket stores."""
+
+    def test_memory_bucket_refills(self, clock):
+        """A bucket allows its capacity, then refills at capacity per window."""
+        store = MemoryBucketStore()
+        results = [store.take('k', 3, 60, 1) for _ in range(4)]
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert results[3].retry_after == pytest.approx(20)
+
+        clock.now += 20
+        assert store.take('k', 3, 60, 1).allowed
+        assert not store.take('k', 3, 60, 1).allowed
+
+    def test_costs_are_weighted(self, clock):
+        """An OCR-weighted request takes several tokens."""
+        store = MemoryBucketStore()
+        assert store.take('k', 20, 60, 10).remaining == 10
+        assert store.take('k', 20, 60, 10).allowed
+        assert not store.take('k', 20, 60, 1).allowed
+        assert store.take('other', 20, 60, 1).allowed
+
+    def test_redis_store_parses_replies(self, clock):
+        """Replies from the script become RateLimitResults; keys are prefixed."""
+        client = FakeRedis(clock)
+        store = RedisBucketStore(client)
+        assert store.take('k', 2, 60, 1).remaining == 1
+        assert store.take('k', 2, 60, 1).allowed
+        result = store.take('k', 2, 60, 1)
+        assert not result.allowed
+        assert result.retry_after == pytest.approx(30)
+        assert list(client.hashes) == ['foodlens:ratelimit:k']
+
+    def test_falls_back_to_memory(self, clock):
+        """While Redis fails, limits are enforced from process memory."""
+        client = FakeRedis(clock)
+        limiter = RateLimiter(storage='memory')
+        limiter.store = RedisBucketStore(client)
+        client.fail = True
+        assert [limiter.take('k', 1, 60).allowed for _ in range(2)] == [True, False]
+
+    def test_redis_cooldown_after_failure(self, clock):
+        """After a failure Redis is left alone for the cooldown, then tried again."""
+        client = FakeRedis(clock)
+        limiter = RateLimiter(storage='memory')
+        limiter.store = RedisBucketStore(client)
+        calls = []
+        script = limiter.store._script
+        limiter.store._script = lambda keys, args: calls.append(keys) or script(keys=keys, args=args)
+
+        client.fail = True
+        for _ in range(3):
+            limiter.take('k', 10, 60)
+        assert len(calls) == 1
+
+        client.fail = False
+        clock.now += rate_limiter_module.REDIS_RETRY_COOLDOWN
+        limiter.take('k', 10, 60)
+        assert len(calls) == 2 and 'foodlens:ratelimit:k' in client.hashes
+
+class TestRateLimitDecorator:
+    """Test the rate_limit decorator."""
+
+    @pytest.fixture
+    def app(self, monkeypatch, clock):
+        """App with rate limited routes and a fresh in-memory limiter."""
+        monkeypatch.setattr(decorators, 'rate_limiter', RateLimiter(storage='memory'))
+        app = Flask(__name__)
+
+        @app.route('/crud')
+        @rate_limit(2, 1)
+        def crud():
+            return jsonify({'success': True})
+
+        @app.route('/ocr')
+        @rate_limit(20, 1, key='user', cost='ocr')
+        def ocr():
+            return jsonify({'success': True}), 201
+
+        @app.before_request
+        def authenticate():
+            user_id = request.headers.get('X-Test-User')
+            request.current_user = {'id': user_id} if user_id else None
+
+        return app
+
+    def test_limits_and_headers(self, app):
+        """Requests past the limit get 429 with RateLimit-* and Retry-After."""
+        client = app.test_client()
+        first = client.get('/crud')
+        assert first.status_code == 200
+        assert first.headers['RateLimit-Limit'] == '2'
+        assert first.headers['RateLimit-Remaining'] == '1'
+        assert first.headers['RateLimit-Policy'] == '2;w=60'
+        assert client.get('/crud').status_code == 200
+
+        limited = client.get('/crud')
+        assert limited.status_code == 429
+        assert limited.headers['Retry-After'] == '30'
+        assert limited.get_json() == {'success': False, 'error': 'Rate limit exceeded', 'retry_after': 30}
+
+    def test_user_key_and_ocr_cost(self, app):
+        """OCR requests cost more and are counted per signed-in user."""
+        client = app.test_client()
+        assert [client.get('/ocr', headers={'X-Test-User': 'a'}).status_code for _ in range(3)] == [201, 201, 429]
+        assert client.get('/ocr', headers={'X-Test-User': 'b'}).status_code == 201
+
+    def test_can_be_disabled(self, app):
+        """RATE_LIMIT_ENABLED=False skips limiting."""
+        app.config['RATE_LIMIT_ENABLED'] = False
+        client = app.test_client()
+        assert all(client.get('/crud').status_code == 200 for _ in range(5))
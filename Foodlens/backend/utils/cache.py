@@ -0,0 +1,54 @@
+"""
+Caching utilities for FoodLens Application
+Thread-safe in-process caches shared by services.
+"""
+
+import threading
+from typing import Any, Callable, Hashable
+
+from cachetools import TTLCache
+
+_MISSING = object()
+
+
+class ThreadSafeTTLCache:
+    """
+    cachetools.TTLCache guarded by a lock, safe to share between request threads.
+    get_or_load runs the loader outside the lock, so a slow load does not block
+    readers of other keys; concurrent misses on one key may both load.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._cache.get(key, default)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._cache.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._cache
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cache)
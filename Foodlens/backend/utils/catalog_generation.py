@@ -0,0 +1,59 @@
+"""
+Catalog generation for FoodLens Application
+A counter shared by every process on the host that product writers bump after
+committing, so copies of products held elsewhere (barcode caches, the product
+store) can tell they are out of date.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+CATALOG_GENERATION_PATH = os.getenv('CATALOG_GENERATION_PATH', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'catalog_generation'))
+# How often readers look at the counter, in seconds; copies may be this stale
+CATALOG_CHECK_INTERVAL = float(os.getenv('CATALOG_CHECK_INTERVAL', '5'))
+
+
+def bump_catalog_generation(path: str = CATALOG_GENERATION_PATH) -> int:
+    """
+    Record that products were written; call after the commit. The generation
+    is the size of the marker file, and each bump appends one byte, so
+    concurrent writers never lose a bump and the counter needs no clock.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, b'.')
+        return os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+
+
+def read_catalog_generation(path: str = CATALOG_GENERATION_PATH) -> int:
+    """Current generation, 0 before the first bump"""
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+class CatalogGeneration:
+    """The current generation, re-read at most every check_interval seconds"""
+
+    def __init__(self, path: str = CATALOG_GENERATION_PATH, check_interval: float = CATALOG_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._generation = 0
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._generation
+        with self._lock:
+            if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+                self._generation = read_catalog_generation(self.path)
+                self._checked_at = time.monotonic()
+            return self._generation
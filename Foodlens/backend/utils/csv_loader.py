@@ -1,14 +1,302 @@
 """
 CSV Loader Utility for FoodLens Application
-Data import utilities for nutritional databases and product information.
+Streaming import of OpenFoodFacts JSON, JSON Lines and CSV exports into the products table.
 """
 
-# CSV loader will be implemented here
-# This utility will handle:
-# - USDA FoodData Central CSV import
-# - OpenFoodFacts data import
-# - Custom nutrition database imports
-# - Product catalog bulk uploads
-# - Data validation and cleaning
-# - Batch processing and progress tracking
-# - Error handling and logging
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, TextIO
+
+import numpy as np
+
+from utils.external_apis import OFF_NUTRIMENT_FIELDS, OFF_PRODUCT_FIELDS, off_product_fields
+from models.product import Product
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+READ_BLOCK_SIZE = 1 << 20
+FORMATS = ('json', 'jsonl', 'csv')
+
+# OpenFoodFacts CSV exports hold comma-separated tags in these columns
+CSV_TAG_FIELDS = {
+    'allergens_tags': ('allergens_tags', 'allergens'),
+    'additives_tags': ('additives_tags',),
+    'countries_tags': ('countries_tags',),
+    'categories_tags': ('categories_tags',),
+}
+# Nutrients without a products column of their own go to nutrition_data
+NUTRIENT_COLUMNS = {'proteins': 'protein', 'fruits_vegetables_nuts': None}
+_NUTRIENTS = list(OFF_NUTRIMENT_FIELDS)
+_NUTRIMENT_KEYS = [OFF_NUTRIMENT_FIELDS[field][0] for field in _NUTRIENTS]
+_FACTORS = np.array([OFF_NUTRIMENT_FIELDS[field][1] for field in _NUTRIENTS])
+
+
+def _column_limit(field: str) -> float:
+    """Largest value the field's DECIMAL column stores (percentages for nutrition_data)"""
+    column = NUTRIENT_COLUMNS.get(field, field)
+    if column is None:
+        return 100.0
+    column_type = Product.__table__.c[column].type
+    return 10.0 ** (column_type.precision - column_type.scale) - 10.0 ** -column_type.scale
+
+
+_LIMITS = np.array([_column_limit(field) for field in _NUTRIENTS])
+
+
+class LoadProgress:
+    """Counters of one import, reported after every chunk"""
+    __slots__ = ('path', 'total_bytes', 'bytes_read', 'records', 'rows', 'skipped', 'started')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+        self.records = 0
+        self.rows = 0
+        self.skipped = 0
+        self.started = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            'path': self.path,
+            'records': self.records,
+            'rows': self.rows,
+            'skipped': self.skipped,
+            'percent': round(100.0 * self.bytes_read / self.total_bytes, 1) if self.total_bytes else 100.0,
+            'elapsed_seconds': round(elapsed, 3),
+            'records_per_second': round(self.records / elapsed, 1) if elapsed else None,
+        }
+
+
+def log_progress(progress: LoadProgress) -> None:
+    stats = progress.to_dict()
+    logger.info(f"{stats['path']}: {stats['percent']}% read, {stats['rows']} rows from "
+                f"{stats['records']} records ({stats['records_per_second']}/s)")
+
+
+def detect_format(path: str) -> str:
+    """json, jsonl or csv from the file name; .json files holding JSON Lines are detected when read"""
+    name = path[:-3] if path.endswith('.gz') else path
+    extension = os.path.splitext(name)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension in ('.csv', '.tsv'):
+        return 'csv'
+    if extension == '.json':
+        return 'json'
+    raise ValueError(f'Unknown import format for {path}; expected .json, .jsonl or .csv')
+
+
+def _project(record: Dict[str, Any], fields: Sequence[str] = OFF_PRODUCT_FIELDS) -> Dict[str, Any]:
+    # Only the fields off_product_fields reads are kept while a chunk is buffered
+    product = {field: record[field] for field in fields if field in record}
+    if isinstance(product.get('nutriments'), dict):
+        product['nutriments'] = {key: product['nutriments'][key] for key in _NUTRIMENT_KEYS
+                                 if key in product['nutriments']}
+    return product
+
+
+def _iter_json_array(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """
+    Elements of a top-level JSON array, decoded one at a time from fixed-size
+    reads. A file starting with '{' is read as concatenated JSON objects.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        block = stream.read(READ_BLOCK_SIZE)
+        eof = not block
+        buffer, pos = buffer[pos:] + block, 0
+
+    in_array = None
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                if in_array:
+                    raise ValueError('Unterminated JSON array')
+                return
+            fill()
+            continue
+        if in_array is None:
+            in_array = buffer[pos] == '['
+            pos += in_array
+            continue
+        if in_array and buffer[pos] == ']':
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Usually an element cut by the read boundary
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buffer) and not eof and not isinstance(value, (dict, list)):
+            # A number may continue in the next block
+            fill()
+            continue
+        pos = end
+        if isinstance(value, dict):
+            yield value
+
+
+def _iter_json_lines(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed JSON on line {number}")
+            continue
+        if isinstance(value, dict):
+            yield value
+
+
+def _csv_number(value: Optional[str]):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _iter_csv(stream: TextIO, fields: Sequence[str] = OFF_PRODUCT_FIELDS) -> Iterator[Dict[str, Any]]:
+    """OpenFoodFacts CSV rows (tab- or comma-separated) in the shape of its JSON products"""
+    header = stream.readline()
+    delimiter = '\t' if '\t' in header else ','
+    # Ingredient lists exceed the default 128 KB field limit in full exports
+    csv.field_size_limit(1 << 30)
+    columns = next(csv.reader([header], delimiter=delimiter))
+    reader = csv.DictReader(stream, fieldnames=columns, delimiter=delimiter)
+    for row in reader:
+        product = {field: row[field] for field in fields if row.get(field)}
+        for field, sources in CSV_TAG_FIELDS.items():
+            value = next((row[source] for source in sources if row.get(source)), None)
+            if value:
+                product[field] = value.split(',')
+        product['serving_quantity'] = _csv_number(row.get('serving_quantity'))
+        product['nutriments'] = {key: row[key] for key in _NUTRIMENT_KEYS if row.get(key)}
+        yield product
+
+
+def iter_records(path: str, fmt: Optional[str] = None, progress: Optional[LoadProgress] = None,
+                 fields: Sequence[str] = OFF_PRODUCT_FIELDS) -> Iterator[Dict[str, Any]]:
+    """
+    OpenFoodFacts products of a JSON array, JSON Lines or CSV file (optionally
+    gzipped), read incrementally and projected to `fields` (by default the
+    fields products use).
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown import format {fmt}; expected one of {", ".join(FORMATS)}')
+
+    with open(path, 'rb') as raw:
+        binary = gzip.GzipFile(fileobj=raw) if path.endswith('.gz') else raw
+        stream = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+        if fmt == 'csv':
+            records = _iter_csv(stream, fields)
+        else:
+            records = {'json': _iter_json_array, 'jsonl': _iter_json_lines}[fmt](stream)
+        for record in records:
+            if progress is not None:
+                progress.records += 1
+                progress.bytes_read = raw.tell()
+            yield _project(record, fields)
+
+
+def _nutrient_value(value) -> float:
+    if isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def normalize_chunk(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Product rows for a chunk of OpenFoodFacts records. Nutrients are converted
+    as one matrix: unit factors applied, values rounded to the column scale,
+    and negative, non-numeric or out-of-range values dropped.
+    Records without a barcode or name are left out.
+    """
+    rows, nutriments = [], []
+    for record in records:
+        fields = off_product_fields(record, nutrition={})
+        if fields is None or not fields['barcode']:
+            continue
+        rows.append(fields)
+        nutriments.append(record.get('nutriments') or {})
+    if not rows:
+        return rows
+
+    matrix = np.array([[_nutrient_value(values.get(key)) for key in _NUTRIMENT_KEYS] for values in nutriments],
+                      dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        matrix = np.round(matrix * _FACTORS, 2)
+        invalid = ~np.isfinite(matrix) | (matrix < 0) | (matrix > _LIMITS)
+    matrix = matrix.astype(object)
+    matrix[invalid] = None
+
+    for row, values in zip(rows, matrix.tolist()):
+        extra = {}
+        for field, value in zip(_NUTRIENTS, values):
+            column = NUTRIENT_COLUMNS.get(field, field)
+            if column is None:
+                if value is not None:
+                    extra[field] = value
+            else:
+                row[column] = value
+        row['nutrition_data'] = extra or None
+    return rows
+
+
+def iter_product_chunks(path: str, fmt: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        progress: Optional[LoadProgress] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Normalized product rows of an import file, chunk_size records at a time"""
+    chunk = []
+    for record in iter_records(path, fmt, progress):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            rows = normalize_chunk(chunk)
+            if progress is not None:
+                progress.skipped += len(chunk) - len(rows)
+            yield rows
+            chunk = []
+    if chunk:
+        rows = normalize_chunk(chunk)
+        if progress is not None:
+            progress.skipped += len(chunk) - len(rows)
+        yield rows
+
+
+def load_products(path: str, sink: Callable[[List[Dict[str, Any]]], Any],
+                  fmt: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  progress: Optional[Callable[[LoadProgress], None]] = log_progress) -> Dict[str, Any]:
+    """
+    Stream an import file to sink (services.product_importer.upsert_products
+    for the products table) one chunk at a time; memory stays bounded by
+    chunk_size whatever the file size. progress is called after every chunk.
+    """
+    state = LoadProgress(path)
+    for rows in iter_product_chunks(path, fmt, chunk_size, state):
+        if rows:
+            sink(rows)
+        state.rows += len(rows)
+        if progress is not None:
+            progress(state)
+    return state.to_dict()
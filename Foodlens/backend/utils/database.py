@@ -3,25 +3,196 @@
 FoodLens Database Utilities
 Database connection, initialization, and utility functions for PostgreSQL.
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from flask import g, has_app_context
 from models import Base
 from dotenv import load_dotenv
+import logging
 import os
+import threading
+import time
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Connection pool settings, shared by every service in the process
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+# Reconnect connections older than this (seconds), before server/proxy idle limits
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+# Server-side limit per statement (milliseconds, 0 disables)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 15000))
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how often and how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                'size': self.size(),
+                'checked_out': self.checkedout(),
+                'idle': self.checkedin(),
+                'overflow': max(0, self.overflow()),
+                'max_overflow': self._max_overflow,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_seconds * 1000, 3)
+            }
+
+
+def create_database_engine(url: str):
+    """Engine with the pool settings above; statement_timeout is set on PostgreSQL."""
+    connect_args = {}
+    if make_url(url).get_backend_name() == 'postgresql' and DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args
+    )
+
+
+_engine = None
+_session_factory = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The process-wide engine, created on first use from DATABASE_URL."""
+    global _engine, _session_factory
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = os.getenv('DATABASE_URL')  # DATABASE_URL .env dosyasından alınacak
+                if not url:
+                    raise RuntimeError('DATABASE_URL is not set')
+                engine = create_database_engine(url)
+                _session_factory = sessionmaker(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def get_session_factory():
+    """sessionmaker bound to the process-wide engine."""
+    get_engine()
+    return _session_factory
+
+
+def dispose_engine() -> None:
+    """Close pooled connections and drop the engine (after fork, or in tests)."""
+    global _engine, _session_factory
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _session_factory = None
+
+
+def create_schema() -> None:
+    """Create missing tables. Run from scripts/init_db.py or tests, never per request."""
+    engine = get_engine()
+    if engine.dialect.name == 'postgresql':
+        # Trigram indexes on products need pg_trgm
+        with engine.begin() as connection:
+            connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    Base.metadata.create_all(engine)
+
+
+def get_pool_stats() -> dict:
+    """Connection pool usage and checkout wait times."""
+    return get_engine().pool.get_stats()
+
+
+def get_request_session():
+    """
+    The session shared by every service during the current app context
+    (request), created on first use. Committed or rolled back and closed by
+    the teardown registered with register_session_teardown.
+    """
+    session = g.get('_db_session')
+    if session is None:
+        session = get_session_factory()()
+        g._db_session = session
+    return session
+
+
+def _teardown_request_session(error=None) -> None:
+    session = g.pop('_db_session', None)
+    if session is None:
+        return
+    try:
+        if error is None:
+            session.commit()
+        else:
+            session.rollback()
+    except Exception as e:
+        logger.error(f"Request session commit failed: {e}")
+        session.rollback()
+    finally:
+        session.close()
+
+
+def register_session_teardown(app) -> None:
+    """Finish the request-scoped session when each app context ends."""
+    app.teardown_appcontext(_teardown_request_session)
+
+
 class Database:
-    def __init__(self):
-        self.engine = None
-        self.Session = None
+    """
+    Session access for services; all instances share one engine and pool.
+    Inside an app context connect() returns the request-scoped session, so one
+    request uses one connection however many services it calls; elsewhere
+    (scripts, background threads) it opens a standalone session.
+    """
+
+    @property
+    def engine(self):
+        return get_engine()
 
     def connect(self):
-        if self.engine is None:
-            self.engine = create_engine(os.getenv('DATABASE_URL'))  # DATABASE_URL .env dosyasından alınacak
-            Base.metadata.create_all(self.engine)
-            self.Session = sessionmaker(bind=self.engine)
-        return self.Session()
+        if has_app_context():
+            return get_request_session()
+        return get_session_factory()()
 
     def close(self, session):
-        session.close()
\ No newline at end of file
+        # The request-scoped session stays open until teardown
+        if has_app_context() and g.get('_db_session') is session:
+            return
+        session.close()
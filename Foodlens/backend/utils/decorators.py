@@ -4,8 +4,10 @@ Authentication, authorization, and utility decorators.
 """
 
 from functools import wraps
-from flask import request, jsonify, current_app
+from typing import Optional
+from flask import request, jsonify, current_app, make_response
 from services.auth_service import auth_service
+from utils.rate_limiter import rate_limiter
 
 def require_auth(f):
     """
@@ -50,6 +52,25 @@ def require_auth(f):
     
     return decorated_function
 
+def optional_auth(f):
+    """
+    Decorator for endpoints that also serve anonymous users.
+    Sets request.current_user from a valid Bearer token, otherwise None;
+    never rejects the request.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        request.current_user = None
+        auth_header = request.headers.get('Authorization', '')
+        token_type, _, token = auth_header.partition(' ')
+        if token_type.lower() == 'bearer' and token:
+            verification_result = auth_service.verify_token(token)
+            if verification_result['success']:
+                request.current_user = verification_result['user']
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
 def require_admin(f):
     """
     Decorator to require admin privileges.
@@ -99,18 +120,55 @@ def validate_json(f):
     
     return decorated_function
 
-def rate_limit(max_requests: int = 100, window_minutes: int = 60):
+def rate_limit(max_requests: int = 100, window_minutes: int = 60, key: str = 'ip',
+               cost='crud', scope: Optional[str] = None):
     """
-    Simple rate limiting decorator.
-    This is a basic implementation - in production, use Redis or similar.
+    Token bucket rate limiting decorator.
+    A bucket holds max_requests tokens and refills over window_minutes; each
+    request takes the cost weight of its endpoint class ('crud', 'ocr' or a
+    number). Buckets are per key: 'ip', 'user' (falls back to the IP for
+    anonymous requests, so place below require_auth/optional_auth) or
+    'endpoint' (one bucket shared by all clients). Endpoints with the same
+    scope share buckets; scope defaults to the endpoint name.
     """
+    if key not in ('ip', 'user', 'endpoint'):
+        raise ValueError(f"Unknown rate limit key: {key}")
+    window_seconds = window_minutes * 60
+    
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Simple rate limiting - in production, implement with Redis
-            # For now, just log the request
-            current_app.logger.info(f"Rate limit check for {request.remote_addr}")
-            return f(*args, **kwargs)
+            if not current_app.config.get('RATE_LIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+            
+            if key == 'endpoint':
+                identity = 'all'
+            elif key == 'user' and getattr(request, 'current_user', None):
+                identity = f"user:{request.current_user['id']}"
+            else:
+                identity = f"ip:{request.remote_addr}"
+            bucket = f"{scope or request.endpoint}:{max_requests}/{window_seconds}:{identity}"
+            
+            # A request costlier than the bucket is allowed once per full window
+            tokens = min(rate_limiter.resolve_cost(cost), max_requests)
+            result = rate_limiter.take(bucket, max_requests, window_seconds, tokens)
+            
+            if not result.allowed:
+                response = jsonify({
+                    'success': False,
+                    'error': 'Rate limit exceeded',
+                    'retry_after': int(result.headers(window_seconds)['Retry-After'])
+                })
+                response.status_code = 429
+            else:
+                response = make_response(f(*args, **kwargs))
+            
+            # With stacked limits the most restrictive one is reported
+            current = response.headers.get('RateLimit-Remaining')
+            if not result.allowed or (response.status_code != 429 and
+                                      (current is None or int(current) >= int(result.remaining))):
+                response.headers.update(result.headers(window_seconds))
+            return response
         
         return decorated_function
     return decorator
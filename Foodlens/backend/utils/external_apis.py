@@ -12,3 +12,187 @@ Integration with OpenFoodFacts and USDA FoodData Central APIs.
 # - Product image fetching
 # - Data validation and normalization
 # - Caching strategies for API responses
+
+import logging
+import os
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+OFF_API_URL = os.getenv('OFF_API_URL', 'https://world.openfoodfacts.org')
+OFF_API_TIMEOUT = float(os.getenv('OFF_API_TIMEOUT', '5'))
+# OpenFoodFacts asks API clients to identify themselves
+OFF_USER_AGENT = os.getenv('OFF_USER_AGENT', 'FoodLens/1.0 (https://github.com/alirizaercan/Foodlens-YZTA_Bootcamp-T199)')
+# Product fields requested from the OFF API: everything off_product_fields
+# reads, plus the modification time delta syncs filter on
+OFF_PRODUCT_FIELDS = (
+    'code', 'last_modified_t', 'product_name', 'product_name_tr', 'generic_name', 'brands', 'categories',
+    'nutriments', 'nutriscore_grade', 'nova_group', 'ingredients_text', 'ingredients_text_tr',
+    'allergens_tags', 'additives_tags', 'countries_tags', 'packaging', 'serving_quantity',
+    'image_url', 'image_ingredients_url', 'image_nutrition_url',
+)
+
+# OpenFoodFacts per-100g nutriment keys mapped to NutritionData fields, with
+# the factor converting OFF units (sodium is reported in g) to ours (mg)
+OFF_NUTRIMENT_FIELDS = {
+    'energy_kj': ('energy-kj_100g', 1.0),
+    'energy_kcal': ('energy-kcal_100g', 1.0),
+    'fat': ('fat_100g', 1.0),
+    'saturated_fat': ('saturated-fat_100g', 1.0),
+    'carbohydrates': ('carbohydrates_100g', 1.0),
+    'sugars': ('sugars_100g', 1.0),
+    'fiber': ('fiber_100g', 1.0),
+    'proteins': ('proteins_100g', 1.0),
+    'salt': ('salt_100g', 1.0),
+    'sodium': ('sodium_100g', 1000.0),
+    'fruits_vegetables_nuts': ('fruits-vegetables-nuts-estimate-from-ingredients_100g', 1.0),
+}
+
+
+def off_nutrition_values(product: Dict) -> Dict[str, float]:
+    """NutritionData-style values from an OpenFoodFacts product; absent nutrients are omitted"""
+    nutriments = product.get('nutriments') or {}
+    values = {}
+    for field, (key, factor) in OFF_NUTRIMENT_FIELDS.items():
+        value = nutriments.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[field] = float(value) * factor
+    return values
+
+
+def _first(value: Optional[str], length: int) -> Optional[str]:
+    """First entry of an OFF comma-separated list, cut to the column length"""
+    first = (value or '').split(',')[0].strip()
+    return first[:length] or None
+
+
+def _tags(tags: Optional[List[str]]) -> Optional[List[str]]:
+    """'en:milk' style tags without the language prefix"""
+    values = [tag.split(':', 1)[-1][:50] for tag in tags or [] if tag]
+    return values or None
+
+
+def off_product_fields(product: Dict, nutrition: Optional[Dict[str, float]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Product column values from an OpenFoodFacts product, or None when it has
+    no name (the products table requires one). Bulk loaders pass nutrition
+    values they normalized themselves.
+    """
+    name = (product.get('product_name_tr') or product.get('product_name') or product.get('generic_name') or '').strip()
+    if not name:
+        return None
+
+    if nutrition is None:
+        nutrition = off_nutrition_values(product)
+    grade = str(product.get('nutriscore_grade') or '').upper()
+    nova_group = product.get('nova_group')
+    serving = product.get('serving_quantity')
+    fields = {
+        'barcode': str(product.get('code') or '')[:50] or None,
+        'name': name[:255],
+        'brand': _first(product.get('brands'), 100),
+        'category': _first(product.get('categories'), 100),
+        'energy_kcal': nutrition.get('energy_kcal'),
+        'energy_kj': nutrition.get('energy_kj'),
+        'fat': nutrition.get('fat'),
+        'saturated_fat': nutrition.get('saturated_fat'),
+        'carbohydrates': nutrition.get('carbohydrates'),
+        'sugars': nutrition.get('sugars'),
+        'fiber': nutrition.get('fiber'),
+        'protein': nutrition.get('proteins'),
+        'salt': nutrition.get('salt'),
+        'sodium': nutrition.get('sodium'),
+        'nutrition_data': {key: value for key, value in nutrition.items() if key == 'fruits_vegetables_nuts'} or None,
+        'nutri_score': grade if grade in ('A', 'B', 'C', 'D', 'E') else None,
+        'nova_group': int(nova_group) if str(nova_group) in ('1', '2', '3', '4') else None,
+        'ingredients': product.get('ingredients_text_tr') or product.get('ingredients_text') or None,
+        'allergens': _tags(product.get('allergens_tags')),
+        'additives': _tags(product.get('additives_tags')),
+        'countries': _tags(product.get('countries_tags')),
+        'packaging': _first(product.get('packaging'), 100),
+        'serving_size': float(serving) if isinstance(serving, (int, float)) and not isinstance(serving, bool) else None,
+        'image_url': (product.get('image_url') or '')[:500] or None,
+        'ingredient_image_url': (product.get('image_ingredients_url') or '')[:500] or None,
+        'nutrition_image_url': (product.get('image_nutrition_url') or '')[:500] or None,
+        'data_source': 'openfoodfacts',
+    }
+    return fields
+
+
+class RemoteSourceError(Exception):
+    """The remote product source could not answer (network error, 5xx, bad payload)"""
+
+
+class OpenFoodFactsClient:
+    """
+    Product lookups against the OpenFoodFacts API over one pooled session.
+    fetch_product returns product column values, None for unknown barcodes,
+    and raises RemoteSourceError when OFF cannot answer.
+    """
+
+    def __init__(self, base_url: str = OFF_API_URL, timeout: float = OFF_API_TIMEOUT, pool_size: int = 10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = OFF_USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch_product(self, barcode: str) -> Optional[Dict[str, Any]]:
+        url = f'{self.base_url}/api/v2/product/{barcode}.json'
+        try:
+            response = self.session.get(url, params={'fields': ','.join(OFF_PRODUCT_FIELDS)}, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise RemoteSourceError(f'OpenFoodFacts request failed: {e}') from e
+
+        # OFF answers unknown barcodes with 404 and status 0
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise RemoteSourceError(f'OpenFoodFacts returned HTTP {response.status_code}')
+        try:
+            payload = response.json()
+        except ValueError as e:
+            raise RemoteSourceError(f'OpenFoodFacts returned invalid JSON: {e}') from e
+
+        if payload.get('status') != 1 or not isinstance(payload.get('product'), dict):
+            return None
+        product = dict(payload['product'], code=payload['product'].get('code') or barcode)
+        return off_product_fields(product)
+
+    def iter_modified(self, since: Optional[int] = None, country: str = 'en:turkey', page_size: int = 100,
+                      max_pages: Optional[int] = None,
+                      fields: Sequence[str] = OFF_PRODUCT_FIELDS) -> Iterator[Dict[str, Any]]:
+        """
+        Raw OFF products of a country, most recently modified first, stopping
+        at the first product last modified before since (a Unix timestamp).
+        Returns (as the generator's value) False when max_pages ended the
+        crawl before that product or the last page.
+        """
+        page = 1
+        while max_pages is None or page <= max_pages:
+            params = {'countries_tags': country, 'sort_by': 'last_modified_t', 'page': page,
+                      'page_size': page_size, 'fields': ','.join(fields)}
+            try:
+                response = self.session.get(f'{self.base_url}/api/v2/search', params=params, timeout=self.timeout)
+                response.raise_for_status()
+                products = response.json().get('products') or []
+            except (requests.RequestException, ValueError) as e:
+                raise RemoteSourceError(f'OpenFoodFacts search failed on page {page}: {e}') from e
+
+            if not products:
+                return True
+            for product in products:
+                modified = product.get('last_modified_t')
+                if since is not None and isinstance(modified, int) and modified < since:
+                    return True
+                yield product
+            page += 1
+        return False
+
+    def close(self) -> None:
+        self.session.close()
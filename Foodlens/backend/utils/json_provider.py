@@ -0,0 +1,104 @@
+"""
+JSON Provider for FoodLens Application
+App-wide JSON serialization backed by orjson, with a stdlib fallback.
+"""
+
+import json
+import logging
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+# Optional fast encoder
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logging.warning("orjson not available. Install with: pip install orjson")
+
+if ORJSON_AVAILABLE:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def json_default(obj: Any) -> Any:
+    """
+    Encode types the JSON encoders do not handle natively.
+    Matches the conversions done by the models' to_dict methods: Decimal to
+    float, UUID to str and dates to ISO 8601.
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if callable(getattr(obj, 'to_dict', None)):
+        return obj.to_dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider encoding with orjson when it is installed.
+    Responses are written straight from orjson's bytes output; anything orjson
+    rejects (e.g. integers beyond 64 bits) falls back to the stdlib encoder.
+    Keys keep insertion order instead of being sorted.
+    """
+    sort_keys = False
+
+    def _orjson_options(self, indent: bool, sort_keys: bool) -> int:
+        options = _ORJSON_OPTIONS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def _stdlib_dumps(self, obj: Any, **kwargs: Any) -> str:
+        kwargs.setdefault('default', json_default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if ORJSON_AVAILABLE and set(kwargs) <= {'indent', 'sort_keys', 'separators'}:
+            options = self._orjson_options(bool(kwargs.get('indent')), kwargs.get('sort_keys', self.sort_keys))
+            try:
+                return orjson.dumps(obj, default=json_default, option=options).decode('utf-8')
+            except TypeError:
+                pass
+        return self._stdlib_dumps(obj, **kwargs)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if ORJSON_AVAILABLE and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                # Let the stdlib raise its usual error type and message
+                pass
+        return json.loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+
+        if ORJSON_AVAILABLE:
+            try:
+                body = orjson.dumps(obj, default=json_default, option=self._orjson_options(indent, self.sort_keys))
+                return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+            except TypeError:
+                pass
+
+        dump_args = {'indent': 2} if indent else {'separators': (',', ':')}
+        return self._app.response_class(f"{self._stdlib_dumps(obj, **dump_args)}\n", mimetype=self.mimetype)
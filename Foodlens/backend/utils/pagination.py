@@ -0,0 +1,30 @@
+"""
+Pagination utilities for FoodLens Application
+Opaque cursors for keyset-paginated listings.
+"""
+
+import base64
+import json
+from typing import Any, List
+
+
+class InvalidCursor(ValueError):
+    """Cursor that was not issued by the listing it was passed to"""
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """URL-safe cursor holding the sort key of the last row on a page"""
+    payload = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    """Sort key from a cursor, which must hold exactly length values"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError as e:
+        raise InvalidCursor(f'Invalid cursor: {e}')
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor('Invalid cursor: wrong shape')
+    return values
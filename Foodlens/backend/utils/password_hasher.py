@@ -0,0 +1,116 @@
+"""
+Password Hashing for FoodLens Application
+Admission control for the password KDF: bounded concurrency, shedding load when saturated.
+"""
+
+import math
+import os
+import threading
+import time
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug method string, e.g. "scrypt" or "pbkdf2:sha256:600000". Stored
+# hashes made with other parameters are upgraded on the next successful login.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+# Hashes computed at once; each one holds a core (and ~32MB for scrypt)
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+# Requests allowed to wait for a hashing slot before new ones get 429
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', PASSWORD_HASH_WORKERS * 8))
+
+
+class PasswordHashingBusy(TooManyRequests):
+    """Raised when the hashing queue is full; rendered as 429 with Retry-After."""
+    description = 'Too many authentication requests, please retry shortly'
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after=retry_after)
+        self.retry_after_seconds = retry_after
+
+
+class PasswordHasher:
+    """
+    Admission control around generate_password_hash/check_password_hash.
+    Hashes run on the calling request thread, at most `workers` at once, so a
+    login burst cannot take every core. At most workers + queue_size requests
+    are admitted (running or waiting for a slot, each holding its request
+    thread); anything beyond that is rejected immediately with 429, which is
+    what keeps a burst from tying up every request thread.
+    """
+
+    def __init__(self, method: str = PASSWORD_HASH_METHOD, workers: int = PASSWORD_HASH_WORKERS,
+                 queue_size: int = PASSWORD_HASH_QUEUE_SIZE):
+        self.method = method
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_size)
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._running = threading.BoundedSemaphore(self.workers)
+        self._method_prefix = None
+        self._in_flight = 0
+        self._rejected = 0
+        # Moving average of one hash, used for Retry-After
+        self._average_seconds = 0.1
+        self._stats_lock = threading.Lock()
+
+    def _timed(self, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self._average_seconds += 0.2 * (elapsed - self._average_seconds)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained."""
+        with self._stats_lock:
+            waves = self._in_flight / self.workers
+            return max(1, math.ceil(waves * self._average_seconds))
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._rejected += 1
+            raise PasswordHashingBusy(self.retry_after())
+        with self._stats_lock:
+            self._in_flight += 1
+        try:
+            with self._running:
+                return self._timed(func, *args)
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured method."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against a stored hash."""
+        if not password_hash:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a stored hash was made with other method or parameters."""
+        if self._method_prefix is None:
+            # werkzeug fills in default parameters ("scrypt" -> "scrypt:32768:8:1");
+            # hashing once gives the exact prefix new hashes are stored with
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return not password_hash or password_hash.split('$', 1)[0] != self._method_prefix
+
+    def get_stats(self) -> dict:
+        """Pool usage for health checks."""
+        with self._stats_lock:
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'in_flight': self._in_flight,
+                'rejected': self._rejected,
+                'average_hash_ms': round(self._average_seconds * 1000, 1)
+            }
+
+# Global password hasher instance
+password_hasher = PasswordHasher()
@@ -0,0 +1,225 @@
+"""
+Query Metrics for FoodLens Application
+Per-request SQL counts, timings and repeated-statement detection.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# A statement run this many times in one request is reported as a likely N+1
+REPEATED_QUERY_THRESHOLD = 5
+# Histogram bucket upper bounds (the last bucket is +Inf)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+QUERY_TIME_MS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_PARAMETER = re.compile(r"%\(\w+\)s|\?|:\w+|\$\d+|%s")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Statement with parameters and literals replaced, so repeats compare equal"""
+    statement = _LITERAL.sub('?', _PARAMETER.sub('?', statement))
+    statement = _IN_LIST.sub('(?+)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+class QueryStats:
+    """Queries run during one request"""
+    __slots__ = ('count', 'seconds', 'fingerprints')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int = REPEATED_QUERY_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statements run at least threshold times, most frequent first"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+
+def current_stats() -> Optional[QueryStats]:
+    """Stats for the current request, if metrics are registered and a request is active"""
+    if not has_app_context():
+        return None
+    return g.get('_query_stats')
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count"""
+    __slots__ = ('bounds', 'buckets', 'total', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = len(self.bounds)
+        for position, bound in enumerate(self.bounds):
+            if value <= bound:
+                index = position
+                break
+        self.buckets[index] += 1
+        self.total += value
+        self.count += 1
+
+    def to_dict(self) -> Dict:
+        cumulative, running = {}, 0
+        for bound, bucket in zip(list(self.bounds) + ['+Inf'], self.buckets):
+            running += bucket
+            cumulative[str(bound)] = running
+        return {'buckets': cumulative, 'sum': round(self.total, 3), 'count': self.count}
+
+
+class QueryMetrics:
+    """Per-endpoint histograms of query count and query time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint: str, stats: QueryStats) -> None:
+        with self._lock:
+            histograms = self._endpoints.get(endpoint)
+            if histograms is None:
+                histograms = self._endpoints[endpoint] = {
+                    'query_count': Histogram(QUERY_COUNT_BUCKETS),
+                    'query_time_ms': Histogram(QUERY_TIME_MS_BUCKETS),
+                    'repeated_queries': 0
+                }
+            histograms['query_count'].observe(stats.count)
+            histograms['query_time_ms'].observe(stats.seconds * 1000)
+            if stats.repeated():
+                histograms['repeated_queries'] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                endpoint: {
+                    'requests': histograms['query_count'].count,
+                    'query_count': histograms['query_count'].to_dict(),
+                    'query_time_ms': histograms['query_time_ms'].to_dict(),
+                    'requests_with_repeated_queries': histograms['repeated_queries']
+                }
+                for endpoint, histograms in sorted(self._endpoints.items())
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+# Global query metrics instance
+query_metrics = QueryMetrics()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """An endpoint ran more queries than its budget (raised only when TESTING)"""
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+def _handle_error(exception_context):
+    # Failed statements never reach after_cursor_execute
+    started = exception_context.connection.info.get('_query_started') \
+        if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+
+def _install_listeners() -> None:
+    global _listeners_installed
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+            _listeners_installed = True
+
+
+def register_query_metrics(app) -> None:
+    """
+    Count the queries each request runs. With QUERY_METRICS_HEADERS (on in
+    debug mode) responses carry X-Query-Count, X-Query-Time-Ms and
+    X-Query-Repeated headers.
+    """
+    _install_listeners()
+    app.config.setdefault('QUERY_METRICS_HEADERS', app.debug)
+
+    @app.before_request
+    def start_query_stats():
+        g._query_stats = QueryStats()
+
+    @app.after_request
+    def record_query_stats(response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        query_metrics.observe(request.endpoint or 'unmatched', stats)
+
+        repeated = stats.repeated()
+        if repeated:
+            logger.warning(f"{request.endpoint}: statement ran {repeated[0][1]} times "
+                           f"in one request (possible N+1): {repeated[0][0][:200]}")
+        if current_app.config.get('QUERY_METRICS_HEADERS'):
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers['X-Query-Time-Ms'] = f'{stats.seconds * 1000:.1f}'
+            response.headers['X-Query-Repeated'] = str(repeated[0][1] if repeated else 0)
+        return response
+
+
+def query_budget(max_queries: int):
+    """
+    Declare the most queries an endpoint may run. Exceeding it raises
+    QueryBudgetExceeded when TESTING, so tests fail, and logs a warning
+    otherwise.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            result = f(*args, **kwargs)
+            stats = current_stats()
+            if stats is not None and stats.count > max_queries:
+                statements = '; '.join(f'{count}x {sql[:120]}' for sql, count in stats.fingerprints.most_common(5))
+                message = f"{request.endpoint} ran {stats.count} queries (budget {max_queries}): {statements}"
+                if current_app.config.get('TESTING'):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return result
+
+        return decorated_function
+    return decorator
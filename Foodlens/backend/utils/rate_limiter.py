@@ -0,0 +1,194 @@
+"""
+Rate Limiting for FoodLens Application
+Token buckets kept in process memory or in Redis for multi-worker deployments.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+# Optional shared backend
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    logging.warning("redis not available. Install with: pip install redis")
+
+logger = logging.getLogger(__name__)
+
+# "memory" (per process) or "redis" (shared by every worker, needs REDIS_URL)
+RATE_LIMIT_STORAGE = os.getenv('RATE_LIMIT_STORAGE', 'memory')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+RATE_LIMIT_KEY_PREFIX = 'foodlens:ratelimit:'
+
+# Tokens one request takes from its bucket, by endpoint class. An OCR request
+# runs image preprocessing and Tesseract; a CRUD request is a few queries.
+COST_WEIGHTS = {
+    'crud': int(os.getenv('RATE_LIMIT_COST_CRUD', 1)),
+    'ocr': int(os.getenv('RATE_LIMIT_COST_OCR', 10)),
+}
+
+# Default budgets, in CRUD-cost tokens: OCR per client per hour, OCR across all
+# clients per minute, and sign-in/registration attempts per IP per minute
+OCR_LIMIT_PER_CLIENT = int(os.getenv('RATE_LIMIT_OCR_PER_CLIENT', 300))
+OCR_LIMIT_GLOBAL = int(os.getenv('RATE_LIMIT_OCR_GLOBAL', 1200))
+AUTH_LIMIT_PER_IP = int(os.getenv('RATE_LIMIT_AUTH_PER_IP', 20))
+
+# Memory store: how often buckets that have refilled are dropped
+SWEEP_INTERVAL = 60
+# After a Redis failure, seconds spent on the memory store before Redis is tried
+# again; otherwise every limited request waits out the socket timeout first
+REDIS_RETRY_COOLDOWN = float(os.getenv('RATE_LIMIT_REDIS_RETRY_COOLDOWN', 30))
+
+
+class RateLimitResult:
+    """Outcome of taking tokens from a bucket"""
+    __slots__ = ('allowed', 'limit', 'remaining', 'reset_after', 'retry_after')
+
+    def __init__(self, allowed: bool, limit: int, remaining: float, reset_after: float, retry_after: float):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        # Seconds until the bucket is full again
+        self.reset_after = reset_after
+        # Seconds until the request would be allowed (0 when allowed)
+        self.retry_after = retry_after
+
+    def headers(self, window_seconds: int) -> Dict[str, str]:
+        """RateLimit-* headers (IETF draft) plus Retry-After when limited"""
+        headers = {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(int(self.remaining)),
+            'RateLimit-Reset': str(math.ceil(self.reset_after)),
+            'RateLimit-Policy': f'{self.limit};w={window_seconds}',
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def _take(tokens: float, updated_at: float, now: float, capacity: int, rate: float,
+          cost: int) -> Tuple[bool, float, float]:
+    """Refill a bucket up to now and take cost tokens; (allowed, tokens, retry_after)"""
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict guarded by a lock; limits apply per process."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    def take(self, key: str, capacity: int, window_seconds: float, cost: int) -> RateLimitResult:
+        rate = capacity / window_seconds
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+            allowed, tokens, retry_after = _take(tokens, updated_at, now, capacity, rate, cost)
+            reset_after = (capacity - tokens) / rate
+            self._buckets[key] = (tokens, now, now + reset_after)
+            if now - self._swept_at >= SWEEP_INTERVAL:
+                # Full buckets are identical to new ones and can be dropped
+                self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+                self._swept_at = now
+        return RateLimitResult(allowed, capacity, tokens, reset_after, retry_after)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+# Same algorithm as _take, run atomically in Redis on the server clock.
+# KEYS[1] bucket; ARGV capacity, rate (tokens/s), cost. Returns
+# {allowed, tokens, retry_after} with floats as strings (Lua numbers
+# are truncated to integers in replies).
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class RedisBucketStore:
+    """
+    Token buckets in Redis, shared by every worker. Each check is one Lua
+    script call, and buckets expire once they have refilled.
+    """
+
+    def __init__(self, client, key_prefix: str = RATE_LIMIT_KEY_PREFIX):
+        self.client = client
+        self.key_prefix = key_prefix
+        self._script = client.register_script(_TOKEN_BUCKET_LUA)
+
+    def take(self, key: str, capacity: int, window_seconds: float, cost: int) -> RateLimitResult:
+        rate = capacity / window_seconds
+        allowed, tokens, retry_after = self._script(keys=[self.key_prefix + key], args=[capacity, rate, cost])
+        tokens = float(tokens)
+        return RateLimitResult(bool(int(allowed)), capacity, tokens, (capacity - tokens) / rate, float(retry_after))
+
+
+class RateLimiter:
+    """
+    Picks the bucket store and falls back to process memory while Redis is
+    unreachable, so an outage degrades to per-worker limits instead of errors.
+    Redis is not retried for REDIS_RETRY_COOLDOWN seconds after a failure.
+    """
+
+    def __init__(self, storage: str = RATE_LIMIT_STORAGE, redis_url: str = REDIS_URL):
+        self.memory = MemoryBucketStore()
+        self.store = self.memory
+        if storage == 'redis':
+            if REDIS_AVAILABLE:
+                self.store = RedisBucketStore(redis.Redis.from_url(redis_url, socket_timeout=0.2))
+            else:
+                logger.warning("RATE_LIMIT_STORAGE=redis but redis is not installed; using memory")
+        self._fallback_logged_at = 0.0
+        self._retry_at = 0.0
+
+    def take(self, key: str, capacity: int, window_seconds: float, cost: int = 1) -> RateLimitResult:
+        if self.store is not self.memory and time.monotonic() >= self._retry_at:
+            try:
+                return self.store.take(key, capacity, window_seconds, cost)
+            except Exception as e:
+                now = time.monotonic()
+                self._retry_at = now + REDIS_RETRY_COOLDOWN
+                if now - self._fallback_logged_at >= 60:
+                    self._fallback_logged_at = now
+                    logger.warning(f"Rate limit store unavailable, using memory for "
+                                   f"{REDIS_RETRY_COOLDOWN:.0f}s: {e}")
+        return self.memory.take(key, capacity, window_seconds, cost)
+
+    def resolve_cost(self, cost) -> int:
+        """Token cost from an endpoint class name or an explicit number"""
+        if isinstance(cost, str):
+            return COST_WEIGHTS[cost]
+        return int(cost)
+
+# Global rate limiter instance
+rate_limiter = RateLimiter()
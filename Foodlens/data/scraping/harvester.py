@@ -0,0 +1,220 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Türkiye ürünlerini popülerliğe göre sayfa sayfa döndüren arama endpoint'i
+TURKEY_SEARCH_URL = (
+    "https://world.openfoodfacts.org/cgi/search.pl?action=process&sort_by=unique_scans_n"
+    "&countries_tags_en=turkey&json=1&page_size={page_size}&page={page}"
+)
+USER_AGENT = "FoodLens/1.0 (https://github.com/alirizaercan/Foodlens-YZTA_Bootcamp-T199)"
+# Bu durum kodlarında istek tekrar denenir
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class HarvestError(Exception):
+    """Bir sayfa tüm denemelere rağmen çekilemedi"""
+
+
+class RateLimiter:
+    """
+    Tüm iş parçacıkları arasında paylaşılan saniye başına istek bütçesi.
+    İstekler 1/rps aralıklı zaman dilimlerine dağıtılır.
+    """
+
+    def __init__(self, rps):
+        self.interval = 1.0 / rps if rps and rps > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Harvester:
+    """
+    Open Food Facts arama sonuçlarını sayfa sayfa çeker.
+
+    - Tek bir bağlantı havuzlu requests.Session kullanılır
+    - Aynı anda en fazla `concurrency` sayfa çekilir, toplam hız `rps` ile sınırlıdır
+    - Hatalı istekler üstel bekleme ile en fazla `max_retries` kez tekrar denenir
+    - Sayfalar sırayla on_page'e verilir; her `checkpoint_every` sayfada bir
+      son tamamlanan sayfa checkpoint dosyasına yazılır, yarıda kalan tarama
+      oradan devam eder
+    """
+
+    def __init__(self, url_template=TURKEY_SEARCH_URL, page_size=100, concurrency=4, rps=2.0,
+                 max_retries=5, backoff=1.0, max_backoff=60.0, timeout=15, max_pages=None,
+                 checkpoint_path=None, checkpoint_every=1):
+        self.url_template = url_template
+        self.page_size = page_size
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.limiter = RateLimiter(rps)
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "pages": 0, "products": 0}
+
+    def page_url(self, page):
+        return self.url_template.format(page=page, page_size=self.page_size)
+
+    def _retry_delay(self, attempt, response=None):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_backoff))
+        return delay
+
+    def fetch_page(self, page):
+        """
+        Tek bir sayfayı çeker: ({'products': [...], 'count': n} gibi) JSON döner.
+        Ağ hataları, 429 ve 5xx yanıtları bekleyip tekrar denenir.
+        """
+        url = self.page_url(page)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            with self._lock:
+                self.stats["requests"] += 1
+            response = None
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+            except requests.exceptions.HTTPError:
+                # 4xx yanıtları tekrar denemekle düzelmez
+                raise HarvestError(f"Sayfa {page}: HTTP {response.status_code}")
+            except (requests.exceptions.RequestException, ValueError) as e:
+                error = str(e)
+
+            if attempt == self.max_retries:
+                break
+            with self._lock:
+                self.stats["retries"] += 1
+            delay = self._retry_delay(attempt, response)
+            print(f"Sayfa {page} çekilirken hata: {error}; {delay:.1f} saniye sonra tekrar denenecek")
+            time.sleep(delay)
+
+        raise HarvestError(f"Sayfa {page} {self.max_retries + 1} denemede çekilemedi: {error}")
+
+    def load_checkpoint(self):
+        """Aynı tarama için kaydedilmiş son tamamlanan sayfa, yoksa 0"""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Checkpoint okunamadı, baştan başlanıyor: {e}")
+            return 0
+        if state.get("url") != self.page_url("{page}") or state.get("page_size") != self.page_size:
+            print("Checkpoint farklı bir taramaya ait, baştan başlanıyor")
+            return 0
+        return int(state.get("last_page", 0))
+
+    def save_checkpoint(self, last_page):
+        if not self.checkpoint_path:
+            return
+        state = {
+            "url": self.page_url("{page}"),
+            "page_size": self.page_size,
+            "last_page": last_page,
+            "products": self.stats["products"],
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        # Yarıda kesilen yazma eski checkpoint'i bozmasın
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def harvest(self, on_page, start_page=None):
+        """
+        Boş sayfaya, son sayfaya veya max_pages'e kadar tarar ve her sayfayı
+        sırasıyla on_page(page, products) ile verir. start_page verilmezse
+        checkpoint'ten devam edilir. Son tamamlanan sayfa numarasını döner.
+        """
+        completed = self.load_checkpoint() if start_page is None else start_page - 1
+        if completed:
+            print(f"Checkpoint bulundu, {completed + 1}. sayfadan devam ediliyor")
+        last_page = self.max_pages or math.inf
+        next_page = completed + 1
+        done = {}
+        futures = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                while futures or next_page <= last_page:
+                    while len(futures) < self.concurrency and next_page <= last_page:
+                        futures[executor.submit(self.fetch_page, next_page)] = next_page
+                        next_page += 1
+
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        page = futures.pop(future)
+                        data = future.result()
+                        products = data.get("products") or []
+                        done[page] = products
+                        # Toplam ürün sayısı bilindiğinde son sayfadan sonrası istenmez
+                        count = data.get("count")
+                        if isinstance(count, int) or (isinstance(count, str) and count.isdigit()):
+                            last_page = min(last_page, max(1, math.ceil(int(count) / self.page_size)))
+                        if not products:
+                            last_page = min(last_page, page - 1)
+
+                    # Sayfalar sırayla teslim edilir; checkpoint yalnızca ardışık ilerler
+                    while completed + 1 in done:
+                        completed += 1
+                        products = done.pop(completed)
+                        if completed > last_page:
+                            continue
+                        self.stats["pages"] += 1
+                        self.stats["products"] += len(products)
+                        on_page(completed, products)
+                        if completed % self.checkpoint_every == 0:
+                            self.save_checkpoint(completed)
+
+                    # Son sayfadan sonrası için başlamış istekler beklenmez
+                    for future, page in list(futures.items()):
+                        if page > last_page and future.cancel():
+                            futures.pop(future)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        return min(completed, last_page)
+
+    def close(self):
+        self.session.close()
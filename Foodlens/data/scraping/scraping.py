@@ -1,8 +1,15 @@
 import requests
 import json
-import time
 import os
 import csv
+import argparse
+
+from harvester import Harvester, HarvestError
+
+# Tarama sırasında ürünlerin eklendiği JSON Lines dosyası (raw_data altında)
+SPOOL_FILENAME = "turkey_products.jsonl"
+# fsync ve checkpoint aralığı (sayfa)
+FSYNC_EVERY = 10
 
 def test_api_endpoint():
     """
@@ -37,75 +44,152 @@ def test_api_endpoint():
     
     return None, None
 
-def fetch_turkey_products():
+def fetch_turkey_products(concurrency=4, rps=2.0, max_pages=None, resume=True, spool_filename=SPOOL_FILENAME):
     """
-    Open Food Facts API'sinden Türkiye ürünlerinin TÜM sayfalarını çeker
+    Open Food Facts API'sinden Türkiye ürünlerinin TÜM sayfalarını çeker.
+    Sayfalar havuzlu bağlantılarla eşzamanlı çekilir ve JSON Lines spool
+    dosyasına eklenir; bellekte en fazla bir sayfa tutulur. Yarıda kalan
+    tarama son fsync edilen sayfadan devam eder. Tarama tamamlanırsa spool
+    dosyasının yolunu, yarıda kalırsa None döner.
     """
-    products = []
-    page = 1
-    max_pages = 200  # Güvenlik için maksimum sayfa sayısı
+    spool_path = os.path.join(raw_data_path(), spool_filename)
+    harvester = Harvester(
+        concurrency=concurrency,
+        rps=rps,
+        max_pages=max_pages,
+        checkpoint_path=f"{spool_path}.checkpoint",
+        # Checkpoint yalnızca diske yazılmış (fsync) sayfaları kapsar
+        checkpoint_every=FSYNC_EVERY
+    )
     
-    print("Türkiye ürünleri çekiliyor... (Tüm sayfalar)")
+    print(f"Türkiye ürünleri çekiliyor... (eşzamanlı {concurrency} sayfa, saniyede en fazla {rps} istek)")
     
-    # API endpoint'ini test et
-    working_url, test_data = test_api_endpoint()
+    completed = harvester.load_checkpoint() if resume and os.path.exists(spool_path) else 0
+    # Checkpoint'ten sonra eklenmiş satırlar tekrar çekilir; sıkıştırma tekrarları ayıklar
+    spool = ProductSpool(spool_path, append=completed > 0, fsync_every=FSYNC_EVERY)
     
-    if not working_url:
-        print("Geçerli API endpoint bulunamadı!")
-        return []
+    def on_page(page, page_products):
+        spool.write_page(page_products)
+        print(f"Sayfa {page} tamamlandı, bu sayfada {len(page_products)} ürün, toplam: {spool.count}")
     
-    print(f"Kullanılacak API endpoint: {working_url}")
+    try:
+        last_page = harvester.harvest(on_page, start_page=completed + 1)
+        print(f"{last_page}. sayfada tarama tamamlandı "
+              f"({harvester.stats['requests']} istek, {harvester.stats['retries']} tekrar deneme)")
+        harvester.clear_checkpoint()
+    except HarvestError as e:
+        print(f"Tarama durduruldu: {e}")
+        print("Tekrar çalıştırıldığında son checkpoint'ten devam edilecek.")
+        return None
+    finally:
+        spool.close()
+        harvester.close()
     
-    # Eğer test URL'i sayfa numarası içeriyorsa, onu temel alarak diğer sayfaları çek
-    if "page=1" in working_url:
-        base_url = working_url.replace("page=1", "page={}")
-        
-        while page <= max_pages:
-            url = base_url.format(page)
-            
+    return spool_path
+
+def raw_data_path():
+    """
+    raw_data dizininin mutlak yolu
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "..", "raw_data")
+
+class ProductSpool:
+    """
+    Ürünleri sayfa sayfa JSON Lines dosyasının sonuna ekler (satır başına bir ürün).
+    Her `fsync_every` sayfada bir dosya diske zorlanır.
+    """
+
+    def __init__(self, path, append=False, fsync_every=FSYNC_EVERY):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.pages = 0
+        self.count = 0
+        if append:
+            truncate_torn_line(path)
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write_page(self, products):
+        self._file.write("".join(json.dumps(product, ensure_ascii=False) + "\n" for product in products))
+        self.pages += 1
+        self.count += len(products)
+        if self.pages % self.fsync_every == 0:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+def truncate_torn_line(path, chunk_size=64 * 1024):
+    """
+    Kesilen bir yazmadan kalan yarım son satırı siler; yoksa sonraki ürün
+    bu satırın devamına eklenir ve ikisi birlikte kaybolur
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+            f.flush()
+            os.fsync(f.fileno())
+
+def read_spool(path):
+    """
+    Spool dosyasındaki ürünleri sırayla okur; yarım kalmış son satır atlanır
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
             try:
-                print(f"Sayfa {page} çekiliyor...")
-                response = requests.get(url, timeout=15)
-                response.raise_for_status()
-                
-                data = response.json()
-                page_products = data.get("products", [])
-                
-                if not page_products:
-                    print(f"Sayfa {page}'de ürün bulunamadı, çekme işlemi tamamlandı.")
-                    break
-                    
-                products.extend(page_products)
-                print(f"Sayfa {page} tamamlandı, bu sayfada {len(page_products)} ürün, toplam: {len(products)}")
-                
-                # Her 10 sayfada bir verileri kaydet (güvenlik için)
-                if page % 10 == 0:
-                    temp_filename = f"turkey_products_temp_{page}.json"
-                    save_products_to_json(products, temp_filename)
-                    print(f"Geçici kayıt yapıldı: {temp_filename}")
-                
-                # API'ye çok hızlı istek göndermemek için kısa bekleme
-                time.sleep(1)
-                
-                page += 1
-                
-            except requests.exceptions.RequestException as e:
-                print(f"Sayfa {page} çekilirken hata: {e}")
-                print("5 saniye bekleyip tekrar deneniyor...")
-                time.sleep(5)
+                yield json.loads(line)
+            except json.JSONDecodeError:
                 continue
-                
-            except Exception as e:
-                print(f"Beklenmeyen hata: {e}")
-                break
-                
-    else:
-        # Eğer tek sayfa ise, sadece o sayfadaki ürünleri al
-        if test_data and 'products' in test_data:
-            products = test_data['products']
-            print(f"Tek sayfadan {len(products)} ürün çekildi")
+
+def compact_spool(spool_path, filename="turkey_products.json"):
+    """
+    Spool dosyasını nihai JSON dizisine dönüştürür. Aynı barkod birden fazla
+    kez çekildiyse (sayfalar tarama sırasında kayabilir) en son kaydı kalır.
+    Ürünler akış halinde yazılır; bellekte yalnızca barkodlar tutulur.
+    Yazılan ürün sayısını döner.
+    """
+    # 1. geçiş: her barkodun son göründüğü satır
+    last_seen = {}
+    for index, product in enumerate(read_spool(spool_path)):
+        last_seen[product.get("code") or f"#{index}"] = index
+    keep = set(last_seen.values())
+    del last_seen
     
-    return products
+    filepath = os.path.join(raw_data_path(), filename)
+    temp_path = f"{filepath}.tmp"
+    written = 0
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for index, product in enumerate(read_spool(spool_path)):
+            if index in keep:
+                f.write(",\n" if written else "\n")
+                json.dump(product, f, ensure_ascii=False)
+                written += 1
+        f.write("\n]\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, filepath)
+    print(f"{written} ürün sıkıştırılarak kaydedildi: {filepath}")
+    return written
 
 def save_products_to_json(products, filename="turkey_products.json"):
     """
@@ -202,26 +286,30 @@ def save_products_to_csv(products, filename="turkey_products.csv"):
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open Food Facts Türkiye ürünlerini çeker")
+    parser.add_argument("--concurrency", type=int, default=4, help="Aynı anda çekilen sayfa sayısı")
+    parser.add_argument("--rps", type=float, default=2.0, help="Saniye başına en fazla istek")
+    parser.add_argument("--max-pages", type=int, default=None, help="En fazla sayfa (varsayılan: tümü)")
+    parser.add_argument("--fresh", action="store_true", help="Checkpoint'i yok sayıp baştan başla")
+    args = parser.parse_args()
+    
     # Ürünleri çek
-    products = fetch_turkey_products()
+    spool_path = fetch_turkey_products(args.concurrency, args.rps, args.max_pages, resume=not args.fresh)
     
-    if products:
-        print(f"\nToplam çekilen ürün sayısı: {len(products)}")
+    if spool_path:
+        # Spool'u nihai JSON dosyasına dönüştür
+        count = compact_spool(spool_path)
+        print(f"\nToplam çekilen ürün sayısı: {count}")
         
-        # İlk birkaç ürünün örnek bilgilerini göster
-        if len(products) > 0:
+        # İlk ürünün örnek bilgilerini göster
+        if count > 0:
             print("\nÖrnek ürün bilgisi:")
-            sample_product = products[0]
+            sample_product = next(read_spool(spool_path))
             print(f"Ürün adı: {sample_product.get('product_name', 'N/A')}")
             print(f"Marka: {sample_product.get('brands', 'N/A')}")
             print(f"Kategori: {sample_product.get('categories', 'N/A')}")
-        
-        # JSON olarak kaydet
-        json_success = save_products_to_json(products)
-        
-        if json_success:
             print("Veri çekme ve kaydetme işlemi başarıyla tamamlandı!")
         else:
-            print("Veri kaydedilirken hata oluştu.")
+            print("Hiç ürün çekilemedi.")
     else:
-        print("Hiç ürün çekilemedi.")
+        print("Tarama tamamlanamadı; çekilen sayfalar spool dosyasında korunuyor.")